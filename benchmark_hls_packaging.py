@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare the CPU cost of the HLS packaging modes on an MP3 file.
+
+The file is fed to the ffmpeg command of each mode (see
+talemo.audiostream.hls.ffmpeg_hls_command), as a session writes a TTS
+engine's output:
+- aac: the MP3 is decoded and encoded with an encoding profile (see
+  talemo.audiostream.profiles) in fMP4 segments
+- copy: the MP3 frames are packaged unchanged in MPEG-TS segments
+
+The CPU time (user + system) of the ffmpeg processes is reported in
+seconds per minute of audio, with the bytes written per minute.
+
+Usage:
+    python benchmark_hls_packaging.py story.mp3 --runs 5 --profile speech
+"""
+import os
+import argparse
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.dev')
+django.setup()
+
+from talemo.audiostream.hls import AUDIO_CODECS, ffmpeg_hls_command  # noqa: E402
+from talemo.audiostream.mp3 import FrameReader  # noqa: E402
+
+
+def children_cpu_seconds():
+    """Return the user and system CPU seconds of the finished child processes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def package(mp3_data, audio_codec, low_latency=False, profile=None):
+    """
+    Package MP3 data to HLS once.
+
+    Returns:
+        tuple: (cpu_seconds, wall_seconds, segment_count, media_bytes)
+    """
+    hls_dir = tempfile.mkdtemp(prefix=f"hls_{audio_codec}_")
+    try:
+        cmd = ffmpeg_hls_command(hls_dir, low_latency=low_latency, audio_codec=audio_codec, profile=profile)
+        cpu_before = children_cpu_seconds()
+        started = time.monotonic()
+        subprocess.run(cmd, input=mp3_data, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        wall = time.monotonic() - started
+        cpu = children_cpu_seconds() - cpu_before
+        # The renditions of an ABR ladder are written to subdirectories
+        segments = [os.path.join(root, f) for root, _, files in os.walk(hls_dir)
+                    for f in files if f.startswith(("segment_", "part_"))]
+        size = sum(os.path.getsize(f) for f in segments)
+        return cpu, wall, len(segments), size
+    finally:
+        shutil.rmtree(hls_dir, ignore_errors=True)
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description='Compare the CPU cost of the HLS packaging modes')
+    parser.add_argument('mp3_file', type=str, help='MP3 file, e.g. the output of a TTS engine')
+    parser.add_argument('--runs', '-n', type=int, default=3, help='Runs per mode (the median is reported)')
+    parser.add_argument('--low-latency', action='store_true', help='Write LL-HLS partial segments')
+    parser.add_argument('--profile', '-p', type=str, help='Encoding profile of the aac mode (default: HLS_ENCODING_PROFILE)')
+    args = parser.parse_args()
+
+    with open(args.mp3_file, 'rb') as f:
+        mp3_data = f.read()
+    reader = FrameReader()
+    reader.feed(mp3_data)
+    if not reader.seconds:
+        parser.error(f"No MP3 audio in {args.mp3_file}")
+    audio_minutes = reader.seconds / 60
+
+    print(f"{args.mp3_file}: {reader.seconds:.1f}s of audio, {reader.header.sample_rate} Hz, "
+          f"{reader.header.bitrate} kbit/s")
+    results = {}
+    for audio_codec in AUDIO_CODECS:
+        runs = sorted(package(mp3_data, audio_codec, args.low_latency, args.profile) for _ in range(args.runs))
+        cpu, wall, segments, size = runs[len(runs) // 2]
+        results[audio_codec] = cpu / audio_minutes
+        print(f"{audio_codec:>5}: {results[audio_codec]:.3f} CPU s per audio minute, "
+              f"{size / audio_minutes / 1024:.0f} KiB per audio minute, "
+              f"{reader.seconds / wall:.0f}x real time, {segments} files")
+
+    if results["copy"]:
+        print(f"copy uses {results['aac'] / results['copy']:.1f}x less CPU than aac")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,11 @@ app.autodiscover_tasks()
 
 # Configure the Celery Beat schedule
 app.conf.beat_schedule = {
-    # No scheduled tasks
+    # Evict old sessions' HLS output from local disk (talemo/audiostream/retention.py)
+    'sweep-hls-storage': {
+        'task': 'talemo.audiostream.tasks.sweep_hls_storage',
+        'schedule': crontab(minute='*/10'),
+    },
 }
 
 
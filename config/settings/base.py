@@ -195,6 +195,112 @@ MEDIA_URL  = "/media/"
 # HLS Streaming
 HLS_ROOT = os.path.join(BASE_DIR, "media", "hls")
 HLS_URL = "/media/hls/"
+# HLS writer backend: "ffmpeg" (external ffmpeg process) or "pyav" (in-process, requires PyAV)
+HLS_WRITER_BACKEND = os.environ.get("HLS_WRITER_BACKEND", "ffmpeg")
+# Pre-started ffmpeg encoders kept per worker process (0 disables the pool)
+HLS_ENCODER_POOL_SIZE = int(os.environ.get("HLS_ENCODER_POOL_SIZE", "2"))
+# Directory of the encoders' slot symlinks (not served)
+HLS_ENCODER_POOL_DIR = os.environ.get("HLS_ENCODER_POOL_DIR", os.path.join(BASE_DIR, "media", "hls_warm"))
+# Idle encoders older than this are replaced
+HLS_ENCODER_MAX_IDLE_SECONDS = float(os.environ.get("HLS_ENCODER_MAX_IDLE_SECONDS", "600"))
+# Low-Latency HLS: partial segments and blocking playlist reloads, served by
+# the /audiostream/live/ endpoints (players need LL-HLS support)
+HLS_LOW_LATENCY = os.environ.get("HLS_LOW_LATENCY", "false").lower() in ("1", "true", "yes")
+# Duration of an LL-HLS partial segment in seconds
+HLS_PART_DURATION = float(os.environ.get("HLS_PART_DURATION", "0.2"))
+# Minimum seconds between two writes of a live media playlist file; the
+# changes in between are written together. The file is read by the static
+# HLS URL and by live requests in other processes without HLS_LIVE_BACKEND,
+# which see a new segment or part up to this much later; readers in the
+# writer's process and the RAM tier get every change at once. 0 writes
+# every change
+HLS_PLAYLIST_WRITE_INTERVAL = float(os.environ.get("HLS_PLAYLIST_WRITE_INTERVAL", "1.0"))
+# Most silence written after a text chunk to get its end encoded and cut
+# into a segment (or part) at once; no silence is written when the next cut
+# is further away. The muxer only cuts on audio, so the silence is heard as
+# a pause after the chunk: this trades gaps in the narration for the end of
+# each sentence being playable without waiting for the next one (up to a
+# segment, or a part in low-latency mode, when TTS is slower than real
+# time). 0 (the default) writes none
+HLS_CHUNK_FLUSH_MAX_SILENCE = float(os.environ.get("HLS_CHUNK_FLUSH_MAX_SILENCE", "0"))
+# Audio codec of the HLS output: "aac" (MP3 encoded with the encoding profile
+# in fMP4 segments) or "copy" (MP3 frames packaged unchanged in MPEG-TS segments,
+# ffmpeg backend only); a session can choose with the "audio_codec" field of
+# its start request
+HLS_AUDIO_CODEC = os.environ.get("HLS_AUDIO_CODEC", "aac")
+# Encoding profile of the HLS output (see talemo/audiostream/profiles.py):
+# "standard" (AAC 128 kbit/s), "speech" (mono 24 kHz AAC 32 kbit/s),
+# "speech-he" (HE-AAC, needs libfdk_aac) or "speech-opus"; a session can
+# choose with the "profile" field of its start request
+HLS_ENCODING_PROFILE = os.environ.get("HLS_ENCODING_PROFILE", "standard")
+# Adaptive-bitrate ladder: comma-separated encoding profiles, e.g.
+# "standard,speech", encoded by one ffmpeg process into renditions listed in
+# the session's master playlist (players start with the first one); empty
+# for a single rendition of HLS_ENCODING_PROFILE. Sessions that choose a
+# profile, copy mode and the pyav backend get a single rendition
+HLS_ABR_LADDER = os.environ.get("HLS_ABR_LADDER", "")
+# Seconds after the playback of a finished session (its audio duration) when
+# its segments are compacted into one byte-range file per rendition with a
+# VOD playlist (talemo/audiostream/vod.py); negative to keep the segments
+HLS_VOD_COMPACTION_DELAY = float(os.environ.get("HLS_VOD_COMPACTION_DELAY", "600"))
+# RAM tier the live playlists and segments are also stored in and served
+# from by the /audiostream/live/ endpoints without disk I/O: "memory" (the
+# worker's own memory, for a single process running the web app and the
+# sessions), "redis" (shared by the worker and web processes) or empty
+HLS_LIVE_BACKEND = os.environ.get("HLS_LIVE_BACKEND", "")
+# Seconds a live file is kept in the RAM tier
+HLS_LIVE_TTL = float(os.environ.get("HLS_LIVE_TTL", "3600"))
+# Redis database of the "redis" live tier
+HLS_LIVE_REDIS_URL = os.environ.get("HLS_LIVE_REDIS_URL", os.environ.get("REDIS_URL", REDIS_URL))
+# Upload the HLS output to the S3-compatible bucket above (e.g. MinIO) as it
+# is produced, with finished sessions deleted from local disk once uploaded,
+# so web nodes need no shared filesystem; players then load the sessions
+# from the /audiostream/live/ endpoints, which read moved sessions from the
+# bucket
+HLS_OBJECT_STORAGE = os.environ.get("HLS_OBJECT_STORAGE", "false").lower() in ("1", "true", "yes")
+# Key prefix of the sessions in the bucket
+HLS_OBJECT_STORAGE_PREFIX = os.environ.get("HLS_OBJECT_STORAGE_PREFIX", "hls")
+# Upload threads (and pooled connections) per worker process
+HLS_OBJECT_STORAGE_UPLOAD_WORKERS = int(os.environ.get("HLS_OBJECT_STORAGE_UPLOAD_WORKERS", "4"))
+# Sweeper of the sessions' HLS output (talemo/audiostream/retention.py, run by
+# Celery beat): finished sessions are moved to object storage if enabled, or
+# deleted, once unused for HLS_GC_MAX_AGE seconds (HLS_GC_ERROR_MAX_AGE for
+# failed sessions and sessions that never finished)
+HLS_GC_MAX_AGE = float(os.environ.get("HLS_GC_MAX_AGE", str(7 * 24 * 3600)))
+HLS_GC_ERROR_MAX_AGE = float(os.environ.get("HLS_GC_ERROR_MAX_AGE", str(24 * 3600)))
+# Bytes of HLS output kept on local disk per tenant (the site a session was
+# started from), least recently used sessions first evicted; 0 for no quota
+HLS_GC_TENANT_QUOTA = int(os.environ.get("HLS_GC_TENANT_QUOTA", "0"))
+# Used fraction of the HLS disk above which the least recently used
+# sessions are evicted, until it is back under the low watermark
+HLS_GC_HIGH_WATERMARK = float(os.environ.get("HLS_GC_HIGH_WATERMARK", "0.9"))
+HLS_GC_LOW_WATERMARK = float(os.environ.get("HLS_GC_LOW_WATERMARK", "0.8"))
+
+# Text-to-speech
+# Engine registered in talemo.audiostream.tts: "gtts" (network) or "espeak" (local espeak-ng)
+TTS_ENGINE = os.environ.get("TTS_ENGINE", "gtts")
+# Engine-specific voice (gTTS accent domain or espeak-ng voice), empty for the default
+TTS_VOICE = os.environ.get("TTS_VOICE", "") or None
+# Word limit of the first text chunk of a session, kept short for a fast first audio
+TTS_FIRST_CHUNK_WORDS = int(os.environ.get("TTS_FIRST_CHUNK_WORDS", "10"))
+# Adapt the size of the following chunks to the seconds of audio buffered ahead of playback
+TTS_ADAPTIVE_CHUNKS = os.environ.get("TTS_ADAPTIVE_CHUNKS", "True") == "True"
+TTS_CHUNK_WORDS_MIN = int(os.environ.get("TTS_CHUNK_WORDS_MIN", "8"))
+TTS_CHUNK_WORDS_MAX = int(os.environ.get("TTS_CHUNK_WORDS_MAX", "80"))
+TTS_TARGET_BUFFER_SECONDS = float(os.environ.get("TTS_TARGET_BUFFER_SECONDS", "10"))
+# Generation pauses when it is this many seconds of audio ahead of playback
+TTS_MAX_BUFFER_SECONDS = float(os.environ.get("TTS_MAX_BUFFER_SECONDS", "60"))
+# TTS worker threads per process, shared by all audio sessions (caps outbound TTS requests)
+TTS_POOL_WORKERS = int(os.environ.get("TTS_POOL_WORKERS", "8"))
+# Number of chunks an audio session may have in the shared TTS pool at once
+TTS_CONCURRENCY = int(os.environ.get("TTS_CONCURRENCY", "3"))
+# Maximum number of text chunks waiting between the LLM reader and the HLS writer
+TTS_PREFETCH_CHUNKS = int(os.environ.get("TTS_PREFETCH_CHUNKS", "4"))
+# Content-addressed cache of synthesized audio (in-process LRU + optional shared disk tier)
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE_ENABLED", "True") == "True"
+TTS_CACHE_MEMORY_BYTES = int(os.environ.get("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(BASE_DIR, "media", "tts_cache"))
+TTS_CACHE_DISK_BYTES = int(os.environ.get("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
 
 
 STABILITY_API_KEY = os.environ.get("STABILITY_API_KEY", "")
@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import logging
 import os
 from django.contrib import admin
 from django.urls import path, include
@@ -21,6 +22,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView, TemplateView
 
+logger = logging.getLogger(__name__)
+
 urlpatterns = [
     # Sticky Mobile
     path('_manifest.json', RedirectView.as_view(url=static('stickymobile/_manifest.json'), permanent=True)),
@@ -51,7 +54,7 @@ if settings.DEBUG:
     # Try to serve HLS files from the Docker container path first
     docker_hls_dir = "/app/media/hls"
     if os.path.exists(docker_hls_dir) and os.path.isdir(docker_hls_dir):
-        print(f"Serving HLS files from Docker container path: {docker_hls_dir}")
+        logger.info(f"Serving HLS files from Docker container path: {docker_hls_dir}")
         urlpatterns += static(settings.HLS_URL, document_root=docker_hls_dir)
         # Also serve without trailing slash
         urlpatterns += static(settings.HLS_URL.rstrip('/'), document_root=docker_hls_dir)
@@ -59,38 +62,18 @@ if settings.DEBUG:
     # Serve HLS files from the media/hls directory in development
     hls_dir = os.path.join(settings.MEDIA_ROOT, 'hls')
     if os.path.exists(hls_dir):
-        print(f"Serving HLS files from media/hls directory: {hls_dir}")
+        logger.info(f"Serving HLS files from media/hls directory: {hls_dir}")
         urlpatterns += static(settings.HLS_URL, document_root=hls_dir)
         # Also serve without trailing slash
         urlpatterns += static(settings.HLS_URL.rstrip('/'), document_root=hls_dir)
 
-    # Serve HLS files from the temporary directory if it exists
-    # This is a fallback for when the media/hls directory is not writable
-    import tempfile
-    temp_dir = tempfile.gettempdir()
-    for dir_name in os.listdir(temp_dir):
-        if dir_name.startswith('hls_'):
-            hls_temp_dir = os.path.join(temp_dir, dir_name)
-            if os.path.isdir(hls_temp_dir):
-                print(f"Serving HLS files from temporary directory: {hls_temp_dir}")
-                # Serve with the standard HLS URL
-                # Look for session directories inside the temp directory
-                for session_dir in os.listdir(hls_temp_dir):
-                    session_path = os.path.join(hls_temp_dir, session_dir)
-                    if os.path.isdir(session_path):
-                        # Map /media/hls/{session_id}/ to {hls_temp_dir}/{session_id}/
-                        print(f"Mapping /media/hls/{session_dir}/ to {session_path}")
-                        # Add URL pattern with trailing slash
-                        urlpatterns += static(f"/media/hls/{session_dir}/", document_root=session_path)
-                        # Add URL pattern without trailing slash to handle both cases
-                        urlpatterns += static(f"/media/hls/{session_dir}", document_root=session_path)
-
-                # Also serve the root temp directory with the standard HLS URL for new sessions
-                urlpatterns += static(settings.HLS_URL, document_root=hls_temp_dir)
-                # Also serve without trailing slash
-                urlpatterns += static(settings.HLS_URL.rstrip('/'), document_root=hls_temp_dir)
-
-                # Also serve with an alternative URL for direct access
-                urlpatterns += static(f"/temp_hls/{dir_name}/", document_root=hls_temp_dir)
-                # Also serve without trailing slash
-                urlpatterns += static(f"/temp_hls/{dir_name}", document_root=hls_temp_dir)
+    # Serve the HLS root of the segment store when it is neither of the
+    # above (e.g. an absolute HLS_ROOT), without creating a store here; the
+    # sessions are in its shard directories, one route serves them all
+    from talemo.audiostream.storage import hls_root
+    store_dir = hls_root()
+    if store_dir and os.path.realpath(store_dir) not in (os.path.realpath(docker_hls_dir), os.path.realpath(hls_dir)):
+        logger.info(f"Serving HLS files from the segment store directory: {store_dir}")
+        urlpatterns += static(settings.HLS_URL, document_root=store_dir)
+        # Also serve without trailing slash
+        urlpatterns += static(settings.HLS_URL.rstrip('/'), document_root=store_dir)
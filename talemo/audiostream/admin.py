@@ -3,10 +3,10 @@ from django.utils.html import format_html
 from .models import AudioSession
 
 class AudioSessionAdmin(admin.ModelAdmin):
-    list_display = ('session_id', 'created_at', 'status_colored', 'playlist_rel_url')
-    list_filter = ('status', 'created_at')
+    list_display = ('session_id', 'created_at', 'status_colored', 'tenant', 'last_accessed_at', 'playlist_rel_url')
+    list_filter = ('status', 'created_at', 'tenant')
     search_fields = ('session_id', 'playlist_rel_url')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'finished_at', 'last_accessed_at')
 
     def status_colored(self, obj):
         colors = {
@@ -14,6 +14,8 @@ class AudioSessionAdmin(admin.ModelAdmin):
             'running': 'blue',
             'ready': 'green',
             'error': 'red',
+            'archived': 'gray',
+            'expired': 'gray',
         }
         color = colors.get(obj.status, 'black')
         return format_html('<span style="color: {};">{}</span>', color, obj.status)
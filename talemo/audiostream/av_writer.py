@@ -0,0 +1,276 @@
+"""
+In-process HLS writer backed by PyAV (libav bindings).
+
+PyAVHLSWriter has the same API as StreamingHLSWriter but decodes the MP3
+data, encodes it to AAC and muxes the fMP4 HLS segments inside the Python
+process, with the same HLS muxer options. A session then costs no ffmpeg
+process, pipe buffers or stderr reader, which lets a worker host many more
+concurrent sessions.
+
+The muxer writes a segment in one go when it cuts it, so a segment is
+reported ready as soon as its file appears, and the last one when the
+muxer is closed.
+
+Select it with ``HLS_WRITER_BACKEND = "pyav"``. PyAV is an optional
+dependency (``pip install av``).
+"""
+import os
+import uuid
+import logging
+
+try:
+    import av
+except ImportError:  # pragma: no cover - optional dependency
+    av = None
+
+from .hls import SegmentEvents, hls_muxer_options, muxer_playlist_path
+from .profiles import get_profile
+
+logger = logging.getLogger(__name__)
+
+
+class PyAVHLSWriter(SegmentEvents):
+    """
+    Encode MP3 chunks into an HLS playlist without an external process.
+    """
+
+    # No ffmpeg process for the pipeline to monitor or restart
+    uses_ffmpeg_process = False
+
+    def __init__(self, output_dir, segment_duration=2, bitrate=None, low_latency=None, profile=None):
+        """
+        Initialize the PyAVHLSWriter instance.
+
+        Args:
+            output_dir (str): Path to output directory
+            segment_duration (int): Duration of each segment in seconds (default: 2)
+            bitrate (int, optional): Bit rate in bits per second
+                (default: the profile's)
+            low_latency (bool, optional): Publish LL-HLS partial segments
+                (default: settings.HLS_LOW_LATENCY)
+            profile (str, optional): Encoding profile, see profiles.py
+                (default: settings.HLS_ENCODING_PROFILE)
+
+        Raises:
+            RuntimeError: If PyAV is not installed, the profile's encoder is
+                not available or the directory is not writable
+            ValueError: If the profile is unknown
+        """
+        if av is None:
+            raise RuntimeError("The pyav HLS writer backend requires PyAV (pip install av)")
+
+        self.segment_duration = segment_duration
+        self.profile = get_profile(profile)
+        self.bitrate = bitrate or self.profile.bitrate
+        try:
+            av.Codec(self.profile.encoder, "w")
+        except ValueError as e:
+            raise RuntimeError(f"The {self.profile.name} profile's encoder {self.profile.encoder} "
+                               f"is not available in this libav build") from e
+
+        self.hls_dir = output_dir
+        os.makedirs(self.hls_dir, exist_ok=True)
+        if not os.access(self.hls_dir, os.W_OK):
+            logger.error(f"Output directory {self.hls_dir} is not writable")
+            raise RuntimeError(f"Output directory {self.hls_dir} is not writable")
+
+        self.chunk_count = 0
+        self.playlist_path = os.path.join(self.hls_dir, "audio.m3u8")
+
+        self._decoder = av.CodecContext.create("mp3", "r")
+        # The output is opened on the first decoded frame, once the sample
+        # rate and channel layout are known
+        self._container = None
+        self._stream = None
+        self._resampler = None
+        self._samples = 0
+        # Samples, format, layout and rate of the decoded input
+        self._input_samples = 0
+        self._input_format = None
+        self._finalized = False
+        self._init_events(low_latency, codecs=self.profile.codecs,
+                          bandwidth=self.profile.bandwidth if bitrate is None else None)
+        self._options = hls_muxer_options(self.hls_dir, self.low_latency)
+
+    def _segment_path(self, index):
+        return self._options["hls_segment_filename"] % index
+
+    def _check_segments(self):
+        """Report the segments completed by the last muxed packets."""
+        # fMP4 segments are buffered by the muxer and written in one go
+        # when they are cut, so a segment file is complete once it exists
+        while os.path.exists(self._segment_path(self.segments_ready)):
+            self._segment_ready(self.segments_ready, self._segment_path(self.segments_ready))
+
+    def _open_output(self, frame):
+        logger.info(f"Opening in-process HLS muxer for {self.playlist_path}")
+        self._container = av.open(
+            muxer_playlist_path(self.hls_dir), "w", format="hls",
+            options=self._options,
+        )
+        profile = self.profile
+        layout = {1: "mono", 2: "stereo"}.get(profile.channels, frame.layout.name)
+        rate = profile.sample_rate or frame.sample_rate
+        self._stream = self._container.add_stream(profile.encoder, rate=rate, layout=layout,
+                                                  options=dict(profile.options))
+        self._stream.bit_rate = self.bitrate
+        # The encoders take fixed-size frames in their own sample format
+        self._resampler = av.AudioResampler(
+            format=self._stream.codec_context.format.name, layout=layout, rate=rate,
+            frame_size=profile.frame_size,
+        )
+
+    def _encode(self, frames):
+        for frame in frames:
+            if self._container is None:
+                self._open_output(frame)
+                self._input_format = (frame.format.name, frame.layout.name, frame.sample_rate)
+            self._input_samples += frame.samples
+            for resampled in self._resampler.resample(frame):
+                self._mux(resampled)
+
+    def _mux(self, frame):
+        frame.pts = self._samples
+        self._samples += frame.samples
+        for packet in self._stream.encode(frame):
+            self._container.mux(packet)
+        self._check_segments()
+
+    def _feed(self, data):
+        """Decode a piece of MP3 data and encode the complete frames it contains."""
+        for packet in self._decoder.parse(data):
+            try:
+                frames = self._decoder.decode(packet)
+            except av.error.InvalidDataError:
+                # ID3 tags and Xing headers are parsed as packets too
+                logger.debug(f"Skipping undecodable MP3 packet of {packet.size} bytes")
+                continue
+            self._encode(frames)
+
+    def _input_timing(self):
+        if self._input_format is None:
+            return None
+        sample_rate = self._input_format[2]
+        return self._input_samples / sample_rate, sample_rate
+
+    def _write_silence(self):
+        """Encode one encoder frame of silence."""
+        if self._finalized:
+            return 0.0
+        sample_format, layout, sample_rate = self._input_format
+        frame = av.AudioFrame(format=sample_format, layout=layout,
+                              samples=self._stream.codec_context.frame_size or 1024)
+        for plane in frame.planes:
+            plane.update(bytes(plane.buffer_size))
+        frame.sample_rate = sample_rate
+        self._encode([frame])
+        return frame.samples / sample_rate
+
+    def process_chunk(self, audio_data):
+        """
+        Process a single audio chunk.
+
+        Args:
+            audio_data (bytes): MP3 data to encode
+
+        Returns:
+            dict: Information about the processed chunk
+        """
+        if not audio_data:
+            logger.warning("Empty audio data received, skipping")
+            return None
+
+        if not isinstance(audio_data, bytes):
+            logger.warning(f"Invalid audio data type: {type(audio_data)}, expected bytes")
+            return None
+
+        return self.process_stream([audio_data])
+
+    def process_stream(self, frames):
+        """
+        Process one audio chunk that arrives as a stream of pieces.
+
+        Args:
+            frames (iterable of bytes): The chunk's MP3 data
+
+        Returns:
+            dict: Information about the processed chunk, or None if no data
+            was received
+        """
+        if self._finalized:
+            logger.warning("HLS writer already finalized, dropping audio chunk")
+            return None
+
+        chunk_id = f"chunk_{self.chunk_count:03d}_{uuid.uuid4().hex[:8]}"
+        bytes_written = 0
+
+        for data in frames:
+            if not data:
+                continue
+            if bytes_written == 0:
+                logger.info(f"Encoding audio chunk {self.chunk_count + 1}")
+            try:
+                self._feed(data)
+            except av.error.FFmpegError as e:
+                logger.error(f"Error encoding audio chunk {self.chunk_count + 1}: {str(e)}")
+                return None
+            bytes_written += len(data)
+
+        if bytes_written == 0:
+            logger.warning("Empty audio stream received, skipping")
+            return None
+
+        self.chunk_count += 1
+
+        return {
+            'chunk_id': chunk_id,
+            'hls_dir': self.hls_dir,
+            'bytes': bytes_written
+        }
+
+    def finalize(self):
+        """
+        Flush the encoder and close the playlist.
+
+        Returns:
+            dict: Information about the generated HLS stream
+        """
+        logger.info("Finalizing HLS playlist")
+
+        if not self._finalized:
+            self._finalized = True
+            try:
+                # Drain the decoder, the resampler and the encoder
+                self._encode(self._decoder.decode(None))
+                if self._container is not None:
+                    for frame in self._resampler.resample(None):
+                        self._mux(frame)
+                    for packet in self._stream.encode(None):
+                        self._container.mux(packet)
+            finally:
+                if self._container is not None:
+                    self._container.close()
+                    self._container = None
+                # Closing the muxer wrote the last segment
+                while os.path.exists(self._segment_path(self.segments_ready)):
+                    self._segment_ready(self.segments_ready, self._segment_path(self.segments_ready))
+                self._close_events()
+
+        if not os.path.exists(self.playlist_path):
+            logger.warning(f"Playlist file not found at {self.playlist_path} after finalization")
+
+        return {
+            'playlist_path': self.playlist_path,
+            'hls_dir': self.hls_dir,
+            'segment_count': len(self.manifest.segments()),
+            'chunk_count': self.chunk_count
+        }
+
+    def __del__(self):
+        """Close the muxer if the session was not finalized."""
+        container = getattr(self, '_container', None)
+        if container is not None:
+            try:
+                container.close()
+            except Exception:
+                pass
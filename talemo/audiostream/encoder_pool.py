@@ -0,0 +1,213 @@
+"""
+Warm pool of pre-started ffmpeg HLS encoders.
+
+Starting ffmpeg costs a fork/exec and the loading of its libraries, which
+would otherwise be paid on every session's time to first audio. The pool
+keeps a few encoders running per worker process, each blocked on its stdin.
+
+An encoder's output paths are fixed on its command line, so every warm
+encoder writes to its own *slot* path, ``<HLS_ENCODER_POOL_DIR>/<id>``,
+which does not exist yet. ffmpeg only opens its HLS outputs once input
+has arrived, so when a session claims an encoder the slot is created as a
+symlink to the session's output directory and the playlist and segments
+land there.
+
+A background thread replaces claimed encoders, and drops the ones that
+died or have been idle for more than ``max_idle`` seconds.
+"""
+import logging
+import os
+import subprocess
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WarmEncoder:
+    """A pre-started encoder process and the slot path its outputs go to."""
+
+    def __init__(self, process, slot_path):
+        self.process = process
+        self.slot_path = slot_path
+        self.started_at = time.monotonic()
+
+    @property
+    def alive(self):
+        return self.process.poll() is None and not self.process.stdin.closed
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error stopping warm ffmpeg encoder {self.process.pid}: {str(e)}")
+
+
+def release_slot(slot_path):
+    """Remove the symlink of a claimed slot once its encoder has exited."""
+    if slot_path and os.path.islink(slot_path):
+        try:
+            os.unlink(slot_path)
+        except OSError as e:
+            logger.warning(f"Error removing encoder slot {slot_path}: {str(e)}")
+
+
+class EncoderPool:
+    """
+    Keep ``size`` encoders started by ``command_factory(slot_path)`` ready.
+    """
+
+    def __init__(self, size, slot_dir, command_factory, max_idle=600.0, check_interval=5.0):
+        """
+        Initialize the pool and start filling it in the background.
+
+        Args:
+            size (int): Number of idle encoders to keep
+            slot_dir (str): Directory holding the encoders' slot paths
+            command_factory (callable): Returns the command line of an encoder
+                writing to the given slot path
+            max_idle (float): Seconds after which an idle encoder is replaced
+            check_interval (float): Seconds between health checks
+        """
+        self.size = size
+        self.slot_dir = slot_dir
+        self.command_factory = command_factory
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+
+        self.claimed = 0
+        self.missed = 0
+        self._idle = []
+        self._lock = threading.Condition()
+        self._stopped = False
+
+        os.makedirs(self.slot_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._maintain, daemon=True, name="hls-encoder-pool")
+        self._thread.start()
+
+    def claim(self, output_dir):
+        """
+        Take a warm encoder and point its outputs at ``output_dir``.
+
+        Returns:
+            WarmEncoder or None: None if no healthy encoder is ready, in which
+            case the caller starts its own process
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.missed += 1
+                    self._lock.notify()
+                    return None
+                encoder = self._idle.pop(0)
+                self._lock.notify()
+
+            if not encoder.alive:
+                logger.warning(f"Warm ffmpeg encoder {encoder.process.pid} died while idle, discarding it")
+                continue
+
+            try:
+                os.symlink(os.path.abspath(output_dir), encoder.slot_path)
+            except OSError as e:
+                logger.error(f"Error linking encoder slot {encoder.slot_path}: {str(e)}")
+                encoder.kill()
+                continue
+
+            with self._lock:
+                self.claimed += 1
+            logger.info(f"Claimed warm ffmpeg encoder {encoder.process.pid} for {output_dir}")
+            return encoder
+
+    def _spawn(self):
+        slot_path = os.path.join(self.slot_dir, uuid.uuid4().hex)
+        process = subprocess.Popen(
+            self.command_factory(slot_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        return WarmEncoder(process, slot_path)
+
+    def _maintain(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                # Health check: drop dead and stale encoders
+                now = time.monotonic()
+                expired = [e for e in self._idle if not e.alive or now - e.started_at > self.max_idle]
+                self._idle = [e for e in self._idle if e not in expired]
+                missing = self.size - len(self._idle)
+
+            for encoder in expired:
+                logger.info(f"Replacing warm ffmpeg encoder {encoder.process.pid}")
+                encoder.kill()
+
+            spawned = []
+            try:
+                for _ in range(missing):
+                    spawned.append(self._spawn())
+            except Exception as e:
+                logger.error(f"Error starting a warm ffmpeg encoder: {str(e)}")
+
+            with self._lock:
+                self._idle.extend(spawned)
+                if self._stopped:
+                    continue
+                if len(self._idle) >= self.size or not spawned:
+                    # Sleep until a claim or the next health check
+                    self._lock.wait(self.check_interval)
+
+    def shutdown(self):
+        """Stop refilling the pool and kill the idle encoders."""
+        with self._lock:
+            self._stopped = True
+            idle, self._idle = self._idle, []
+            self._lock.notify()
+        for encoder in idle:
+            encoder.kill()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "claimed": self.claimed,
+                "missed": self.missed,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_encoder_pool():
+    """
+    Return the warm encoder pool of the current process, creating it on first
+    use, or None when it is disabled (``HLS_ENCODER_POOL_SIZE = 0``).
+    """
+    global _pool, _pool_pid
+
+    size = getattr(settings, 'HLS_ENCODER_POOL_SIZE', 2)
+    if size <= 0:
+        return None
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                from .hls import ffmpeg_hls_command
+                _pool = EncoderPool(
+                    size=size,
+                    slot_dir=getattr(settings, 'HLS_ENCODER_POOL_DIR',
+                                     os.path.join(settings.BASE_DIR, "media", "hls_warm")),
+                    command_factory=ffmpeg_hls_command,
+                    max_idle=getattr(settings, 'HLS_ENCODER_MAX_IDLE_SECONDS', 600.0),
+                )
+                _pool_pid = pid
+    return _pool
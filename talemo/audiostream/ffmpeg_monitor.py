@@ -0,0 +1,186 @@
+"""
+Background reader of an ffmpeg HLS encoder's stderr.
+
+ffmpeg blocks once its stderr pipe buffer (64 KB on Linux) is full, so the
+pipe must be drained for as long as the process runs. FFmpegMonitor reads
+it in a thread and turns the output into structured events:
+
+``segment_opened``
+    The HLS muxer started writing a segment (``{"index", "path"}``).
+``segment_ready``
+    A segment is complete and listed in the playlist: the muxer rewrites
+    the playlist right after closing a segment (``{"index", "path"}``).
+``progress``
+    A ``-progress`` report (``{"out_time", "total_size", "speed"}``).
+``exit``
+    The process closed its stderr.
+
+The renditions of an adaptive-bitrate ladder are muxed to their own
+directories, each with its open segment and its playlist. Events are
+dispatched from the reader thread. The last log lines are kept for error
+reports.
+"""
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OPENING_RE = re.compile(r"Opening '(?P<path>[^']+)' for writing")
+# Segments, or the partial segments of low-latency mode
+SEGMENT_RE = re.compile(r"(?:segment|part)_(?P<index>\d+)\.(?:m4s|ts)(?:\.tmp)?$")
+PLAYLIST_SUFFIXES = (".m3u8", ".m3u8.tmp")
+
+
+class FFmpegMonitor:
+    """
+    Drain an ffmpeg process's stderr and dispatch segment and progress events.
+    """
+
+    def __init__(self, stream, callbacks=None, output_dir=None, source_dir=None, name="ffmpeg"):
+        """
+        Initialize the monitor.
+
+        Args:
+            stream: The process's stderr, a binary file object
+            callbacks (list, optional): Callables invoked as ``callback(event, data)``
+                from the reader thread; the list may be extended later
+            output_dir (str, optional): Directory reported in segment paths,
+                for encoders writing through a slot symlink
+            source_dir (str, optional): Directory on the encoder's command
+                line; the segment paths below it keep their subdirectory in
+                ``output_dir`` (default: only the file name is kept)
+            name (str): Label of the reader thread
+        """
+        self.stream = stream
+        self.callbacks = callbacks if callbacks is not None else []
+        self.output_dir = output_dir
+        self.source_dir = source_dir
+        self.name = name
+
+        self.recent_lines = deque(maxlen=50)
+        self.segments_opened = 0
+        self.segments_ready = 0
+        self.last_ready_index = None
+        self.out_time = 0.0
+        self.total_size = 0
+        self.speed = None
+        self.progress_reports = 0
+        self.exited = False
+
+        # (index, path) of the open segment, by muxer directory
+        self._current_segments = {}
+        self._progress = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._read, daemon=True, name=f"{self.name}-stderr")
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        """Wait until the process closed its stderr and every event was dispatched."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def started(self):
+        """Whether the process opened a segment or reported progress: it got past its start-up."""
+        return self.segments_opened > 0 or self.progress_reports > 0
+
+    def _read(self):
+        try:
+            while True:
+                line = self.stream.readline()
+                if not line or not isinstance(line, bytes):
+                    break
+                self.feed(line.decode("utf-8", errors="replace").rstrip())
+        except (OSError, ValueError) as e:
+            logger.debug(f"Stopped reading ffmpeg stderr: {str(e)}")
+        finally:
+            self.exited = True
+            self._emit("exit", {})
+
+    def feed(self, line):
+        """Parse one line of ffmpeg output."""
+        if not line:
+            return
+
+        if "=" in line and not line.startswith("["):
+            key, _, value = line.partition("=")
+            self._progress[key.strip()] = value.strip()
+            if key.strip() == "progress":
+                self._on_progress()
+            return
+
+        self.recent_lines.append(line)
+
+        match = OPENING_RE.search(line)
+        if not match:
+            return
+        path = match.group("path")
+        directory = os.path.dirname(path)
+
+        segment = SEGMENT_RE.search(os.path.basename(path))
+        if segment:
+            # Opening the next segment also means the previous one is complete
+            self._segment_done(directory)
+            if path.endswith(".tmp"):
+                path = path[:-len(".tmp")]
+            if self.output_dir is not None:
+                relative = os.path.basename(path)
+                if self.source_dir is not None:
+                    relative = os.path.relpath(path, self.source_dir)
+                path = os.path.join(self.output_dir, relative)
+            index = int(segment.group("index"))
+            self._current_segments[directory] = (index, path)
+            self.segments_opened += 1
+            self._emit("segment_opened", {"index": index, "path": path})
+        elif path.endswith(PLAYLIST_SUFFIXES):
+            self._segment_done(directory)
+
+    def _segment_done(self, directory):
+        if directory not in self._current_segments:
+            return
+        index, path = self._current_segments.pop(directory)
+        self.segments_ready += 1
+        self.last_ready_index = index
+        self._emit("segment_ready", {"index": index, "path": path})
+
+    def _on_progress(self):
+        progress, self._progress = self._progress, {}
+        self.progress_reports += 1
+        try:
+            self.out_time = int(progress.get("out_time_us", "0")) / 1_000_000
+        except ValueError:
+            pass
+        try:
+            self.total_size = int(progress.get("total_size", "0"))
+        except ValueError:
+            pass
+        speed = progress.get("speed", "").rstrip("x")
+        try:
+            self.speed = float(speed)
+        except ValueError:
+            self.speed = None
+        self._emit("progress", {"out_time": self.out_time, "total_size": self.total_size, "speed": self.speed})
+
+    def _emit(self, event, data):
+        for callback in list(self.callbacks):
+            try:
+                callback(event, data)
+            except Exception as e:
+                logger.error(f"Error in ffmpeg event callback for {event}: {str(e)}")
+
+    def metrics(self):
+        """Return the encoder's counters."""
+        return {
+            "segments_opened": self.segments_opened,
+            "segments_ready": self.segments_ready,
+            "last_ready_index": self.last_ready_index,
+            "out_time": self.out_time,
+            "total_size": self.total_size,
+            "speed": self.speed,
+        }
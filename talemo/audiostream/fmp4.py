@@ -0,0 +1,117 @@
+"""
+Minimal reader of fragmented MP4 (ISO BMFF) boxes.
+
+Only what the HLS packaging needs: the media timescale of an init segment
+and the duration of a media fragment, read from its ``trun`` sample
+durations or the defaults of ``tfhd`` / ``trex``.
+"""
+import struct
+
+# Boxes that only contain other boxes
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"mvex", b"moof", b"traf"}
+
+
+def iter_boxes(data, start=0, end=None):
+    """
+    Yield the boxes between ``start`` and ``end``.
+
+    Yields:
+        tuple: (type, box_start, payload_start, box_end)
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError(f"Truncated {box_type!r} box at offset {offset}")
+        yield box_type, offset, offset + header, offset + size
+        offset += size
+
+
+def find_boxes(data, path, start=0, end=None):
+    """Yield (payload_start, box_end) of the boxes at ``path``, e.g. (b"moof", b"traf")."""
+    for box_type, _, payload, box_end in iter_boxes(data, start, end):
+        if box_type != path[0]:
+            continue
+        if len(path) == 1:
+            yield payload, box_end
+        elif box_type in CONTAINER_BOXES:
+            yield from find_boxes(data, path[1:], payload, box_end)
+
+
+def read_init(data):
+    """
+    Read the timing defaults of an init segment.
+
+    Returns:
+        tuple: (timescale, default_sample_duration) of the first track
+    """
+    timescale = None
+    for payload, _ in find_boxes(data, (b"moov", b"trak", b"mdia", b"mdhd")):
+        version = data[payload]
+        # creation and modification times are 32 or 64 bit
+        timescale = struct.unpack_from(">I", data, payload + (20 if version == 1 else 12))[0]
+        break
+    if not timescale:
+        raise ValueError("No media timescale in init segment")
+
+    default_duration = 0
+    for payload, _ in find_boxes(data, (b"moov", b"mvex", b"trex")):
+        default_duration = struct.unpack_from(">I", data, payload + 12)[0]
+        break
+    return timescale, default_duration
+
+
+def fragment_duration(data, timescale, default_duration=0):
+    """
+    Return the duration of the samples in a media fragment, in seconds.
+
+    Args:
+        data (bytes): One or more moof/mdat pairs
+        timescale (int): Media timescale from the init segment
+        default_duration (int): Sample duration of the init segment's trex box
+    """
+    total = 0
+    for traf, traf_end in find_boxes(data, (b"moof", b"traf")):
+        duration = default_duration
+        for payload, _ in find_boxes(data, (b"tfhd",), traf, traf_end):
+            flags = struct.unpack_from(">I", data, payload)[0] & 0xFFFFFF
+            offset = payload + 8
+            if flags & 0x01:
+                offset += 8
+            if flags & 0x02:
+                offset += 4
+            if flags & 0x08:
+                duration = struct.unpack_from(">I", data, offset)[0]
+
+        for payload, _ in find_boxes(data, (b"trun",), traf, traf_end):
+            flags = struct.unpack_from(">I", data, payload)[0] & 0xFFFFFF
+            count = struct.unpack_from(">I", data, payload + 4)[0]
+            if not flags & 0x100:
+                total += count * duration
+                continue
+            offset = payload + 8
+            if flags & 0x01:
+                offset += 4
+            if flags & 0x04:
+                offset += 4
+            # Each sample entry holds the fields flagged 0x100 to 0x800
+            stride = 4 * bin(flags & 0xF00).count("1")
+            for i in range(count):
+                total += struct.unpack_from(">I", data, offset + i * stride)[0]
+    return total / timescale
+
+
+def strip_boxes(data, box_types):
+    """Return ``data`` without its top-level boxes of the given types."""
+    return b"".join(
+        data[box_start:box_end]
+        for box_type, box_start, _, box_end in iter_boxes(data)
+        if box_type not in box_types
+    )
@@ -12,6 +12,19 @@ import subprocess
 import logging
 import uuid
 import shutil
+import threading
+
+from django.conf import settings
+
+from .encoder_pool import get_encoder_pool, release_slot
+from .ffmpeg_monitor import FFmpegMonitor
+from .manifest import SessionManifest
+from .mp3 import FrameReader, silent_frame
+from .playlist import (
+    MASTER_PLAYLIST_NAME, MUXER_PLAYLIST_NAME, PLAYLIST_NAME, SegmentPackager, media_pattern,
+    write_master_playlist,
+)
+from .profiles import get_ladder
 
 # Set up logging
 logging.basicConfig(
@@ -20,22 +33,460 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Duration of the segments cut by the muxer outside low-latency mode
+SEGMENT_DURATION = 1
+# Audio codecs of the HLS output: "aac" encodes the MP3 input in fMP4
+# segments with the session's encoding profile (AAC unless the profile
+# says otherwise), "copy" packages the MP3 frames unchanged in MPEG-TS
+# segments, without the cost of transcoding
+AUDIO_CODECS = ("aac", "copy")
+SEGMENT_TYPES = {"aac": "fmp4", "copy": "mpegts"}
+# CODECS of MP3 audio (MPEG-1/2 Layer III)
+MP3_CODECS = "mp4a.40.34"
+# Init segment of each rendition of a ladder, in its subdirectory; the
+# muxer replaces %v with the rendition (profile) name
+RENDITION_INIT_PATTERN = "init_%v.mp4"
+
+
+def resolve_audio_codec(audio_codec=None):
+    """
+    Return the output audio codec of a session.
+
+    Args:
+        audio_codec (str, optional): "aac" or "copy"
+            (default: settings.HLS_AUDIO_CODEC)
+
+    Raises:
+        ValueError: If the codec is unknown
+    """
+    audio_codec = audio_codec or getattr(settings, 'HLS_AUDIO_CODEC', 'aac')
+    if audio_codec not in AUDIO_CODECS:
+        raise ValueError(f"Unknown HLS audio codec: {audio_codec}. Available: {', '.join(AUDIO_CODECS)}")
+    return audio_codec
+
+
+def playlist_duration(playlist_path):
+    """
+    Return the total duration of the segments listed in an HLS playlist.
+
+    Args:
+        playlist_path (str): Path to the playlist file
+
+    Returns:
+        float: Sum of the #EXTINF durations in seconds, 0.0 if the playlist
+        does not exist yet
+    """
+    total = 0.0
+    try:
+        with open(playlist_path, 'r') as f:
+            for line in f:
+                if line.startswith("#EXTINF:"):
+                    try:
+                        total += float(line[len("#EXTINF:"):].split(",", 1)[0])
+                    except ValueError:
+                        continue
+    except FileNotFoundError:
+        return 0.0
+    return total
+
+
+def hls_muxer_options(hls_dir, low_latency=False, segment_type="fmp4", renditions=()):
+    """
+    Return the options of the HLS muxer, shared by the writer backends.
+
+    The muxer only writes the media files and a short internal playlist;
+    the session's playlist is rendered by a SegmentPackager. In low-latency
+    mode the muxer writes partial segments of ``HLS_PART_DURATION``
+    seconds, which the packager groups into segments.
+
+    Args:
+        hls_dir (str): Directory of the playlist and segments
+        low_latency (bool): Write LL-HLS partial segments (default: False)
+        segment_type (str): "fmp4" or "mpegts" (default: "fmp4")
+        renditions (tuple): Names of the renditions of a ladder, one per
+            output audio stream, each muxed to its own subdirectory
+            (default: a single rendition in ``hls_dir``)
+
+    Returns:
+        dict: Muxer option names (without the leading dash) and values
+    """
+    media_dir = os.path.join(hls_dir, "%v") if renditions else hls_dir
+    if low_latency:
+        options = hls_muxer_options(hls_dir, segment_type=segment_type, renditions=renditions)
+        options["hls_time"] = str(getattr(settings, 'HLS_PART_DURATION', 0.2))
+        options["hls_segment_filename"] = os.path.join(media_dir, media_pattern(segment_type, part=True))
+        return options
+
+    options = {
+        # Shorter segments for lower latency
+        "hls_time": str(SEGMENT_DURATION),
+        # The internal playlist only needs the last entries: an event
+        # playlist would be rewritten in full for every segment
+        "hls_list_size": "10",
+        # The *temp_file* flag forces ffmpeg to write segments and
+        # playlist to temporary files, then atomically rename them.
+        # We also remove *delete_segments* so that old segments stay
+        # available for players that start late.
+        "hls_flags": "append_list+independent_segments+temp_file",
+        "hls_segment_type": segment_type,
+        "hls_init_time": "0.5",
+        "hls_allow_cache": "1",
+        "hls_segment_filename": os.path.join(media_dir, media_pattern(segment_type)),
+    }
+    if renditions:
+        options["var_stream_map"] = " ".join(f"a:{i},name:{name}" for i, name in enumerate(renditions))
+        options["hls_fmp4_init_filename"] = RENDITION_INIT_PATTERN
+    return options
+
+
+def muxer_playlist_path(hls_dir, renditions=()):
+    """Return the internal playlist written by the muxer."""
+    if renditions:
+        return os.path.join(hls_dir, "%v", MUXER_PLAYLIST_NAME)
+    return os.path.join(hls_dir, MUXER_PLAYLIST_NAME)
+
+
+def ffmpeg_hls_command(hls_dir, low_latency=None, audio_codec=None, profile=None):
+    """
+    Return the ffmpeg command line that encodes MP3 from stdin into an HLS
+    playlist and fMP4 segments in ``hls_dir``, or in copy mode packages the
+    MP3 frames unchanged into MPEG-TS segments.
+
+    Without a profile the input is encoded once per rendition of the
+    ``HLS_ABR_LADDER`` setting: the decoded audio is mapped to one output
+    stream per rendition, and each is muxed to a subdirectory named after
+    its profile.
+
+    Progress reports go to stderr with the log (``-progress pipe:2``), where
+    FFmpegMonitor reads both; the carriage-return stats line is disabled.
+
+    Args:
+        hls_dir (str): Directory of the playlist and segments
+        low_latency (bool, optional): Write LL-HLS partial segments
+            (default: settings.HLS_LOW_LATENCY)
+        audio_codec (str, optional): "aac" or "copy"
+            (default: settings.HLS_AUDIO_CODEC)
+        profile (str, optional): Encoding profile, see profiles.py
+            (default: the ladder, or settings.HLS_ENCODING_PROFILE)
+
+    Returns:
+        list: The command arguments
+    """
+    if low_latency is None:
+        low_latency = getattr(settings, 'HLS_LOW_LATENCY', False)
+    audio_codec = resolve_audio_codec(audio_codec)
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "info",
+        "-nostats", "-progress", "pipe:2",
+        "-f", "mp3", "-i", "pipe:0",
+    ]
+    renditions = ()
+    if audio_codec == "copy":
+        cmd += ["-c:a", "copy"]
+    else:
+        ladder = get_ladder(profile)
+        if len(ladder) == 1:
+            cmd += ladder[0].ffmpeg_args()
+        else:
+            renditions = tuple(p.name for p in ladder)
+            for stream, rendition in enumerate(ladder):
+                cmd += ["-map", "0:a"] + rendition.ffmpeg_args(stream)
+    cmd += ["-f", "hls"]
+    for name, value in hls_muxer_options(hls_dir, low_latency, SEGMENT_TYPES[audio_codec], renditions).items():
+        cmd += [f"-{name}", value]
+    cmd.append(muxer_playlist_path(hls_dir, renditions))
+    return cmd
+
+
+class SegmentEvents:
+    """
+    Segment readiness shared by the HLS writer backends.
+
+    A writer reports each file the muxer completes with ``_segment_ready``.
+    It is first handed to a SegmentPackager, which publishes it in the
+    session's playlist (``self.playlist``); the other listeners are called
+    afterwards, and callers can block in wait_for_segments instead of
+    polling the output directory. In low-latency mode the muxer's segments
+    are LL-HLS parts.
+
+    The renditions of a ladder have a packager each, in their
+    subdirectories. The first one is the primary rendition: its playlist is
+    ``self.playlist``, and only its segments are counted in
+    ``segments_ready``. The packagers record the media files in the
+    session's manifest (``self.manifest``).
+
+    Backends provide ``_input_timing`` and ``_write_silence`` for end_chunk.
+    """
+
+    # Seconds to wait for the muxer after writing silence in end_chunk
+    _silence_wait = 0.0
+    # Encoding profile of the output, None when the input is muxed as it is
+    profile = None
+
+    def _init_events(self, low_latency=None, segment_type="fmp4", codecs=None, bandwidth=None, renditions=()):
+        if low_latency is None:
+            low_latency = getattr(settings, 'HLS_LOW_LATENCY', False)
+        self.low_latency = low_latency
+        self.segments_ready = 0
+        self._listeners = [self._on_event]
+        self._events = threading.Condition()
+        self._closed = False
+        # Seconds of input when end_chunk last returned
+        self._flushed_at = None
+        # Master playlist of a ladder, written before the first media file
+        self._master_text = None
+        self.manifest = SessionManifest(self.hls_dir)
+
+        packager_options = {
+            "segment_duration": SEGMENT_DURATION,
+            "low_latency": low_latency,
+            "part_duration": getattr(settings, 'HLS_PART_DURATION', 0.2),
+            "segment_type": segment_type,
+            "write_interval": getattr(settings, 'HLS_PLAYLIST_WRITE_INTERVAL', 1.0),
+        }
+        if renditions:
+            # The muxer writes each rendition to a subdirectory named after
+            # its profile; the master playlist lists their nominal bandwidth
+            self.packagers = {}
+            for profile in renditions:
+                rendition_dir = os.path.join(self.hls_dir, profile.name)
+                os.makedirs(rendition_dir, exist_ok=True)
+                self.packagers[os.path.normpath(rendition_dir)] = SegmentPackager(
+                    rendition_dir, init_name=RENDITION_INIT_PATTERN.replace("%v", profile.name),
+                    manifest=self.manifest, rendition=profile.name, **packager_options)
+            self._master_text = write_master_playlist(self.hls_dir, [
+                (f"{profile.name}/{PLAYLIST_NAME}", profile.bandwidth, profile.codecs) for profile in renditions
+            ])
+        else:
+            self.packagers = {
+                os.path.normpath(self.hls_dir): SegmentPackager(
+                    self.hls_dir, codecs=codecs, bandwidth=bandwidth, manifest=self.manifest,
+                    **packager_options),
+            }
+        self.packager = next(iter(self.packagers.values()))
+        self.playlist = self.packager.playlist
+        self._listeners.insert(0, self._on_media)
+
+    def add_listener(self, callback):
+        """
+        Register a callback for writer events.
+
+        Args:
+            callback (callable): Called as ``callback(event, data)``, possibly
+                from a background thread; it must not block
+        """
+        self._listeners.append(callback)
+
+    def publish_to(self, backend, session_id):
+        """
+        Also store the session's playlists and media files in a storage
+        backend as they are published, e.g. the RAM tier the live endpoints
+        are served from (see storage.py).
+
+        Args:
+            backend (StorageBackend): Backend receiving the files
+            session_id (str): Session the files are stored under
+        """
+        for packager in self.packagers.values():
+            prefix = os.path.relpath(packager.hls_dir, self.hls_dir)
+            prefix = "" if prefix == os.curdir else f"{prefix}/"
+            packager.publish_to(lambda name, data, prefix=prefix: backend.put(session_id, prefix + name, data))
+        if self._master_text is not None:
+            try:
+                backend.put(session_id, MASTER_PLAYLIST_NAME, self._master_text.encode())
+            except Exception as e:
+                logger.error(f"Error publishing the master playlist of {self.hls_dir}: {str(e)}")
+
+    def _emit(self, event, data):
+        for callback in list(self._listeners):
+            try:
+                callback(event, data)
+            except Exception as e:
+                logger.error(f"Error in HLS writer callback for {event}: {str(e)}")
+
+    def _packager_for(self, path):
+        """Return the packager of a media file's rendition, or None."""
+        if len(self.packagers) == 1:
+            return self.packager
+        return self.packagers.get(os.path.normpath(os.path.dirname(path)))
+
+    def _on_event(self, event, data):
+        if event == "segment_ready" and self._packager_for(data["path"]) is self.packager:
+            with self._events:
+                self.segments_ready += 1
+                self._events.notify_all()
+
+    def _on_media(self, event, data):
+        if event == "segment_ready":
+            packager = self._packager_for(data["path"])
+            if packager is None:
+                logger.warning(f"No rendition for the HLS media file {data['path']}")
+                return
+            packager.add(data["path"], data["index"])
+
+    def _segment_ready(self, index, path):
+        self._emit("segment_ready", {"index": index, "path": path})
+
+    def _close_events(self):
+        """End the playlists and wake up the waiters once no further segment can come."""
+        for packager in self.packagers.values():
+            try:
+                packager.finish()
+            except Exception as e:
+                logger.error(f"Error ending the playlist {packager.playlist.path}: {str(e)}")
+        self.manifest.end()
+        with self._events:
+            self._closed = True
+            self._events.notify_all()
+
+    def end_chunk(self, max_silence=None):
+        """
+        Make the audio written so far playable at once.
+
+        The encoder holds back the last frames of its input, and the muxer
+        completes a segment (or part) only when audio past its end arrives,
+        so the end of a text chunk would wait for the next chunk's audio.
+        Silence is written after it until the playlist lists all the audio
+        written. Nothing is written if the muxer's next cut is more than
+        ``max_silence`` seconds away. The silence is heard as a pause after
+        the chunk, so it is off unless enabled.
+
+        Args:
+            max_silence (float, optional): Maximum seconds of silence, 0
+                for none (default: settings.HLS_CHUNK_FLUSH_MAX_SILENCE)
+
+        Returns:
+            float: Seconds of silence written
+        """
+        if max_silence is None:
+            max_silence = getattr(settings, 'HLS_CHUNK_FLUSH_MAX_SILENCE', 0.0)
+        if max_silence <= 0:
+            return 0.0
+        timing = self._input_timing()
+        if timing is None or timing[0] == self._flushed_at:
+            # No audio since the last call
+            return 0.0
+        seconds, sample_rate = timing
+        target = seconds - 1e-6
+        if self.profile is not None:
+            # The encoder delay is listed on top of the input
+            target += self.profile.encoder_delay(sample_rate)
+
+        def published():
+            return self.playlist.duration >= target or self._closed
+
+        # The muxer cuts once the open segment (or part) reaches its duration
+        cut = getattr(settings, 'HLS_PART_DURATION', 0.2) if self.low_latency else SEGMENT_DURATION
+        if self._silence_wait:
+            # Let the muxer catch up with the audio before the open segment
+            with self._events:
+                self._events.wait_for(lambda: self.playlist.duration + cut >= target or self._closed,
+                                      self._silence_wait)
+        silence = 0.0
+        if not published() and self.playlist.duration + cut - target <= max_silence:
+            while not published() and silence < max_silence:
+                written = self._write_silence()
+                if not written:
+                    break
+                silence += written
+                if self._silence_wait:
+                    with self._events:
+                        self._events.wait_for(published, self._silence_wait)
+            if not published():
+                logger.debug(f"End of chunk not published after {silence:.3f}s of silence")
+        self._flushed_at = self._input_timing()[0]
+        return silence
+
+    def wait_for_segments(self, count=1, timeout=None):
+        """
+        Block until ``count`` segments are complete and listed in the playlist.
+
+        Args:
+            count (int): Number of segments to wait for (default: 1)
+            timeout (float, optional): Maximum seconds to wait
 
-class StreamingHLSWriter:
+        Returns:
+            bool: True if the segments are ready, False on timeout or if the
+            writer was finalized without producing them
+        """
+        with self._events:
+            self._events.wait_for(lambda: self.segments_ready >= count or self._closed, timeout)
+            return self.segments_ready >= count
+
+
+WRITER_BACKENDS = ("ffmpeg", "pyav")
+
+
+def create_writer(output_dir, backend=None, audio_codec=None, profile=None):
+    """
+    Create the HLS writer of the configured backend.
+
+    Args:
+        output_dir (str): Directory of the playlist and segments
+        backend (str, optional): "ffmpeg" (external process) or "pyav"
+            (in-process libav) (default: settings.HLS_WRITER_BACKEND)
+        audio_codec (str, optional): "aac" or "copy"
+            (default: settings.HLS_AUDIO_CODEC); the pyav backend
+            always encodes
+        profile (str, optional): Encoding profile, see profiles.py
+            (default: the renditions of settings.HLS_ABR_LADDER, or
+            settings.HLS_ENCODING_PROFILE); the pyav backend encodes a
+            single rendition
+
+    Returns:
+        StreamingHLSWriter or PyAVHLSWriter: A writer with the
+        process_chunk / process_stream / finalize API
+
+    Raises:
+        ValueError: If the backend, the audio codec or the profile is unknown
+    """
+    backend = backend or getattr(settings, 'HLS_WRITER_BACKEND', 'ffmpeg')
+    if backend not in WRITER_BACKENDS:
+        raise ValueError(f"Unknown HLS writer backend: {backend}. Available: {', '.join(WRITER_BACKENDS)}")
+    audio_codec = resolve_audio_codec(audio_codec)
+
+    if backend == "pyav":
+        from .av_writer import PyAVHLSWriter
+        if audio_codec != "aac":
+            logger.warning(f"The pyav HLS writer backend does not support the {audio_codec} audio codec, encoding")
+        if profile is None and len(get_ladder()) > 1:
+            logger.warning("The pyav HLS writer backend encodes a single rendition, not the ABR ladder")
+        return PyAVHLSWriter(output_dir, profile=profile)
+    return StreamingHLSWriter(output_dir, audio_codec=audio_codec, profile=profile)
+
+
+class StreamingHLSWriter(SegmentEvents):
     """
     Class for processing audio chunks incrementally and creating HLS audio.
 
     This class maintains a single long-lived ffmpeg process and streams
     audio output directly to it for true low-latency streaming.
+
+    ffmpeg's stderr is drained by an FFmpegMonitor thread. Its events
+    ("segment_opened", "segment_ready", "progress", "exit") are passed to the
+    listeners registered with add_listener (see SegmentEvents).
     """
 
-    def __init__(self, output_dir, segment_duration=2):
+    # ffmpeg encodes asynchronously: wait for it between pieces of silence
+    _silence_wait = 0.1
+    # Seconds to wait for a replaced ffmpeg process to exit and report why
+    _exit_wait = 1.0
+
+    def __init__(self, output_dir, segment_duration=2, low_latency=None, audio_codec=None, profile=None):
         """
         Initialize the StreamingHLSWriter instance.
 
         Args:
             output_dir (str): Path to output directory
             segment_duration (int): Duration of each segment in seconds (default: 2)
+            low_latency (bool, optional): Publish LL-HLS partial segments
+                (default: settings.HLS_LOW_LATENCY)
+            audio_codec (str, optional): "aac" to encode the MP3 input, or
+                "copy" to package its frames in MPEG-TS segments
+                (default: settings.HLS_AUDIO_CODEC)
+            profile (str, optional): Encoding profile when encoding, see
+                profiles.py (default: the renditions of settings.HLS_ABR_LADDER,
+                or settings.HLS_ENCODING_PROFILE)
         """
         self.segment_duration = segment_duration
 
@@ -47,6 +498,25 @@ class StreamingHLSWriter:
         self.chunk_count = 0
         self.ffmpeg_process = None
         self.ffmpeg_stdin = None
+        # Slot symlink of a warm encoder claimed from the pool
+        self._slot_path = None
+        self.audio_codec = resolve_audio_codec(audio_codec)
+        # Encoding profile of each rendition; the MP3 frames are muxed as
+        # they are in copy mode
+        self.renditions = get_ladder(profile) if self.audio_codec == "aac" else ()
+        self.profile = self.renditions[0] if self.renditions else None
+
+        # Encoder events, across process restarts
+        self.monitor = None
+        if len(self.renditions) > 1:
+            self._init_events(low_latency, SEGMENT_TYPES[self.audio_codec], renditions=self.renditions)
+        elif self.profile is not None:
+            self._init_events(low_latency, SEGMENT_TYPES[self.audio_codec],
+                              codecs=self.profile.codecs, bandwidth=self.profile.bandwidth)
+        else:
+            self._init_events(low_latency, SEGMENT_TYPES[self.audio_codec], codecs=MP3_CODECS)
+        # Frames of the MP3 input written to ffmpeg
+        self._mp3 = FrameReader()
 
         # Start the ffmpeg process
         self._start_ffmpeg_process()
@@ -54,36 +524,19 @@ class StreamingHLSWriter:
     def _start_ffmpeg_process(self):
         """
         Start a single long-lived ffmpeg process for HLS streaming.
+
+        A warm encoder is claimed from the worker's encoder pool when one is
+        ready, so the session does not pay for starting ffmpeg; otherwise a
+        new process is started.
         """
         logger.info("Starting ffmpeg process for HLS streaming")
 
-        # FFmpeg will create the playlist with the temp_file flag
-        playlist_path = os.path.join(self.hls_dir, "audio.m3u8")
-        logger.info(f"FFmpeg will create/update playlist at {playlist_path}")
-
-        ffmpeg_cmd = [
-            "ffmpeg", "-hide_banner", "-loglevel", "info",
-            "-f", "mp3", "-i", "pipe:0",
-            "-c:a", "aac", "-b:a", "128k",
-            "-f", "hls",
-            # Shorter segments for lower latency
-            "-hls_time", "1",
-            "-hls_list_size", "10",
-            # The *temp_file* flag forces ffmpeg to write to a temporary
-            # playlist, then atomically rename it – this guarantees that
-            # the file is **always present on disk** and never half-written.
-            # We also remove *delete_segments* so that old segments stay
-            # available for a short period; this is important for players
-            # that start late.
-            "-hls_flags", 
-              "append_list+independent_segments+program_date_time+temp_file",
-            "-hls_segment_type", "fmp4",
-            "-hls_init_time", "0.5",
-            "-hls_allow_cache", "1",
-            "-hls_playlist_type", "event",
-            "-hls_segment_filename", os.path.join(self.hls_dir, "segment_%03d.m4s"),
-            playlist_path,  # Use the playlist we just created
-        ]
+        logger.info(f"FFmpeg will write segments to {self.hls_dir}")
+
+        # A process that died before encoding anything could not start:
+        # a new one would fail the same way
+        if self.ffmpeg_process is not None:
+            self._check_started(self._exit_wait)
 
         # Ensure the output directory exists
         os.makedirs(self.hls_dir, exist_ok=True)
@@ -93,55 +546,119 @@ class StreamingHLSWriter:
             logger.error(f"Output directory {self.hls_dir} is not writable")
             raise RuntimeError(f"Output directory {self.hls_dir} is not writable")
 
-        # Start the ffmpeg process and capture stderr
-        logger.info(f"Running ffmpeg command: {' '.join(ffmpeg_cmd)}")
-        self.ffmpeg_process = subprocess.Popen(
-            ffmpeg_cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        # A replaced process no longer needs its slot
+        release_slot(self._slot_path)
+        self._slot_path = None
+
+        # Warm encoders are started in the configured mode
+        pool = None
+        if (self.low_latency == getattr(settings, 'HLS_LOW_LATENCY', False)
+                and self.audio_codec == resolve_audio_codec()
+                and (self.profile is None or self.renditions == get_ladder())):
+            pool = get_encoder_pool()
+        encoder = pool.claim(self.hls_dir) if pool is not None else None
+        if encoder is not None:
+            self.ffmpeg_process = encoder.process
+            self._slot_path = encoder.slot_path
+        else:
+            # Start the ffmpeg process and capture stderr; without a
+            # profile the command encodes the ladder
+            ffmpeg_cmd = ffmpeg_hls_command(self.hls_dir, self.low_latency, self.audio_codec,
+                                            self.profile.name if len(self.renditions) == 1 else None)
+            logger.info(f"Running ffmpeg command: {' '.join(ffmpeg_cmd)}")
+            self.ffmpeg_process = subprocess.Popen(
+                ffmpeg_cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
         self.ffmpeg_stdin = self.ffmpeg_process.stdin
 
-        # Check if process started successfully
-        import time
-        time.sleep(0.1)
-        if self.ffmpeg_process.poll() is not None:
-            stderr = self.ffmpeg_process.stderr.read().decode()
-            logger.error(f"ffmpeg process failed to start: {stderr}")
-            raise RuntimeError(f"ffmpeg process failed: {stderr}")
+        # Drain stderr for as long as the process runs, or ffmpeg blocks once
+        # the pipe buffer is full
+        self.monitor = FFmpegMonitor(
+            self.ffmpeg_process.stderr, self._listeners,
+            output_dir=self.hls_dir, source_dir=self._slot_path or self.hls_dir,
+            name=f"ffmpeg-{self.ffmpeg_process.pid}",
+        ).start()
+
+        # Fail fast if ffmpeg could not run at all, without waiting for it:
+        # a process rejecting its arguments a moment later is found when
+        # the first write replaces it. Later failures surface as a broken
+        # pipe on the next write and trigger a restart
+        self._check_started()
 
         # Log the FFmpeg PID so it can be killed from the outside if needed
         logger.info(f"FFmpeg process started with PID: {self.ffmpeg_process.pid}")
 
-    def process_chunk(self, audio_data):
+    def _check_started(self, timeout=0):
         """
-        Process a single audio chunk.
-
-        This method streams the audio data directly to the ffmpeg process.
+        Raise if the ffmpeg process exited before encoding anything.
 
         Args:
-            audio_data (bytes): Audio data to process
+            timeout (float): Seconds to wait for a process that is still running to exit
 
-        Returns:
-            dict: Information about the processed chunk
+        Raises:
+            RuntimeError: With the last lines ffmpeg logged
         """
-        if not audio_data:
-            logger.warning("Empty audio data received, skipping")
+        if self.monitor is None or self.monitor.started:
+            return
+        if self.ffmpeg_process.poll() is None:
+            if not timeout:
+                return
+            try:
+                self.ffmpeg_process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                return
+        self.monitor.join(self._exit_wait)
+        stderr = "\n".join(self.monitor.recent_lines)
+        logger.error(f"ffmpeg process failed to start: {stderr}")
+        raise RuntimeError(f"ffmpeg process failed: {stderr}")
+
+    def metrics(self):
+        """
+        Return the encoder metrics: segments opened and ready, seconds of
+        audio encoded, bytes written and encoding speed of the current process.
+        """
+        metrics = {
+            "segments_opened": 0,
+            "last_ready_index": None,
+            "out_time": 0.0,
+            "total_size": 0,
+            "speed": None,
+        }
+        if self.monitor is not None:
+            metrics.update(self.monitor.metrics())
+        metrics["segments_ready"] = self.segments_ready
+        return metrics
+
+    def _input_timing(self):
+        if self._mp3.header is None:
             return None
+        return self._mp3.seconds, self._mp3.header.sample_rate
 
-        logger.info(f"Processing audio chunk {self.chunk_count + 1}")
+    def _write_silence(self, seconds=0.1):
+        """Write frames of MP3 silence in the format of the input."""
+        header = self._mp3.header
+        count = max(1, round(seconds / header.duration))
+        if not self._ensure_process() or not self._write(silent_frame(header) * count):
+            return 0.0
+        return count * header.duration
 
-        # Generate a unique ID for this chunk
-        chunk_id = f"chunk_{self.chunk_count:03d}_{uuid.uuid4().hex[:8]}"
+    def _ensure_process(self):
+        """
+        Make sure the ffmpeg process is running, restarting it if it died.
 
+        Returns:
+            bool: True if the process is running and its stdin is open
+        """
         # Check if ffmpeg process is still running
         if self.ffmpeg_process is None or self.ffmpeg_process.poll() is not None:
             logger.warning("ffmpeg process is not running, restarting it")
 
-            # The playlist should be created by FFmpeg with the temp_file flag,
-            # but check if it exists and log a warning if it doesn't
-            playlist_path = os.path.join(self.hls_dir, "audio.m3u8")
+            # The playlist is published with the first segment,
+            # check if it exists and log a warning if it doesn't
+            playlist_path = self.playlist.path
             if not os.path.exists(playlist_path) and self.chunk_count > 0:
                 logger.warning(f"Playlist file not found at {playlist_path} before restart, which is unexpected")
 
@@ -153,35 +670,74 @@ class StreamingHLSWriter:
                 # Log a warning if the playlist file is missing
                 if not os.path.exists(playlist_path):
                     logger.warning(f"Playlist file not found at {playlist_path} after restart attempt, which is unexpected")
-                return None
+                return False
 
         # Check if stdin is still open
         if self.ffmpeg_stdin is None or self.ffmpeg_stdin.closed:
             logger.warning("ffmpeg stdin is closed, cannot write audio data")
-            return None
+            return False
 
-        # Ensure audio data is valid
-        if not isinstance(audio_data, bytes):
-            logger.warning(f"Invalid audio data type: {type(audio_data)}, expected bytes")
-            return None
+        return True
 
+    def _write(self, audio_data):
+        """
+        Write audio data to ffmpeg's stdin and flush it immediately.
+
+        Returns:
+            bool: True if the data was written
+        """
         try:
             # Stream audio data directly to ffmpeg
             self.ffmpeg_stdin.write(audio_data)
             self.ffmpeg_stdin.flush()
+            self._mp3.feed(audio_data)
         except BrokenPipeError:
             logger.error("BrokenPipeError: ffmpeg process may have terminated unexpectedly")
             # Try to restart the ffmpeg process
             self._start_ffmpeg_process()
 
             # Check if the playlist file exists after restart
-            playlist_path = os.path.join(self.hls_dir, "audio.m3u8")
+            playlist_path = self.playlist.path
             if not os.path.exists(playlist_path) and self.chunk_count > 0:
                 logger.warning(f"Playlist file not found at {playlist_path} after BrokenPipeError, which is unexpected")
 
-            return None
+            return False
         except Exception as e:
             logger.error(f"Error writing to ffmpeg: {str(e)}")
+            return False
+
+        return True
+
+    def process_chunk(self, audio_data):
+        """
+        Process a single audio chunk.
+
+        This method streams the audio data directly to the ffmpeg process.
+
+        Args:
+            audio_data (bytes): Audio data to process
+
+        Returns:
+            dict: Information about the processed chunk
+        """
+        if not audio_data:
+            logger.warning("Empty audio data received, skipping")
+            return None
+
+        logger.info(f"Processing audio chunk {self.chunk_count + 1}")
+
+        # Generate a unique ID for this chunk
+        chunk_id = f"chunk_{self.chunk_count:03d}_{uuid.uuid4().hex[:8]}"
+
+        if not self._ensure_process():
+            return None
+
+        # Ensure audio data is valid
+        if not isinstance(audio_data, bytes):
+            logger.warning(f"Invalid audio data type: {type(audio_data)}, expected bytes")
+            return None
+
+        if not self._write(audio_data):
             return None
 
         # Update state
@@ -192,6 +748,48 @@ class StreamingHLSWriter:
             'hls_dir': self.hls_dir
         }
 
+    def process_stream(self, frames):
+        """
+        Process one audio chunk that arrives as a stream of pieces.
+
+        Each piece (e.g. the MP3 frames of a TTS engine's network reads) is
+        forwarded to ffmpeg as soon as it is produced, so the segmenter
+        starts encoding before the whole chunk has been synthesized.
+        Exceptions raised by the ``frames`` iterator propagate to the caller.
+
+        Args:
+            frames (iterable of bytes): Audio data of a single chunk
+
+        Returns:
+            dict: Information about the processed chunk, or None if nothing was written
+        """
+        chunk_id = f"chunk_{self.chunk_count:03d}_{uuid.uuid4().hex[:8]}"
+        bytes_written = 0
+
+        for audio_data in frames:
+            if not audio_data:
+                continue
+
+            if bytes_written == 0:
+                logger.info(f"Streaming audio chunk {self.chunk_count + 1}")
+
+            if not self._ensure_process() or not self._write(audio_data):
+                return None
+            bytes_written += len(audio_data)
+
+        if bytes_written == 0:
+            logger.warning("Empty audio stream received, skipping")
+            return None
+
+        # Update state
+        self.chunk_count += 1
+
+        return {
+            'chunk_id': chunk_id,
+            'hls_dir': self.hls_dir,
+            'bytes': bytes_written
+        }
+
     def finalize(self):
         """
         Finalize the HLS playlist and close the ffmpeg process.
@@ -212,26 +810,30 @@ class StreamingHLSWriter:
             self.ffmpeg_process.wait()
             self.ffmpeg_process = None
 
-        # The playlist file should already exist since FFmpeg creates it immediately
-        # with the temp_file flag, but we'll log if it's missing for debugging
-        playlist_path = os.path.join(self.hls_dir, "audio.m3u8")
+        # Dispatch the events of the final playlist write
+        if self.monitor is not None:
+            self.monitor.join(timeout=5)
+        self._close_events()
+
+        release_slot(self._slot_path)
+        self._slot_path = None
+
+        # The playlist was rendered when it ended, log if it's missing for debugging
+        playlist_path = self.playlist.path
         if not os.path.exists(playlist_path):
             logger.warning(f"Playlist file not found at {playlist_path} after finalization, which is unexpected")
 
-        # Check for segment files and log them
-        segment_files = [f for f in os.listdir(self.hls_dir) if f.endswith('.m4s') or f.startswith('segment_')]
-        if segment_files:
-            logger.info(f"Found {len(segment_files)} segment files: {', '.join(segment_files)}")
+        # The segments of the primary rendition, as recorded in the manifest
+        segments = self.manifest.segments()
+        if segments:
+            logger.info(f"Wrote {len(segments)} segments: {', '.join(segment[0] for segment in segments)}")
         else:
-            logger.warning(f"No segment files found in {self.hls_dir}")
-            # List all files in the directory for debugging
-            all_files = os.listdir(self.hls_dir)
-            logger.info(f"Files in directory: {', '.join(all_files) if all_files else 'none'}")
+            logger.warning(f"No segments written to {self.packager.hls_dir}")
 
         return {
             'playlist_path': playlist_path,
             'hls_dir': self.hls_dir,
-            'segment_count': len(segment_files),
+            'segment_count': len(segments),
             'chunk_count': self.chunk_count
         }
 
@@ -301,3 +903,4 @@ class StreamingHLSWriter:
                 self.ffmpeg_process.wait(timeout=5)
             except subprocess.TimeoutExpired:
                 self.ffmpeg_process.kill()
+        release_slot(getattr(self, '_slot_path', None))
@@ -0,0 +1,181 @@
+"""
+Low-Latency HLS delivery.
+
+With ``HLS_LOW_LATENCY`` the HLS muxer (ffmpeg or PyAV) cuts the stream
+into partial segments of about ``HLS_PART_DURATION`` seconds,
+``part_%05d.m4s``, which the session's playlist (see playlist.py) groups
+into segments of about one second and lists with ``EXT-X-PART`` entries
+and an ``EXT-X-PRELOAD-HINT`` for the part being encoded.
+
+A player then gets each part as soon as it is encoded instead of a whole
+segment later. The playlist advertises ``CAN-BLOCK-RELOAD``: the live
+endpoints hold a playlist request carrying ``_HLS_msn`` / ``_HLS_part``
+until that part is listed, and a request for the hinted part until its
+file exists (wait_for_file), so players do not poll. Outside the process
+producing the playlist they read the rendered file (wait_for_playlist), or
+the copy in the RAM tier of storage.py (wait_for_stored_playlist,
+wait_for_data).
+"""
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Files a live endpoint may serve from a session (or rendition) directory,
+# including the single media file of a compacted session (see vod.py)
+MEDIA_NAME_RE = re.compile(r"^(init(_[\w-]+)?\.mp4|(segment|part)_\d+\.(m4s|ts)|audio\.(mp4|ts))$")
+# Single byte range of a Range header
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d+)-(?P<end>\d*)$")
+
+# Seconds between two checks of a held request
+POLL_INTERVAL = 0.02
+
+
+class PlaylistState:
+    """What a rendered playlist makes available."""
+
+    def __init__(self, text):
+        self.target_duration = 1
+        self.media_sequence = 0
+        self.segments = 0
+        self.parts = 0
+        self.ended = False
+        self.vod = False
+        for line in text.splitlines():
+            if line.startswith("#EXT-X-TARGETDURATION:"):
+                self.target_duration = int(line.split(":", 1)[1])
+            elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                self.media_sequence = int(line.split(":", 1)[1])
+            elif line.startswith("#EXT-X-SKIP:"):
+                self.segments += int(line.rsplit("=", 1)[1])
+            elif line.startswith("#EXTINF:"):
+                self.segments += 1
+                self.parts = 0
+            elif line.startswith("#EXT-X-PART:"):
+                self.parts += 1
+            elif line.startswith("#EXT-X-ENDLIST"):
+                self.ended = True
+            elif line.startswith("#EXT-X-PLAYLIST-TYPE:VOD"):
+                self.vod = True
+
+    @property
+    def next_msn(self):
+        """Media sequence number of the segment being built."""
+        return self.media_sequence + self.segments
+
+    def has(self, msn, part=None):
+        """
+        Return whether the playlist lists segment ``msn``, or its part
+        ``part`` when given.
+        """
+        if self.ended or msn < self.next_msn:
+            return True
+        return part is not None and msn == self.next_msn and part < self.parts
+
+
+def read_playlist(path):
+    """
+    Read a rendered playlist.
+
+    Returns:
+        tuple: (text, PlaylistState), or (None, None) if it does not exist yet
+    """
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None, None
+    return text, PlaylistState(text)
+
+
+def wait_for_playlist(path, msn, part=None, timeout=3.0):
+    """
+    Block until the playlist at ``path`` lists segment ``msn`` (or its part).
+
+    Args:
+        path (str): Path of the rendered playlist
+        msn (int): Media sequence number from ``_HLS_msn``
+        part (int, optional): Part index from ``_HLS_part``
+        timeout (float): Maximum seconds to wait
+
+    Returns:
+        tuple: (text, PlaylistState) of the last version read; text is None
+        if the playlist does not exist
+    """
+    deadline = time.monotonic() + timeout
+    text, state, mtime = None, None, None
+    while True:
+        try:
+            current = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            current = None
+        if current is not None and current != mtime:
+            text, state = read_playlist(path)
+            mtime = current
+        if state is not None and state.has(msn, part):
+            return text, state
+        if time.monotonic() >= deadline:
+            return text, state
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_stored_playlist(read, msn, part=None, timeout=3.0):
+    """
+    Block until the playlist returned by ``read`` lists segment ``msn`` (or
+    its part), for playlists kept in a storage backend.
+
+    Args:
+        read (callable): Returns the playlist (bytes), or None
+        msn (int): Media sequence number from ``_HLS_msn``
+        part (int, optional): Part index from ``_HLS_part``
+        timeout (float): Maximum seconds to wait
+
+    Returns:
+        tuple: (text, PlaylistState) of the last version read; text is None
+        if the playlist does not exist
+    """
+    deadline = time.monotonic() + timeout
+    data, text, state = None, None, None
+    while True:
+        current = read()
+        if current is not None and current != data:
+            data, text = current, current.decode()
+            state = PlaylistState(text)
+        if state is not None and state.has(msn, part):
+            return text, state
+        if time.monotonic() >= deadline:
+            return text, state
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_data(read, timeout=3.0):
+    """
+    Block until ``read`` returns a file's data, e.g. the part of a preload
+    hint in a storage backend.
+
+    Returns:
+        bytes: The data, or None if it did not arrive in time
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        data = read()
+        if data is not None or time.monotonic() >= deadline:
+            return data
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_file(path, timeout=3.0):
+    """
+    Block until a file exists, e.g. the part of a preload hint.
+
+    Returns:
+        bool: True if the file exists
+    """
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
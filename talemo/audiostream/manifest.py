@@ -0,0 +1,134 @@
+"""
+Index of a session's HLS output, kept in its directory as ``manifest.json``.
+
+The writer records each media file as its packager publishes it (see
+SegmentPackager): the init segment, the segments with their durations and
+byte sizes, and the bytes of the low-latency parts, per rendition. The
+file is replaced atomically on every new segment, and marked ended with
+the playlists. Compaction records the single media file that replaces the
+segments (see vod.py).
+
+Whoever needs a session's state (segment count, duration, bytes on disk)
+reads the manifest instead of listing the session directory:
+
+    {
+        "ended": true,
+        "duration": 12.48,
+        "size": 201234,
+        "renditions": {
+            "": {
+                "init": ["init.mp4", 758],
+                "segments": [["segment_000.m4s", 1.024, 16512], ...],
+                "duration": 12.48,
+                "size": 201234
+            }
+        }
+    }
+
+Renditions are named after their subdirectory, "" for the session
+directory itself; the first one is the primary rendition.
+"""
+import json
+import logging
+import os
+import threading
+
+from .playlist import write_atomic
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def read_manifest(session_dir):
+    """
+    Return the manifest of a session directory.
+
+    Returns:
+        dict: The manifest, or None if the session has none (e.g. it was
+        created before the writers kept one) or it cannot be read
+    """
+    try:
+        with open(os.path.join(session_dir, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SessionManifest:
+    """Writer of a session's manifest.json."""
+
+    def __init__(self, session_dir, data=None):
+        """
+        Args:
+            session_dir (str): Directory of the session
+            data (dict, optional): Manifest to continue (see load)
+        """
+        self.path = os.path.join(session_dir, MANIFEST_NAME)
+        self.data = data or {"ended": False, "duration": 0.0, "size": 0, "renditions": {}}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, session_dir):
+        """Return the manifest of a session directory to update, or None if it has none."""
+        data = read_manifest(session_dir)
+        return cls(session_dir, data) if data is not None else None
+
+    def _rendition(self, rendition):
+        renditions = self.data["renditions"]
+        if rendition not in renditions:
+            renditions[rendition] = {"init": None, "segments": [], "duration": 0.0, "size": 0}
+        return renditions[rendition]
+
+    def _write(self):
+        renditions = list(self.data["renditions"].values())
+        self.data["duration"] = renditions[0]["duration"] if renditions else 0.0
+        self.data["size"] = sum(r["size"] for r in renditions)
+        try:
+            write_atomic(self.path, json.dumps(self.data, separators=(",", ":")).encode())
+        except OSError as e:
+            logger.error(f"Error writing the manifest {self.path}: {str(e)}")
+
+    def add_init(self, rendition, uri, size):
+        """Record the init segment of a rendition."""
+        with self._lock:
+            entry = self._rendition(rendition)
+            entry["init"] = [uri, size]
+            entry["size"] += size
+            self._write()
+
+    def add_part(self, rendition, size):
+        """Count the bytes of a low-latency part; written with the next segment."""
+        with self._lock:
+            self._rendition(rendition)["size"] += size
+
+    def add_segment(self, rendition, uri, duration, size):
+        """Record a segment listed in a rendition's playlist."""
+        with self._lock:
+            entry = self._rendition(rendition)
+            entry["segments"].append([uri, round(duration, 6), size])
+            entry["duration"] = round(entry["duration"] + duration, 6)
+            entry["size"] += size
+            self._write()
+
+    def compacted(self, rendition, uri, size):
+        """Record the single media file that replaced a rendition's segments and parts."""
+        with self._lock:
+            entry = self._rendition(rendition)
+            entry["media"] = uri
+            entry["size"] = size
+            self._write()
+
+    def end(self):
+        """Mark the session's playlists ended."""
+        with self._lock:
+            self.data["ended"] = True
+            self._write()
+
+    def segments(self, rendition=None):
+        """Return the (uri, duration, size) of a rendition's segments (default: the primary one)."""
+        with self._lock:
+            renditions = self.data["renditions"]
+            if rendition is None:
+                rendition = next(iter(renditions), "")
+            return [tuple(segment) for segment in renditions.get(rendition, {}).get("segments", [])]
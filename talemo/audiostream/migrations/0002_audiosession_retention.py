@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiostream', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiosession',
+            name='tenant',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='audiosession',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audiosession',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -3,6 +3,12 @@ from django.db import models
 class AudioSession(models.Model):
     session_id       = models.CharField(max_length=32, primary_key=True)
     created_at       = models.DateTimeField(auto_now_add=True)
-    status           = models.CharField(max_length=12, default="pending") # pending|running|ready|error
+    status           = models.CharField(max_length=12, default="pending") # pending|running|ready|error|archived|expired
     playlist_rel_url = models.CharField(max_length=200, blank=True)
-    error_message    = models.TextField(blank=True)
\ No newline at end of file
+    error_message    = models.TextField(blank=True)
+    # Site the session was started from, whose output counts against HLS_GC_TENANT_QUOTA
+    tenant           = models.CharField(max_length=255, blank=True, db_index=True)
+    # Set once the rendering ended (ready or error); the output may be evicted afterwards
+    finished_at      = models.DateTimeField(null=True, blank=True)
+    # Last request for the session's playlists or media, for the LRU eviction
+    last_accessed_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,157 @@
+"""
+MPEG audio (MP3) frame headers.
+
+The TTS engines produce MP3, which the HLS writers take as input. Reading
+the frame headers gives the duration of the audio written without decoding
+it, and the format of a frame of silence that can be appended to it.
+"""
+import struct
+from collections import namedtuple
+
+# Bitrates in kbit/s of Layer III, by bitrate index
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates by version bits (MPEG-2.5, reserved, MPEG-2, MPEG-1) and index
+SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+ID3_HEADER_SIZE = 10
+
+# Bits of a header kept in a frame of silence: sync, version, layer,
+# bitrate, sample rate and channel mode
+_SILENCE_MASK = 0xFFFEFCC0
+_PROTECTION_ABSENT = 0x10000
+
+
+class FrameHeader(namedtuple("FrameHeader", "raw sample_rate bitrate channels padding mpeg1")):
+    """A Layer III frame header."""
+
+    __slots__ = ()
+
+    @property
+    def samples(self):
+        """Samples per channel in the frame."""
+        return 1152 if self.mpeg1 else 576
+
+    @property
+    def length(self):
+        """Length of the frame in bytes, header included."""
+        return self.samples // 8 * self.bitrate * 1000 // self.sample_rate + self.padding
+
+    @property
+    def duration(self):
+        """Duration of the frame in seconds."""
+        return self.samples / self.sample_rate
+
+    @property
+    def side_info_length(self):
+        if self.mpeg1:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+
+def parse_header(data, offset=0):
+    """
+    Parse the Layer III frame header at ``offset``.
+
+    Returns:
+        FrameHeader: The header, or None if ``data`` has no valid header there
+    """
+    if len(data) < offset + 4:
+        return None
+    raw = struct.unpack_from(">I", data, offset)[0]
+    version = (raw >> 19) & 0x3
+    layer = (raw >> 17) & 0x3
+    bitrate_index = (raw >> 12) & 0xF
+    rate_index = (raw >> 10) & 0x3
+    # Layer III only, no free-format or reserved values
+    if (raw & 0xFFE00000 != 0xFFE00000 or version == 1 or layer != 1
+            or bitrate_index in (0, 15) or rate_index == 3):
+        return None
+    mpeg1 = version == 3
+    return FrameHeader(
+        raw=raw,
+        sample_rate=SAMPLE_RATES[version][rate_index],
+        bitrate=BITRATES[1 if mpeg1 else 2][bitrate_index],
+        channels=1 if (raw >> 6) & 0x3 == 3 else 2,
+        padding=(raw >> 9) & 0x1,
+        mpeg1=mpeg1,
+    )
+
+
+def is_info_frame(data, offset, header):
+    """
+    Return whether the frame at ``offset`` is the Xing / Info frame of an
+    encoder, which holds stream information instead of audio.
+    """
+    tag_offset = offset + 4 + header.side_info_length
+    return data[tag_offset:tag_offset + 4] in (b"Xing", b"Info")
+
+
+def silent_frame(header):
+    """
+    Return a frame of silence in the format of ``header``.
+
+    All the side information is zero, so the frame has no main data and
+    every sample decodes to zero.
+    """
+    raw = (header.raw & _SILENCE_MASK) | _PROTECTION_ABSENT
+    silence = header._replace(raw=raw, padding=0)
+    return struct.pack(">I", raw) + bytes(silence.length - 4)
+
+
+class FrameReader:
+    """
+    Follow the frames of an MP3 stream written in pieces of any size.
+
+    ID3v2 tags and Xing / Info frames are skipped, and bytes that do not
+    start a frame are skipped one at a time until the next frame header.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.seconds = 0.0
+        # Header of the last frame, the format of the stream
+        self.header = None
+        self._pending = b""
+        self._skip = 0
+
+    def feed(self, data):
+        """Read the frame headers of the next piece of the stream."""
+        if self._skip >= len(data):
+            self._skip -= len(data)
+            return
+        data = self._pending + data[self._skip:]
+        self._skip = 0
+        offset = 0
+        while offset + 4 <= len(data):
+            if data.startswith(b"ID3", offset):
+                if len(data) - offset < ID3_HEADER_SIZE:
+                    break
+                size = 0
+                for byte in data[offset + 6:offset + 10]:
+                    size = (size << 7) | (byte & 0x7F)
+                footer = ID3_HEADER_SIZE if data[offset + 5] & 0x10 else 0
+                offset += ID3_HEADER_SIZE + size + footer
+                continue
+            header = parse_header(data, offset)
+            if header is None:
+                offset += 1
+                continue
+            if len(data) < offset + min(header.length, 8 + header.side_info_length):
+                # Not enough data to tell an Info frame from audio yet
+                break
+            if not is_info_frame(data, offset, header):
+                self.frames += 1
+                self.seconds += header.duration
+            self.header = header
+            offset += header.length
+        if offset > len(data):
+            self._skip = offset - len(data)
+            self._pending = b""
+        else:
+            self._pending = data[offset:]
@@ -0,0 +1,195 @@
+"""
+Adaptive chunk sizing driven by the playback buffer.
+
+A session produces audio while the listener plays it. The controller keeps
+track of two quantities:
+
+1. The buffer: seconds of audio already in the HLS playlist minus the
+   seconds played since the first segment appeared (wall-clock playback,
+   the server has no other signal of what the player consumed).
+2. The TTS latency per word: an exponentially weighted moving average of
+   the synthesis time of each chunk divided by its word count.
+
+From these it picks the word limit of the next text chunk: smaller chunks
+when the buffer is running low (their audio arrives sooner), larger ones
+when the buffer is comfortable (fewer, cheaper TTS requests). A chunk is
+never made larger than what can be synthesized before the buffer runs dry.
+When the buffer exceeds ``max_buffer`` seconds the reader is asked to pause
+instead of generating further ahead of the listener.
+
+The same estimate gives each chunk a deadline, the time at which playback
+would stall without it, which the shared TTS pool uses to serve the
+sessions closest to running dry first.
+"""
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkSizeController:
+    """
+    Choose text chunk sizes that hold a target playback buffer.
+    """
+
+    # Weight of the latest measurement in the latency moving average
+    smoothing = 0.3
+    # Share of the buffer that the synthesis of the next chunk may use
+    safety = 0.5
+    # Speech rate assumed until it can be measured (about 150 words per minute)
+    default_seconds_per_word = 0.4
+
+    def __init__(self, initial_words=40, min_words=8, max_words=80,
+                 target_buffer=10.0, max_buffer=60.0, adaptive=True,
+                 clock=time.monotonic):
+        """
+        Initialize the controller.
+
+        Args:
+            initial_words (int): Word limit used until the buffer is known (default: 40)
+            min_words (int): Smallest word limit (default: 8)
+            max_words (int): Largest word limit (default: 80)
+            target_buffer (float): Seconds of buffered audio to hold (default: 10.0)
+            max_buffer (float): Seconds ahead of playback at which generation
+                pauses (default: 60.0)
+            adaptive (bool): If False the word limit stays at ``initial_words``
+                and only the measurements are reported (default: True)
+            clock (callable): Monotonic clock, in seconds
+        """
+        self.min_words = max(1, min(min_words, max_words))
+        self.max_words = max(self.min_words, max_words)
+        self.chunk_words = min(max(initial_words, self.min_words), self.max_words)
+        self.target_buffer = target_buffer
+        self.max_buffer = max_buffer
+        self.adaptive = adaptive
+        self._clock = clock
+
+        self.latency_per_word = None
+        self.audio_seconds = 0.0
+        self.words_written = 0
+        self.created_at = clock()
+        self.playback_started_at = None
+        self.decision = "startup"
+
+    def record_synthesis(self, words, seconds):
+        """
+        Record how long the TTS engine took for a chunk.
+
+        Args:
+            words (int): Number of words in the chunk
+            seconds (float): Time from the start of synthesis to its last byte
+        """
+        if words <= 0:
+            return
+        sample = seconds / words
+        if self.latency_per_word is None:
+            self.latency_per_word = sample
+        else:
+            self.latency_per_word += self.smoothing * (sample - self.latency_per_word)
+
+    def record_written(self, words):
+        """Record that a chunk of ``words`` words was written to the stream."""
+        self.words_written += words
+
+    def record_playlist(self, audio_seconds):
+        """
+        Record the total duration of the segments listed in the playlist.
+
+        Playback is assumed to start when the first segment appears.
+        """
+        if audio_seconds > 0 and self.playback_started_at is None:
+            self.playback_started_at = self._clock()
+        self.audio_seconds = max(self.audio_seconds, audio_seconds)
+
+    @property
+    def played_seconds(self):
+        if self.playback_started_at is None:
+            return 0.0
+        return self._clock() - self.playback_started_at
+
+    @property
+    def seconds_per_word(self):
+        """Seconds of audio per word, measured from the playlist once it has segments."""
+        if self.audio_seconds > 0 and self.words_written > 0:
+            return self.audio_seconds / self.words_written
+        return self.default_seconds_per_word
+
+    @property
+    def buffered_seconds(self):
+        """Seconds of audio available to the listener ahead of playback."""
+        return max(0.0, self.audio_seconds - self.played_seconds)
+
+    def update(self):
+        """
+        Recompute the word limit of the next chunk.
+
+        Returns:
+            int: The new word limit
+        """
+        if not self.adaptive:
+            self.decision = "fixed"
+            return self.chunk_words
+
+        if self.playback_started_at is None:
+            self.decision = "startup"
+            return self.chunk_words
+
+        buffered = self.buffered_seconds
+        words = self.chunk_words
+        if buffered < self.target_buffer / 2:
+            words = words // 2
+            self.decision = "shrink"
+        elif buffered > self.target_buffer:
+            words = int(words * 1.5)
+            self.decision = "grow"
+        else:
+            self.decision = "hold"
+
+        if self.latency_per_word:
+            # The next chunk must be synthesized before the buffer runs out
+            affordable = int(buffered * self.safety / self.latency_per_word)
+            if affordable < words:
+                words = affordable
+                self.decision = "cap"
+
+        self.chunk_words = min(max(words, self.min_words), self.max_words)
+        return self.chunk_words
+
+    def deadline(self, words_ahead=0):
+        """
+        Return when playback stalls unless the next chunk is ready.
+
+        Before the first segment the listener is already waiting, so the
+        deadline is the start of the session.
+
+        Args:
+            words_ahead (int): Words of earlier chunks that are submitted but
+                not written yet; their audio plays first
+
+        Returns:
+            float: A value of the controller's clock
+        """
+        if self.playback_started_at is None:
+            return self.created_at
+        return self._clock() + self.buffered_seconds + words_ahead * self.seconds_per_word
+
+    def pause_seconds(self):
+        """
+        Return how long generation should pause because it is too far ahead
+        of playback, or 0.0 if it can continue.
+        """
+        if self.playback_started_at is None:
+            return 0.0
+        return max(0.0, self.buffered_seconds - self.max_buffer)
+
+    def snapshot(self):
+        """Return the controller state for progress metadata."""
+        return {
+            "chunk_words": self.chunk_words,
+            "decision": self.decision,
+            "buffered_seconds": round(self.buffered_seconds, 2),
+            "audio_seconds": round(self.audio_seconds, 2),
+            "latency_per_word": (round(self.latency_per_word, 4)
+                                 if self.latency_per_word is not None else None),
+            "seconds_per_word": round(self.seconds_per_word, 4),
+        }
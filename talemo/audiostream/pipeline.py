@@ -1,20 +1,211 @@
 import asyncio, os
 import logging
-from .hls import StreamingHLSWriter
-from . import tts, llm
+import queue
+import time
+from django.conf import settings
+from .hls import create_writer, playlist_duration
+from .pacing import ChunkSizeController
+from .playlist import MediaPlaylist
+from .segmenter import SentenceSegmenter
+from . import tts, tts_pool, llm
 
 logger = logging.getLogger(__name__)
 
+
+def _playlist_seconds(writer, playlist_path):
+    """
+    Return the seconds of audio published in the session's playlist, from
+    the writer's in-memory playlist when it has one.
+    """
+    playlist = getattr(writer, 'playlist', None)
+    if isinstance(playlist, MediaPlaylist):
+        return playlist.duration
+    return playlist_duration(playlist_path)
+
+
+def _ensure_ffmpeg_running(writer):
+    """
+    Make sure the writer's ffmpeg process is alive and accepting input,
+    restarting it if necessary.
+
+    Returns:
+        bool: True if ffmpeg is ready to receive audio
+    """
+    if not getattr(writer, 'uses_ffmpeg_process', True):
+        # In-process backend, nothing to restart
+        return True
+
+    def is_running():
+        return not (writer.ffmpeg_process is None or
+                    writer.ffmpeg_process.poll() is not None or
+                    writer.ffmpeg_stdin is None or
+                    writer.ffmpeg_stdin.closed)
+
+    if is_running():
+        return True
+
+    logger.warning("ffmpeg process is not running or stdin is closed, restarting it")
+    writer._start_ffmpeg_process()
+
+    # Double-check that the process started successfully
+    return is_running()
+
+
+class _ChunkAudio:
+    """
+    MP3 data of one text chunk, handed from a TTS worker thread to the writer.
+
+    The TTS thread pushes each piece as the engine yields it, so the writer
+    can stream the chunk at the head of the queue while it is still being
+    synthesized, and simply drain the already buffered chunks behind it.
+    """
+
+    _END = object()
+
+    def __init__(self):
+        self._frames = queue.Queue()
+        self.error = None
+        # Time from the start of synthesis to its last byte, once it is done
+        self.synthesis_seconds = None
+
+    def produce(self, stream, *args):
+        """Run ``stream(*args)`` in the calling (worker) thread and collect its output."""
+        started = time.monotonic()
+        try:
+            for frame in stream(*args):
+                if frame:
+                    self._frames.put(frame)
+        except Exception as e:
+            self.error = e
+            self._frames.put(e)
+        finally:
+            self.synthesis_seconds = time.monotonic() - started
+            self._frames.put(self._END)
+
+    def next_frame(self):
+        """Block until the next piece is available; returns None at the end."""
+        item = self._frames.get()
+        if item is self._END:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def frames(self, first):
+        """Iterate over the chunk's MP3 data, starting with an already read piece."""
+        frame = first
+        while frame is not None:
+            yield frame
+            frame = self.next_frame()
+
+
 def run_audio_session(prompt, playlist_path, lang="en", chunk_words=40,
-                      progress_cb=lambda *a,**k: None):
+                      progress_cb=lambda *a,**k: None,
+                      tts_workers=None, prefetch_chunks=None,
+                      tts_engine=None, voice=None, first_chunk_words=None,
+                      adaptive_chunks=None, writer=None, writer_factory=None):
+    """
+    Render the LLM answer to a prompt as an HLS audio stream.
+
+    The session runs as three concurrent stages:
+
+    1. The LLM reader cuts the token stream into text chunks on sentence or
+       clause boundaries (see SentenceSegmenter) and submits each chunk for
+       synthesis as soon as it is cut.
+    2. Up to ``tts_workers`` chunks are synthesized at the same time by the
+       process-wide TTS worker pool (see tts_pool), so token intake never
+       waits for a TTS round-trip. The pool caps the TTS load of the whole
+       process and serves first the sessions whose listener is closest to
+       running out of audio (each chunk gets the deadline at which playback
+       would stall without it); while this session already has
+       ``tts_workers`` jobs in the pool the reader waits.
+    3. The ordered writer takes the chunks strictly in order and streams
+       their MP3 data into the HLS writer (see hls.create_writer) as the
+       TTS engine produces it; chunks synthesized ahead of time are
+       already buffered. After each chunk the writer's end_chunk can get
+       its last sentence encoded and published without waiting for the next
+       chunk's audio, with a little silence (HLS_CHUNK_FLUSH_MAX_SILENCE).
+
+    At most ``prefetch_chunks`` chunks wait between the reader and the
+    writer; when the queue is full the reader stops pulling tokens until
+    the writer catches up.
+
+    With ``adaptive_chunks`` a ChunkSizeController adjusts the word limit of
+    the following chunks after every written chunk, from the seconds of
+    audio buffered ahead of playback and the measured TTS latency per word,
+    and pauses the reader when it gets too far ahead of the listener. Its
+    decisions are reported in the "pacing" entry of the chunk progress
+    metadata.
+
+    The session is the single producer of the playlist: it writes every
+    chunk through one HLS writer and finalizes that writer when it ends,
+    also when it fails. A caller that starts the writer early (so that
+    ffmpeg is ready before the first chunk) passes it as ``writer`` and
+    hands over its ownership; it must not write to or finalize it itself.
+
+    Args:
+        prompt (str): The prompt sent to the LLM
+        playlist_path (str): Path of the playlist; segments go to its directory
+        lang (str): The language code (default: "en")
+        chunk_words (int): Maximum number of words per text chunk; the
+            initial limit when chunk sizes are adaptive
+        progress_cb (callable): Called with ("chunk", meta) and ("done", info)
+        tts_workers (int, optional): TTS jobs this session may have in the
+            shared pool at once (default: settings.TTS_CONCURRENCY)
+        prefetch_chunks (int, optional): Queue bound (default: settings.TTS_PREFETCH_CHUNKS)
+        tts_engine (str, optional): TTS engine name (default: settings.TTS_ENGINE)
+        voice (str, optional): Engine-specific voice (default: settings.TTS_VOICE)
+        first_chunk_words (int, optional): Word limit of the first chunk, kept
+            short for a fast first audio (default: settings.TTS_FIRST_CHUNK_WORDS)
+        adaptive_chunks (bool, optional): Adapt chunk sizes to the playback
+            buffer (default: settings.TTS_ADAPTIVE_CHUNKS)
+        writer (optional): An already started HLS writer for the playlist's
+            directory; the session takes ownership of it
+        writer_factory (callable, optional): Creates the writer from the
+            output directory when none is given (default: hls.create_writer)
+
+    Returns:
+        dict: Information about the generated HLS stream
+    """
+    if tts_workers is None:
+        tts_workers = getattr(settings, 'TTS_CONCURRENCY', 3)
+    if prefetch_chunks is None:
+        prefetch_chunks = getattr(settings, 'TTS_PREFETCH_CHUNKS', 4)
+    if voice is None:
+        voice = getattr(settings, 'TTS_VOICE', None)
+    if first_chunk_words is None:
+        first_chunk_words = getattr(settings, 'TTS_FIRST_CHUNK_WORDS', 10)
+    if adaptive_chunks is None:
+        adaptive_chunks = getattr(settings, 'TTS_ADAPTIVE_CHUNKS', True)
+    if writer is not None and writer_factory is not None:
+        raise ValueError("Pass either a writer or a writer_factory, not both")
+    # Resolve the engine up front so a misconfiguration fails before any work starts
+    engine_name = tts.get_engine(tts_engine).name
 
     async def _run():
         # Extract the directory path from the playlist_path
         output_dir = os.path.dirname(playlist_path)
-        writer = StreamingHLSWriter(output_dir)
-        buf = []
-        first_chunk = True
+        local_playlist_path = os.path.join(output_dir, "audio.m3u8")
+        hls_writer = writer if writer is not None else (writer_factory or create_writer)(output_dir)
         chunk_count = 0
+        # Words of submitted chunks that are not written to the stream yet
+        words_ahead = 0
+
+        controller = ChunkSizeController(
+            initial_words=chunk_words,
+            min_words=getattr(settings, 'TTS_CHUNK_WORDS_MIN', 8),
+            max_words=getattr(settings, 'TTS_CHUNK_WORDS_MAX', 80),
+            target_buffer=getattr(settings, 'TTS_TARGET_BUFFER_SECONDS', 10.0),
+            max_buffer=getattr(settings, 'TTS_MAX_BUFFER_SECONDS', 60.0),
+            adaptive=adaptive_chunks,
+        )
+
+        loop = asyncio.get_running_loop()
+        pool_session = tts_pool.get_pool().open_session(os.path.basename(output_dir))
+        # Released when a job leaves the pool (backpressure into the reader)
+        tts_slots = asyncio.Semaphore(tts_workers)
+        # Items are (chunk_index, text_chunk, _ChunkAudio); None ends the stream
+        chunk_queue = asyncio.Queue(maxsize=prefetch_chunks)
         
         # Create a text log file to store all text chunks
         text_log_path = os.path.join(output_dir, "text_chunks.log")
@@ -25,108 +216,144 @@ def run_audio_session(prompt, playlist_path, lang="en", chunk_words=40,
             f.write(f"Timestamp: {os.popen('date').read().strip()}\n")
             f.write(f"Original prompt: {prompt}\n")
             f.write(f"Language: {lang}\n")
-            f.write(f"Chunk words: {chunk_words}\n")
+            f.write(f"Chunk words: {chunk_words}{' (adaptive)' if adaptive_chunks else ''}\n")
+            f.write(f"TTS engine: {engine_name}\n")
+            f.write(f"TTS workers: {tts_workers}\n")
             f.write(f"Output directory: {output_dir}\n")
             f.write(f"\n=== Text Chunks ===\n\n")
-        
-        try:
-            async for tok in llm.stream_tokens(prompt):
-                buf.append(tok)
-                # Use a smaller chunk size for the first chunk to start audio faster
-                if tok.endswith(('.', '!', '?')) or (first_chunk and len(buf) >= 10) or len(buf) >= chunk_words:
-                    try:
-                        # Check if ffmpeg process is still running or stdin is closed
-                        if (writer.ffmpeg_process is None or 
-                            writer.ffmpeg_process.poll() is not None or 
-                            writer.ffmpeg_stdin is None or 
-                            writer.ffmpeg_stdin.closed):
-                            logger.warning("ffmpeg process is not running or stdin is closed, restarting it")
-                            writer._start_ffmpeg_process()
-
-                            # Double-check that the process started successfully
-                            if (writer.ffmpeg_process is None or 
-                                writer.ffmpeg_process.poll() is not None or 
-                                writer.ffmpeg_stdin is None or 
-                                writer.ffmpeg_stdin.closed):
-                                logger.error("Failed to restart ffmpeg process")
-                                continue
-
-                        # Process the text chunk
-                        try:
-                            text_chunk = ' '.join(buf)
-                            chunk_count += 1
-                            
-                            # Log to console
-                            logger.info(f"Sending text chunk #{chunk_count} to TTS: '{text_chunk}'")
-                            
-                            # Write to file
-                            with open(text_log_path, 'a', encoding='utf-8') as f:
-                                f.write(f"=== Chunk #{chunk_count} ===\n")
-                                f.write(f"{text_chunk}\n\n")
-                            
-                            tts.speak_chunk_to_ffmpeg(text_chunk, lang, writer.ffmpeg_stdin)
-                            buf.clear()
-                            progress_cb("chunk", {"chunk_count": chunk_count})
-                            first_chunk = False
-                        except Exception as e:
-                            logger.error(f"Error in speak_chunk_to_ffmpeg: {str(e)}")
-                            # Try to restart ffmpeg if there was an error
-                            writer._start_ffmpeg_process()
-                    except Exception as e:
-                        logger.error(f"Error processing chunk: {str(e)}")
-                        # Continue with the next chunk
-
-            # Process any remaining text
-            if buf:
+
+        def release_slot(_future):
+            # Runs in a pool thread, possibly after the session has ended
+            try:
+                loop.call_soon_threadsafe(tts_slots.release)
+            except RuntimeError:
+                pass
+
+        async def submit_chunk(text_chunk, final=False):
+            """Log a text chunk, start its synthesis and queue it for the writer."""
+            nonlocal chunk_count, words_ahead
+
+            # Do not generate too far ahead of the listener
+            pause = controller.pause_seconds()
+            while pause > 0:
+                logger.debug(f"{controller.buffered_seconds:.1f}s of audio buffered, pausing generation")
+                await asyncio.sleep(min(pause, 1.0))
+                pause = controller.pause_seconds()
+
+            chunk_count += 1
+            label = "Final Chunk" if final else "Chunk"
+
+            # Log to console
+            logger.info(f"Sending {'final ' if final else ''}text chunk #{chunk_count} to TTS: '{text_chunk}'")
+
+            # Write to file
+            with open(text_log_path, 'a', encoding='utf-8') as f:
+                f.write(f"=== {label} #{chunk_count} ===\n")
+                f.write(f"{text_chunk}\n\n")
+
+            await tts_slots.acquire()
+            audio = _ChunkAudio()
+            words = len(text_chunk.split())
+            future = pool_session.submit(
+                audio.produce, tts.stream, text_chunk, lang, engine_name, voice,
+                deadline=controller.deadline(words_ahead),
+            )
+            words_ahead += words
+            future.add_done_callback(release_slot)
+            # Blocks when the writer is prefetch_chunks behind (backpressure)
+            await chunk_queue.put((chunk_count, text_chunk, audio))
+
+        async def read_llm():
+            # Use a smaller chunk size for the first chunk to start audio faster
+            segmenter = SentenceSegmenter(first_chunk_words=first_chunk_words, max_words=chunk_words)
+            try:
+                async for tok in llm.stream_tokens(prompt):
+                    segmenter.max_words = controller.chunk_words
+                    for text_chunk in segmenter.feed(tok):
+                        await submit_chunk(text_chunk)
+
+                # Process any remaining text
+                text_chunk = segmenter.flush()
+                if text_chunk:
+                    await submit_chunk(text_chunk, final=True)
+            except Exception as e:
+                logger.error(f"Error in stream_tokens: {str(e)}")
+            finally:
+                await chunk_queue.put(None)
+
+        async def write_ordered():
+            nonlocal words_ahead
+            while True:
+                item = await chunk_queue.get()
+                if item is None:
+                    return
+
+                index, text_chunk, audio = item
+                words = len(text_chunk.split())
+                # Written or dropped, the chunk no longer delays the next ones
+                words_ahead -= words
                 try:
-                    # Check if ffmpeg process is still running or stdin is closed
-                    if (writer.ffmpeg_process is None or 
-                        writer.ffmpeg_process.poll() is not None or 
-                        writer.ffmpeg_stdin is None or 
-                        writer.ffmpeg_stdin.closed):
-                        logger.warning("ffmpeg process is not running or stdin is closed, restarting it")
-                        writer._start_ffmpeg_process()
-
-                        # Double-check that the process started successfully
-                        if (writer.ffmpeg_process is None or 
-                            writer.ffmpeg_process.poll() is not None or 
-                            writer.ffmpeg_stdin is None or 
-                            writer.ffmpeg_stdin.closed):
-                            logger.error("Failed to restart ffmpeg process for final chunk")
-                            # Skip processing the final chunk
-                            buf.clear()
-
-                    # Process the remaining text
-                    try:
-                        text_chunk = ' '.join(buf)
-                        chunk_count += 1
-                        
-                        # Log to console
-                        logger.info(f"Sending final text chunk #{chunk_count} to TTS: '{text_chunk}'")
-                        
-                        # Write to file
-                        with open(text_log_path, 'a', encoding='utf-8') as f:
-                            f.write(f"=== Final Chunk #{chunk_count} ===\n")
-                            f.write(f"{text_chunk}\n\n")
-                        
-                        tts.speak_chunk_to_ffmpeg(text_chunk, lang, writer.ffmpeg_stdin)
-                        buf.clear()
-                    except Exception as e:
-                        logger.error(f"Error in speak_chunk_to_ffmpeg for final chunk: {str(e)}")
-                        # Try to restart ffmpeg if there was an error
-                        writer._start_ffmpeg_process()
+                    # Wait for the first piece of audio without blocking the loop
+                    first_frame = await loop.run_in_executor(None, audio.next_frame)
                 except Exception as e:
-                    logger.error(f"Error processing final chunk: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error in stream_tokens: {str(e)}")
+                    logger.error(f"Error synthesizing chunk #{index}: {str(e)}")
+                    continue
+
+                if first_frame is None:
+                    logger.error(f"TTS generated no audio for chunk #{index}, skipping it")
+                    continue
+
+                try:
+                    if not _ensure_ffmpeg_running(hls_writer):
+                        logger.error(f"Failed to restart ffmpeg process, dropping chunk #{index}")
+                        continue
+
+                    # Pipe writes can block while ffmpeg is busy, keep them off the loop
+                    await loop.run_in_executor(None, hls_writer.process_stream, audio.frames(first_frame))
+                    # Publish the end of the chunk now rather than with the next one
+                    await loop.run_in_executor(None, hls_writer.end_chunk)
+
+                    if audio.synthesis_seconds is not None:
+                        controller.record_synthesis(words, audio.synthesis_seconds)
+                    controller.record_written(words)
+                    controller.record_playlist(_playlist_seconds(hls_writer, local_playlist_path))
+                    controller.update()
+                    progress_cb("chunk", {
+                        "chunk_count": index,
+                        "pacing": controller.snapshot(),
+                        "tts_queue": pool_session.stats(),
+                    })
+                except Exception as e:
+                    if audio.error is not None:
+                        logger.error(f"Error synthesizing chunk #{index}: {str(e)}")
+                        continue
+                    logger.error(f"Error writing chunk #{index} to ffmpeg: {str(e)}")
+                    if not getattr(hls_writer, 'uses_ffmpeg_process', True):
+                        continue
+                    # Try to restart ffmpeg if there was an error
+                    try:
+                        hls_writer._start_ffmpeg_process()
+                    except Exception as restart_error:
+                        logger.error(f"Failed to restart ffmpeg process: {str(restart_error)}")
+
+        try:
+            await asyncio.gather(read_llm(), write_ordered())
+        except BaseException:
+            # The session owns the writer: end the stream even when it fails
+            try:
+                hls_writer.finalize()
+            except Exception as e:
+                logger.error(f"Error finalizing HLS playlist after a failed session: {str(e)}")
+            raise
+        finally:
+            pool_session.close()
 
         # Finalize the HLS playlist
         try:
-            info = writer.finalize()
+            info = hls_writer.finalize()
             progress_cb("done", info)
 
             # Verify that the playlist file exists
-            local_playlist_path = os.path.join(output_dir, "audio.m3u8")
             if not os.path.exists(local_playlist_path):
                 logger.warning(f"Playlist file still not created after finalize: {local_playlist_path}, which is unexpected with FFmpeg temp_file flag")
 
@@ -142,7 +369,6 @@ def run_audio_session(prompt, playlist_path, lang="en", chunk_words=40,
             logger.error(f"Error finalizing HLS playlist: {str(e)}")
 
             # Check if the playlist file exists after finalize error
-            local_playlist_path = os.path.join(output_dir, "audio.m3u8")
             if not os.path.exists(local_playlist_path):
                 logger.warning(f"Playlist file not found after finalize error: {local_playlist_path}, which is unexpected with FFmpeg temp_file flag")
 
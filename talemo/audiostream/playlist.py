@@ -0,0 +1,577 @@
+"""
+In-memory model of a session's HLS media playlist.
+
+The application owns the playlist. The HLS muxer (ffmpeg or PyAV) writes
+the media files and a short internal playlist of its last entries
+(``muxer.m3u8``). Each file it completes is added by SegmentPackager to a
+MediaPlaylist, which holds the segments with their durations and program
+date times, the parts of low-latency mode and the end-list state. The
+model renders ``audio.m3u8`` and replaces the file atomically, outside the
+lock its readers wait on; the changes of a write interval are written
+together (``HLS_PLAYLIST_WRITE_INTERVAL``). The media files are fMP4 fragments after an init segment, or MPEG-TS
+segments when the MP3 input is packaged without transcoding. A master
+playlist (``master.m3u8``) declares the codecs and bandwidth of the media,
+or lists the renditions of an adaptive-bitrate ladder, each produced by
+its own packager in a subdirectory.
+
+Readers in the same process use the model directly (get_live):
+- the rendered text is cached per version
+- a reader can wait for a segment or part without touching the disk
+- long low-latency sessions are served as delta updates
+  (``_HLS_skip=YES``): the segments older than ``CAN-SKIP-UNTIL`` are
+  replaced by an ``EXT-X-SKIP`` tag, so a reload no longer grows with the
+  length of the story. The other sessions are played from the file, which
+  cannot answer them
+
+The packager can also hand each media file and playlist version to a
+storage backend as it publishes them (publish_to), e.g. the RAM tier of
+storage.py, from which other processes serve the live session, and
+record it in the session's manifest (manifest.py).
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+
+from . import fmp4, ts
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "audio.m3u8"
+MASTER_PLAYLIST_NAME = "master.m3u8"
+MUXER_PLAYLIST_NAME = "muxer.m3u8"
+INIT_NAME = "init.mp4"
+PART_PATTERN = "part_%05d.m4s"
+SEGMENT_PATTERN = "segment_%03d.m4s"
+# File extension of the media files by HLS segment type
+SEGMENT_EXTENSIONS = {"fmp4": "m4s", "mpegts": "ts"}
+
+# The muxer cuts a segment or part after the audio frame that reaches its
+# duration, so it can be one AAC frame (1024 samples, 64 ms at 16 kHz)
+# longer than requested
+FRAME_MARGIN = 0.064
+# Delta updates may skip segments older than this many target durations
+# (the minimum the LL-HLS specification allows)
+SKIP_TARGET_DURATIONS = 6
+
+
+def media_pattern(segment_type="fmp4", part=False):
+    """Return the file name pattern of the segments (or parts) of a segment type."""
+    pattern = PART_PATTERN if part else SEGMENT_PATTERN
+    return pattern.replace(".m4s", f".{SEGMENT_EXTENSIONS[segment_type]}")
+
+
+def write_atomic(path, data):
+    """Replace a file so readers see either the old or the new content."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def render_master_playlist(variants):
+    """
+    Return the text of a master playlist.
+
+    Args:
+        variants (list): (uri, bandwidth, codecs) of the media playlists
+    """
+    lines = ["#EXTM3U", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for uri, bandwidth, codecs in variants:
+        lines += [f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},CODECS="{codecs}"', uri]
+    return "\n".join(lines) + "\n"
+
+
+def write_master_playlist(hls_dir, variants):
+    """
+    Write the master playlist of a session directory.
+
+    Args:
+        hls_dir (str): Session directory
+        variants (list): (uri, bandwidth, codecs) of the media playlists,
+            with URIs relative to the directory
+
+    Returns:
+        str: Text of the master playlist
+    """
+    text = render_master_playlist(variants)
+    write_atomic(os.path.join(hls_dir, MASTER_PLAYLIST_NAME), text.encode())
+    return text
+
+
+class Segment:
+    """A media segment of the playlist."""
+
+    __slots__ = ("uri", "duration", "program_date_time", "parts")
+
+    def __init__(self, uri, duration, program_date_time, parts=()):
+        self.uri = uri
+        self.duration = duration
+        self.program_date_time = program_date_time
+        # (uri, duration) of its LL-HLS parts
+        self.parts = list(parts)
+
+
+class MediaPlaylist:
+    """
+    Segments, parts and end-list state of a live EVENT playlist.
+    """
+
+    def __init__(self, path, target_duration=1, low_latency=False, part_target=None,
+                 part_window=3, map_uri=INIT_NAME, write_interval=0.0):
+        """
+        Initialize the playlist.
+
+        Args:
+            path (str): File the playlist is rendered to
+            target_duration (int): EXT-X-TARGETDURATION in seconds
+            low_latency (bool): Render LL-HLS parts, preload hint and server
+                control (blocking reload, delta updates) (default: False)
+            part_target (float, optional): EXT-X-PART-INF part target in seconds
+            part_window (int): Number of most recent segments whose parts
+                are listed (default: 3)
+            map_uri (str, optional): URI of the init segment, None for
+                segments without one (default: "init.mp4")
+            write_interval (float): Minimum seconds between two writes of
+                the file while the playlist is live; the changes in between
+                are written at the end of the interval (default: 0, every
+                change is written)
+        """
+        self.path = path
+        self.target_duration = target_duration
+        self.low_latency = low_latency
+        self.part_target = part_target
+        self.part_window = part_window
+        self.map_uri = map_uri
+        self.write_interval = write_interval
+
+        self.media_sequence = 0
+        self.segments = []
+        # (uri, duration) of the parts of the segment being built
+        self.parts = []
+        self.preload_hint = None
+        self.ended = False
+        # Incremented on every change
+        self.version = 0
+        # Called with the rendered text on every change, outside the lock
+        # the readers wait on
+        self.on_change = None
+
+        self._next_pdt = None
+        self._rendered = {}
+        self._cond = threading.Condition()
+        # Orders the file writes and on_change calls; the versions last
+        # written and handed over
+        self._publish_lock = threading.Lock()
+        self._written_version = 0
+        self._written_at = None
+        self._write_timer = None
+        self._published_version = 0
+
+    @property
+    def can_skip_until(self):
+        """Age in seconds beyond which delta updates skip segments, or None (low-latency playlists only)."""
+        if not self.low_latency:
+            return None
+        return SKIP_TARGET_DURATIONS * self.target_duration
+
+    @property
+    def duration(self):
+        """Seconds of audio listed, including the parts of the open segment."""
+        with self._cond:
+            return (sum(segment.duration for segment in self.segments)
+                    + sum(duration for _, duration in self.parts))
+
+    @property
+    def next_msn(self):
+        """Media sequence number of the segment being built."""
+        return self.media_sequence + len(self.segments)
+
+    def _start_time(self, duration):
+        if self._next_pdt is None:
+            # The first media was just encoded: it started ``duration`` ago
+            self._next_pdt = (datetime.datetime.now(datetime.timezone.utc)
+                              - datetime.timedelta(seconds=duration))
+        return self._next_pdt
+
+    def add_part(self, uri, duration, preload_hint=None, publish=True):
+        """
+        Add a part to the open segment.
+
+        Args:
+            uri (str): URI of the part file
+            duration (float): Duration in seconds
+            preload_hint (str, optional): URI of the next part
+            publish (bool): Render the playlist now (default: True)
+        """
+        with self._cond:
+            self._start_time(duration)
+            self.parts.append((uri, duration))
+            self.preload_hint = preload_hint
+            if not publish:
+                return
+            self._changed()
+        self._publish()
+
+    def add_segment(self, uri, duration, publish=True):
+        """
+        Add a complete segment, made of the open parts if there are any.
+
+        Args:
+            uri (str): URI of the segment file
+            duration (float): Duration in seconds
+            publish (bool): Render the playlist now (default: True)
+        """
+        with self._cond:
+            pdt = self._start_time(duration)
+            self.segments.append(Segment(uri, duration, pdt, self.parts))
+            self.parts = []
+            self._next_pdt = pdt + datetime.timedelta(seconds=duration)
+            if not publish:
+                return
+            self._changed()
+        self._publish()
+
+    def end(self):
+        """Add the end-list tag and publish the playlist, written at once."""
+        with self._cond:
+            self.ended = True
+            self.preload_hint = None
+            self._changed()
+        self._publish(flush=True)
+
+    def _changed(self):
+        # Called with the lock held: readers in this process render the new
+        # version from memory
+        self.version += 1
+        self._rendered.clear()
+        self._cond.notify_all()
+
+    def _publish(self, flush=False):
+        # The file write, and on_change, which may store the text over the
+        # network (see storage.py), do not hold the readers; a version
+        # overtaken by a newer one is neither written nor handed over
+        with self._publish_lock:
+            write = self._write_due(flush)
+            with self._cond:
+                version = self.version
+                write = write and version > self._written_version
+                publish = self.on_change is not None and version > self._published_version
+                if not (write or publish):
+                    return
+                text = self.render()
+            if write:
+                try:
+                    write_atomic(self.path, text.encode())
+                except OSError as e:
+                    logger.error(f"Error writing the playlist {self.path}: {str(e)}")
+                self._written_version, self._written_at = version, time.monotonic()
+            if publish:
+                self._published_version = version
+                self.on_change(text)
+
+    def _write_due(self, flush):
+        # Called with the publish lock held
+        if flush or self.write_interval <= 0 or self._written_at is None:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+            return True
+        remaining = self._written_at + self.write_interval - time.monotonic()
+        if remaining <= 0:
+            return True
+        if self._write_timer is None:
+            # Write the newest version at the end of the interval
+            self._write_timer = threading.Timer(remaining, self._write_pending)
+            self._write_timer.daemon = True
+            self._write_timer.start()
+        return False
+
+    def _write_pending(self):
+        with self._publish_lock:
+            self._write_timer = None
+        self._publish(flush=True)
+
+    def has(self, msn, part=None):
+        """
+        Return whether the playlist lists segment ``msn``, or its part
+        ``part`` when given.
+        """
+        with self._cond:
+            if self.ended or msn < self.next_msn:
+                return True
+            return part is not None and msn == self.next_msn and part < len(self.parts)
+
+    def wait(self, msn, part=None, timeout=None):
+        """
+        Block until segment ``msn`` (or its part) is listed or the playlist ends.
+
+        Returns:
+            bool: True if it is listed
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.has(msn, part), timeout)
+
+    def render(self, skip=False):
+        """
+        Return the playlist text, cached until the next change.
+
+        Args:
+            skip (bool): Render a delta update without the segments older
+                than CAN-SKIP-UNTIL (low-latency playlists only)
+        """
+        skip = bool(skip) and self.can_skip_until is not None
+        with self._cond:
+            if skip not in self._rendered:
+                self._rendered[skip] = self._render(skip)
+            return self._rendered[skip]
+
+    def _skipped_segments(self):
+        total = sum(segment.duration for segment in self.segments)
+        elapsed, skipped = 0.0, 0
+        for segment in self.segments:
+            elapsed += segment.duration
+            if total - elapsed < self.can_skip_until:
+                break
+            skipped += 1
+        return skipped
+
+    def _render(self, skip):
+        lines = [
+            "#EXTM3U",
+            f"#EXT-X-VERSION:{9 if self.low_latency else 7}",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+        ]
+        if self.low_latency:
+            lines += [
+                f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,CAN-SKIP-UNTIL={self.can_skip_until:.1f},"
+                f"PART-HOLD-BACK={3 * self.part_target:.3f}",
+                f"#EXT-X-PART-INF:PART-TARGET={self.part_target:.3f}",
+            ]
+        lines += [
+            f"#EXT-X-MEDIA-SEQUENCE:{self.media_sequence}",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            "#EXT-X-INDEPENDENT-SEGMENTS",
+        ]
+        if self.map_uri:
+            lines.append(f'#EXT-X-MAP:URI="{self.map_uri}"')
+
+        skipped = self._skipped_segments() if skip else 0
+        if skipped:
+            lines.append(f"#EXT-X-SKIP:SKIPPED-SEGMENTS={skipped}")
+
+        first_with_parts = len(self.segments) - self.part_window
+        for number, segment in enumerate(self.segments[skipped:], skipped):
+            lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{_format_pdt(segment.program_date_time)}")
+            if self.low_latency and number >= first_with_parts:
+                lines += [_part_line(*part) for part in segment.parts]
+            lines += [f"#EXTINF:{segment.duration:.6f},", segment.uri]
+        lines += [_part_line(*part) for part in self.parts]
+
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        elif self.preload_hint:
+            lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{self.preload_hint}"')
+        return "\n".join(lines) + "\n"
+
+
+def _format_pdt(value):
+    return value.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _part_line(uri, duration):
+    # Every AAC or MP3 frame is a sync sample, so every part is independent
+    return f'#EXT-X-PART:DURATION={duration:.6f},URI="{uri}",INDEPENDENT=YES'
+
+
+class SegmentPackager:
+    """
+    Add the media files completed by an HLS muxer to a session's playlist.
+
+    Each muxer file is a segment, or in low-latency mode a part: parts are
+    grouped into segments of about ``segment_duration`` seconds, whose
+    files are the concatenated parts. With the first file the master
+    playlist is written, when the codecs of the media are known.
+    """
+
+    def __init__(self, hls_dir, segment_duration=1.0, low_latency=False, part_duration=0.2,
+                 segment_type="fmp4", codecs=None, bandwidth=None, init_name=INIT_NAME,
+                 manifest=None, rendition="", write_interval=0.0):
+        """
+        Initialize the packager and register its playlist for in-process readers.
+
+        Args:
+            hls_dir (str): Directory of the media files and playlist
+            segment_duration (float): Segment duration of the muxer, or the
+                minimum duration of a segment of parts (default: 1.0)
+            low_latency (bool): The muxer writes LL-HLS parts (default: False)
+            part_duration (float): Part duration requested from the muxer (default: 0.2)
+            segment_type (str): "fmp4" or "mpegts" (default: "fmp4")
+            codecs (str, optional): CODECS of the media for the master playlist
+            bandwidth (int, optional): BANDWIDTH of the master playlist
+                (default: the bit rate of the first media file)
+            init_name (str): File name of the fMP4 init segment (default: "init.mp4")
+            manifest (SessionManifest, optional): Manifest the media files are recorded in
+            rendition (str): Name of the rendition in the manifest (default: "")
+            write_interval (float): Minimum seconds between two writes of
+                the playlist file, see MediaPlaylist (default: 0)
+        """
+        self.hls_dir = hls_dir
+        self.segment_duration = segment_duration
+        self.low_latency = low_latency
+        self.segment_type = segment_type
+        self.part_pattern = media_pattern(segment_type, part=True)
+        self.segment_pattern = media_pattern(segment_type)
+        self.codecs = codecs
+        self.bandwidth = bandwidth
+        self.init_name = init_name
+        self.manifest = manifest
+        self.rendition = rendition
+
+        part_target = round(part_duration + FRAME_MARGIN, 3) if low_latency else None
+        self.playlist = MediaPlaylist(
+            os.path.join(hls_dir, PLAYLIST_NAME),
+            target_duration=max(1, round(segment_duration + (part_target or FRAME_MARGIN))),
+            low_latency=low_latency,
+            part_target=part_target,
+            map_uri=init_name if segment_type == "fmp4" else None,
+            write_interval=write_interval,
+        )
+        register(self.playlist)
+
+        # (uri, duration, data) of the parts of the open segment
+        self._parts = []
+        self._master_written = False
+        self._timing = None
+        # Callbacks of publish_to
+        self._publishers = []
+
+    def publish_to(self, callback):
+        """
+        Hand each media file and playlist version to ``callback(name, data)``
+        as it is published, in addition to the callbacks already registered.
+        A file is handed over before the playlist that lists it; failures
+        are logged and do not stop the packaging.
+
+        Args:
+            callback (callable): Called with the file name, relative to the
+                directory, and the file data (bytes)
+        """
+        self._publishers.append(callback)
+        self.playlist.on_change = lambda text: self._publish_file(PLAYLIST_NAME, text.encode())
+
+    def _publish_file(self, name, data):
+        for callback in self._publishers:
+            try:
+                callback(name, data)
+            except Exception as e:
+                logger.error(f"Error publishing {name} of {self.hls_dir}: {str(e)}")
+
+    def _read_timing(self):
+        if self._timing is None:
+            with open(os.path.join(self.hls_dir, self.init_name), "rb") as f:
+                data = f.read()
+            self._timing = fmp4.read_init(data)
+            self._publish_file(self.init_name, data)
+            if self.manifest is not None:
+                self.manifest.add_init(self.rendition, self.init_name, len(data))
+        return self._timing
+
+    def add(self, path, index):
+        """
+        Add a media file completed by the muxer and publish the playlist.
+
+        Args:
+            path (str): Path of the complete segment or part
+            index (int): Index of the file in the muxer's numbering
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if self.segment_type == "mpegts":
+            duration = ts.segment_duration(data)
+        else:
+            timescale, default_duration = self._read_timing()
+            duration = fmp4.fragment_duration(data, timescale, default_duration)
+        if self.codecs and not self._master_written:
+            self._write_master(len(data), duration)
+        self._publish_file(os.path.basename(path), data)
+
+        if not self.low_latency:
+            if self.manifest is not None:
+                self.manifest.add_segment(self.rendition, os.path.basename(path), duration, len(data))
+            self.playlist.add_segment(os.path.basename(path), duration)
+            return
+
+        if self.manifest is not None:
+            self.manifest.add_part(self.rendition, len(data))
+        self._parts.append((os.path.basename(path), duration, data))
+        closes_segment = sum(part[1] for part in self._parts) >= self.segment_duration
+        # A segment and its last part are published together
+        self.playlist.add_part(os.path.basename(path), duration,
+                               preload_hint=self.part_pattern % (index + 1), publish=not closes_segment)
+        if closes_segment:
+            self._close_segment()
+
+    def _write_master(self, size, duration):
+        bandwidth = self.bandwidth
+        if bandwidth is None:
+            # Rounded up to the next kbit/s for the variation of the next files
+            bandwidth = (int(size * 8 / duration) // 1000 + 1) * 1000 if duration else 0
+        text = write_master_playlist(self.hls_dir, [(PLAYLIST_NAME, bandwidth, self.codecs)])
+        self._publish_file(MASTER_PLAYLIST_NAME, text.encode())
+        self._master_written = True
+
+    def _close_segment(self, publish=True):
+        if not self._parts:
+            return
+        uri = self.segment_pattern % len(self.playlist.segments)
+        if self.segment_type == "mpegts":
+            # Transport stream parts continue each other
+            data = b"".join(part[2] for part in self._parts)
+        else:
+            # The parts' moof/mdat pairs form the segment; their styp and
+            # sidx boxes only describe the part itself
+            data = b"".join(
+                fmp4.strip_boxes(part[2], {b"sidx"} if i == 0 else {b"styp", b"sidx"})
+                for i, part in enumerate(self._parts)
+            )
+        duration = sum(part[1] for part in self._parts)
+        write_atomic(os.path.join(self.hls_dir, uri), data)
+        self._publish_file(uri, data)
+        if self.manifest is not None:
+            self.manifest.add_segment(self.rendition, uri, duration, len(data))
+        self.playlist.add_segment(uri, duration, publish=publish)
+        self._parts = []
+
+    def finish(self):
+        """Close the last segment and end the playlist."""
+        self._close_segment(publish=False)
+        self.playlist.end()
+        unregister(self.playlist)
+
+
+_live = {}
+_live_lock = threading.Lock()
+
+
+def register(playlist):
+    """Make a playlist available to the readers of this process."""
+    with _live_lock:
+        _live[os.path.realpath(playlist.path)] = playlist
+
+
+def unregister(playlist):
+    with _live_lock:
+        key = os.path.realpath(playlist.path)
+        if _live.get(key) is playlist:
+            del _live[key]
+
+
+def get_live(path):
+    """
+    Return the MediaPlaylist being produced in this process for the
+    playlist file ``path``, or None.
+    """
+    with _live_lock:
+        return _live.get(os.path.realpath(path))
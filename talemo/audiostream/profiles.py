@@ -0,0 +1,129 @@
+"""
+Encoding profiles of the HLS output.
+
+A profile names the encoder settings of a session: codec, bit rate, sample
+rate and channels. Stories are read by a single narrator, so the speech
+profiles encode mono audio at a fraction of the bit rate of the standard
+profile, which cuts the disk usage and the bandwidth of a story minute
+several-fold. Each profile declares the RFC 6381 codec string listed in
+the ``CODECS`` attribute of the session's master playlist.
+
+The standard profile is the 128 kbit/s AAC encoding of earlier versions.
+
+An adaptive-bitrate ladder (``HLS_ABR_LADDER``) encodes a session in
+several profiles at once, from one decode of the input: players on weak
+networks switch down to a lower rendition instead of stalling.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+
+# Share of the bit rate added for the container (fMP4 boxes) in BANDWIDTH
+CONTAINER_OVERHEAD = 0.1
+
+
+class EncodingProfile(namedtuple(
+        "EncodingProfile",
+        "name encoder bitrate sample_rate channels codecs frame_size priming_samples options")):
+    """
+    Encoder settings of the HLS output.
+
+    ``sample_rate`` and ``channels`` are None to keep those of the input.
+    ``priming_samples`` is the encoder delay at the start of the stream, at
+    the output sample rate, and ``options`` are private encoder options.
+    """
+
+    __slots__ = ()
+
+    @property
+    def bandwidth(self):
+        """Peak bit rate of the output, for the master playlist's BANDWIDTH."""
+        return int(self.bitrate * (1 + CONTAINER_OVERHEAD))
+
+    def encoder_delay(self, input_rate):
+        """Seconds of encoder delay listed in the playlist on top of the input."""
+        return self.priming_samples / (self.sample_rate or input_rate)
+
+    def ffmpeg_args(self, stream=None):
+        """
+        Return the ffmpeg output options of the profile.
+
+        Args:
+            stream (int, optional): Index of the output audio stream the
+                options apply to, for the renditions of a ladder
+                (default: all audio streams)
+        """
+        audio = "a" if stream is None else f"a:{stream}"
+        args = [f"-c:{audio}", self.encoder, f"-b:{audio}", str(self.bitrate)]
+        # The other options apply to every stream without a specifier
+        spec = "" if stream is None else f":{audio}"
+        if self.sample_rate:
+            args += [f"-ar{spec}", str(self.sample_rate)]
+        if self.channels:
+            args += [f"-ac{spec}", str(self.channels)]
+        for name, value in self.options.items():
+            args += [f"-{name}{spec}", value]
+        return args
+
+
+PROFILES = {profile.name: profile for profile in (
+    # AAC-LC at 128 kbit/s, in the sample rate and channels of the input
+    EncodingProfile("standard", "aac", 128000, None, None, "mp4a.40.2", 1024, 1024, {}),
+    # Mono AAC-LC at 24 kHz: playable everywhere, with ffmpeg's native encoder
+    EncodingProfile("speech", "aac", 32000, 24000, 1, "mp4a.40.2", 1024, 1024, {}),
+    # Mono HE-AAC (AAC-LC core at half the rate plus SBR), needs an
+    # ffmpeg built with libfdk_aac
+    EncodingProfile("speech-he", "libfdk_aac", 32000, 24000, 1, "mp4a.40.5", 2048, 2048,
+                    {"profile": "aac_he"}),
+    # Mono Opus in fMP4: the lowest bit rate for speech, played by recent
+    # browsers and iOS 17+; Opus always runs at 48 kHz
+    EncodingProfile("speech-opus", "libopus", 24000, 48000, 1, "Opus", 960, 312,
+                    {"application": "voip"}),
+)}
+
+
+def get_profile(name=None):
+    """
+    Return an encoding profile.
+
+    Args:
+        name (str, optional): Profile name (default: settings.HLS_ENCODING_PROFILE)
+
+    Returns:
+        EncodingProfile: The profile
+
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    name = name or getattr(settings, 'HLS_ENCODING_PROFILE', 'standard')
+    if name not in PROFILES:
+        raise ValueError(f"Unknown HLS encoding profile: {name}. Available: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def get_ladder(profile=None):
+    """
+    Return the encoding profiles of a session's renditions.
+
+    A session that names a profile gets a single rendition of it. Otherwise
+    it gets the renditions of ``settings.HLS_ABR_LADDER``, or a single
+    rendition of the default profile when no ladder is configured.
+
+    Args:
+        profile (str, optional): Profile name chosen by the session
+
+    Returns:
+        tuple: EncodingProfile of each rendition; players start with the first
+
+    Raises:
+        ValueError: If a profile is unknown or listed twice in the ladder
+    """
+    if profile:
+        return (get_profile(profile),)
+    names = getattr(settings, 'HLS_ABR_LADDER', '')
+    if isinstance(names, str):
+        names = names.split(",")
+    names = [name.strip() for name in names if name.strip()]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Profile listed twice in the HLS ABR ladder: {', '.join(names)}")
+    return tuple(get_profile(name) for name in names) or (get_profile(),)
@@ -0,0 +1,202 @@
+"""
+Garbage collection of the sessions' HLS output.
+
+Nothing else deletes a session directory, so sweep (run periodically by
+the sweep_hls_storage Celery beat task) evicts finished sessions from
+local disk in three passes:
+1. age: sessions unused for ``HLS_GC_MAX_AGE`` seconds, failed sessions
+   and sessions that never finished after ``HLS_GC_ERROR_MAX_AGE``
+2. quota: the least recently used sessions of each tenant over
+   ``HLS_GC_TENANT_QUOTA`` bytes
+3. watermarks: the least recently used sessions, while the disk of the
+   HLS root is used above ``HLS_GC_HIGH_WATERMARK`` and until it is back
+   under ``HLS_GC_LOW_WATERMARK``
+
+A session is last used when a live endpoint last served it or its task
+status was last requested (see views.py), or else when it finished.
+Sessions being generated are never evicted. The application does not see
+requests for the static HLS files. A session played from HLS_URL (without
+low-latency mode or object storage) is therefore only seen through its
+player's status requests, and its replays do not count as uses.
+With object storage a session is moved there (SegmentStore.archive) and
+stays playable, otherwise its output is deleted; its AudioSession status
+becomes "archived" or "expired". The bytes reclaimed are counted by pass,
+per sweep and for the process (stats).
+"""
+import logging
+import os
+import shutil
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .manifest import read_manifest
+from .models import AudioSession
+from .storage import get_store
+
+logger = logging.getLogger(__name__)
+
+# Statuses of the sessions whose output left the local disk
+EVICTED_STATUSES = ("archived", "expired")
+# Statuses of the sessions whose output can still be on local disk
+LOCAL_STATUSES = ("running", "ready", "error")
+# Eviction passes, in order
+REASONS = ("age", "quota", "watermark")
+
+_counters = {f"{kind}_{reason}": 0 for kind in ("sessions", "bytes") for reason in REASONS}
+_counters_lock = threading.Lock()
+
+
+def directory_size(path):
+    """Return the bytes of the files under a directory."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+class Sweep:
+    """One run of the sweeper over the sessions with local output."""
+
+    def __init__(self, store=None, now=None):
+        self.store = store or get_store()
+        self.now = now or timezone.now()
+        self.report = {
+            "sessions": dict.fromkeys(REASONS, 0),
+            "bytes": dict.fromkeys(REASONS, 0),
+        }
+        self._sizes = {}
+        # Bytes on local disk by tenant, counted when a quota is set
+        self.tenant_usage = {}
+
+    def size(self, session):
+        if session.session_id not in self._sizes:
+            # The media bytes listed in the session's manifest, without
+            # walking its directory; older sessions have no manifest
+            path = self.store.session_path(session.session_id)
+            manifest = read_manifest(path)
+            self._sizes[session.session_id] = manifest["size"] if manifest is not None else directory_size(path)
+        return self._sizes[session.session_id]
+
+    def evict(self, session, reason):
+        """
+        Move a session to object storage, or delete its output.
+
+        Returns:
+            int: Bytes reclaimed on local disk
+        """
+        path = self.store.session_path(session.session_id)
+        try:
+            if self.store.remote is not None:
+                size = self.store.archive(session.session_id)["size"]
+                status = "archived"
+            else:
+                size = self.size(session)
+                self.store.cleanup(path)
+                status = "expired"
+        except Exception as e:
+            logger.error(f"Error evicting session {session.session_id}: {str(e)}")
+            return 0
+        AudioSession.objects.filter(session_id=session.session_id).update(status=status)
+        self._sizes[session.session_id] = 0
+        if session.tenant in self.tenant_usage:
+            self.tenant_usage[session.tenant] -= size
+        self.report["sessions"][reason] += 1
+        self.report["bytes"][reason] += size
+        with _counters_lock:
+            _counters[f"sessions_{reason}"] += 1
+            _counters[f"bytes_{reason}"] += size
+        logger.info(f"Evicted session {session.session_id} ({reason}): {status}, {size} bytes reclaimed")
+        return size
+
+    def run(self):
+        """
+        Run the three passes.
+
+        Returns:
+            dict: Sessions evicted and bytes reclaimed by pass, their totals
+            and the used fraction of the disk afterwards
+        """
+        error_max_age = timedelta(seconds=getattr(settings, 'HLS_GC_ERROR_MAX_AGE', 24 * 3600))
+        quota = getattr(settings, 'HLS_GC_TENANT_QUOTA', 0)
+        sessions = (
+            AudioSession.objects.filter(status__in=LOCAL_STATUSES)
+            .annotate(last_used=Coalesce(F("last_accessed_at"), F("finished_at"), F("created_at")))
+            .order_by("last_used")
+        )
+        evictable = []
+        for session in sessions.iterator():
+            if not os.path.isdir(self.store.session_path(session.session_id)):
+                continue
+            if quota:
+                # Sessions being generated count against the quota too
+                self.tenant_usage[session.tenant] = self.tenant_usage.get(session.tenant, 0) + self.size(session)
+            # Sessions being generated, unless they never finished
+            if session.finished_at is not None or session.created_at < self.now - error_max_age:
+                evictable.append(session)
+
+        evictable = self.sweep_age(evictable, error_max_age)
+        evictable = self.sweep_quota(evictable, quota)
+        usage = self.sweep_watermarks(evictable)
+
+        self.report["sessions_evicted"] = sum(self.report["sessions"].values())
+        self.report["bytes_reclaimed"] = sum(self.report["bytes"].values())
+        self.report["disk_usage"] = usage
+        logger.info(f"HLS storage sweep: {self.report['sessions_evicted']} sessions evicted, "
+                    f"{self.report['bytes_reclaimed']} bytes reclaimed, disk {usage:.0%} used")
+        return self.report
+
+    def sweep_age(self, evictable, error_max_age):
+        max_age = timedelta(seconds=getattr(settings, 'HLS_GC_MAX_AGE', 7 * 24 * 3600))
+        kept = []
+        for session in evictable:
+            failed = session.status == "error" or session.finished_at is None
+            if session.last_used < self.now - (error_max_age if failed else max_age):
+                self.evict(session, "age")
+            else:
+                kept.append(session)
+        return kept
+
+    def sweep_quota(self, evictable, quota):
+        if not quota:
+            return evictable
+        kept = []
+        for session in evictable:
+            if self.tenant_usage[session.tenant] > quota:
+                self.evict(session, "quota")
+            else:
+                kept.append(session)
+        return kept
+
+    def sweep_watermarks(self, evictable):
+        high = getattr(settings, 'HLS_GC_HIGH_WATERMARK', 0.9)
+        low = getattr(settings, 'HLS_GC_LOW_WATERMARK', 0.8)
+        disk = shutil.disk_usage(self.store.base_dir)
+        used = disk.used
+        if used > high * disk.total:
+            for session in evictable:
+                if used <= low * disk.total:
+                    break
+                used -= self.evict(session, "watermark")
+        return used / disk.total if disk.total else 0.0
+
+
+def sweep(store=None, now=None):
+    """Evict the sessions due for eviction (see Sweep.run)."""
+    return Sweep(store, now).run()
+
+
+def stats():
+    """Return the sessions evicted and bytes reclaimed by pass since the process started."""
+    with _counters_lock:
+        stats = dict(_counters)
+    stats["bytes_reclaimed"] = sum(stats[f"bytes_{reason}"] for reason in REASONS)
+    return stats
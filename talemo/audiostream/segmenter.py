@@ -0,0 +1,194 @@
+"""
+Incremental sentence segmenter for LLM token streams.
+
+The segmenter receives the raw token deltas of an LLM stream and emits
+speakable text chunks as soon as a chunk boundary is known:
+
+1. Sentence boundaries: ``.``, ``!``, ``?`` or ``…``, optionally followed by
+   closing quotes or brackets, and confirmed by the whitespace that follows
+   (so ``3.5`` and a token split like ``"end" + "."`` are handled).
+2. Clause boundaries (``,``, ``;``, ``:``, dashes), used when a chunk has to
+   be cut before the sentence ends.
+3. Word boundaries, as a last resort when a chunk reaches its size limit
+   without any punctuation.
+
+The first chunk is kept short (``first_chunk_words``) to minimize the time
+to first audio. Every character is scanned once when it arrives, and only
+the text after a cut is scanned again, so the cost per token is O(1)
+amortized. This module has no Django dependency so that standalone scripts
+can use it.
+"""
+
+SENTENCE_END = frozenset(".!?…")
+CLAUSE_END = frozenset(",;:—–")
+CLOSERS = frozenset("\"'”’»)]")
+
+# Abbreviations whose trailing period does not end a sentence (lower case)
+ABBREVIATIONS = frozenset({"mr", "mrs", "ms", "dr", "st", "jr", "sr", "prof", "mme", "mlle", "m"})
+
+
+class SentenceSegmenter:
+    """
+    Cut a stream of text deltas into chunks on sentence or clause boundaries.
+
+    Usage::
+
+        segmenter = SentenceSegmenter()
+        async for token in llm.stream_tokens(prompt):
+            for chunk in segmenter.feed(token):
+                speak(chunk)
+        rest = segmenter.flush()
+        if rest:
+            speak(rest)
+    """
+
+    def __init__(self, first_chunk_words=10, max_words=40, min_words=1):
+        """
+        Initialize the segmenter.
+
+        Args:
+            first_chunk_words (int): Word limit of the first chunk (default: 10)
+            max_words (int): Word limit of the following chunks (default: 40)
+            min_words (int): Minimum words before a sentence end emits a chunk;
+                shorter sentences are merged with the next one (default: 1)
+        """
+        self.first_chunk_words = max(1, first_chunk_words)
+        self.max_words = max(1, max_words)
+        self.min_words = max(1, min_words)
+        self.chunk_count = 0
+
+        self._chars = []
+        self._reset_scan()
+
+    def _reset_scan(self):
+        self._words = 0            # words in the buffer
+        self._in_word = False
+        self._word_start = 0       # buffer index where the current word starts
+        self._pending = None       # (kind, end) of punctuation awaiting whitespace
+        self._clause_end = None    # last confirmed clause boundary (end index, words)
+
+    @property
+    def word_limit(self):
+        """The word limit of the chunk currently being collected."""
+        return self.first_chunk_words if self.chunk_count == 0 else self.max_words
+
+    def feed(self, delta):
+        """
+        Add a token delta and return the chunks it completes.
+
+        Args:
+            delta (str): Text as produced by the LLM, including its whitespace
+
+        Returns:
+            list of str: Zero or more complete chunks
+        """
+        chunks = []
+        for char in delta:
+            chunk = self._scan(char)
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """
+        Return whatever text is left at the end of the stream.
+
+        Returns:
+            str or None: The last chunk, or None if nothing speakable is left
+        """
+        text = "".join(self._chars).strip()
+        self._chars = []
+        self._reset_scan()
+        if not text:
+            return None
+        self.chunk_count += 1
+        return text
+
+    def _scan(self, char):
+        """Process one character; return a chunk if it completes one."""
+        index = len(self._chars)
+        self._chars.append(char)
+
+        if char.isspace():
+            return self._on_whitespace(index)
+
+        if char in SENTENCE_END:
+            self._pending = ("sentence", index + 1)
+        elif char in CLAUSE_END:
+            self._pending = ("clause", index + 1)
+        elif char in CLOSERS and self._pending and self._pending[1] == index:
+            # Closing quote/bracket right after punctuation belongs to the boundary
+            self._pending = (self._pending[0], index + 1)
+        else:
+            self._pending = None
+
+        if not self._in_word:
+            self._in_word = True
+            self._word_start = index
+            self._words += 1
+        return None
+
+    def _on_whitespace(self, index):
+        self._in_word = False
+        pending, self._pending = self._pending, None
+
+        if pending is not None:
+            kind, end = pending
+            if kind == "sentence" and not self._is_abbreviation(end):
+                if self._words >= min(self.min_words, self.word_limit):
+                    return self._cut(end)
+            # A sentence end that is too short to emit still makes a good cut point
+            self._clause_end = (end, self._words)
+            if self.chunk_count == 0 and self._words >= max(1, self.first_chunk_words // 2):
+                # Early clause boundary: good enough for the first chunk
+                return self._cut(end)
+
+        if self._words >= self.word_limit:
+            # Size limit reached: prefer the last clause boundary, else cut here
+            if self._clause_end is not None and self._clause_end[1] >= self.word_limit // 2:
+                return self._cut(self._clause_end[0])
+            return self._cut(index)
+        return None
+
+    def _is_abbreviation(self, end):
+        # The word ending at the period, without the period and any closers
+        word = "".join(self._chars[self._word_start:end]).rstrip("".join(CLOSERS)).rstrip(".")
+        return "." not in word and word.lower() in ABBREVIATIONS
+
+    def _cut(self, end):
+        """Emit the buffer up to ``end`` and rescan the remainder."""
+        text = "".join(self._chars[:end]).strip()
+        remainder = self._chars[end:]
+
+        self._chars = []
+        self._reset_scan()
+        if text:
+            self.chunk_count += 1
+
+        # Only the (short) text after the cut is scanned again
+        for char in remainder:
+            self._chars.append(char)
+            self._rescan_char(len(self._chars) - 1, char)
+
+        return text or None
+
+    def _rescan_char(self, index, char):
+        """Rebuild scan state for carried-over text without emitting chunks."""
+        if char.isspace():
+            self._in_word = False
+            if self._pending is not None:
+                self._clause_end = (self._pending[1], self._words)
+                self._pending = None
+            return
+
+        if char in SENTENCE_END or char in CLAUSE_END:
+            self._pending = ("clause", index + 1)
+        elif char in CLOSERS and self._pending and self._pending[1] == index:
+            self._pending = ("clause", index + 1)
+        else:
+            self._pending = None
+
+        if not self._in_word:
+            self._in_word = True
+            self._word_start = index
+            self._words += 1
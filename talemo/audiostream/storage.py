@@ -1,12 +1,392 @@
 import os, uuid, shutil
 from django.conf import settings
 import tempfile
+import hashlib
 import logging
 import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlparse
+
+from .playlist import MUXER_PLAYLIST_NAME, write_atomic
 
 logger = logging.getLogger(__name__)
 
+
+def session_key(session_id):
+    """
+    Return the path of a session's files relative to the HLS root (and the
+    HLS_URL), sharded by a hash of the session ID: ``ab/cd/<session_id>``.
+    No directory of the root then holds more than 256 entries, however many
+    sessions it has.
+    """
+    digest = hashlib.sha1(session_id.encode()).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{session_id}"
+
+
+def session_dir(root, session_id):
+    """
+    Return the directory of a session under an HLS root: its sharded
+    directory (see session_key), or ``<root>/<session_id>`` for a session
+    created before the layout was sharded.
+    """
+    path = os.path.join(root, *session_key(session_id).split("/"))
+    if not os.path.isdir(path):
+        flat_path = os.path.join(root, session_id)
+        if os.path.isdir(flat_path):
+            return flat_path
+    return path
+
+
+def master_url(session_id):
+    """
+    Return the URL players load a session from, its master playlist: from
+    the static HLS files, or from the live endpoints in low-latency mode
+    and with object storage, whose sessions leave the local disk (the live
+    endpoints then read them from the bucket). The master playlist lists
+    the session's renditions, whose media playlists are relative to it.
+    """
+    if getattr(settings, 'HLS_LOW_LATENCY', False) or getattr(settings, 'HLS_OBJECT_STORAGE', False):
+        from django.urls import reverse
+        return reverse("live-master", args=[session_id])
+    return f"{settings.HLS_URL}{session_key(session_id)}/master.m3u8"
+
+
+class StorageBackend:
+    """
+    Files of the sessions, by session ID and name. Names are relative to the
+    session directory, e.g. "audio.m3u8" or "speech/segment_001.m4s".
+    """
+
+    def put(self, session_id, name, data):
+        """Store a file (bytes), replacing any previous version."""
+        raise NotImplementedError
+
+    def get(self, session_id, name):
+        """Return the data of a file, or None if it is not stored."""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Delete the files of a session."""
+        raise NotImplementedError
+
+
+class FileSystemBackend(StorageBackend):
+    """Session directories under a root directory (see session_dir), served as static files."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, session_id, name=""):
+        return os.path.join(session_dir(self.root, session_id), name)
+
+    def put(self, session_id, name, data):
+        path = self.path(session_id, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data)
+
+    def get(self, session_id, name):
+        try:
+            with open(self.path(session_id, name), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def delete(self, session_id):
+        shutil.rmtree(self.path(session_id), ignore_errors=True)
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Files kept in the memory of this process for ``ttl`` seconds. Only the
+    web requests handled by the process running the session see them.
+    """
+
+    def __init__(self, ttl=3600.0):
+        self.ttl = ttl
+        # (session_id, name) -> (expiry, data)
+        self._files = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def put(self, session_id, name, data):
+        now = time.monotonic()
+        with self._lock:
+            self._files[(session_id, name)] = (now + self.ttl, bytes(data))
+            # Expired files are dropped from time to time, not on every write
+            if now >= self._next_purge:
+                self._files = {key: entry for key, entry in self._files.items() if entry[0] > now}
+                self._next_purge = now + self.ttl / 10
+
+    def get(self, session_id, name):
+        with self._lock:
+            entry = self._files.get((session_id, name))
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def delete(self, session_id):
+        with self._lock:
+            for key in [key for key in self._files if key[0] == session_id]:
+                del self._files[key]
+
+
+class RedisBackend(StorageBackend):
+    """
+    Files kept in Redis with a TTL, shared by the worker and web processes.
+    Each file is a key ``hls:<session_id>:<name>``.
+    """
+
+    KEY_PREFIX = "hls"
+
+    def __init__(self, url, ttl=3600.0, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, session_id, name):
+        return f"{self.KEY_PREFIX}:{session_id}:{name}"
+
+    def put(self, session_id, name, data):
+        self.client.set(self._key(session_id, name), data, ex=max(1, int(self.ttl)))
+
+    def get(self, session_id, name):
+        return self.client.get(self._key(session_id, name))
+
+    def delete(self, session_id):
+        keys = list(self.client.scan_iter(match=self._key(session_id, "*")))
+        if keys:
+            self.client.delete(*keys)
+
+
+# Content type and Cache-Control of the uploaded files, by extension
+OBJECT_HEADERS = {
+    ".m3u8": ("application/vnd.apple.mpegurl", "no-cache"),
+    ".m4s": ("audio/mp4", "public, max-age=31536000, immutable"),
+    ".mp4": ("audio/mp4", "public, max-age=31536000, immutable"),
+    ".ts": ("video/mp2t", "public, max-age=31536000, immutable"),
+    ".json": ("application/json", "no-cache"),
+}
+
+
+class ObjectStorageBackend(StorageBackend):
+    """
+    Files kept in an S3-compatible bucket (e.g. MinIO), as objects
+    ``<prefix>/<session_key>/<name>``, the layout of the HLS root (see
+    session_key).
+
+    put only queues the upload: a pool of ``workers`` threads uploads the
+    files over the client's pooled connections, so the packager never waits
+    for the network. Versions of the same file are uploaded in order, and
+    a version still queued is replaced by a newer one, so a fast-changing
+    playlist is uploaded at most once per upload time. flush waits for a
+    session's uploads.
+    """
+
+    def __init__(self, endpoint_url, bucket, access_key="", secret_key="", prefix="hls", workers=4,
+                 client=None):
+        if client is None:
+            import minio
+            import urllib3
+            url = urlparse(endpoint_url)
+            client = minio.Minio(
+                url.netloc, access_key=access_key, secret_key=secret_key, secure=url.scheme == "https",
+                http_client=urllib3.PoolManager(
+                    maxsize=workers,
+                    timeout=urllib3.Timeout(connect=5.0, read=30.0),
+                    retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+                ),
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="HLS-upload")
+        # Key -> data of the latest version not uploaded yet
+        self._pending = {}
+        # Keys with an upload queued or running
+        self._active = set()
+        # Keys whose last upload failed
+        self._failed = set()
+        self._cond = threading.Condition()
+
+    def _key(self, session_id, name=""):
+        key = f"{session_key(session_id)}/{name}"
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, session_id, name, data):
+        key = self._key(session_id, name)
+        with self._cond:
+            self._pending[key] = bytes(data)
+            if key in self._active:
+                # The running upload of this key picks the new version up
+                return
+            self._active.add(key)
+        self._executor.submit(self._upload, key)
+
+    def _upload(self, key):
+        while True:
+            with self._cond:
+                data = self._pending.pop(key, None)
+                if data is None:
+                    self._active.discard(key)
+                    self._cond.notify_all()
+                    return
+            content_type, cache_control = OBJECT_HEADERS.get(os.path.splitext(key)[1],
+                                                             ("application/octet-stream", "no-cache"))
+            try:
+                self.client.put_object(self.bucket, key, BytesIO(data), len(data), content_type=content_type,
+                                       metadata={"Cache-Control": cache_control})
+                with self._cond:
+                    self._failed.discard(key)
+            except Exception as e:
+                logger.error(f"Error uploading {key} to {self.bucket}: {str(e)}")
+                with self._cond:
+                    self._failed.add(key)
+
+    def flush(self, session_id, timeout=None):
+        """
+        Wait for the queued uploads of a session.
+
+        Returns:
+            bool: True if every file of the session was uploaded
+        """
+        prefix = self._key(session_id)
+        with self._cond:
+            done = self._cond.wait_for(
+                lambda: not any(key.startswith(prefix) for key in self._active), timeout=timeout)
+            return done and not any(key.startswith(prefix) for key in self._failed)
+
+    def get(self, session_id, name):
+        try:
+            response = self.client.get_object(self.bucket, self._key(session_id, name))
+        except Exception as e:
+            if getattr(e, "code", None) == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def list(self, session_id):
+        """Return the names of a session's files in the bucket."""
+        prefix = self._key(session_id)
+        return [obj.object_name[len(prefix):]
+                for obj in self.client.list_objects(self.bucket, prefix=prefix, recursive=True)]
+
+    def remove(self, session_id, names):
+        """Delete some of a session's files from the bucket."""
+        keys = [self._key(session_id, name) for name in names]
+        list(self._executor.map(lambda key: self.client.remove_object(self.bucket, key), keys))
+        with self._cond:
+            self._failed.difference_update(keys)
+
+    def delete(self, session_id):
+        self.remove(session_id, self.list(session_id))
+
+
+_object_backend = None
+_object_backend_lock = threading.Lock()
+
+
+def get_object_backend():
+    """
+    Return the object storage of the HLS output (settings.HLS_OBJECT_STORAGE,
+    in the bucket of AWS_STORAGE_BUCKET_NAME at AWS_S3_ENDPOINT_URL).
+
+    Returns:
+        ObjectStorageBackend: Backend shared by the process, or None if the
+        output stays on local disk
+    """
+    global _object_backend
+    if not getattr(settings, 'HLS_OBJECT_STORAGE', False):
+        return None
+    with _object_backend_lock:
+        if _object_backend is None:
+            _object_backend = ObjectStorageBackend(
+                settings.AWS_S3_ENDPOINT_URL,
+                settings.AWS_STORAGE_BUCKET_NAME,
+                access_key=settings.AWS_ACCESS_KEY_ID,
+                secret_key=settings.AWS_SECRET_ACCESS_KEY,
+                prefix=getattr(settings, 'HLS_OBJECT_STORAGE_PREFIX', 'hls'),
+                workers=getattr(settings, 'HLS_OBJECT_STORAGE_UPLOAD_WORKERS', 4),
+            )
+        return _object_backend
+
+
+# Live backends of this process by name, shared by all SegmentStores
+_live_backends = {}
+_live_backends_lock = threading.Lock()
+
+
+def get_live_backend(name=None):
+    """
+    Return the RAM tier of the live sessions (settings.HLS_LIVE_BACKEND).
+
+    Args:
+        name (str, optional): "memory", "redis" or "" (default: the setting)
+
+    Returns:
+        StorageBackend: Backend shared by the process, or None without a tier
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if name is None:
+        name = getattr(settings, 'HLS_LIVE_BACKEND', '')
+    if not name:
+        return None
+    if name not in ("memory", "redis"):
+        raise ValueError(f"Unknown HLS live backend: {name}. Available: memory, redis")
+    with _live_backends_lock:
+        if name not in _live_backends:
+            ttl = getattr(settings, 'HLS_LIVE_TTL', 3600.0)
+            if name == "memory":
+                _live_backends[name] = MemoryBackend(ttl)
+            else:
+                url = getattr(settings, 'HLS_LIVE_REDIS_URL', None) or settings.CELERY_BROKER_URL
+                _live_backends[name] = RedisBackend(url, ttl)
+        return _live_backends[name]
+
+
+def hls_root():
+    """
+    Return the HLS root a SegmentStore of this host uses, without creating
+    a store or any directory: the first existing, writable directory of
+    HLS_ROOT, media/hls and the Docker container path, in the order the
+    store tries them. A store that falls back to a temporary directory
+    links the expected directory to it, so that link is returned.
+
+    Returns:
+        str: The directory, or None if no store has created one yet
+    """
+    candidates = [os.path.join(settings.MEDIA_ROOT, 'hls'), "/app/media/hls"]
+    if hasattr(settings, 'HLS_ROOT') and os.path.isabs(settings.HLS_ROOT):
+        candidates.insert(0, settings.HLS_ROOT)
+    for path in candidates:
+        if os.path.isdir(path) and os.access(path, os.W_OK):
+            return path
+    return None
+
+
 class SegmentStore:
+    """
+    Storage of the sessions' HLS files.
+
+    The files are written to a session directory under ``base_dir``
+    (``self.backend``), sharded by session_key, with the manifest of the
+    session's output (manifest.py). With a live tier (``self.live``, see
+    get_live_backend), the writer also stores the live playlists and media
+    files in RAM, where the live endpoints read them first. With object
+    storage (``self.remote``, see get_object_backend), it uploads them as
+    they are produced, and finished sessions are moved there (archive).
+    """
+
     def __init__(self):
         # Store the expected directory for HLS files
         self.expected_dir = None
@@ -85,80 +465,145 @@ class SegmentStore:
 
         self.base_url = settings.HLS_URL
         print(f"Using HLS directory: {self.base_dir}")
+        self.backend = FileSystemBackend(self.base_dir)
+        self.live = get_live_backend()
+        self.remote = get_object_backend()
+        # Copies of the sessions that could not be linked to expected_dir
+        self._replicas = {}
 
     def create(self, session_id=None):
         sid   = session_id or uuid.uuid4().hex
-        path  = os.path.join(self.base_dir, sid)
+        path  = session_dir(self.base_dir, sid)
         os.makedirs(path, exist_ok=True)
 
         # If we're using a temporary directory and couldn't create a symbolic link,
         # we need to make sure the files are accessible via the expected URL
         if self.expected_dir and self.base_dir != self.expected_dir and not os.path.islink(self.expected_dir):
             # Try to create a directory-specific symbolic link
-            expected_session_dir = os.path.join(self.expected_dir, sid)
+            expected_session_dir = session_dir(self.expected_dir, sid)
             try:
-                # Create the parent directory if it doesn't exist
-                if not os.path.exists(self.expected_dir):
-                    os.makedirs(self.expected_dir, exist_ok=True)
+                # Create the parent (shard) directory if it doesn't exist
+                os.makedirs(os.path.dirname(expected_session_dir), exist_ok=True)
 
                 # Create a symbolic link for this specific session on Unix-like systems
+                linked = False
                 if platform.system() != 'Windows' and not os.path.exists(expected_session_dir):
-                    os.symlink(path, expected_session_dir)
-                    logger.info(f"Created session-specific symbolic link from {expected_session_dir} to {path}")
-                # On Windows or if symlinks fail, set up a file copy mechanism
-                elif not os.path.exists(expected_session_dir):
+                    try:
+                        os.symlink(path, expected_session_dir)
+                        linked = True
+                        logger.info(f"Created session-specific symbolic link from {expected_session_dir} to {path}")
+                    except OSError as e:
+                        logger.warning(f"Error creating session-specific symbolic link: {str(e)}")
+                # On Windows or if symlinks fail, the writer also publishes the
+                # files there as it produces them (see attach)
+                if not linked and not os.path.islink(expected_session_dir):
                     os.makedirs(expected_session_dir, exist_ok=True)
-                    logger.info(f"Created session-specific directory: {expected_session_dir}")
-
-                    # Set up a file watcher to copy files as they're created
-                    import threading
-                    def file_watcher():
-                        import time
-                        logger.info(f"Starting file watcher for {path} -> {expected_session_dir}")
-                        error_count = 0
-                        max_errors = 10  # Allow up to 10 errors before giving up
-
-                        while error_count < max_errors:
-                            try:
-                                # Copy any new files from the source to the destination
-                                for filename in os.listdir(path):
-                                    src_file = os.path.join(path, filename)
-                                    dst_file = os.path.join(expected_session_dir, filename)
-                                    if os.path.isfile(src_file) and (not os.path.exists(dst_file) or 
-                                                                    os.path.getmtime(src_file) > os.path.getmtime(dst_file)):
-                                        shutil.copy2(src_file, dst_file)
-                                        logger.info(f"Copied {src_file} to {dst_file}")
-
-                                # Check if the playlist file exists and has been copied
-                                playlist_file = os.path.join(path, "audio.m3u8")
-                                if os.path.exists(playlist_file):
-                                    dst_playlist = os.path.join(expected_session_dir, "audio.m3u8")
-                                    if os.path.exists(dst_playlist):
-                                        # If the playlist file exists and has been copied, we can reduce the check frequency
-                                        time.sleep(2.0)  # Check less frequently once the playlist is available
-                                    else:
-                                        # If the playlist file exists but hasn't been copied, copy it immediately
-                                        shutil.copy2(playlist_file, dst_playlist)
-                                        logger.info(f"Copied playlist file to {dst_playlist}")
-                                else:
-                                    # If the playlist file doesn't exist yet, check more frequently
-                                    time.sleep(0.5)
-
-                                # Reset error count on successful iteration
-                                error_count = 0
-                            except Exception as e:
-                                error_count += 1
-                                logger.error(f"Error in file watcher ({error_count}/{max_errors}): {str(e)}")
-                                time.sleep(1.0)  # Wait a bit longer after an error
-
-                        logger.warning(f"File watcher for {path} -> {expected_session_dir} stopped after {max_errors} errors")
-
-                    # Start the file watcher in a background thread
-                    watcher_thread = threading.Thread(target=file_watcher, daemon=True)
-                    watcher_thread.start()
+                    self._replicas[sid] = FileSystemBackend(self.expected_dir)
+                    logger.info(f"Replicating session {sid} to {expected_session_dir}")
             except Exception as e:
                 logger.warning(f"Error creating session-specific directory or symlink: {str(e)}")
 
-        return sid, path, f"{self.base_url}{sid}/audio.m3u8"
+        return sid, path, master_url(sid)
+
+    def attach(self, writer, session_id):
+        """
+        Have a session's writer publish its files to the store's other
+        backends as it produces them: the RAM tier, object storage, and the
+        copy in the expected HLS directory when it could not be linked. The
+        publication ends with the writer, without a thread per session.
+
+        Args:
+            writer: HLS writer of the session (see hls.SegmentEvents.publish_to)
+            session_id (str): The session ID
+        """
+        for backend in (self.live, self.remote, self._replicas.pop(session_id, None)):
+            if backend is not None:
+                writer.publish_to(backend, session_id)
+
+    def session_path(self, session_id):
+        """Return the directory of an existing session's files."""
+        return session_dir(self.base_dir, session_id)
+
+    def _delete_expected_copy(self, session_id):
+        # The link or copy of the session in the expected HLS directory
+        if not self.expected_dir or self.base_dir == self.expected_dir or os.path.islink(self.expected_dir):
+            return
+        expected_session_dir = session_dir(self.expected_dir, session_id)
+        if os.path.islink(expected_session_dir):
+            os.unlink(expected_session_dir)
+        else:
+            shutil.rmtree(expected_session_dir, ignore_errors=True)
+
+    def cleanup(self, path):
+        shutil.rmtree(path, ignore_errors=True)
+        session_id = os.path.basename(os.path.normpath(path))
+        self._delete_expected_copy(session_id)
+        for backend in (self.live, self.remote):
+            if backend is not None:
+                backend.delete(session_id)
+
+    def archive(self, session_id, timeout=300.0):
+        """
+        Move a finished session to object storage: upload its files, delete
+        the objects of files it no longer has (e.g. the segments replaced by
+        compaction), then delete the local directory and the RAM tier copy.
+
+        Args:
+            session_id (str): The session ID
+            timeout (float): Maximum seconds to wait for the uploads
+
+        A session without local files (e.g. archived already, by a retried
+        task or the sweeper) is left as it is in the bucket.
+
+        Returns:
+            dict: Files uploaded and deleted from the bucket, and bytes
+            freed on local disk
+
+        Raises:
+            RuntimeError: If the uploads failed; the local files are kept
+        """
+        path = self.session_path(session_id)
+        if not os.path.isdir(path):
+            logger.info(f"Not archiving session {session_id}: it has no local files")
+            return {"uploaded": 0, "deleted": 0, "size": 0}
+        names = []
+        size = 0
+        for root, _, files in os.walk(path):
+            for filename in files:
+                # Temporary files and the muxer's own playlist are not served
+                if filename.endswith(".tmp") or filename.startswith(MUXER_PLAYLIST_NAME):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename), path).replace(os.sep, "/")
+                data = self.backend.get(session_id, name)
+                if data is None:
+                    continue
+                self.remote.put(session_id, name, data)
+                names.append(name)
+                size += len(data)
+        if not self.remote.flush(session_id, timeout=timeout):
+            raise RuntimeError(f"Uploading session {session_id} to object storage failed")
+        if not names:
+            # Nothing to replace the bucket's copy with
+            logger.warning(f"Not archiving session {session_id}: none of its local files can be served")
+            return {"uploaded": 0, "deleted": 0, "size": 0}
+
+        stale = set(self.remote.list(session_id)) - set(names)
+        self.remote.remove(session_id, stale)
+        self.backend.delete(session_id)
+        self._delete_expected_copy(session_id)
+        if self.live is not None:
+            self.live.delete(session_id)
+        logger.info(f"Moved session {session_id} to object storage: {len(names)} files uploaded, "
+                    f"{len(stale)} deleted, {size} bytes freed")
+        return {"uploaded": len(names), "deleted": len(stale), "size": size}
+
+
+_store = None
+
 
-    def cleanup(self, path): shutil.rmtree(path, ignore_errors=True)
+def get_store():
+    """Return the SegmentStore of the current process, created on first use."""
+    global _store
+    if _store is None:
+        _store = SegmentStore()
+    return _store
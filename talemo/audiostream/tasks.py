@@ -1,7 +1,11 @@
 from celery import shared_task
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.utils import timezone
 from .models import AudioSession
-from .storage import SegmentStore
+from .storage import SegmentStore, get_store
 from .pipeline import run_audio_session
+from .hls import create_writer
 import os
 import logging
 import traceback
@@ -17,19 +21,34 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
+
+@worker_process_init.connect
+def warm_encoder_pool(**kwargs):
+    """Start filling the ffmpeg encoder pool as soon as a worker process starts."""
+    from .encoder_pool import get_encoder_pool
+    get_encoder_pool()
+
+
 @shared_task(bind=True)
 def generate_audio_stream(self, prompt, lang="en", session_id=None,
                           min_segments_before_return=1,
-                          timeout_before_return=5.0):
+                          timeout_before_return=5.0, audio_codec=None, profile=None, tenant=""):
     """
     Generate an audio stream from the given prompt.
 
+    The task returns as soon as the writer reports the first
+    ``min_segments_before_return`` segments complete and listed in the
+    playlist, while the rendering continues in a background thread.
+
     Args:
         prompt (str): The text prompt to generate audio from
         lang (str): The language code (default: "en")
         session_id (str, optional): A custom session ID
         min_segments_before_return (int): Minimum number of segments to wait for before returning (default: 1)
         timeout_before_return (float): Maximum time to wait for segments in seconds (default: 5.0)
+        audio_codec (str, optional): "aac" or "copy" (default: settings.HLS_AUDIO_CODEC)
+        profile (str, optional): Encoding profile (default: settings.HLS_ENCODING_PROFILE)
+        tenant (str): Site the session is started from, for the storage quota
 
     Returns:
         dict: A dictionary containing the playlist URL
@@ -51,25 +70,17 @@ def generate_audio_stream(self, prompt, lang="en", session_id=None,
 
     AudioSession.objects.update_or_create(
         session_id=sid,
-        defaults={"status":"running","playlist_rel_url":playlist_url},
+        defaults={"status":"running","playlist_rel_url":playlist_url,"tenant":tenant},
     )
 
-    # FFmpeg will create the playlist with the temp_file flag
+    # The writer creates the playlist along with the first segment
     playlist_path = os.path.join(path, "audio.m3u8")
-    from .hls import StreamingHLSWriter
-    writer = StreamingHLSWriter(path)
-
-    # Verify that the playlist file is created by FFmpeg
-    # It might take a moment for FFmpeg to create the file
-    import time
-    start_time = time.time()
-    while not os.path.exists(playlist_path) and time.time() - start_time < 1.0:
-        time.sleep(0.1)  # Short sleep to allow FFmpeg to create the file
-
-    if os.path.exists(playlist_path):
-        logger.info(f"FFmpeg created playlist file successfully: {playlist_path}")
-    else:
-        logger.warning(f"Playlist file not created by FFmpeg yet: {playlist_path}, which is unexpected with temp_file flag")
+    # Start the session's only writer now so ffmpeg is ready before the first
+    # chunk; run_audio_session takes it over and finalizes it
+    writer = create_writer(path, audio_codec=audio_codec, profile=profile)
+    # The RAM tier, object storage and the copy for the static HLS URL get
+    # each file as the writer publishes it
+    store.attach(writer, sid)
 
     from .utils import safe_update_state          #  add
 
@@ -94,34 +105,135 @@ def generate_audio_stream(self, prompt, lang="en", session_id=None,
     def _render():
         try:
             logger.info(f"Running audio session with playlist path: {playlist_path}")
-            run_audio_session(prompt, playlist_path, lang, progress_cb=progress)
+            info = run_audio_session(prompt, playlist_path, lang, progress_cb=progress, writer=writer)
+            # A failed finalization is returned rather than raised
+            if isinstance(info, dict) and info.get("error"):
+                raise RuntimeError(info["error"])
 
             # Update the session status to ready when processing is complete
-            AudioSession.objects.filter(session_id=sid).update(status="ready")
+            AudioSession.objects.filter(session_id=sid).update(status="ready", finished_at=timezone.now())
+            schedule_compaction(sid, writer.playlist.duration)
         except Exception as exc:
             logger.error(f"Error generating audio stream: {str(exc)}")
-            AudioSession.objects.filter(session_id=sid).update(status="error", error_message=str(exc))
+            AudioSession.objects.filter(session_id=sid).update(status="error", error_message=str(exc),
+                                                               finished_at=timezone.now())
 
     # Start the audio processing thread
     t = threading.Thread(target=_render, daemon=True, name=f"HLS-{sid}")
     t.start()
 
-    # 3. Poll until the first N segments are present (or we time-out)
-    expected_first_segment = os.path.join(path, f"segment_000.m4s")
-    deadline = time.time() + timeout_before_return
-
-    # Use contextlib.suppress to avoid a race condition when the directory disappears
-    from contextlib import suppress
-
-    while time.time() < deadline:
-        with suppress(FileNotFoundError):
-            if os.path.exists(expected_first_segment):
-                logger.info(f"First segment found: {expected_first_segment}")
-                break
-        time.sleep(0.05)  # 50 ms polling interval
+    # 3. Wait until the writer reports the first N segments (or we time-out)
+    if writer.wait_for_segments(min_segments_before_return, timeout=timeout_before_return):
+        logger.info(f"First {min_segments_before_return} segment(s) ready in {path}")
     else:
         logger.warning(f"Timeout waiting for first segment after {timeout_before_return}s")
 
-    # 4. Mark DB as 'ready' and return immediately - ffmpeg is still running
-    AudioSession.objects.filter(session_id=sid).update(status="ready")
+    # 4. Mark DB as 'ready' and return immediately - ffmpeg is still running.
+    # A session that already failed keeps its error status
+    AudioSession.objects.filter(session_id=sid, status="running").update(status="ready")
     return {"playlist": playlist_url}
+
+
+def schedule_compaction(session_id, playback_seconds=0.0):
+    """
+    Queue the VOD compaction of a finished session (see vod.py), followed
+    by its move to object storage if the output is uploaded there.
+
+    Players that loaded the event playlist keep fetching its loose segments
+    until they reach its end, so the compaction waits for a playback of the
+    whole story plus ``HLS_VOD_COMPACTION_DELAY`` seconds. A negative delay
+    disables it; the move to object storage then follows the playback.
+
+    Args:
+        session_id (str): The session ID
+        playback_seconds (float): Duration of the session's audio
+    """
+    delay = getattr(settings, 'HLS_VOD_COMPACTION_DELAY', 600.0)
+    if delay >= 0:
+        task, countdown = compact_hls_session, playback_seconds + delay
+    elif getattr(settings, 'HLS_OBJECT_STORAGE', False):
+        task, countdown = archive_hls_session, playback_seconds
+    else:
+        return
+    if getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        # The countdown is ignored by eager tasks, the segments would be
+        # deleted under the players
+        logger.info(f"Not compacting or archiving session {session_id}: Celery tasks run eagerly")
+        return
+    try:
+        task.apply_async(args=[session_id], countdown=countdown)
+    except Exception as e:
+        logger.warning(f"Could not schedule the compaction of session {session_id}: {str(e)}")
+
+
+@shared_task
+def compact_hls_session(session_id):
+    """
+    Compact a finished session's HLS output into a single file per
+    rendition, with a byte-range VOD playlist, then move it to object
+    storage if the output is uploaded there.
+
+    Args:
+        session_id (str): The session ID
+
+    Returns:
+        dict: Compaction result by rendition directory, relative to the
+        session directory (None if it was already compacted)
+    """
+    from .vod import compact_session
+    store = get_store()
+    path = store.session_path(session_id)
+    results = compact_session(path)
+    if store.live is not None:
+        # The compacted files are served from disk
+        store.live.delete(session_id)
+    if store.remote is not None:
+        archive_session(store, session_id)
+    return {os.path.relpath(hls_dir, path): result for hls_dir, result in results.items()}
+
+
+@shared_task
+def archive_hls_session(session_id):
+    """
+    Move a finished session's HLS output to object storage and delete it
+    from local disk (see SegmentStore.archive).
+
+    Args:
+        session_id (str): The session ID
+
+    Returns:
+        dict: Files uploaded and deleted from the bucket, and bytes freed
+        (None if the session was archived already)
+    """
+    return archive_session(get_store(), session_id)
+
+
+def archive_session(store, session_id):
+    """
+    Move a session to object storage (SegmentStore.archive) and mark it
+    "archived", so the sweeper no longer looks for it on local disk.
+
+    Returns:
+        dict: SegmentStore.archive's result, or None if the session was
+        archived already
+    """
+    if AudioSession.objects.filter(session_id=session_id, status="archived").exists():
+        logger.info(f"Session {session_id} is already in object storage")
+        return None
+    result = store.archive(session_id)
+    AudioSession.objects.filter(session_id=session_id).update(status="archived")
+    return result
+
+
+@shared_task
+def sweep_hls_storage():
+    """
+    Evict old sessions' HLS output from local disk by age, tenant quota and
+    disk watermarks (see retention.py). Run by Celery beat.
+
+    Returns:
+        dict: Sessions evicted and bytes reclaimed by pass, and the used
+        fraction of the disk
+    """
+    from .retention import sweep
+    return sweep()
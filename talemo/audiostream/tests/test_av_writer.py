@@ -0,0 +1,217 @@
+import io
+import math
+import os
+import struct
+import tempfile
+import shutil
+from unittest import skipUnless
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from talemo.audiostream.hls import create_writer, playlist_duration, StreamingHLSWriter
+
+try:
+    import av
+    from talemo.audiostream.av_writer import PyAVHLSWriter
+except ImportError:
+    av = None
+
+
+def make_mp3(seconds=3.0, rate=24000):
+    """Encode a sine tone to MP3, as a TTS engine would return it."""
+    buf = io.BytesIO()
+    container = av.open(buf, "w", format="mp3")
+    stream = container.add_stream("libmp3lame", rate=rate, layout="mono")
+    total = int(seconds * rate)
+    for start in range(0, total, 1152):
+        samples = min(1152, total - start)
+        frame = av.AudioFrame(format="s16", layout="mono", samples=samples)
+        frame.planes[0].update(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * (start + i) / rate)))
+            for i in range(samples)
+        ))
+        frame.sample_rate = rate
+        frame.pts = start
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return buf.getvalue()
+
+
+@skipUnless(av, "PyAV is not installed")
+class TestPyAVHLSWriter(TestCase):
+    """Test cases for the in-process HLS writer backend."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mp3 = make_mp3()
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_stream_encoded_to_hls(self):
+        """MP3 data arriving in small pieces is encoded to fMP4 segments."""
+        writer = PyAVHLSWriter(self.temp_dir)
+        pieces = [self.mp3[i:i + 500] for i in range(0, len(self.mp3), 500)]
+
+        result = writer.process_stream(iter(pieces))
+        self.assertEqual(result['bytes'], len(self.mp3))
+        # Segments are cut while the session is running
+        self.assertTrue(any(f.endswith('.m4s') for f in os.listdir(self.temp_dir)))
+
+        info = writer.finalize()
+
+        self.assertEqual(info['chunk_count'], 1)
+        self.assertGreaterEqual(info['segment_count'], 3)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "init.mp4")))
+        with open(info['playlist_path']) as f:
+            playlist = f.read()
+        self.assertIn("#EXT-X-PLAYLIST-TYPE:EVENT", playlist)
+        self.assertIn("#EXT-X-ENDLIST", playlist)
+        self.assertAlmostEqual(playlist_duration(info['playlist_path']), 3.0, delta=0.2)
+
+    def test_chunks_are_appended(self):
+        """Consecutive chunks continue the same stream."""
+        writer = PyAVHLSWriter(self.temp_dir)
+        self.assertIsNotNone(writer.process_chunk(self.mp3))
+        self.assertIsNotNone(writer.process_chunk(self.mp3))
+        info = writer.finalize()
+
+        self.assertEqual(info['chunk_count'], 2)
+        self.assertAlmostEqual(playlist_duration(info['playlist_path']), 6.0, delta=0.3)
+
+    def test_segment_ready_events(self):
+        """Each segment is reported once it is listed in the playlist."""
+        writer = PyAVHLSWriter(self.temp_dir)
+        ready = []
+        writer.add_listener(lambda event, data: ready.append(data["index"]))
+
+        writer.process_chunk(self.mp3)
+        # The first segments are ready before the session ends
+        self.assertTrue(writer.wait_for_segments(1, timeout=0))
+        with open(writer.playlist_path) as f:
+            self.assertIn("segment_000.m4s", f.read())
+
+        info = writer.finalize()
+        self.assertEqual(ready, list(range(info['segment_count'])))
+        self.assertFalse(writer.wait_for_segments(info['segment_count'] + 1, timeout=0))
+
+    def test_low_latency_parts(self):
+        """In low-latency mode parts are published while the session runs."""
+        writer = PyAVHLSWriter(self.temp_dir, low_latency=True)
+        writer.process_chunk(self.mp3)
+
+        # Served from memory; the file is written once per write interval
+        playlist = writer.playlist.render()
+        self.assertIn("#EXT-X-PART:", playlist)
+        self.assertIn("#EXT-X-PRELOAD-HINT:TYPE=PART", playlist)
+        self.assertIn("segment_000.m4s", playlist)
+
+        info = writer.finalize()
+        with open(info['playlist_path']) as f:
+            playlist = f.read()
+        self.assertIn("#EXT-X-ENDLIST", playlist)
+        self.assertEqual(info['segment_count'], len(writer.playlist.segments))
+        self.assertAlmostEqual(playlist_duration(info['playlist_path']), 3.0, delta=0.2)
+
+    def test_end_chunk_publishes_the_tail(self):
+        """The end of a chunk is pushed into the playlist with a little silence."""
+        writer = PyAVHLSWriter(self.temp_dir, low_latency=True)
+        writer.process_chunk(self.mp3)
+        written = writer._input_timing()[0]
+        self.assertLess(writer.playlist.duration, written)
+
+        silence = writer.end_chunk(max_silence=0.5)
+
+        self.assertGreater(silence, 0)
+        self.assertLessEqual(silence, 0.5)
+        # The encoder's priming frame is listed too
+        self.assertGreaterEqual(writer.playlist.duration, written + 1024 / 24000 - 1e-6)
+        # Once published, nothing more is written
+        self.assertEqual(writer.end_chunk(max_silence=0.5), 0)
+        writer.finalize()
+
+    def test_end_chunk_without_cut_in_reach(self):
+        """No silence is written when the next cut is further than allowed."""
+        writer = PyAVHLSWriter(self.temp_dir)
+        self.assertEqual(writer.end_chunk(), 0)
+
+        # The chunk ends about 0.4s into a 1s segment
+        writer.process_chunk(make_mp3(1.3))
+        samples = writer._input_samples
+        self.assertEqual(writer.end_chunk(max_silence=0.5), 0)
+        self.assertEqual(writer._input_samples, samples)
+        writer.finalize()
+
+    def test_speech_profiles(self):
+        """The speech profiles encode mono audio in a fraction of the bytes."""
+        sizes = {}
+        for profile in ("standard", "speech", "speech-opus"):
+            hls_dir = os.path.join(self.temp_dir, profile)
+            writer = PyAVHLSWriter(hls_dir, profile=profile)
+            writer.process_chunk(self.mp3)
+            info = writer.finalize()
+            self.assertAlmostEqual(playlist_duration(info['playlist_path']), 3.0, delta=0.2)
+            sizes[profile] = sum(os.path.getsize(os.path.join(hls_dir, f))
+                                 for f in os.listdir(hls_dir) if f.startswith("segment_"))
+            with open(os.path.join(hls_dir, "master.m3u8")) as f:
+                self.assertIn(f'CODECS="{writer.profile.codecs}"', f.read())
+
+        self.assertLess(sizes["speech"] * 2, sizes["standard"])
+        self.assertLess(sizes["speech-opus"] * 2, sizes["standard"])
+
+    def test_unavailable_encoder(self):
+        """A profile whose encoder is missing from the libav build is refused."""
+        with patch('talemo.audiostream.av_writer.av.Codec', side_effect=ValueError("libfdk_aac")):
+            with self.assertRaisesRegex(RuntimeError, "not available"):
+                PyAVHLSWriter(self.temp_dir, profile="speech-he")
+
+    def test_empty_and_late_chunks_are_skipped(self):
+        """Empty chunks and chunks after finalize are not encoded."""
+        writer = PyAVHLSWriter(self.temp_dir)
+        self.assertIsNone(writer.process_chunk(b""))
+        self.assertIsNone(writer.process_stream(iter([b""])))
+        writer.finalize()
+        self.assertIsNone(writer.process_chunk(self.mp3))
+        self.assertEqual(writer.chunk_count, 0)
+
+    def test_selected_by_setting(self):
+        """HLS_WRITER_BACKEND selects the in-process writer."""
+        with override_settings(HLS_WRITER_BACKEND="pyav"):
+            writer = create_writer(self.temp_dir)
+        self.assertIsInstance(writer, PyAVHLSWriter)
+        self.assertFalse(writer.uses_ffmpeg_process)
+        writer.finalize()
+
+
+class TestCreateWriter(TestCase):
+    """Test cases for the writer backend selection."""
+
+    @override_settings(HLS_WRITER_BACKEND="ffmpeg", HLS_ENCODER_POOL_SIZE=0)
+    @patch('subprocess.Popen')
+    def test_ffmpeg_backend_is_default(self, mock_popen):
+        """The ffmpeg backend creates a StreamingHLSWriter."""
+        mock_popen.return_value.poll.return_value = None
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.assertIsInstance(create_writer(temp_dir), StreamingHLSWriter)
+
+    def test_unknown_backend(self):
+        """An unknown backend name is rejected."""
+        with self.assertRaisesRegex(ValueError, "Unknown HLS writer backend"):
+            create_writer("/tmp", backend="gstreamer")
+
+    @override_settings(HLS_WRITER_BACKEND="ffmpeg", HLS_ENCODER_POOL_SIZE=0, HLS_AUDIO_CODEC="copy")
+    @patch('subprocess.Popen')
+    def test_audio_codec_setting(self, mock_popen):
+        """HLS_AUDIO_CODEC is the default of the sessions' audio codec."""
+        mock_popen.return_value.poll.return_value = None
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.assertEqual(create_writer(temp_dir).audio_codec, "copy")
+            self.assertEqual(create_writer(temp_dir, audio_codec="aac").audio_codec, "aac")
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import tempfile
+import shutil
+from unittest.mock import Mock, patch
+from django.test import TestCase, override_settings
+from talemo.audiostream.encoder_pool import EncoderPool, WarmEncoder, release_slot
+from talemo.audiostream.hls import StreamingHLSWriter
+
+# Stands in for ffmpeg: copies stdin to <slot>/audio.m3u8 once input arrives
+COPY_TO_SLOT = (
+    "import sys, os\n"
+    "data = sys.stdin.buffer.read()\n"
+    "open(os.path.join(sys.argv[1], 'audio.m3u8'), 'wb').write(data)\n"
+)
+
+
+def copy_command(slot_path):
+    return [sys.executable, "-c", COPY_TO_SLOT, slot_path]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestEncoderPool(TestCase):
+    """Test cases for the warm ffmpeg encoder pool."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.slot_dir = os.path.join(self.temp_dir, "warm")
+        self.output_dir = os.path.join(self.temp_dir, "session")
+        os.makedirs(self.output_dir)
+        self.pools = []
+
+    def tearDown(self):
+        """Clean up after tests."""
+        for pool in self.pools:
+            pool.shutdown()
+        shutil.rmtree(self.temp_dir)
+
+    def make_pool(self, command_factory=copy_command, **kwargs):
+        pool = EncoderPool(2, self.slot_dir, command_factory, check_interval=0.05, **kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def test_claimed_encoder_writes_to_session_directory(self):
+        """A claimed encoder's slot points at the session's output directory."""
+        pool = self.make_pool()
+        self.assertTrue(wait_for(lambda: pool.stats()["idle"] == 2))
+
+        encoder = pool.claim(self.output_dir)
+        self.assertIsNotNone(encoder)
+        self.assertEqual(os.path.realpath(encoder.slot_path), os.path.realpath(self.output_dir))
+
+        encoder.process.stdin.write(b"#EXTM3U\n")
+        encoder.process.stdin.close()
+        encoder.process.wait(timeout=5)
+        with open(os.path.join(self.output_dir, "audio.m3u8"), "rb") as f:
+            self.assertEqual(f.read(), b"#EXTM3U\n")
+
+        release_slot(encoder.slot_path)
+        self.assertFalse(os.path.lexists(encoder.slot_path))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "audio.m3u8")))
+
+    def test_pool_is_refilled_after_claim(self):
+        """Claimed encoders are replaced in the background."""
+        pool = self.make_pool()
+        self.assertTrue(wait_for(lambda: pool.stats()["idle"] == 2))
+
+        encoder = pool.claim(self.output_dir)
+        self.assertTrue(wait_for(lambda: pool.stats()["idle"] == 2))
+        self.assertEqual(pool.stats()["claimed"], 1)
+        encoder.kill()
+
+    def test_dead_encoders_are_not_handed_out(self):
+        """An encoder that exited while idle is discarded; an empty pool returns None."""
+        pool = self.make_pool(command_factory=lambda slot: [sys.executable, "-c", "pass"])
+        self.assertTrue(wait_for(lambda: pool.stats()["idle"] == 2))
+        # No healthy replacement can be started from now on
+        pool.command_factory = lambda slot: [os.path.join(self.temp_dir, "missing")]
+        self.assertTrue(wait_for(lambda: all(e.process.poll() is not None for e in pool._idle)))
+
+        self.assertIsNone(pool.claim(self.output_dir))
+        self.assertGreaterEqual(pool.stats()["missed"], 1)
+        self.assertEqual(os.listdir(self.slot_dir), [])
+
+    def test_spawn_failure_does_not_stop_the_pool(self):
+        """A missing encoder binary is logged and the pool stays empty."""
+        pool = self.make_pool(command_factory=lambda slot: [os.path.join(self.temp_dir, "missing")])
+        time.sleep(0.1)
+        self.assertEqual(pool.stats()["idle"], 0)
+        self.assertIsNone(pool.claim(self.output_dir))
+
+
+class TestWriterWithEncoderPool(TestCase):
+    """Test cases for StreamingHLSWriter claiming warm encoders."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.slot_path = os.path.join(self.temp_dir, "slot")
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    @patch('subprocess.Popen')
+    @patch('talemo.audiostream.hls.get_encoder_pool')
+    def test_writer_uses_warm_encoder(self, mock_get_pool, mock_popen):
+        """A session claims a warm encoder instead of starting ffmpeg, and frees its slot."""
+        output_dir = os.path.join(self.temp_dir, "session")
+        os.makedirs(output_dir)
+        os.symlink(output_dir, self.slot_path)
+
+        process = Mock()
+        process.poll.return_value = None
+        process.stdin = Mock()
+        process.stdin.closed = False
+        mock_get_pool.return_value.claim.return_value = WarmEncoder(process, self.slot_path)
+
+        writer = StreamingHLSWriter(output_dir)
+
+        mock_popen.assert_not_called()
+        mock_get_pool.return_value.claim.assert_called_once_with(output_dir)
+        self.assertIs(writer.ffmpeg_process, process)
+
+        writer.finalize()
+        self.assertFalse(os.path.lexists(self.slot_path))
+
+    @override_settings(HLS_ENCODER_POOL_SIZE=0)
+    @patch('subprocess.Popen')
+    def test_writer_starts_ffmpeg_when_pool_disabled(self, mock_popen):
+        """Without a pool the writer starts ffmpeg itself, without waiting for it."""
+        mock_popen.return_value.poll.return_value = None
+
+        with patch('time.sleep') as mock_sleep:
+            StreamingHLSWriter(self.temp_dir)
+
+        mock_popen.assert_called_once()
+        mock_sleep.assert_not_called()
@@ -0,0 +1,143 @@
+import io
+import os
+import threading
+from unittest.mock import Mock
+from django.test import TestCase
+from talemo.audiostream.ffmpeg_monitor import FFmpegMonitor
+
+# stderr of an HLS encoding: two segments, then the final playlist write
+FFMPEG_STDERR = b"""Input #0, mp3, from 'pipe:0':
+[hls @ 0x5581] Opening '/tmp/s/init.mp4' for writing
+[hls @ 0x5581] Opening '/tmp/s/segment_000.m4s' for writing
+out_time_us=1000000
+total_size=16384
+speed=2.5x
+progress=continue
+[hls @ 0x5581] Opening '/tmp/s/audio.m3u8.tmp' for writing
+[hls @ 0x5581] Opening '/tmp/s/segment_001.m4s' for writing
+out_time_us=1500000
+total_size=24576
+speed=N/A
+progress=end
+[hls @ 0x5581] Opening '/tmp/s/audio.m3u8.tmp' for writing
+size=N/A time=00:00:01.50 bitrate=N/A speed=2.1x
+"""
+
+
+class TestFFmpegMonitor(TestCase):
+    """Test cases for the ffmpeg stderr reader."""
+
+    def run_monitor(self, data, **kwargs):
+        events = []
+        monitor = FFmpegMonitor(io.BytesIO(data), [lambda e, d: events.append((e, d))], **kwargs)
+        monitor.start()
+        monitor.join(timeout=5)
+        return monitor, events
+
+    def test_segment_events(self):
+        """Segments are ready when the playlist is rewritten or the next one opens."""
+        monitor, events = self.run_monitor(FFMPEG_STDERR)
+
+        segment_events = [(e, d["index"]) for e, d in events if e.startswith("segment")]
+        self.assertEqual(segment_events, [
+            ("segment_opened", 0),
+            ("segment_ready", 0),
+            ("segment_opened", 1),
+            ("segment_ready", 1),
+        ])
+        self.assertEqual(events[-1], ("exit", {}))
+        self.assertTrue(monitor.exited)
+        self.assertEqual(monitor.segments_ready, 2)
+        self.assertEqual(monitor.last_ready_index, 1)
+
+    def test_progress_metrics(self):
+        """-progress blocks are reported as events and metrics."""
+        monitor, events = self.run_monitor(FFMPEG_STDERR)
+
+        progress = [d for e, d in events if e == "progress"]
+        self.assertEqual(progress, [
+            {"out_time": 1.0, "total_size": 16384, "speed": 2.5},
+            {"out_time": 1.5, "total_size": 24576, "speed": None},
+        ])
+        metrics = monitor.metrics()
+        self.assertEqual(metrics["out_time"], 1.5)
+        self.assertEqual(metrics["total_size"], 24576)
+        self.assertEqual(metrics["segments_opened"], 2)
+
+    def test_next_segment_completes_previous(self):
+        """Opening a segment also completes the one before it."""
+        monitor = FFmpegMonitor(io.BytesIO(b""))
+        monitor.feed("[hls @ 0x1] Opening 'd/segment_004.m4s' for writing")
+        monitor.feed("[hls @ 0x1] Opening 'd/segment_005.m4s.tmp' for writing")
+
+        self.assertEqual(monitor.segments_ready, 1)
+        self.assertEqual(monitor.last_ready_index, 4)
+
+    def test_paths_reported_in_output_directory(self):
+        """Segment paths of a warm encoder's slot are reported in the session directory."""
+        _, events = self.run_monitor(
+            b"[hls @ 0x1] Opening '/warm/abc/segment_000.m4s' for writing\n"
+            b"[hls @ 0x1] Opening '/warm/abc/audio.m3u8.tmp' for writing\n",
+            output_dir="/media/session",
+        )
+
+        self.assertEqual(events[1], ("segment_ready", {"index": 0, "path": "/media/session/segment_000.m4s"}))
+
+    def test_renditions_tracked_per_directory(self):
+        """The segments of each rendition complete independently, in their subdirectory."""
+        _, events = self.run_monitor(
+            b"[hls @ 0x1] Opening '/warm/abc/standard/segment_000.m4s' for writing\n"
+            b"[hls @ 0x1] Opening '/warm/abc/speech/segment_000.m4s' for writing\n"
+            b"[hls @ 0x1] Opening '/warm/abc/standard/segment_001.m4s' for writing\n"
+            b"[hls @ 0x1] Opening '/warm/abc/speech/muxer.m3u8.tmp' for writing\n",
+            output_dir="/media/session", source_dir="/warm/abc",
+        )
+
+        ready = [d["path"] for e, d in events if e == "segment_ready"]
+        self.assertEqual(ready, [
+            "/media/session/standard/segment_000.m4s",
+            "/media/session/speech/segment_000.m4s",
+        ])
+
+    def test_log_lines_kept_without_progress(self):
+        """Log lines are kept for error reports, progress lines are not."""
+        monitor, _ = self.run_monitor(FFMPEG_STDERR)
+
+        self.assertIn("Input #0, mp3, from 'pipe:0':", monitor.recent_lines)
+        self.assertFalse(any(line.startswith("progress=") for line in monitor.recent_lines))
+
+    def test_callback_error_does_not_stop_reader(self):
+        """A failing listener does not stop the draining of stderr."""
+        events = []
+        callback = Mock(side_effect=ValueError("boom"))
+        monitor = FFmpegMonitor(io.BytesIO(FFMPEG_STDERR), [callback, lambda e, d: events.append(e)])
+        monitor.start()
+        monitor.join(timeout=5)
+
+        self.assertEqual(events.count("segment_ready"), 2)
+        self.assertTrue(monitor.exited)
+
+    def test_drains_real_pipe(self):
+        """The writer side of a pipe never blocks once stderr is monitored."""
+        read_fd, write_fd = os.pipe()
+        monitor = FFmpegMonitor(os.fdopen(read_fd, "rb")).start()
+
+        # Far more than a pipe buffer holds
+        line = b"[aac @ 0x1] Qavg: 1234.567\n"
+        writer = threading.Thread(target=lambda: (os.write(write_fd, line * 10000), os.close(write_fd)))
+        writer.start()
+        writer.join(timeout=5)
+        monitor.join(timeout=5)
+
+        self.assertFalse(writer.is_alive())
+        self.assertTrue(monitor.exited)
+
+    def test_started(self):
+        """A process is started once it opened a segment or reported progress, not by logging an error."""
+        monitor, _ = self.run_monitor(b"Unknown encoder 'aac_at'\n")
+        self.assertFalse(monitor.started)
+
+        monitor, _ = self.run_monitor(b"out_time_us=0\ntotal_size=0\nprogress=continue\n")
+        self.assertTrue(monitor.started)
+        monitor, _ = self.run_monitor(FFMPEG_STDERR)
+        self.assertTrue(monitor.started)
@@ -0,0 +1,79 @@
+import struct
+from django.test import TestCase
+from talemo.audiostream import fmp4
+
+
+def box(box_type, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type, version, flags, payload):
+    return box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def make_init(timescale=24000, trex_duration=0, mdhd_version=0):
+    """An init segment with one track of the given timescale."""
+    if mdhd_version == 1:
+        mdhd = full_box(b"mdhd", 1, 0, struct.pack(">QQIQ", 0, 0, timescale, 0) + b"\0" * 4)
+    else:
+        mdhd = full_box(b"mdhd", 0, 0, struct.pack(">IIII", 0, 0, timescale, 0) + b"\0" * 4)
+    trex = full_box(b"trex", 0, 0, struct.pack(">IIIII", 1, 1, trex_duration, 0, 0))
+    return box(b"ftyp", b"iso6") + box(b"moov", box(b"trak", box(b"mdia", mdhd)), box(b"mvex", trex))
+
+
+def make_fragment(samples, sample_duration=1024, per_sample=False):
+    """A styp/sidx/moof/mdat fragment as written by the HLS muxer."""
+    if per_sample:
+        tfhd = full_box(b"tfhd", 0, 0x020000, struct.pack(">I", 1))
+        trun = full_box(b"trun", 0, 0x301, struct.pack(">II", samples, 0)
+                        + b"".join(struct.pack(">II", sample_duration, 4) for _ in range(samples)))
+    else:
+        tfhd = full_box(b"tfhd", 0, 0x020008, struct.pack(">II", 1, sample_duration))
+        trun = full_box(b"trun", 0, 0x201, struct.pack(">II", samples, 0)
+                        + b"".join(struct.pack(">I", 4) for _ in range(samples)))
+    return (box(b"styp", b"msdh") + box(b"sidx", b"\0" * 12)
+            + box(b"moof", box(b"traf", tfhd, trun)) + box(b"mdat", b"\0" * 4 * samples))
+
+
+class TestFMP4(TestCase):
+    """Test cases for the fragmented MP4 reader."""
+
+    def test_read_init(self):
+        """The timescale comes from mdhd and the default duration from trex."""
+        self.assertEqual(fmp4.read_init(make_init(24000, 1024)), (24000, 1024))
+        self.assertEqual(fmp4.read_init(make_init(44100, mdhd_version=1)), (44100, 0))
+
+    def test_read_init_without_track(self):
+        """An init segment without a media header is rejected."""
+        with self.assertRaises(ValueError):
+            fmp4.read_init(box(b"ftyp", b"iso6"))
+
+    def test_fragment_duration_from_tfhd_default(self):
+        """Samples without their own duration use the tfhd default."""
+        self.assertAlmostEqual(fmp4.fragment_duration(make_fragment(5), 24000), 5 * 1024 / 24000)
+
+    def test_fragment_duration_from_trun_samples(self):
+        """Per-sample durations of trun are added up."""
+        data = make_fragment(4, sample_duration=960, per_sample=True)
+        self.assertAlmostEqual(fmp4.fragment_duration(data, 48000), 4 * 960 / 48000)
+
+    def test_fragment_duration_from_trex_default(self):
+        """Without tfhd or trun durations the init segment's default applies."""
+        tfhd = full_box(b"tfhd", 0, 0x020000, struct.pack(">I", 1))
+        trun = full_box(b"trun", 0, 0, struct.pack(">I", 3))
+        data = box(b"moof", box(b"traf", tfhd, trun))
+        self.assertAlmostEqual(fmp4.fragment_duration(data, 24000, 1024), 3 * 1024 / 24000)
+
+    def test_strip_boxes(self):
+        """Top-level boxes are removed, the others kept in order."""
+        data = make_fragment(2)
+        stripped = fmp4.strip_boxes(data, {b"styp", b"sidx"})
+
+        self.assertEqual([b[0] for b in fmp4.iter_boxes(stripped)], [b"moof", b"mdat"])
+        self.assertTrue(data.endswith(stripped))
+
+    def test_truncated_box(self):
+        """A box running past the end of the data is an error."""
+        with self.assertRaises(ValueError):
+            list(fmp4.iter_boxes(make_fragment(2)[:-1]))
@@ -1,11 +1,29 @@
+import io
 import os
+import sys
 import tempfile
 import shutil
 from unittest.mock import Mock, patch, MagicMock, call
-from django.test import TestCase
-from talemo.audiostream.hls import StreamingHLSWriter
+from django.test import TestCase, override_settings
+from talemo.audiostream.hls import StreamingHLSWriter, playlist_duration
 
+# Stands in for ffmpeg: one segment per line of input, logged like the HLS muxer
+FAKE_FFMPEG = (
+    "import sys, os\n"
+    "out = sys.argv[1]\n"
+    "for i, line in enumerate(sys.stdin.buffer):\n"
+    "    sys.stderr.write(f\"[hls @ 0x1] Opening '{out}/segment_{i:03d}.m4s' for writing\\n\")\n"
+    "    sys.stderr.write(f\"[hls @ 0x1] Opening '{out}/audio.m3u8.tmp' for writing\\n\")\n"
+    "    sys.stderr.write(f\"total_size={(i + 1) * 100}\\nout_time_us={(i + 1) * 1000000}\\nspeed=3x\\nprogress=continue\\n\")\n"
+    "    sys.stderr.flush()\n"
+)
 
+
+def fake_ffmpeg_command(hls_dir, low_latency=False, audio_codec=None, profile=None):
+    return [sys.executable, "-c", FAKE_FFMPEG, hls_dir]
+
+
+@override_settings(HLS_ENCODER_POOL_SIZE=0)
 class TestStreamingHLSWriter(TestCase):
     """Test cases for the StreamingHLSWriter class."""
 
@@ -82,7 +100,7 @@ class TestStreamingHLSWriter(TestCase):
         # Mock process that fails immediately
         mock_process = Mock()
         mock_process.poll.return_value = 1  # Non-zero exit code
-        mock_process.stderr.read.return_value = b"FFmpeg error"
+        mock_process.stderr = io.BytesIO(b"FFmpeg error\n")
         mock_popen.return_value = mock_process
         
         # Should raise RuntimeError
@@ -90,6 +108,7 @@ class TestStreamingHLSWriter(TestCase):
             StreamingHLSWriter(self.temp_dir)
         
         self.assertIn("ffmpeg process failed", str(cm.exception))
+        self.assertIn("FFmpeg error", str(cm.exception))
 
     @patch('subprocess.Popen')
     def test_process_chunk_success(self, mock_popen):
@@ -118,6 +137,186 @@ class TestStreamingHLSWriter(TestCase):
         self.assertIsInstance(result, dict)
         self.assertIn('chunk_id', result)
 
+    @patch('subprocess.Popen')
+    def test_end_chunk_writes_mp3_silence(self, mock_popen):
+        """The end of a chunk is pushed through ffmpeg with silent MP3 frames."""
+        from talemo.audiostream.tests.test_mp3 import mp3_frame
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_stdin = Mock()
+        mock_stdin.closed = False
+        mock_process.stdin = mock_stdin
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir, low_latency=True)
+        writer._silence_wait = 0.01
+        written = []
+
+        def encode(data):
+            # 0.2s parts are published once a 24 ms frame follows them
+            written.append(data)
+            total = len(b"".join(written)) / 96 * 0.024
+            while writer.playlist.duration + 0.2 + 0.024 <= total + 1e-9:
+                writer.playlist.add_part("part", 0.2)
+        mock_stdin.write.side_effect = encode
+
+        writer.process_chunk(mp3_frame() * 10)
+        self.assertAlmostEqual(writer.playlist.duration, 0.2)
+        silence = writer.end_chunk(max_silence=0.5)
+
+        # 8 frames of silence complete the part holding the chunk's end
+        self.assertAlmostEqual(silence, 0.192)
+        self.assertAlmostEqual(writer.playlist.duration, 0.4)
+        self.assertEqual(b"".join(written[1:]), (b"\xff\xf3\x44\xc0" + bytes(92)) * 8)
+
+    @patch('subprocess.Popen')
+    def test_end_chunk_off_by_default(self, mock_popen):
+        """No silence is written after a chunk unless HLS_CHUNK_FLUSH_MAX_SILENCE allows it."""
+        from talemo.audiostream.tests.test_mp3 import mp3_frame
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.stdin = Mock()
+        mock_process.stdin.closed = False
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir, low_latency=True)
+        writer.process_chunk(mp3_frame() * 10)
+
+        self.assertEqual(writer.end_chunk(), 0)
+        mock_process.stdin.write.assert_called_once()
+
+    @patch('subprocess.Popen')
+    def test_copy_mode(self, mock_popen):
+        """In copy mode the MP3 frames are packaged in MPEG-TS segments."""
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir, low_latency=False, audio_codec="copy")
+
+        args = mock_popen.call_args[0][0]
+        self.assertEqual(args[args.index('-c:a') + 1], 'copy')
+        self.assertNotIn('-b:a', args)
+        self.assertEqual(args[args.index('-hls_segment_type') + 1], 'mpegts')
+        self.assertTrue(args[args.index('-hls_segment_filename') + 1].endswith('segment_%03d.ts'))
+        # No init segment, and no encoder delay to account for
+        self.assertIsNone(writer.playlist.map_uri)
+        self.assertIsNone(writer.profile)
+        self.assertEqual(writer.packager.codecs, "mp4a.40.34")
+
+    @patch('subprocess.Popen')
+    def test_encoding_profile(self, mock_popen):
+        """The encoding profile sets the encoder options and the master playlist's CODECS."""
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir, profile="speech-opus")
+
+        args = mock_popen.call_args[0][0]
+        self.assertEqual(args[args.index('-c:a') + 1], 'libopus')
+        self.assertEqual(args[args.index('-ar') + 1], '48000')
+        self.assertEqual(args[args.index('-ac') + 1], '1')
+        self.assertEqual(writer.packager.codecs, "Opus")
+        self.assertEqual(writer.packager.bandwidth, 26400)
+
+    @override_settings(HLS_ABR_LADDER="standard,speech")
+    @patch('subprocess.Popen')
+    def test_abr_ladder(self, mock_popen):
+        """One ffmpeg process encodes every rendition of the ladder, listed in the master playlist."""
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir, low_latency=False)
+
+        mock_popen.assert_called_once()
+        args = mock_popen.call_args[0][0]
+        self.assertEqual(args.count('-map'), 2)
+        self.assertEqual(args[args.index('-b:a:0') + 1], '128000')
+        self.assertEqual(args[args.index('-b:a:1') + 1], '32000')
+        self.assertEqual(args[args.index('-ar:a:1') + 1], '24000')
+        self.assertEqual(args[args.index('-var_stream_map') + 1], 'a:0,name:standard a:1,name:speech')
+        self.assertEqual(args[args.index('-hls_segment_filename') + 1],
+                         os.path.join(self.temp_dir, '%v', 'segment_%03d.m4s'))
+        self.assertEqual(args[-1], os.path.join(self.temp_dir, '%v', 'muxer.m3u8'))
+
+        with open(os.path.join(self.temp_dir, 'master.m3u8')) as f:
+            master = f.read()
+        self.assertIn('#EXT-X-STREAM-INF:BANDWIDTH=140800,CODECS="mp4a.40.2"\nstandard/audio.m3u8\n', master)
+        self.assertIn('#EXT-X-STREAM-INF:BANDWIDTH=35200,CODECS="mp4a.40.2"\nspeech/audio.m3u8\n', master)
+        self.assertEqual(writer.profile.name, 'standard')
+        self.assertEqual(writer.playlist.path, os.path.join(self.temp_dir, 'standard', 'audio.m3u8'))
+        self.assertEqual(writer.playlist.map_uri, 'init_standard.mp4')
+
+    @override_settings(HLS_ABR_LADDER="standard,speech")
+    @patch('subprocess.Popen')
+    def test_abr_ladder_segments_routed_to_renditions(self, mock_popen):
+        """Each segment goes to its rendition's playlist; the first rendition's are counted."""
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+        writer = StreamingHLSWriter(self.temp_dir, low_latency=False)
+        standard = writer.packagers[os.path.join(self.temp_dir, 'standard')]
+        speech = writer.packagers[os.path.join(self.temp_dir, 'speech')]
+
+        with patch.object(standard, 'add') as standard_add, patch.object(speech, 'add') as speech_add:
+            writer._segment_ready(0, os.path.join(self.temp_dir, 'speech', 'segment_000.m4s'))
+            self.assertEqual(writer.segments_ready, 0)
+            writer._segment_ready(0, os.path.join(self.temp_dir, 'standard', 'segment_000.m4s'))
+
+        speech_add.assert_called_once_with(os.path.join(self.temp_dir, 'speech', 'segment_000.m4s'), 0)
+        standard_add.assert_called_once_with(os.path.join(self.temp_dir, 'standard', 'segment_000.m4s'), 0)
+        self.assertTrue(writer.wait_for_segments(1, timeout=0))
+
+    @override_settings(HLS_ABR_LADDER="standard,speech")
+    @patch('subprocess.Popen')
+    def test_abr_ladder_published_to_backend(self, mock_popen):
+        """A storage backend gets the master playlist and each rendition's files by relative name."""
+        from talemo.audiostream.storage import MemoryBackend
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+        writer = StreamingHLSWriter(self.temp_dir, low_latency=False)
+        backend = MemoryBackend()
+
+        writer.publish_to(backend, "abc123")
+        writer.packagers[os.path.join(self.temp_dir, 'speech')].playlist.add_segment("segment_000.m4s", 1.0)
+
+        self.assertIn(b"speech/audio.m3u8", backend.get("abc123", "master.m3u8"))
+        self.assertIn(b"segment_000.m4s", backend.get("abc123", "speech/audio.m3u8"))
+        self.assertIsNone(backend.get("abc123", "audio.m3u8"))
+
+    @override_settings(HLS_ABR_LADDER="standard,speech")
+    @patch('subprocess.Popen')
+    def test_profile_overrides_abr_ladder(self, mock_popen):
+        """A session that chooses a profile gets a single rendition."""
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir, profile="speech")
+
+        args = mock_popen.call_args[0][0]
+        self.assertNotIn('-var_stream_map', args)
+        self.assertEqual(args[args.index('-b:a') + 1], '32000')
+        self.assertEqual(writer.playlist.path, os.path.join(self.temp_dir, 'audio.m3u8'))
+
+    @patch('subprocess.Popen')
+    def test_unknown_audio_codec(self, mock_popen):
+        """An unknown audio codec is rejected before ffmpeg starts."""
+        with self.assertRaisesRegex(ValueError, "Unknown HLS audio codec"):
+            StreamingHLSWriter(self.temp_dir, audio_codec="opus")
+        mock_popen.assert_not_called()
+
     @patch('subprocess.Popen')
     def test_process_chunk_empty_data(self, mock_popen):
         """Test processing empty audio data."""
@@ -172,6 +371,31 @@ class TestStreamingHLSWriter(TestCase):
         self.assertEqual(writer.ffmpeg_process, mock_process2)
         mock_stdin2.write.assert_called_once_with(audio_data)
 
+    @patch('subprocess.Popen')
+    def test_process_stream_forwards_each_piece(self, mock_popen):
+        """Test that a streamed chunk is written piece by piece and counted once."""
+        # Mock the subprocess
+        mock_process = Mock()
+        mock_process.poll.return_value = None
+        mock_stdin = Mock()
+        mock_stdin.closed = False
+        mock_process.stdin = mock_stdin
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+
+        writer = StreamingHLSWriter(self.temp_dir)
+
+        result = writer.process_stream(iter([b"frame1", b"", b"frame2"]))
+
+        mock_stdin.write.assert_has_calls([call(b"frame1"), call(b"frame2")])
+        self.assertEqual(mock_stdin.flush.call_count, 2)
+        self.assertEqual(writer.chunk_count, 1)
+        self.assertEqual(result['bytes'], 12)
+
+        # An empty stream is skipped
+        self.assertIsNone(writer.process_stream(iter([])))
+        self.assertEqual(writer.chunk_count, 1)
+
     @patch('subprocess.Popen')
     def test_finalize_success(self, mock_popen):
         """Test successful finalization."""
@@ -336,4 +560,118 @@ class TestStreamingHLSWriter(TestCase):
             mock_logger.warning.assert_any_call(
                 "Playlist file not found at %s before restart, which is unexpected",
                 os.path.join(self.temp_dir, "audio.m3u8")
-            )
\ No newline at end of file
+            )
+
+
+class TestPlaylistDuration(TestCase):
+    """Test cases for reading the duration of a playlist."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.playlist_path = os.path.join(self.temp_dir, "audio.m3u8")
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_sums_segment_durations(self):
+        """The #EXTINF durations of all segments are added up."""
+        with open(self.playlist_path, 'w') as f:
+            f.write("#EXTM3U\n#EXT-X-TARGETDURATION:2\n"
+                    "#EXTINF:2.005333,\nsegment_000.m4s\n"
+                    "#EXTINF:1.5,\nsegment_001.m4s\n")
+
+        self.assertAlmostEqual(playlist_duration(self.playlist_path), 3.505333)
+
+    def test_missing_playlist(self):
+        """A playlist that does not exist yet holds no audio."""
+        self.assertEqual(playlist_duration(self.playlist_path), 0.0)
+
+
+@override_settings(HLS_ENCODER_POOL_SIZE=0)
+@patch('talemo.audiostream.hls.ffmpeg_hls_command', fake_ffmpeg_command)
+class TestStreamingHLSWriterEvents(TestCase):
+    """Test cases for the encoder events of the StreamingHLSWriter."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_listeners_receive_segment_events(self):
+        """Listeners are told when a segment is ready, with its path."""
+        writer = StreamingHLSWriter(self.temp_dir)
+        ready = []
+        writer.add_listener(lambda event, data: event == "segment_ready" and ready.append(data))
+
+        writer.process_chunk(b"first\n")
+        self.assertTrue(writer.wait_for_segments(1, timeout=5))
+        writer.process_chunk(b"second\n")
+        writer.finalize()
+
+        self.assertEqual(ready, [
+            {"index": 0, "path": os.path.join(self.temp_dir, "segment_000.m4s")},
+            {"index": 1, "path": os.path.join(self.temp_dir, "segment_001.m4s")},
+        ])
+
+    def test_metrics(self):
+        """The writer reports the encoder's progress."""
+        writer = StreamingHLSWriter(self.temp_dir)
+        writer.process_chunk(b"first\n")
+        writer.process_chunk(b"second\n")
+        writer.finalize()
+
+        metrics = writer.metrics()
+        self.assertEqual(metrics["segments_ready"], 2)
+        self.assertEqual(metrics["total_size"], 200)
+        self.assertEqual(metrics["out_time"], 2.0)
+        self.assertEqual(metrics["speed"], 3.0)
+
+    def test_wait_for_segments_returns_after_finalize(self):
+        """Waiting for segments that will never come ends with the writer."""
+        writer = StreamingHLSWriter(self.temp_dir)
+        writer.finalize()
+
+        self.assertFalse(writer.wait_for_segments(1, timeout=5))
+
+    def test_startup_failure(self):
+        """An encoder that rejects its arguments after a moment fails the first write, and is not restarted."""
+        failing = [sys.executable, "-c",
+                   "import sys, time\n"
+                   "time.sleep(0.02)\n"
+                   "sys.stderr.write(\"Unknown encoder 'aac_at'\\n\")\n"
+                   "sys.exit(1)\n"]
+        with patch('talemo.audiostream.hls.ffmpeg_hls_command', return_value=failing) as mock_command:
+            writer = StreamingHLSWriter(self.temp_dir)
+            writer.ffmpeg_process.wait(5)
+            with self.assertRaises(RuntimeError) as cm:
+                writer.process_chunk(b"first\n")
+
+        self.assertIn("Unknown encoder 'aac_at'", str(cm.exception))
+        self.assertEqual(mock_command.call_count, 1)
+
+    def test_crashed_encoder_restarted(self):
+        """An encoder that dies after encoding audio is replaced on the next write."""
+        writer = StreamingHLSWriter(self.temp_dir)
+        writer.process_chunk(b"first\n")
+        self.assertTrue(writer.wait_for_segments(1, timeout=5))
+        first = writer.ffmpeg_process
+        first.kill()
+        first.wait(5)
+
+        writer.process_chunk(b"second\n")
+        writer.finalize()
+
+        self.assertIsNot(writer.ffmpeg_process, first)
+
+    def test_wait_for_segments_timeout(self):
+        """Waiting for a segment times out while no audio is written."""
+        writer = StreamingHLSWriter(self.temp_dir)
+        try:
+            self.assertFalse(writer.wait_for_segments(1, timeout=0.05))
+        finally:
+            writer.finalize()
@@ -25,9 +25,9 @@ class TestAudioStreamingIntegration(TransactionTestCase):
             shutil.rmtree(self.temp_dir)
             
     @patch('talemo.audiostream.tasks.SegmentStore')
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     @patch('talemo.audiostream.views.redis.Redis.from_url')
     def test_complete_audio_generation_flow(self, mock_redis_from_url, mock_speak, 
                                           mock_stream_tokens, mock_writer_class, mock_store_class):
@@ -156,9 +156,9 @@ class TestAudioStreamingIntegration(TransactionTestCase):
         self.assertIn('playlist', response.data)
         
     @patch('talemo.audiostream.tasks.SegmentStore')
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_error_handling_in_pipeline(self, mock_speak, mock_stream_tokens, 
                                        mock_writer_class, mock_store_class):
         """Test error handling throughout the pipeline."""
@@ -243,9 +243,9 @@ class TestAudioStreamingIntegration(TransactionTestCase):
     @patch('talemo.audiostream.pipeline.os.path.join')
     @patch('talemo.audiostream.pipeline.open', create=True)
     @patch('talemo.audiostream.tasks.SegmentStore')
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_text_logging_integration(self, mock_speak, mock_stream_tokens, mock_writer_class,
                                     mock_store_class, mock_open, mock_path_join):
         """Test that text chunks are properly logged during generation."""
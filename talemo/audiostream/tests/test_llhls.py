@@ -0,0 +1,88 @@
+import os
+import tempfile
+import shutil
+import threading
+import time
+from django.test import TestCase
+from talemo.audiostream import llhls
+from talemo.audiostream.llhls import PlaylistState
+from talemo.audiostream.playlist import write_atomic
+
+
+class TestPlaylistState(TestCase):
+    """Test cases for reading what a playlist makes available."""
+
+    PLAYLIST = (
+        "#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:0\n"
+        '#EXT-X-PART:DURATION=0.2,URI="part_00000.m4s"\n'
+        "#EXTINF:1.0,\nsegment_000.m4s\n"
+        '#EXT-X-PART:DURATION=0.2,URI="part_00005.m4s"\n'
+        '#EXT-X-PART:DURATION=0.2,URI="part_00006.m4s"\n'
+    )
+
+    def test_has(self):
+        """Complete segments and the listed parts of the open one are available."""
+        state = PlaylistState(self.PLAYLIST)
+
+        self.assertEqual(state.target_duration, 2)
+        self.assertEqual(state.next_msn, 1)
+        self.assertTrue(state.has(0))
+        self.assertTrue(state.has(1, 1))
+        self.assertFalse(state.has(1, 2))
+        self.assertFalse(state.has(1))
+        self.assertTrue(PlaylistState(self.PLAYLIST + "#EXT-X-ENDLIST\n").has(5))
+
+    def test_skipped_segments_are_counted(self):
+        """The segments of a delta update's EXT-X-SKIP tag keep their numbers."""
+        text = self.PLAYLIST.replace("#EXT-X-MEDIA-SEQUENCE:0\n", "#EXT-X-MEDIA-SEQUENCE:0\n#EXT-X-SKIP:SKIPPED-SEGMENTS=4\n")
+        self.assertEqual(PlaylistState(text).next_msn, 5)
+
+
+class TestWaiting(TestCase):
+    """Test cases for holding requests until the media exists."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "audio.m3u8")
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def write_later(self, path, text, delay=0.1):
+        def write():
+            time.sleep(delay)
+            write_atomic(path, text.encode())
+        thread = threading.Thread(target=write)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_wait_for_playlist_returns_on_update(self):
+        """A held request returns as soon as the part is listed."""
+        write_atomic(self.path, b"#EXTM3U\n")
+        self.write_later(self.path, TestPlaylistState.PLAYLIST)
+
+        started = time.monotonic()
+        text, state = llhls.wait_for_playlist(self.path, 1, 0, timeout=5)
+
+        self.assertTrue(state.has(1, 0))
+        self.assertEqual(text, TestPlaylistState.PLAYLIST)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_wait_for_playlist_timeout(self):
+        """The last version is returned when the part does not come in time."""
+        write_atomic(self.path, TestPlaylistState.PLAYLIST.encode())
+
+        text, state = llhls.wait_for_playlist(self.path, 2, timeout=0.05)
+
+        self.assertFalse(state.has(2))
+        self.assertEqual(text, TestPlaylistState.PLAYLIST)
+
+    def test_wait_for_file(self):
+        """A hinted part is served once it is written."""
+        part = os.path.join(self.temp_dir, "part_00001.m4s")
+        self.assertFalse(llhls.wait_for_file(part, timeout=0.01))
+
+        self.write_later(part, "data")
+        self.assertTrue(llhls.wait_for_file(part, timeout=5))
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+from django.test import TestCase
+from talemo.audiostream.manifest import MANIFEST_NAME, SessionManifest, read_manifest
+from talemo.audiostream.vod import EndedPlaylist, compact_session
+from talemo.audiostream.tests.test_av_writer import make_mp3
+
+try:
+    import av
+    from talemo.audiostream.av_writer import PyAVHLSWriter
+except ImportError:
+    av = None
+
+
+class TestSessionManifest(TestCase):
+    """Test cases for the manifest of a session's HLS output."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_segments_recorded(self):
+        """Each segment is written to the manifest with its duration and size."""
+        manifest = SessionManifest(self.temp_dir)
+        manifest.add_init("", "init.mp4", 700)
+        manifest.add_segment("", "segment_000.m4s", 1.024, 16000)
+        manifest.add_segment("", "segment_001.m4s", 0.512, 8000)
+
+        data = read_manifest(self.temp_dir)
+        self.assertFalse(data["ended"])
+        self.assertEqual(data["renditions"][""]["init"], ["init.mp4", 700])
+        self.assertEqual(data["renditions"][""]["segments"],
+                         [["segment_000.m4s", 1.024, 16000], ["segment_001.m4s", 0.512, 8000]])
+        self.assertAlmostEqual(data["duration"], 1.536)
+        self.assertEqual(data["size"], 24700)
+        self.assertEqual(manifest.segments(), [("segment_000.m4s", 1.024, 16000), ("segment_001.m4s", 0.512, 8000)])
+
+    def test_parts_and_renditions(self):
+        """Parts count towards the size with the next segment; the first rendition gives the duration."""
+        manifest = SessionManifest(self.temp_dir)
+        manifest.add_segment("standard", "segment_000.m4s", 1.0, 16000)
+        manifest.add_part("speech", 2000)
+        manifest.add_part("speech", 2000)
+        self.assertEqual(read_manifest(self.temp_dir)["size"], 16000)
+        manifest.add_segment("speech", "segment_000.m4s", 0.4, 3900)
+        manifest.end()
+
+        data = read_manifest(self.temp_dir)
+        self.assertTrue(data["ended"])
+        self.assertEqual(list(data["renditions"]), ["standard", "speech"])
+        self.assertEqual(data["duration"], 1.0)
+        self.assertEqual(data["size"], 23900)
+        self.assertEqual(manifest.segments("speech"), [("segment_000.m4s", 0.4, 3900)])
+
+    def test_missing_manifest(self):
+        """A session without a manifest has none to read or update."""
+        self.assertIsNone(read_manifest(self.temp_dir))
+        self.assertIsNone(SessionManifest.load(self.temp_dir))
+        with open(os.path.join(self.temp_dir, MANIFEST_NAME), "w") as f:
+            f.write('{"ended": ')
+        self.assertIsNone(read_manifest(self.temp_dir))
+
+    @skipUnless(av, "PyAV is not installed")
+    def test_written_by_the_writer(self):
+        """The writer's manifest lists the playlist's segments, and compaction records the VOD file."""
+        writer = PyAVHLSWriter(self.temp_dir, low_latency=True)
+        writer.process_chunk(make_mp3(3.0))
+        result = writer.finalize()
+        with open(os.path.join(self.temp_dir, "audio.m3u8")) as f:
+            segments = EndedPlaylist(f.read()).segments
+
+        data = read_manifest(self.temp_dir)
+        self.assertTrue(data["ended"])
+        self.assertEqual(result["segment_count"], len(segments))
+        rendition = data["renditions"][""]
+        self.assertEqual([(uri, duration) for uri, duration, _ in rendition["segments"]],
+                         [(uri, round(duration, 6)) for uri, duration in segments])
+        for uri, _, size in rendition["segments"]:
+            self.assertEqual(os.path.getsize(os.path.join(self.temp_dir, uri)), size)
+        self.assertEqual(rendition["init"][1], os.path.getsize(os.path.join(self.temp_dir, rendition["init"][0])))
+
+        compact_session(self.temp_dir)
+
+        rendition = read_manifest(self.temp_dir)["renditions"][""]
+        self.assertEqual(rendition["media"], "audio.mp4")
+        self.assertEqual(rendition["size"], os.path.getsize(os.path.join(self.temp_dir, "audio.mp4")))
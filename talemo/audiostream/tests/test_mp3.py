@@ -0,0 +1,76 @@
+import struct
+from django.test import TestCase
+from talemo.audiostream import mp3
+
+# MPEG-2 Layer III, 32 kbit/s, 24 kHz, mono: 96-byte frames of 24 ms
+MPEG2_HEADER = 0xFFF344C0
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, joint stereo, padded
+MPEG1_HEADER = 0xFFFB9264
+
+
+def mp3_frame(raw=MPEG2_HEADER, fill=b"\x55"):
+    """A frame with the given header and filler as its body."""
+    header = mp3.parse_header(struct.pack(">I", raw))
+    return struct.pack(">I", raw) + fill * (header.length - 4)
+
+
+def id3_tag(size):
+    """An ID3v2 tag with ``size`` bytes of frames."""
+    synchsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + synchsafe + b"\0" * size
+
+
+class TestFrameHeader(TestCase):
+    """Test cases for MP3 frame headers."""
+
+    def test_parse_header(self):
+        """Rate, bitrate, channels and length come from the header fields."""
+        header = mp3.parse_header(struct.pack(">I", MPEG2_HEADER))
+        self.assertEqual((header.sample_rate, header.bitrate, header.channels), (24000, 32, 1))
+        self.assertEqual((header.length, header.samples), (96, 576))
+        self.assertAlmostEqual(header.duration, 0.024)
+
+        header = mp3.parse_header(struct.pack(">I", MPEG1_HEADER))
+        self.assertEqual((header.sample_rate, header.bitrate, header.channels), (44100, 128, 2))
+        self.assertEqual((header.length, header.samples), (418, 1152))
+
+    def test_invalid_headers(self):
+        """Data without sync, other layers and reserved values are not frames."""
+        for raw in (0x12345678, 0xFFFD9264, 0xFFFBF264, 0xFFFB9C64):
+            self.assertIsNone(mp3.parse_header(struct.pack(">I", raw)))
+        self.assertIsNone(mp3.parse_header(b"\xff\xf3"))
+
+    def test_silent_frame(self):
+        """A silent frame keeps the format without CRC, padding or main data."""
+        header = mp3.parse_header(struct.pack(">I", MPEG1_HEADER))
+        frame = mp3.silent_frame(header)
+        silent = mp3.parse_header(frame)
+
+        self.assertEqual(len(frame), 417)
+        self.assertEqual((silent.sample_rate, silent.bitrate, silent.channels), (44100, 128, 2))
+        self.assertEqual(silent.padding, 0)
+        self.assertEqual(frame[4:], bytes(413))
+
+
+class TestFrameReader(TestCase):
+    """Test cases for following the frames of a written stream."""
+
+    def test_frames_counted_across_pieces(self):
+        """Frames split over any number of writes are counted once."""
+        data = id3_tag(300) + b"junk" + mp3_frame() * 10
+        for size in (1, 7, 97, len(data)):
+            reader = mp3.FrameReader()
+            for start in range(0, len(data), size):
+                reader.feed(data[start:start + size])
+            self.assertEqual(reader.frames, 10, size)
+            self.assertAlmostEqual(reader.seconds, 0.24)
+            self.assertEqual(reader.header.sample_rate, 24000)
+
+    def test_info_frame_is_not_audio(self):
+        """The encoder's Xing / Info frame is not counted."""
+        info = bytearray(mp3_frame(fill=b"\0"))
+        info[13:17] = b"Info"
+        reader = mp3.FrameReader()
+        reader.feed(bytes(info) + mp3_frame() * 2)
+
+        self.assertEqual(reader.frames, 2)
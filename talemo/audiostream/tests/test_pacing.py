@@ -0,0 +1,115 @@
+from django.test import TestCase
+from talemo.audiostream.pacing import ChunkSizeController
+
+
+class FakeClock:
+    """A monotonic clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestChunkSizeController(TestCase):
+    """Test cases for the adaptive chunk-size controller."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.clock = FakeClock()
+
+    def make_controller(self, **kwargs):
+        options = dict(initial_words=40, min_words=8, max_words=80,
+                       target_buffer=10.0, max_buffer=60.0, clock=self.clock)
+        options.update(kwargs)
+        return ChunkSizeController(**options)
+
+    def test_size_kept_until_playback_starts(self):
+        """Without any segment in the playlist the initial size is kept."""
+        controller = self.make_controller()
+        controller.record_playlist(0.0)
+        self.assertEqual(controller.update(), 40)
+        self.assertEqual(controller.decision, "startup")
+        self.assertEqual(controller.pause_seconds(), 0.0)
+
+    def test_buffer_follows_wall_clock_playback(self):
+        """Buffered audio is the playlist duration minus the time played since the first segment."""
+        controller = self.make_controller()
+        controller.record_playlist(12.0)
+        self.clock.now += 5.0
+        self.assertEqual(controller.buffered_seconds, 7.0)
+        self.clock.now += 20.0
+        self.assertEqual(controller.buffered_seconds, 0.0)
+
+    def test_grows_when_buffer_is_comfortable(self):
+        """Chunks grow, up to max_words, while the buffer is above the target."""
+        controller = self.make_controller()
+        controller.record_playlist(30.0)
+        self.assertEqual(controller.update(), 60)
+        self.assertEqual(controller.decision, "grow")
+        self.assertEqual(controller.update(), 80)
+
+    def test_shrinks_when_buffer_runs_low(self):
+        """Chunks shrink, down to min_words, when the buffer is below half the target."""
+        controller = self.make_controller()
+        controller.record_playlist(4.0)
+        self.assertEqual(controller.update(), 20)
+        self.assertEqual(controller.decision, "shrink")
+        self.assertEqual(controller.update(), 10)
+        self.assertEqual(controller.update(), 8)
+
+    def test_capped_by_tts_latency(self):
+        """A chunk is never larger than what can be synthesized before the buffer runs out."""
+        controller = self.make_controller()
+        controller.record_synthesis(words=10, seconds=2.0)  # 0.2 s per word
+        controller.record_playlist(30.0)
+        # 30 s buffered, half of it may be spent: 75 words affordable, growth asks for 60
+        self.assertEqual(controller.update(), 60)
+        self.clock.now += 22.0
+        # 8 s buffered: only 20 words can be synthesized in time
+        self.assertEqual(controller.update(), 20)
+        self.assertEqual(controller.decision, "cap")
+
+    def test_latency_moving_average(self):
+        """The latency per word is smoothed across chunks."""
+        controller = self.make_controller()
+        controller.record_synthesis(words=10, seconds=1.0)
+        self.assertAlmostEqual(controller.latency_per_word, 0.1)
+        controller.record_synthesis(words=10, seconds=2.0)
+        self.assertAlmostEqual(controller.latency_per_word, 0.13)
+        controller.record_synthesis(words=0, seconds=5.0)
+        self.assertAlmostEqual(controller.latency_per_word, 0.13)
+
+    def test_pause_when_too_far_ahead(self):
+        """Generation pauses while the buffer exceeds max_buffer."""
+        controller = self.make_controller(max_buffer=20.0)
+        controller.record_playlist(50.0)
+        self.assertEqual(controller.pause_seconds(), 30.0)
+        self.clock.now += 30.0
+        self.assertEqual(controller.pause_seconds(), 0.0)
+
+    def test_fixed_size_when_not_adaptive(self):
+        """With adaptive=False the size never changes but the state is still reported."""
+        controller = self.make_controller(adaptive=False)
+        controller.record_playlist(2.0)
+        self.assertEqual(controller.update(), 40)
+        snapshot = controller.snapshot()
+        self.assertEqual(snapshot["decision"], "fixed")
+        self.assertEqual(snapshot["buffered_seconds"], 2.0)
+
+    def test_deadline_before_playback_is_session_start(self):
+        """A listener still waiting for the first segment is already late."""
+        controller = self.make_controller()
+        self.clock.now += 3.0
+        self.assertEqual(controller.deadline(words_ahead=50), 100.0)
+
+    def test_deadline_from_buffer_and_words_ahead(self):
+        """Playback stalls after the buffered audio and the audio of earlier pending chunks."""
+        controller = self.make_controller()
+        controller.record_written(20)
+        controller.record_playlist(10.0)  # 0.5 s per word
+        self.clock.now += 4.0
+        self.assertEqual(controller.seconds_per_word, 0.5)
+        self.assertEqual(controller.deadline(), 110.0)
+        self.assertEqual(controller.deadline(words_ahead=10), 115.0)
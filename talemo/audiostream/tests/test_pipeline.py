@@ -2,7 +2,7 @@ import os
 import asyncio
 import tempfile
 import shutil
-from unittest.mock import Mock, patch, MagicMock, AsyncMock, mock_open
+from unittest.mock import Mock, patch, MagicMock, AsyncMock, mock_open, ANY
 from django.test import TestCase
 from talemo.audiostream.pipeline import run_audio_session
 
@@ -20,9 +20,9 @@ class TestPipeline(TestCase):
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_run_audio_session_basic(self, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test basic audio session with simple text."""
         # Mock the writer
@@ -61,12 +61,12 @@ class TestPipeline(TestCase):
         mock_speak.assert_called()
         
         # Verify progress callbacks
-        mock_progress.assert_any_call("chunk", {"chunk_count": 1})
+        mock_progress.assert_any_call("chunk", {"chunk_count": 1, "pacing": ANY, "tts_queue": ANY})
         mock_progress.assert_any_call("done", {'chunks': 1, 'segment_count': 1})
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     @patch('builtins.open', new_callable=mock_open)
     def test_run_audio_session_with_logging(self, mock_file, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test that text chunks are logged to file."""
@@ -105,9 +105,9 @@ class TestPipeline(TestCase):
         handle.write.assert_any_call("=== Audio Generation Session ===\n")
         handle.write.assert_any_call("Original prompt: Test prompt\n")
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_run_audio_session_multiple_chunks(self, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test processing multiple text chunks."""
         # Mock the writer
@@ -151,12 +151,12 @@ class TestPipeline(TestCase):
         # Verify the text chunks
         calls = mock_speak.call_args_list
         self.assertEqual(calls[0][0][0], "First sentence.")
-        self.assertEqual(calls[1][0][0], " Second one!")
-        self.assertEqual(calls[2][0][0], " Third?")
+        self.assertEqual(calls[1][0][0], "Second one!")
+        self.assertEqual(calls[2][0][0], "Third?")
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_run_audio_session_ffmpeg_restart(self, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test that FFmpeg process is restarted when it dies."""
         # Mock the writer
@@ -185,9 +185,9 @@ class TestPipeline(TestCase):
         # Should have restarted FFmpeg
         mock_writer._start_ffmpeg_process.assert_called()
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     @patch('talemo.audiostream.pipeline.logger')
     def test_run_audio_session_tts_error_handling(self, mock_logger, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test error handling when TTS fails."""
@@ -216,11 +216,11 @@ class TestPipeline(TestCase):
         )
         
         # Should have logged the error
-        mock_logger.error.assert_any_call("Error in speak_chunk_to_ffmpeg: TTS error")
+        mock_logger.error.assert_any_call("Error synthesizing chunk #1: TTS error")
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_run_audio_session_first_chunk_optimization(self, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test that first chunk is sent early for faster startup."""
         # Mock the writer
@@ -259,7 +259,7 @@ class TestPipeline(TestCase):
         word_count = len(first_chunk.strip().split())
         self.assertEqual(word_count, 10)
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
     @patch('talemo.audiostream.pipeline.logger')
     def test_run_audio_session_llm_error(self, mock_logger, mock_stream_tokens, mock_writer_class):
@@ -285,9 +285,9 @@ class TestPipeline(TestCase):
         # Should have logged the error
         mock_logger.error.assert_any_call("Error in stream_tokens: LLM error")
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     @patch('os.path.exists')
     @patch('talemo.audiostream.pipeline.logger')
     def test_run_audio_session_missing_playlist_warning(self, mock_logger, mock_exists, mock_speak, mock_stream_tokens, mock_writer_class):
@@ -321,9 +321,9 @@ class TestPipeline(TestCase):
             f"Playlist file still not created after finalize: {self.playlist_path}, which is unexpected with FFmpeg temp_file flag"
         )
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     def test_run_audio_session_word_based_chunking(self, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test word-based chunking when no punctuation."""
         # Mock the writer
@@ -353,9 +353,9 @@ class TestPipeline(TestCase):
         # Should have created multiple chunks
         self.assertGreaterEqual(mock_speak.call_count, 1)
 
-    @patch('talemo.audiostream.pipeline.StreamingHLSWriter')
+    @patch('talemo.audiostream.pipeline.create_writer')
     @patch('talemo.audiostream.pipeline.llm.stream_tokens')
-    @patch('talemo.audiostream.pipeline.tts.speak_chunk_to_ffmpeg')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
     @patch('talemo.audiostream.pipeline.logger')
     def test_run_audio_session_finalize_error(self, mock_logger, mock_speak, mock_stream_tokens, mock_writer_class):
         """Test error handling during finalization."""
@@ -384,4 +384,317 @@ class TestPipeline(TestCase):
         mock_logger.error.assert_any_call("Error finalizing HLS playlist: Finalize error")
         
         # Should still return None (no result)
-        self.assertIsNone(result)
\ No newline at end of file
+        self.assertIsNone(result)
+
+class TestPipelineConcurrency(TestCase):
+    """Test cases for the staged (reader / TTS / writer) pipeline."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.playlist_path = os.path.join(self.temp_dir, 'audio.m3u8')
+
+    def tearDown(self):
+        """Clean up after tests."""
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def _mock_writer(self):
+        mock_writer = Mock()
+        mock_writer.ffmpeg_process = Mock()
+        mock_writer.ffmpeg_process.poll.return_value = None
+        mock_writer.ffmpeg_stdin = Mock()
+        mock_writer.ffmpeg_stdin.closed = False
+        mock_writer.finalize.return_value = {'segment_count': 3}
+        # Consume each streamed chunk the way StreamingHLSWriter does
+        self.written = []
+        mock_writer.process_stream.side_effect = lambda frames: self.written.append(b"".join(frames))
+        return mock_writer
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_chunks_written_in_order_when_synthesis_finishes_out_of_order(
+            self, mock_stream, mock_stream_tokens, mock_writer_class):
+        """A slow first chunk must not let later chunks overtake it."""
+        import threading
+        import time
+
+        mock_writer = self._mock_writer()
+        mock_writer_class.return_value = mock_writer
+
+        in_flight = 0
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def stream(text, lang, *args):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            # The first chunk is the slowest one
+            time.sleep(0.2 if text.startswith("One") else 0.05)
+            with lock:
+                in_flight -= 1
+            yield text.encode()
+
+        mock_stream.side_effect = stream
+
+        async def mock_token_generator():
+            for token in ["One.", " Two.", " Three."]:
+                yield token
+
+        mock_stream_tokens.return_value = mock_token_generator()
+
+        run_audio_session(
+            prompt="Test",
+            playlist_path=self.playlist_path,
+            tts_workers=3,
+            prefetch_chunks=3,
+        )
+
+        written = self.written
+        self.assertEqual(written, [b"One.", b"Two.", b"Three."])
+        # Chunks were synthesized concurrently rather than one after another
+        self.assertGreater(max_in_flight, 1)
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream')
+    def test_end_of_each_chunk_is_flushed(self, mock_stream, mock_stream_tokens, mock_writer_class):
+        """The writer is told when a chunk's audio is complete, before the next one."""
+        mock_writer = self._mock_writer()
+        mock_writer_class.return_value = mock_writer
+        mock_writer.end_chunk.side_effect = lambda: self.written.append("end")
+        mock_stream.side_effect = lambda text, lang, *args: iter([text.encode()])
+
+        async def mock_token_generator():
+            for token in ["One.", " Two."]:
+                yield token
+
+        mock_stream_tokens.return_value = mock_token_generator()
+
+        run_audio_session(prompt="Test", playlist_path=self.playlist_path)
+
+        self.assertEqual(self.written, [b"One.", "end", b"Two.", "end"])
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_session_jobs_in_pool_are_bounded(self, mock_stream, mock_stream_tokens, mock_writer_class):
+        """The reader waits while the session has tts_workers jobs in the shared pool."""
+        import threading
+        import time
+
+        mock_writer = self._mock_writer()
+        mock_writer_class.return_value = mock_writer
+
+        in_flight = 0
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def stream(text, lang, *args):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight -= 1
+            yield text.encode()
+
+        mock_stream.side_effect = stream
+
+        async def mock_token_generator():
+            for token in ["One.", " Two.", " Three.", " Four."]:
+                yield token
+
+        mock_stream_tokens.return_value = mock_token_generator()
+
+        run_audio_session(
+            prompt="Test",
+            playlist_path=self.playlist_path,
+            tts_workers=2,
+            prefetch_chunks=4,
+        )
+
+        self.assertEqual(self.written, [b"One.", b"Two.", b"Three.", b"Four."])
+        self.assertLessEqual(max_in_flight, 2)
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_failed_chunk_is_skipped(self, mock_stream, mock_stream_tokens, mock_writer_class):
+        """A chunk whose synthesis fails is skipped, the others are still written."""
+        mock_writer = self._mock_writer()
+        mock_writer_class.return_value = mock_writer
+
+        def stream(text, lang, *args):
+            if text.startswith("Two"):
+                raise Exception("TTS error")
+            yield text.encode()
+
+        mock_stream.side_effect = stream
+
+        async def mock_token_generator():
+            for token in ["One.", " Two.", " Three."]:
+                yield token
+
+        mock_stream_tokens.return_value = mock_token_generator()
+        mock_progress = Mock()
+
+        run_audio_session(
+            prompt="Test",
+            playlist_path=self.playlist_path,
+            progress_cb=mock_progress,
+        )
+
+        written = self.written
+        self.assertEqual(written, [b"One.", b"Three."])
+        mock_progress.assert_any_call("chunk", {"chunk_count": 3, "pacing": ANY, "tts_queue": ANY})
+        mock_writer.finalize.assert_called_once()
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream')
+    def test_first_audio_written_before_chunk_is_synthesized(
+            self, mock_stream, mock_stream_tokens, mock_writer_class):
+        """MP3 data reaches the writer while the chunk is still being synthesized."""
+        import threading
+
+        mock_writer = self._mock_writer()
+        mock_writer_class.return_value = mock_writer
+        first_frame_written = threading.Event()
+        seen_before_end = []
+
+        def process_stream(frames):
+            for frame in frames:
+                first_frame_written.set()
+                seen_before_end.append(frame)
+
+        mock_writer.process_stream.side_effect = process_stream
+
+        def stream(text, lang, *args):
+            yield b"frame-1"
+            # The rest of the chunk is only produced once the first frame was written
+            self.assertTrue(first_frame_written.wait(timeout=5))
+            yield b"frame-2"
+
+        mock_stream.side_effect = stream
+
+        async def mock_token_generator():
+            yield "Hello."
+
+        mock_stream_tokens.return_value = mock_token_generator()
+
+        run_audio_session(prompt="Test", playlist_path=self.playlist_path)
+
+        self.assertEqual(seen_before_end, [b"frame-1", b"frame-2"])
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_chunk_progress_reports_pacing(self, mock_stream, mock_stream_tokens, mock_writer_class):
+        """The chunk-size controller state is part of the chunk progress metadata."""
+        mock_writer = self._mock_writer()
+        mock_writer_class.return_value = mock_writer
+
+        # The playlist already lists 30 seconds of audio: the buffer is comfortable
+        with open(self.playlist_path, 'w') as f:
+            f.write("#EXTM3U\n#EXTINF:15.0,\nsegment_000.m4s\n#EXTINF:15.0,\nsegment_001.m4s\n")
+
+        async def mock_token_generator():
+            for token in ["One two three.", " Four five."]:
+                yield token
+
+        mock_stream_tokens.return_value = mock_token_generator()
+        mock_progress = Mock()
+
+        run_audio_session(
+            prompt="Test",
+            playlist_path=self.playlist_path,
+            chunk_words=20,
+            progress_cb=mock_progress,
+        )
+
+        chunk_events = [c.args[1] for c in mock_progress.call_args_list if c.args[0] == "chunk"]
+        self.assertEqual(len(chunk_events), 2)
+        pacing = chunk_events[0]["pacing"]
+        self.assertEqual(pacing["audio_seconds"], 30.0)
+        self.assertEqual(pacing["decision"], "grow")
+        self.assertEqual(pacing["chunk_words"], 30)
+        self.assertIsNotNone(pacing["latency_per_word"])
+
+
+class TestPipelineWriterOwnership(TestCase):
+    """Test cases for the single HLS writer of a session."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.playlist_path = os.path.join(self.temp_dir, 'audio.m3u8')
+        self.writer = Mock()
+        self.writer.ffmpeg_process.poll.return_value = None
+        self.writer.ffmpeg_stdin.closed = False
+        self.writer.finalize.return_value = {'segment_count': 1}
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def _tokens(self, mock_stream_tokens, *tokens):
+        async def mock_token_generator():
+            for token in tokens:
+                yield token
+        mock_stream_tokens.return_value = mock_token_generator()
+
+    @patch('talemo.audiostream.pipeline.create_writer')
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_injected_writer_is_the_only_writer(self, mock_stream, mock_stream_tokens, mock_create_writer):
+        """A started writer is used as is and finalized by the session."""
+        self._tokens(mock_stream_tokens, "Hello.")
+
+        info = run_audio_session(prompt="Test", playlist_path=self.playlist_path, writer=self.writer)
+
+        mock_create_writer.assert_not_called()
+        self.writer.process_stream.assert_called_once()
+        self.writer.finalize.assert_called_once()
+        self.assertEqual(info, {'segment_count': 1})
+
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_writer_factory(self, mock_stream, mock_stream_tokens):
+        """A writer factory is called once with the output directory."""
+        self._tokens(mock_stream_tokens, "Hello.")
+        factory = Mock(return_value=self.writer)
+
+        run_audio_session(prompt="Test", playlist_path=self.playlist_path, writer_factory=factory)
+
+        factory.assert_called_once_with(self.temp_dir)
+        self.writer.finalize.assert_called_once()
+
+    def test_writer_and_factory_are_exclusive(self):
+        """Passing both a writer and a factory is an error."""
+        with self.assertRaises(ValueError):
+            run_audio_session(prompt="Test", playlist_path=self.playlist_path,
+                              writer=self.writer, writer_factory=Mock())
+        self.writer.finalize.assert_not_called()
+
+    @patch('talemo.audiostream.pipeline.llm.stream_tokens')
+    @patch('talemo.audiostream.pipeline.tts.stream', return_value=[b'mp3 data'])
+    def test_writer_finalized_when_session_is_aborted(self, mock_stream, mock_stream_tokens):
+        """The stream is ended even if the session is aborted (e.g. cancelled)."""
+        class Abort(BaseException):
+            pass
+
+        async def mock_token_generator():
+            yield "Hello."
+            raise Abort()
+
+        mock_stream_tokens.return_value = mock_token_generator()
+
+        with self.assertRaises(Abort):
+            run_audio_session(prompt="Test", playlist_path=self.playlist_path, writer=self.writer)
+
+        self.writer.finalize.assert_called_once()
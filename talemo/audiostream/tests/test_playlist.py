@@ -0,0 +1,365 @@
+import os
+import tempfile
+import shutil
+import threading
+import time
+from unittest.mock import patch
+from django.test import TestCase
+from talemo.audiostream import playlist
+from talemo.audiostream.llhls import PlaylistState
+from talemo.audiostream.playlist import MediaPlaylist, SegmentPackager
+from talemo.audiostream.tests.test_fmp4 import make_fragment, make_init
+from talemo.audiostream.tests.test_mp3 import mp3_frame
+from talemo.audiostream.tests.test_ts import make_segment
+
+# 5 AAC frames at 24 kHz
+PART_SECONDS = 5 * 1024 / 24000
+
+
+class TestMediaPlaylist(TestCase):
+    """Test cases for the in-memory playlist model."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "audio.m3u8")
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def read_playlist(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_segments_rendered_atomically(self):
+        """Every change replaces the playlist file with the rendered text."""
+        model = MediaPlaylist(self.path)
+        model.add_segment("segment_000.m4s", 1.024)
+        model.add_segment("segment_001.m4s", 0.98)
+
+        text = self.read_playlist()
+        self.assertEqual(text, model.render())
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        self.assertIn("#EXTINF:1.024000,\nsegment_000.m4s\n", text)
+        self.assertIn('#EXT-X-MAP:URI="init.mp4"', text)
+        self.assertNotIn("SERVER-CONTROL", text)
+        self.assertAlmostEqual(model.duration, 2.004)
+
+        model.end()
+        self.assertTrue(self.read_playlist().endswith("segment_001.m4s\n#EXT-X-ENDLIST\n"))
+
+    def test_program_date_time(self):
+        """Segments are dated back to back from the first one."""
+        model = MediaPlaylist(self.path)
+        model.add_segment("segment_000.m4s", 1.5)
+        model.add_segment("segment_001.m4s", 1.0)
+
+        first, second = model.segments
+        self.assertEqual((second.program_date_time - first.program_date_time).total_seconds(), 1.5)
+        self.assertEqual(self.read_playlist().count("#EXT-X-PROGRAM-DATE-TIME:"), 2)
+        self.assertIn(f"#EXT-X-PROGRAM-DATE-TIME:{first.program_date_time:%Y-%m-%dT%H:%M:%S}", self.read_playlist())
+
+    def test_render_is_cached_per_version(self):
+        """The text is rendered once per change."""
+        model = MediaPlaylist(self.path)
+        model.add_segment("segment_000.m4s", 1.0)
+        version = model.version
+
+        self.assertIs(model.render(), model.render())
+        model.add_segment("segment_001.m4s", 1.0)
+        self.assertEqual(model.version, version + 1)
+        self.assertIn("segment_001.m4s", model.render())
+
+    def test_delta_update(self):
+        """A delta update replaces the segments older than CAN-SKIP-UNTIL."""
+        model = MediaPlaylist(self.path, low_latency=True, part_target=0.264)
+        for index in range(10):
+            model.add_segment(f"segment_{index:03d}.m4s", 1.0)
+
+        full = model.render()
+        delta = model.render(skip=True)
+        self.assertIn("CAN-SKIP-UNTIL=6.0", full)
+        self.assertIn("#EXT-X-SKIP:SKIPPED-SEGMENTS=4\n", delta)
+        self.assertNotIn("segment_003.m4s", delta)
+        self.assertIn("segment_004.m4s", delta)
+        self.assertEqual(PlaylistState(delta).next_msn, PlaylistState(full).next_msn)
+        self.assertLess(len(delta), len(full))
+
+    def test_no_delta_without_server_control(self):
+        """Playlists that do not advertise delta updates are always full."""
+        model = MediaPlaylist(self.path)
+        for index in range(10):
+            model.add_segment(f"segment_{index:03d}.m4s", 1.0)
+
+        self.assertEqual(model.render(skip=True), model.render())
+
+    def test_wait(self):
+        """A reader waiting for a segment is woken up when it is added."""
+        model = MediaPlaylist(self.path)
+
+        def add_later():
+            time.sleep(0.1)
+            model.add_segment("segment_000.m4s", 1.0)
+        thread = threading.Thread(target=add_later)
+        thread.start()
+        self.addCleanup(thread.join)
+
+        self.assertFalse(model.wait(0, timeout=0.01))
+        self.assertTrue(model.wait(0, timeout=5))
+        self.assertFalse(model.has(1, 0))
+
+    def test_readers_not_held_by_a_slow_publication(self):
+        """A change is published outside the lock, so readers see it while a backend stores it."""
+        model = MediaPlaylist(self.path)
+        entered, release = threading.Event(), threading.Event()
+        published = []
+
+        def slow_put(text):
+            entered.set()
+            release.wait(5)
+            published.append(text)
+        model.on_change = slow_put
+        thread = threading.Thread(target=model.add_segment, args=("segment_000.m4s", 1.0))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        self.assertTrue(entered.wait(5))
+
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append(model.wait(0, timeout=1) and model.render()))
+        reader.start()
+        reader.join(2)
+        self.assertEqual(len(seen), 1)
+        self.assertIn("segment_000.m4s", seen[0])
+        self.assertEqual(published, [])
+        release.set()
+        thread.join(5)
+        self.assertEqual(published, [model.render()])
+
+    def test_readers_not_held_by_a_slow_write(self):
+        """The file is written outside the lock, so readers see a change while the disk is slow."""
+        model = MediaPlaylist(self.path)
+        entered, release = threading.Event(), threading.Event()
+        write_atomic = playlist.write_atomic
+
+        def slow_write(path, data):
+            entered.set()
+            release.wait(5)
+            write_atomic(path, data)
+        with patch('talemo.audiostream.playlist.write_atomic', slow_write):
+            thread = threading.Thread(target=model.add_segment, args=("segment_000.m4s", 1.0))
+            thread.start()
+            self.addCleanup(thread.join)
+            self.addCleanup(release.set)
+            self.assertTrue(entered.wait(5))
+
+            seen = []
+            reader = threading.Thread(target=lambda: seen.append(model.wait(0, timeout=1) and model.render()))
+            reader.start()
+            reader.join(2)
+            self.assertEqual(len(seen), 1)
+            self.assertIn("segment_000.m4s", seen[0])
+            release.set()
+            thread.join(5)
+        self.assertEqual(self.read_playlist(), model.render())
+
+    def test_writes_coalesced(self):
+        """The changes of a write interval are written together at its end, and the end at once."""
+        model = MediaPlaylist(self.path, write_interval=0.2)
+        with patch('talemo.audiostream.playlist.write_atomic', side_effect=playlist.write_atomic) as mock_write:
+            for index in range(5):
+                model.add_segment(f"segment_{index:03d}.m4s", 1.0)
+            self.assertEqual(mock_write.call_count, 1)
+            self.assertNotIn("segment_001.m4s", self.read_playlist())
+
+            deadline = time.monotonic() + 5
+            while mock_write.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.read_playlist(), model.render())
+
+            model.add_segment("segment_005.m4s", 1.0)
+            model.end()
+            self.assertEqual(mock_write.call_count, 3)
+        self.assertTrue(self.read_playlist().endswith("#EXT-X-ENDLIST\n"))
+        self.assertIn("segment_005.m4s", self.read_playlist())
+
+    def test_overtaken_versions_not_published(self):
+        """A change published with a newer one is not handed over again."""
+        model = MediaPlaylist(self.path)
+        published = []
+        model.on_change = published.append
+
+        with model._cond:
+            model._changed()
+            model.ended = True
+            model._changed()
+        model._publish()
+        model._publish()
+
+        self.assertEqual(len(published), 1)
+        self.assertIn("#EXT-X-ENDLIST", published[0])
+
+
+class TestSegmentPackager(TestCase):
+    """Test cases for publishing the muxer's files in the playlist."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.temp_dir, "init.mp4"), "wb") as f:
+            f.write(make_init(24000))
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def add_files(self, packager, pattern, count, start=0, samples=5):
+        for index in range(start, start + count):
+            path = os.path.join(self.temp_dir, pattern % index)
+            with open(path, "wb") as f:
+                f.write(make_fragment(samples))
+            packager.add(path, index)
+
+    def read_playlist(self):
+        with open(os.path.join(self.temp_dir, "audio.m3u8")) as f:
+            return f.read()
+
+    def test_segments(self):
+        """Outside low-latency mode each muxer file is a segment."""
+        packager = SegmentPackager(self.temp_dir)
+        self.add_files(packager, "segment_%03d.m4s", 2, samples=24)
+        text = self.read_playlist()
+
+        self.assertIn(f"#EXTINF:{24 * 1024 / 24000:.6f},\nsegment_001.m4s", text)
+        self.assertNotIn("#EXT-X-PART", text)
+        self.assertNotIn("PRELOAD-HINT", text)
+
+        packager.finish()
+        self.assertTrue(PlaylistState(self.read_playlist()).ended)
+
+    def test_master_playlist(self):
+        """The master playlist declares the codecs with the first media file."""
+        packager = SegmentPackager(self.temp_dir, codecs="mp4a.40.2", bandwidth=35200)
+        master = os.path.join(self.temp_dir, "master.m3u8")
+        self.assertFalse(os.path.exists(master))
+
+        self.add_files(packager, "segment_%03d.m4s", 1)
+        with open(master) as f:
+            self.assertEqual(f.read(), (
+                "#EXTM3U\n#EXT-X-INDEPENDENT-SEGMENTS\n"
+                '#EXT-X-STREAM-INF:BANDWIDTH=35200,CODECS="mp4a.40.2"\naudio.m3u8\n'
+            ))
+
+    def test_master_playlist_measured_bandwidth(self):
+        """Without a nominal bandwidth, the bit rate of the first file is declared."""
+        packager = SegmentPackager(self.temp_dir, codecs="mp4a.40.34")
+        self.add_files(packager, "segment_%03d.m4s", 1)
+        size = os.path.getsize(os.path.join(self.temp_dir, "segment_000.m4s"))
+
+        with open(os.path.join(self.temp_dir, "master.m3u8")) as f:
+            bandwidth = int(f.read().split("BANDWIDTH=")[1].split(",")[0])
+        self.assertGreaterEqual(bandwidth, size * 8 / PART_SECONDS)
+        self.assertEqual(bandwidth % 1000, 0)
+
+    def test_registered_while_live(self):
+        """In-process readers find the playlist until it ends."""
+        packager = SegmentPackager(self.temp_dir)
+        path = os.path.join(self.temp_dir, "audio.m3u8")
+
+        self.assertIs(playlist.get_live(path), packager.playlist)
+        packager.finish()
+        self.assertIsNone(playlist.get_live(path))
+
+    def test_parts_listed_with_preload_hint(self):
+        """Each part is published at once, followed by a hint for the next one."""
+        packager = SegmentPackager(self.temp_dir, low_latency=True, part_duration=0.2)
+        self.add_files(packager, "part_%05d.m4s", 2)
+        text = self.read_playlist()
+
+        self.assertIn("#EXT-X-PART-INF:PART-TARGET=0.264", text)
+        self.assertIn("CAN-BLOCK-RELOAD=YES", text)
+        self.assertIn(f'#EXT-X-PART:DURATION={PART_SECONDS:.6f},URI="part_00001.m4s",INDEPENDENT=YES', text)
+        self.assertTrue(text.endswith('#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part_00002.m4s"\n'))
+        self.assertNotIn("#EXTINF", text)
+
+    def test_parts_grouped_into_segments(self):
+        """A segment is cut once its parts reach the segment duration."""
+        packager = SegmentPackager(self.temp_dir, low_latency=True)
+        self.add_files(packager, "part_%05d.m4s", 6)
+
+        state = PlaylistState(self.read_playlist())
+        self.assertEqual((state.segments, state.parts), (1, 1))
+        self.assertIn(f"#EXTINF:{5 * PART_SECONDS:.6f},\nsegment_000.m4s", self.read_playlist())
+
+        # The segment holds the parts' moof/mdat pairs, with the first styp only
+        with open(os.path.join(self.temp_dir, "segment_000.m4s"), "rb") as f:
+            data = f.read()
+        self.assertEqual(data.count(b"moof"), 5)
+        self.assertEqual(data.count(b"styp"), 1)
+        self.assertNotIn(b"sidx", data)
+
+    def test_parts_of_old_segments_are_dropped(self):
+        """Only the newest segments keep their parts in the playlist."""
+        packager = SegmentPackager(self.temp_dir, low_latency=True)
+        self.add_files(packager, "part_%05d.m4s", 25)
+        text = self.read_playlist()
+
+        self.assertEqual(PlaylistState(text).segments, 5)
+        self.assertNotIn('"part_00009.m4s"', text)
+        self.assertIn('"part_00010.m4s"', text)
+
+    def test_finish(self):
+        """Finishing closes the last segment and ends the playlist."""
+        packager = SegmentPackager(self.temp_dir, low_latency=True)
+        self.add_files(packager, "part_%05d.m4s", 7)
+        packager.finish()
+        text = self.read_playlist()
+
+        state = PlaylistState(text)
+        self.assertTrue(state.ended)
+        self.assertEqual(state.segments, 2)
+        self.assertNotIn("PRELOAD-HINT", text)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "segment_001.m4s")))
+
+    def test_published_to_backend(self):
+        """Media files are handed over before the playlist version listing them."""
+        published = []
+        packager = SegmentPackager(self.temp_dir, low_latency=True, codecs="mp4a.40.2")
+        packager.publish_to(lambda name, data: published.append((name, data)))
+        self.add_files(packager, "part_%05d.m4s", 6)
+        packager.finish()
+
+        names = [name for name, _ in published]
+        self.assertEqual(names[:4], ["init.mp4", "master.m3u8", "part_00000.m4s", "audio.m3u8"])
+        self.assertLess(names.index("segment_000.m4s"), names.index("part_00005.m4s"))
+        self.assertEqual(published[-1], ("audio.m3u8", self.read_playlist().encode()))
+        with open(os.path.join(self.temp_dir, "segment_000.m4s"), "rb") as f:
+            self.assertIn(("segment_000.m4s", f.read()), published)
+
+    def test_publishing_failure(self):
+        """A failing backend does not stop the packaging."""
+        packager = SegmentPackager(self.temp_dir)
+        packager.publish_to(lambda name, data: 1 / 0)
+        self.add_files(packager, "segment_%03d.m4s", 2)
+
+        self.assertEqual(PlaylistState(self.read_playlist()).segments, 2)
+
+    def test_transport_stream_parts(self):
+        """MPEG-TS parts are timed from their MP3 frames and concatenated into segments."""
+        packager = SegmentPackager(self.temp_dir, low_latency=True, segment_type="mpegts")
+        # 0.24s parts of 24 ms frames
+        parts = [make_segment([mp3_frame()] * 10) for _ in range(5)]
+        for index, data in enumerate(parts):
+            path = os.path.join(self.temp_dir, f"part_{index:05d}.ts")
+            with open(path, "wb") as f:
+                f.write(data)
+            packager.add(path, index)
+        text = self.read_playlist()
+
+        self.assertNotIn("#EXT-X-MAP", text)
+        self.assertIn('#EXT-X-PART:DURATION=0.240000,URI="part_00004.ts",INDEPENDENT=YES', text)
+        self.assertIn(f"#EXTINF:{5 * 0.24:.6f},\nsegment_000.ts", text)
+        self.assertTrue(text.endswith('#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part_00005.ts"\n'))
+        with open(os.path.join(self.temp_dir, "segment_000.ts"), "rb") as f:
+            self.assertEqual(f.read(), b"".join(parts))
@@ -0,0 +1,52 @@
+from django.test import TestCase, override_settings
+from talemo.audiostream.profiles import PROFILES, get_ladder, get_profile
+
+
+class TestEncodingProfiles(TestCase):
+    """Test cases for the encoding profiles of the HLS output."""
+
+    def test_ffmpeg_args(self):
+        """A profile sets the encoder, bit rate, format and encoder options."""
+        self.assertEqual(get_profile("standard").ffmpeg_args(), ["-c:a", "aac", "-b:a", "128000"])
+        self.assertEqual(
+            get_profile("speech-he").ffmpeg_args(),
+            ["-c:a", "libfdk_aac", "-b:a", "32000", "-ar", "24000", "-ac", "1", "-profile", "aac_he"],
+        )
+
+    def test_ffmpeg_args_per_stream(self):
+        """The options of a ladder rendition apply to its output stream only."""
+        self.assertEqual(
+            get_profile("speech-opus").ffmpeg_args(stream=1),
+            ["-c:a:1", "libopus", "-b:a:1", "24000", "-ar:a:1", "48000", "-ac:a:1", "1",
+             "-application:a:1", "voip"],
+        )
+
+    def test_speech_profiles_are_smaller(self):
+        """The speech profiles need a fraction of the standard bandwidth."""
+        standard = get_profile("standard").bandwidth
+        for name in ("speech", "speech-he", "speech-opus"):
+            self.assertLessEqual(PROFILES[name].bandwidth * 4, standard, name)
+            self.assertEqual(PROFILES[name].channels, 1)
+
+    def test_encoder_delay(self):
+        """The encoder delay is counted at the output sample rate."""
+        self.assertAlmostEqual(get_profile("standard").encoder_delay(16000), 0.064)
+        self.assertAlmostEqual(get_profile("speech").encoder_delay(16000), 1024 / 24000)
+        self.assertAlmostEqual(get_profile("speech-opus").encoder_delay(24000), 0.0065)
+
+    def test_default_profile(self):
+        """HLS_ENCODING_PROFILE is the default, unknown names are rejected."""
+        with override_settings(HLS_ENCODING_PROFILE="speech"):
+            self.assertIs(get_profile(), PROFILES["speech"])
+        with self.assertRaisesRegex(ValueError, "Unknown HLS encoding profile"):
+            get_profile("flac")
+
+    def test_ladder(self):
+        """HLS_ABR_LADDER lists the renditions, unless the session chooses a profile."""
+        self.assertEqual(get_ladder(), (PROFILES["standard"],))
+        with override_settings(HLS_ABR_LADDER="standard, speech"):
+            self.assertEqual(get_ladder(), (PROFILES["standard"], PROFILES["speech"]))
+            self.assertEqual(get_ladder("speech-opus"), (PROFILES["speech-opus"],))
+        with override_settings(HLS_ABR_LADDER="speech,speech"):
+            with self.assertRaisesRegex(ValueError, "listed twice"):
+                get_ladder()
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from datetime import timedelta
+from unittest.mock import Mock, patch
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from talemo.audiostream import retention
+from talemo.audiostream.manifest import SessionManifest
+from talemo.audiostream.models import AudioSession
+from talemo.audiostream.storage import SegmentStore
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+@override_settings(HLS_GC_MAX_AGE=7 * 24 * 3600, HLS_GC_ERROR_MAX_AGE=24 * 3600, HLS_GC_TENANT_QUOTA=0,
+                   HLS_GC_HIGH_WATERMARK=0.9, HLS_GC_LOW_WATERMARK=0.8)
+class TestStorageSweep(TestCase):
+    """Test cases for the garbage collection of the sessions' HLS output."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        with override_settings(HLS_ROOT=self.temp_dir, HLS_LIVE_BACKEND="", HLS_OBJECT_STORAGE=False):
+            self.store = SegmentStore()
+        self.now = timezone.now()
+        disk_patcher = patch('talemo.audiostream.retention.shutil.disk_usage',
+                             return_value=DiskUsage(total=10000, used=100, free=9900))
+        self.mock_disk_usage = disk_patcher.start()
+        self.addCleanup(disk_patcher.stop)
+
+    def make_session(self, session_id, size=100, status="ready", finished_hours=1, accessed_hours=None,
+                     created_hours=2, tenant="talemo.example"):
+        sid, path, _ = self.store.create(session_id)
+        with open(os.path.join(path, "audio.mp4"), "wb") as f:
+            f.write(b"x" * size)
+        AudioSession.objects.create(session_id=sid, status=status, tenant=tenant)
+        hours = lambda n: self.now - timedelta(hours=n) if n is not None else None  # noqa: E731
+        AudioSession.objects.filter(session_id=sid).update(
+            created_at=hours(created_hours), finished_at=hours(finished_hours),
+            last_accessed_at=hours(accessed_hours))
+        return sid
+
+    def exists(self, session_id):
+        return os.path.isdir(self.store.session_path(session_id))
+
+    def test_age(self):
+        """Sessions unused for too long are deleted, sessions being generated are kept."""
+        old = self.make_session("old", finished_hours=200, created_hours=201)
+        replayed = self.make_session("replayed", finished_hours=200, accessed_hours=1, created_hours=201)
+        failed = self.make_session("failed", status="error", finished_hours=30, created_hours=31)
+        running = self.make_session("running", status="running", finished_hours=None, created_hours=1)
+        stuck = self.make_session("stuck", status="running", finished_hours=None, created_hours=30)
+
+        report = retention.sweep(self.store, self.now)
+
+        self.assertEqual(report["sessions"]["age"], 3)
+        self.assertEqual(report["bytes"]["age"], 300)
+        for sid in (old, failed, stuck):
+            self.assertFalse(self.exists(sid))
+            self.assertEqual(AudioSession.objects.get(session_id=sid).status, "expired")
+        self.assertTrue(self.exists(replayed))
+        self.assertTrue(self.exists(running))
+        # Evicted sessions are not swept again
+        self.assertEqual(retention.sweep(self.store, self.now)["sessions_evicted"], 0)
+
+    def test_evicted_sessions_not_scanned(self):
+        """Only the sessions whose output can be on local disk are looked up."""
+        old = self.make_session("old", finished_hours=200, created_hours=201)
+        self.make_session("moved", status="archived", finished_hours=200, created_hours=201)
+        self.make_session("deleted", status="expired", finished_hours=200, created_hours=201)
+
+        with patch.object(self.store, 'session_path', wraps=self.store.session_path) as mock_session_path:
+            report = retention.sweep(self.store, self.now)
+
+        self.assertEqual(report["sessions"]["age"], 1)
+        self.assertFalse(self.exists(old))
+        self.assertTrue(self.exists("moved"))
+        self.assertEqual({call.args[0] for call in mock_session_path.call_args_list}, {old})
+
+    @override_settings(HLS_GC_TENANT_QUOTA=250)
+    def test_tenant_quota(self):
+        """A tenant over its quota loses its least recently used sessions."""
+        for index, hours in enumerate((3, 1, 5)):
+            self.make_session(f"a{index}", accessed_hours=hours)
+        self.make_session("b0", tenant="other.example", size=200)
+
+        report = retention.sweep(self.store, self.now)
+
+        self.assertEqual(report["sessions"]["quota"], 1)
+        self.assertFalse(self.exists("a2"))
+        self.assertTrue(all(self.exists(sid) for sid in ("a0", "a1", "b0")))
+
+    @override_settings(HLS_GC_TENANT_QUOTA=250)
+    def test_size_from_manifest(self):
+        """The size of a session with a manifest is read from it, without walking its directory."""
+        sid = self.make_session("indexed", size=100)
+        manifest = SessionManifest(self.store.session_path(sid))
+        manifest.add_segment("", "segment_000.m4s", 1.0, 300)
+        manifest.end()
+
+        with patch('talemo.audiostream.retention.directory_size') as mock_directory_size:
+            report = retention.sweep(self.store, self.now)
+
+        mock_directory_size.assert_not_called()
+        self.assertEqual(report["bytes"]["quota"], 300)
+        self.assertFalse(self.exists(sid))
+
+    def test_watermarks(self):
+        """Above the high watermark, sessions are evicted by last access until under the low one."""
+        for index, hours in enumerate((4, 2, 6, 1)):
+            self.make_session(f"s{index}", size=1000, accessed_hours=hours)
+        self.mock_disk_usage.return_value = DiskUsage(total=10000, used=9500, free=500)
+
+        report = retention.sweep(self.store, self.now)
+
+        self.assertEqual(report["sessions"]["watermark"], 2)
+        self.assertEqual(report["bytes_reclaimed"], 2000)
+        self.assertAlmostEqual(report["disk_usage"], 0.75)
+        self.assertEqual([self.exists(f"s{index}") for index in range(4)], [False, True, False, True])
+
+    def test_watermarks_without_accesses(self):
+        """Sessions never served by the application are evicted in the order they finished."""
+        for index, hours in enumerate((4, 2, 6, 1)):
+            self.make_session(f"s{index}", size=1000, finished_hours=hours, created_hours=hours + 1)
+        self.mock_disk_usage.return_value = DiskUsage(total=10000, used=9500, free=500)
+
+        retention.sweep(self.store, self.now)
+
+        self.assertEqual([self.exists(f"s{index}") for index in range(4)], [False, True, False, True])
+
+    def test_below_high_watermark(self):
+        """Nothing is evicted for space under the high watermark."""
+        self.make_session("s0", size=1000)
+        self.mock_disk_usage.return_value = DiskUsage(total=10000, used=8900, free=1100)
+
+        self.assertEqual(retention.sweep(self.store, self.now)["sessions_evicted"], 0)
+
+    def test_archived_with_object_storage(self):
+        """With object storage, evicted sessions are moved there."""
+        sid = self.make_session("old", finished_hours=200, created_hours=201)
+        self.store.remote = Mock()
+        self.store.archive = Mock(return_value={"uploaded": 1, "deleted": 0, "size": 100})
+        before = retention.stats()["bytes_age"]
+
+        report = retention.sweep(self.store, self.now)
+
+        self.store.archive.assert_called_once_with(sid)
+        self.assertEqual(AudioSession.objects.get(session_id=sid).status, "archived")
+        self.assertEqual(report["bytes_reclaimed"], 100)
+        self.assertEqual(retention.stats()["bytes_age"] - before, 100)
+
+    def test_failed_eviction(self):
+        """A session that cannot be archived is kept and not counted."""
+        sid = self.make_session("old", finished_hours=200, created_hours=201)
+        self.store.remote = Mock()
+        self.store.archive = Mock(side_effect=RuntimeError("Uploading failed"))
+
+        report = retention.sweep(self.store, self.now)
+
+        self.assertEqual(report["sessions_evicted"], 0)
+        self.assertEqual(AudioSession.objects.get(session_id=sid).status, "ready")
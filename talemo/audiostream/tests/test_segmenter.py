@@ -0,0 +1,71 @@
+from django.test import TestCase
+from talemo.audiostream.segmenter import SentenceSegmenter
+
+
+def segment(tokens, **kwargs):
+    """Feed tokens one by one and return every emitted chunk, including the flushed rest."""
+    segmenter = SentenceSegmenter(**kwargs)
+    chunks = []
+    for token in tokens:
+        chunks.extend(segmenter.feed(token))
+    rest = segmenter.flush()
+    if rest:
+        chunks.append(rest)
+    return chunks
+
+
+class TestSentenceSegmenter(TestCase):
+    """Test cases for the incremental sentence segmenter."""
+
+    def test_sentence_boundaries(self):
+        """Sentences are emitted as soon as the following whitespace arrives."""
+        segmenter = SentenceSegmenter()
+        self.assertEqual(segmenter.feed("First sentence."), [])
+        self.assertEqual(segmenter.feed(" Second"), ["First sentence."])
+        self.assertEqual(segmenter.feed(" one! Third?"), ["Second one!"])
+        self.assertEqual(segmenter.flush(), "Third?")
+        self.assertIsNone(segmenter.flush())
+
+    def test_tokens_keep_their_own_whitespace(self):
+        """Token deltas are concatenated, not re-joined with spaces."""
+        chunks = segment(["Hel", "lo", " wor", "ld", ".", " Bye", "."])
+        self.assertEqual(chunks, ["Hello world.", "Bye."])
+
+    def test_closing_quotes_stay_with_the_sentence(self):
+        """Quotes and brackets after the punctuation belong to the sentence."""
+        chunks = segment(['He said "Hello there!"', ' (It was late.)', ' Then he left.'])
+        self.assertEqual(chunks, ['He said "Hello there!"', '(It was late.)', 'Then he left.'])
+
+    def test_no_false_boundaries(self):
+        """Decimals and common abbreviations do not end a sentence."""
+        chunks = segment(["It cost 3.5 coins. ", "Mr. Fox smiled."])
+        self.assertEqual(chunks, ["It cost 3.5 coins.", "Mr. Fox smiled."])
+
+    def test_short_first_chunk(self):
+        """The first chunk is cut after first_chunk_words words."""
+        chunks = segment([f"word{i} " for i in range(25)], first_chunk_words=5, max_words=10)
+        self.assertEqual([len(c.split()) for c in chunks], [5, 10, 10])
+
+    def test_first_chunk_cut_at_clause(self):
+        """An early clause boundary is used for the first chunk."""
+        chunks = segment(["Once upon a time, in a land far away, there lived a fox."], first_chunk_words=8)
+        self.assertEqual(chunks[0], "Once upon a time,")
+
+    def test_long_sentence_cut_at_clause_boundary(self):
+        """A sentence over the limit is cut at its last clause boundary."""
+        chunks = segment(
+            ["A b c d e f g, h i j k l."],
+            first_chunk_words=1, max_words=10,
+        )
+        # The first chunk is a single word, then the clause boundary wins over a word cut
+        self.assertEqual(chunks, ["A", "b c d e f g,", "h i j k l."])
+
+    def test_min_words_merges_short_sentences(self):
+        """Short sentences are packed together when min_words is set."""
+        chunks = segment(["One. Two. Three four five six. Seven."], first_chunk_words=10, max_words=10, min_words=4)
+        self.assertEqual(chunks, ["One. Two. Three four five six.", "Seven."])
+
+    def test_character_by_character_matches_whole_text(self):
+        """Segmentation does not depend on how the text is split into tokens."""
+        text = "Il était une fois, un renard. Il aimait les étoiles! Fin."
+        self.assertEqual(segment(list(text)), segment([text]))
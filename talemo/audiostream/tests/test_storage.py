@@ -0,0 +1,363 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+from django.test import TestCase, override_settings
+from talemo.audiostream import storage
+from talemo.audiostream.storage import (
+    FileSystemBackend, MemoryBackend, ObjectStorageBackend, RedisBackend, SegmentStore, get_live_backend,
+    hls_root, master_url, session_key,
+)
+
+try:
+    import minio
+except ImportError:
+    minio = None
+
+
+class NoSuchKey(Exception):
+    code = "NoSuchKey"
+
+
+class FakeS3Client:
+    """In-memory stand-in for the minio client."""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+
+    def put_object(self, bucket, key, data, length, content_type=None, metadata=None):
+        self.puts.append(key)
+        self.objects[(bucket, key)] = (data.read(length), content_type, metadata)
+
+    def get_object(self, bucket, key):
+        if (bucket, key) not in self.objects:
+            raise NoSuchKey(key)
+        response = Mock()
+        response.read.return_value = self.objects[(bucket, key)][0]
+        return response
+
+    def list_objects(self, bucket, prefix="", recursive=False):
+        return [Mock(object_name=key) for b, key in sorted(self.objects) if b == bucket and key.startswith(prefix)]
+
+    def remove_object(self, bucket, key):
+        self.objects.pop((bucket, key), None)
+
+
+class TestStorageBackends(TestCase):
+    """Test cases for the backends of the segment store."""
+
+    def test_file_system(self):
+        """Files are written to the session directory and deleted with it."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        backend = FileSystemBackend(temp_dir)
+
+        backend.put("abc123", "speech/segment_000.m4s", b"segment data")
+
+        with open(os.path.join(temp_dir, "63", "67", "abc123", "speech", "segment_000.m4s"), "rb") as f:
+            self.assertEqual(f.read(), b"segment data")
+        self.assertEqual(backend.get("abc123", "speech/segment_000.m4s"), b"segment data")
+        self.assertIsNone(backend.get("abc123", "audio.m3u8"))
+        backend.delete("abc123")
+        self.assertFalse(os.path.exists(os.path.join(temp_dir, "63", "67", "abc123")))
+
+    def test_memory(self):
+        """Files are kept per session and replaced by newer versions."""
+        backend = MemoryBackend()
+        backend.put("abc123", "audio.m3u8", b"v1")
+        backend.put("abc123", "audio.m3u8", b"v2")
+        backend.put("other", "audio.m3u8", b"other")
+
+        self.assertEqual(backend.get("abc123", "audio.m3u8"), b"v2")
+        self.assertIsNone(backend.get("abc123", "part_00000.m4s"))
+        backend.delete("abc123")
+        self.assertIsNone(backend.get("abc123", "audio.m3u8"))
+        self.assertEqual(backend.get("other", "audio.m3u8"), b"other")
+
+    @patch('talemo.audiostream.storage.time.monotonic')
+    def test_memory_ttl(self, mock_monotonic):
+        """Expired files are not returned, and are dropped by later writes."""
+        backend = MemoryBackend(ttl=10.0)
+        mock_monotonic.return_value = 100.0
+        backend.put("abc123", "segment_000.m4s", b"old")
+        mock_monotonic.return_value = 105.0
+        backend.put("abc123", "segment_001.m4s", b"new")
+
+        mock_monotonic.return_value = 111.0
+        self.assertIsNone(backend.get("abc123", "segment_000.m4s"))
+        self.assertEqual(backend.get("abc123", "segment_001.m4s"), b"new")
+        backend.put("abc123", "segment_002.m4s", b"newer")
+        self.assertNotIn(("abc123", "segment_000.m4s"), backend._files)
+
+    def test_redis(self):
+        """Files are Redis keys with the TTL, deleted by session."""
+        client = Mock()
+        client.scan_iter.return_value = [b"hls:abc123:audio.m3u8", b"hls:abc123:init.mp4"]
+        backend = RedisBackend("redis://localhost:6379/0", ttl=60.0, client=client)
+
+        backend.put("abc123", "speech/audio.m3u8", b"playlist")
+        backend.get("abc123", "init.mp4")
+        backend.delete("abc123")
+
+        client.set.assert_called_once_with("hls:abc123:speech/audio.m3u8", b"playlist", ex=60)
+        client.get.assert_called_once_with("hls:abc123:init.mp4")
+        client.scan_iter.assert_called_once_with(match="hls:abc123:*")
+        client.delete.assert_called_once_with(b"hls:abc123:audio.m3u8", b"hls:abc123:init.mp4")
+
+    @patch.dict(storage._live_backends, clear=True)
+    def test_live_backend_setting(self):
+        """HLS_LIVE_BACKEND selects the RAM tier, shared by the process."""
+        with override_settings(HLS_LIVE_BACKEND=""):
+            self.assertIsNone(get_live_backend())
+        with override_settings(HLS_LIVE_BACKEND="memory", HLS_LIVE_TTL=30.0):
+            backend = get_live_backend()
+            self.assertIsInstance(backend, MemoryBackend)
+            self.assertEqual(backend.ttl, 30.0)
+            self.assertIs(get_live_backend(), backend)
+        with override_settings(HLS_LIVE_BACKEND="redis", HLS_LIVE_REDIS_URL="redis://cache:6379/1"):
+            self.assertEqual(get_live_backend().client.connection_pool.connection_kwargs["host"], "cache")
+        with self.assertRaisesRegex(ValueError, "Unknown HLS live backend"):
+            get_live_backend("memcached")
+
+
+class TestObjectStorage(TestCase):
+    """Test cases for the S3-compatible backend and the move of finished sessions."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.client = FakeS3Client()
+        self.backend = ObjectStorageBackend("http://minio:9000", "talemo", client=self.client)
+        # The upload threads must not outlive the test (see test_session_replicated_by_writer)
+        self.addCleanup(self.backend._executor.shutdown)
+
+    def test_uploads(self):
+        """Files are uploaded under the prefix, with their content type and caching."""
+        self.backend.put("abc123", "speech/segment_000.m4s", b"segment data")
+        self.backend.put("abc123", "audio.m3u8", b"playlist")
+
+        self.assertTrue(self.backend.flush("abc123", timeout=5))
+        data, content_type, metadata = self.client.objects[("talemo", "hls/63/67/abc123/speech/segment_000.m4s")]
+        self.assertEqual((data, content_type), (b"segment data", "audio/mp4"))
+        self.assertIn("immutable", metadata["Cache-Control"])
+        self.assertEqual(self.client.objects[("talemo", "hls/63/67/abc123/audio.m3u8")][2]["Cache-Control"], "no-cache")
+        self.assertEqual(self.backend.get("abc123", "audio.m3u8"), b"playlist")
+        self.assertIsNone(self.backend.get("abc123", "master.m3u8"))
+        self.assertEqual(sorted(self.backend.list("abc123")), ["audio.m3u8", "speech/segment_000.m4s"])
+        self.backend.delete("abc123")
+        self.assertEqual(self.client.objects, {})
+
+    def test_playlist_versions_coalesced(self):
+        """Versions queued during an upload are replaced by the newest one."""
+        started, release = threading.Event(), threading.Event()
+        put_object = self.client.put_object
+
+        def slow_put_object(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            put_object(*args, **kwargs)
+        self.client.put_object = slow_put_object
+
+        self.backend.put("abc123", "audio.m3u8", b"v1")
+        started.wait(5)
+        self.backend.put("abc123", "audio.m3u8", b"v2")
+        self.backend.put("abc123", "audio.m3u8", b"v3")
+        release.set()
+
+        self.assertTrue(self.backend.flush("abc123", timeout=5))
+        self.assertEqual(self.client.puts, ["hls/63/67/abc123/audio.m3u8"] * 2)
+        self.assertEqual(self.backend.get("abc123", "audio.m3u8"), b"v3")
+
+    def test_failed_upload(self):
+        """flush reports a failed upload until the file is uploaded."""
+        self.client.put_object = Mock(side_effect=ConnectionError("MinIO is down"))
+        self.backend.put("abc123", "segment_000.m4s", b"segment data")
+
+        self.assertFalse(self.backend.flush("abc123", timeout=5))
+        self.assertTrue(self.backend.flush("other", timeout=5))
+
+    def make_store(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        with override_settings(HLS_ROOT=temp_dir, HLS_LIVE_BACKEND=""):
+            store = SegmentStore()
+        store.remote = self.backend
+        return store
+
+    def test_archive(self):
+        """A finished session is uploaded, stale objects are dropped, and the local copy deleted."""
+        store = self.make_store()
+        store.backend.put("abc123", "audio.m3u8", b"vod playlist")
+        store.backend.put("abc123", "audio.mp4", b"compacted media")
+        store.backend.put("abc123", "speech/audio.m3u8", b"speech playlist")
+        store.backend.put("abc123", "muxer.m3u8", b"muxer playlist")
+        with open(store.backend.path("abc123", "audio.m3u8.tmp"), "wb") as f:
+            f.write(b"partial")
+        # Uploaded while live, replaced by the compacted file
+        self.backend.put("abc123", "segment_000.m4s", b"segment data")
+        self.backend.flush("abc123")
+
+        result = store.archive("abc123")
+
+        self.assertEqual(result, {"uploaded": 3, "deleted": 1, "size": 42})
+        self.assertEqual(sorted(self.backend.list("abc123")), ["audio.m3u8", "audio.mp4", "speech/audio.m3u8"])
+        self.assertFalse(os.path.exists(store.session_path("abc123")))
+
+    def test_archive_failure_keeps_local_files(self):
+        """The local copy is only deleted once the upload succeeded."""
+        store = self.make_store()
+        store.backend.put("abc123", "audio.m3u8", b"playlist")
+        self.client.put_object = Mock(side_effect=ConnectionError("MinIO is down"))
+
+        with self.assertRaisesRegex(RuntimeError, "failed"):
+            store.archive("abc123")
+        self.assertTrue(os.path.exists(store.backend.path("abc123", "audio.m3u8")))
+
+    def test_archive_twice(self):
+        """Archiving a session again leaves the bucket's copy alone."""
+        store = self.make_store()
+        store.backend.put("abc123", "audio.m3u8", b"vod playlist")
+        store.backend.put("abc123", "audio.mp4", b"compacted media")
+        store.archive("abc123")
+
+        result = store.archive("abc123")
+
+        self.assertEqual(result, {"uploaded": 0, "deleted": 0, "size": 0})
+        self.assertEqual(sorted(self.backend.list("abc123")), ["audio.m3u8", "audio.mp4"])
+
+    def test_archive_without_served_files(self):
+        """A session directory with nothing to upload does not empty the bucket."""
+        store = self.make_store()
+        self.backend.put("abc123", "audio.m3u8", b"vod playlist")
+        self.backend.flush("abc123")
+        os.makedirs(store.session_path("abc123"))
+        with open(os.path.join(store.session_path("abc123"), "audio.m3u8.tmp"), "wb") as f:
+            f.write(b"partial")
+
+        result = store.archive("abc123")
+
+        self.assertEqual(result["deleted"], 0)
+        self.assertEqual(self.backend.list("abc123"), ["audio.m3u8"])
+
+
+class TestSessionLayout(TestCase):
+    """Test cases for the sharded layout of the session directories."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        with override_settings(HLS_ROOT=self.temp_dir, HLS_LIVE_BACKEND=""):
+            self.store = SegmentStore()
+
+    def test_session_key(self):
+        """Sessions are spread over two levels of shard directories by a hash of their ID."""
+        self.assertEqual(session_key("abc123"), "63/67/abc123")
+        shards = {session_key(f"{i:032x}").rsplit("/", 1)[0] for i in range(200)}
+        self.assertGreater(len(shards), 150)
+
+    @override_settings(HLS_URL="/media/hls/", HLS_LOW_LATENCY=False)
+    def test_sharded_session(self):
+        """A new session is created in its shard directory, and its URLs follow the layout."""
+        sid, path, url = self.store.create("abc123")
+
+        self.assertEqual(path, os.path.join(self.temp_dir, "63", "67", "abc123"))
+        self.assertTrue(os.path.isdir(path))
+        self.assertEqual(self.store.session_path(sid), path)
+        self.assertEqual(url, "/media/hls/63/67/abc123/master.m3u8")
+        self.assertEqual(master_url(sid), url)
+
+    @patch('talemo.audiostream.storage.os.access', return_value=True)
+    def test_hls_root(self, mock_access):
+        """The store's HLS root is found without creating a store or a directory."""
+        missing = os.path.join(self.temp_dir, "missing")
+        with override_settings(HLS_ROOT=self.temp_dir):
+            self.assertEqual(hls_root(), self.temp_dir)
+        with override_settings(HLS_ROOT=os.path.join(missing, "hls"), MEDIA_ROOT=self.temp_dir):
+            os.makedirs(os.path.join(self.temp_dir, "hls"))
+            self.assertEqual(hls_root(), os.path.join(self.temp_dir, "hls"))
+        # Nor the Docker container path of this host
+        not_docker = lambda path: os.path.exists(path) and path != "/app/media/hls"  # noqa: E731
+        with override_settings(HLS_ROOT=os.path.join(missing, "hls"), MEDIA_ROOT=missing), \
+                patch('talemo.audiostream.storage.os.path.isdir', side_effect=not_docker):
+            self.assertIsNone(hls_root())
+        self.assertFalse(os.path.exists(missing))
+
+    def test_flat_session(self):
+        """A session created before the layout was sharded is still found in the root."""
+        flat_path = os.path.join(self.temp_dir, "abc123")
+        os.makedirs(flat_path)
+        with open(os.path.join(flat_path, "audio.m3u8"), "wb") as f:
+            f.write(b"playlist")
+
+        self.assertEqual(self.store.session_path("abc123"), flat_path)
+        self.assertEqual(self.store.backend.get("abc123", "audio.m3u8"), b"playlist")
+        self.store.cleanup(self.store.session_path("abc123"))
+        self.assertFalse(os.path.exists(flat_path))
+
+
+class TestExpectedDirectory(TestCase):
+    """Test cases for the sessions written outside the expected HLS directory."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        with override_settings(HLS_ROOT=os.path.join(self.temp_dir, "writable"), HLS_LIVE_BACKEND=""):
+            self.store = SegmentStore()
+        self.store.expected_dir = os.path.join(self.temp_dir, "expected")
+
+    def test_session_linked(self):
+        """The session directory is linked into the expected directory."""
+        sid, path, _ = self.store.create("abc123")
+        writer = Mock()
+        self.store.attach(writer, sid)
+
+        self.assertEqual(os.path.realpath(os.path.join(self.temp_dir, "expected", "63", "67", "abc123")),
+                         os.path.realpath(path))
+        writer.publish_to.assert_not_called()
+
+    @patch('talemo.audiostream.storage.os.symlink', side_effect=OSError("Operation not permitted"))
+    def test_session_replicated_by_writer(self, mock_symlink):
+        """Without a link, the writer publishes the session's files to the expected directory, without a thread."""
+        threads = threading.active_count()
+        sid, path, _ = self.store.create("abc123")
+        writer = Mock()
+        self.store.attach(writer, sid)
+
+        self.assertEqual(threading.active_count(), threads)
+        backend, session_id = writer.publish_to.call_args[0]
+        self.assertEqual(session_id, "abc123")
+        backend.put(session_id, "speech/audio.m3u8", b"playlist")
+        with open(os.path.join(self.temp_dir, "expected", "63", "67", "abc123", "speech", "audio.m3u8"), "rb") as f:
+            self.assertEqual(f.read(), b"playlist")
+
+        self.store.cleanup(path)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "expected", "63", "67", "abc123")))
+
+
+@skipUnless(minio and os.environ.get("HLS_TEST_S3_ENDPOINT_URL"),
+            "Set HLS_TEST_S3_ENDPOINT_URL to a local MinIO with an existing bucket, e.g. http://localhost:9000")
+class TestObjectStorageMinIO(TestCase):
+    """Test cases against a local MinIO server."""
+
+    def test_round_trip(self):
+        """Files are uploaded, listed, read and deleted."""
+        from django.conf import settings
+        backend = ObjectStorageBackend(
+            os.environ["HLS_TEST_S3_ENDPOINT_URL"],
+            os.environ.get("HLS_TEST_S3_BUCKET", settings.AWS_STORAGE_BUCKET_NAME or "talemo"),
+            access_key=os.environ.get("MINIO_ROOT_USER", "minioadmin"),
+            secret_key=os.environ.get("MINIO_ROOT_PASSWORD", "minioadmin"),
+            prefix="hls-test",
+        )
+        self.addCleanup(backend.delete, "roundtrip")
+
+        backend.put("roundtrip", "speech/audio.m3u8", b"#EXTM3U\n")
+
+        self.assertTrue(backend.flush("roundtrip", timeout=30))
+        self.assertEqual(backend.list("roundtrip"), ["speech/audio.m3u8"])
+        self.assertEqual(backend.get("roundtrip", "speech/audio.m3u8"), b"#EXTM3U\n")
+        self.assertIsNone(backend.get("roundtrip", "missing.m4s"))
@@ -76,7 +76,8 @@ class TestGenerateAudioStreamTask(TestCase):
             session_id='session-123',
             defaults={
                 "status": "running",
-                "playlist_rel_url": 'http://example.com/hls/session-123/audio.m3u8'
+                "playlist_rel_url": 'http://example.com/hls/session-123/audio.m3u8',
+                "tenant": "",
             }
         )
         
@@ -384,6 +385,120 @@ class TestGenerateAudioStreamTask(TestCase):
         mock_thread.start.assert_called_once()
 
 
+class TestGenerateAudioStreamWriter(TestCase):
+    """Test cases for the writer ownership of the Celery task."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        import tempfile
+        self.temp_dir = tempfile.mkdtemp()
+        open(os.path.join(self.temp_dir, "audio.m3u8"), "w").close()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    @patch('talemo.audiostream.tasks.SegmentStore')
+    @patch('talemo.audiostream.tasks.create_writer')
+    @patch('talemo.audiostream.tasks.run_audio_session')
+    @patch('talemo.audiostream.tasks.AudioSession.objects')
+    def test_single_writer_handed_to_pipeline(self, mock_objects, mock_run_audio,
+                                              mock_create_writer, mock_store_class):
+        """The task starts one writer and hands it over to the pipeline."""
+        mock_store_class.return_value.create.return_value = (
+            'writer-session', self.temp_dir, '/media/hls/writer-session/audio.m3u8'
+        )
+        rendered = threading.Event()
+        mock_run_audio.side_effect = lambda *args, **kwargs: rendered.set()
+
+        generate_audio_stream.apply(args=["Test prompt", "en"], kwargs={"timeout_before_return": 0})
+
+        self.assertTrue(rendered.wait(timeout=5))
+        mock_create_writer.assert_called_once_with(self.temp_dir, audio_codec=None, profile=None)
+        self.assertIs(mock_run_audio.call_args.kwargs['writer'], mock_create_writer.return_value)
+        # The pipeline owns the writer, the task never finalizes it
+        mock_create_writer.return_value.finalize.assert_not_called()
+
+
+    @patch('talemo.audiostream.tasks.SegmentStore')
+    @patch('talemo.audiostream.tasks.create_writer')
+    @patch('talemo.audiostream.tasks.run_audio_session')
+    @patch('talemo.audiostream.tasks.AudioSession.objects')
+    def test_returns_when_first_segment_ready(self, mock_objects, mock_run_audio,
+                                              mock_create_writer, mock_store_class):
+        """The task waits on the writer's segment events instead of polling files."""
+        mock_store_class.return_value.create.return_value = (
+            'ready-session', self.temp_dir, '/media/hls/ready-session/audio.m3u8'
+        )
+        writer = mock_create_writer.return_value
+        writer.wait_for_segments.return_value = True
+
+        result = generate_audio_stream.apply(
+            args=["Test prompt", "en"],
+            kwargs={"min_segments_before_return": 2, "timeout_before_return": 3.0},
+        )
+
+        self.assertEqual(result.result, {"playlist": '/media/hls/ready-session/audio.m3u8'})
+        writer.wait_for_segments.assert_called_once_with(2, timeout=3.0)
+        mock_objects.filter.return_value.update.assert_any_call(status="ready")
+
+    @patch('talemo.audiostream.tasks.schedule_compaction')
+    @patch('talemo.audiostream.tasks.SegmentStore')
+    @patch('talemo.audiostream.tasks.create_writer')
+    @patch('talemo.audiostream.tasks.run_audio_session')
+    @patch('talemo.audiostream.tasks.AudioSession.objects')
+    def test_failed_session_not_compacted(self, mock_objects, mock_run_audio, mock_create_writer,
+                                          mock_store_class, mock_schedule_compaction):
+        """A session whose pipeline returns an error is marked failed and never compacted."""
+        mock_store_class.return_value.create.return_value = (
+            'failed-session', self.temp_dir, '/media/hls/failed-session/audio.m3u8'
+        )
+        mock_run_audio.return_value = {"error": "ffmpeg died", "playlist_path": self.temp_dir}
+        failed = threading.Event()
+        mock_objects.filter.return_value.update.side_effect = (
+            lambda **fields: fields.get("status") == "error" and failed.set()
+        )
+
+        generate_audio_stream.apply(args=["Test prompt", "en"], kwargs={"timeout_before_return": 0})
+
+        self.assertTrue(failed.wait(timeout=5))
+        update = mock_objects.filter.return_value.update
+        self.assertEqual([c.kwargs["error_message"] for c in update.call_args_list if c.kwargs.get("status") == "error"],
+                         ["ffmpeg died"])
+        mock_schedule_compaction.assert_not_called()
+
+    @patch('talemo.audiostream.tasks.SegmentStore')
+    @patch('talemo.audiostream.tasks.create_writer')
+    @patch('talemo.audiostream.tasks.run_audio_session')
+    @patch('talemo.audiostream.tasks.AudioSession.objects')
+    def test_fast_failure_not_marked_ready(self, mock_objects, mock_run_audio, mock_create_writer, mock_store_class):
+        """A session that failed before the task returns is not marked ready afterwards."""
+        mock_store_class.return_value.create.return_value = (
+            'fast-failure', self.temp_dir, '/media/hls/fast-failure/audio.m3u8'
+        )
+        mock_run_audio.side_effect = RuntimeError("ffmpeg process failed")
+        updates = []
+        failed = threading.Event()
+
+        def filter_sessions(**lookup):
+            queryset = Mock()
+
+            def update(**fields):
+                updates.append((lookup, fields))
+                if fields.get("status") == "error":
+                    failed.set()
+            queryset.update.side_effect = update
+            return queryset
+        mock_objects.filter.side_effect = filter_sessions
+        mock_create_writer.return_value.wait_for_segments.side_effect = lambda *args, **kwargs: failed.wait(5) and False
+
+        generate_audio_stream.apply(args=["Test prompt", "en"], kwargs={"timeout_before_return": 1.0})
+
+        self.assertEqual([fields["status"] for _, fields in updates], ["error", "ready"])
+        # The error is not overwritten
+        self.assertEqual(updates[-1], ({"session_id": "fast-failure", "status": "running"}, {"status": "ready"}))
+
 class TestTaskIntegration(TestCase):
     """Integration tests for the Celery task."""
     
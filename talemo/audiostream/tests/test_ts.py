@@ -0,0 +1,60 @@
+from django.test import TestCase
+from talemo.audiostream import ts
+from talemo.audiostream.tests.test_mp3 import mp3_frame
+
+AUDIO_PID = 0x100
+
+
+def ts_packet(pid, payload, unit_start=False):
+    """A transport packet, padded with an adaptation field."""
+    header = bytes([0x47, (0x40 if unit_start else 0) | (pid >> 8), pid & 0xFF])
+    if len(payload) >= 184:
+        return header + b"\x10" + payload[:184]
+    stuffing = 183 - len(payload)
+    adaptation = bytes([stuffing]) + (b"\x00" + b"\xff" * (stuffing - 1) if stuffing else b"")
+    return header + b"\x30" + adaptation + payload
+
+
+def pes_packets(pid, data, stream_id=0xC0):
+    """The transport packets of one PES packet holding ``data``."""
+    # PTS only
+    header = b"\x80\x80\x05" + b"\x21\x00\x01\x00\x01"
+    pes = b"\0\0\1" + bytes([stream_id]) + (len(header) + len(data)).to_bytes(2, "big") + header + data
+    return b"".join(
+        ts_packet(pid, pes[start:start + 184], unit_start=start == 0)
+        for start in range(0, len(pes), 184)
+    )
+
+
+def make_segment(frames, per_pes=4):
+    """A TS segment as the HLS muxer writes it: PAT, then PES packets of MP3 frames."""
+    pat = ts_packet(0, b"\x00\x00\xb0\x0d\x00\x01\xc1\x00\x00\x00\x01\xf0\x00\x2a\xb1\x04\xb2")
+    return pat + b"".join(
+        pes_packets(AUDIO_PID, b"".join(frames[start:start + per_pes]))
+        for start in range(0, len(frames), per_pes)
+    )
+
+
+class TestTransportStream(TestCase):
+    """Test cases for reading the MP3 audio of MPEG-TS segments."""
+
+    def test_audio_stream(self):
+        """The PES payloads of the audio stream are joined without their headers."""
+        frames = [mp3_frame(fill=bytes([i])) for i in range(10)]
+        data = make_segment(frames)
+
+        self.assertEqual(len(data) % ts.PACKET_SIZE, 0)
+        self.assertEqual(ts.audio_stream(data), b"".join(frames))
+        self.assertAlmostEqual(ts.segment_duration(data), 0.24)
+
+    def test_other_streams_are_ignored(self):
+        """Packets of other PIDs and stream types are not audio."""
+        frames = [mp3_frame()] * 5
+        data = pes_packets(0x101, b"metadata", stream_id=0xBD) + make_segment(frames)
+
+        self.assertEqual(ts.audio_stream(data), b"".join(frames))
+
+    def test_lost_sync(self):
+        """Data that is not a transport stream is rejected."""
+        with self.assertRaisesRegex(ValueError, "No sync byte"):
+            ts.segment_duration(b"\0" * ts.PACKET_SIZE)
@@ -1,10 +1,12 @@
 import io
 import unittest
-from unittest.mock import Mock, patch, MagicMock
-from django.test import TestCase
+from unittest.mock import Mock, patch, MagicMock, call
+from django.test import TestCase, override_settings
 from talemo.audiostream import tts
+from talemo.audiostream.tts_cache import TTSCache
 
 
+@override_settings(TTS_CACHE_ENABLED=False)
 class TestTTSFunctions(TestCase):
     """Test cases for the TTS module."""
 
@@ -191,6 +193,7 @@ class TestTTSFunctions(TestCase):
             mock_gtts_class.assert_called_once_with(text="Hello", lang=lang, slow=False)
 
 
+@override_settings(TTS_CACHE_ENABLED=False)
 class TestTTSIntegration(TestCase):
     """Integration tests for TTS functionality."""
 
@@ -225,4 +228,123 @@ class TestTTSIntegration(TestCase):
         
         # Verify the flow
         mock_gtts_class.assert_called_once()
-        mock_stdin.write.assert_called_once_with(test_mp3_data)
\ No newline at end of file
+        mock_stdin.write.assert_called_once_with(test_mp3_data)
+
+@override_settings(TTS_CACHE_ENABLED=False)
+class TestTTSEngines(TestCase):
+    """Test cases for the TTS engine registry."""
+
+    def test_default_engine_is_gtts(self):
+        """Without configuration the gTTS engine is used."""
+        self.assertIsInstance(tts.get_engine(), tts.GTTSEngine)
+        self.assertIn('gtts', tts.available_engines())
+        self.assertIn('espeak', tts.available_engines())
+
+    def test_unknown_engine_raises(self):
+        """An unknown engine name is rejected."""
+        with self.assertRaises(ValueError) as cm:
+            tts.get_engine('does-not-exist')
+        self.assertIn('does-not-exist', str(cm.exception))
+
+    def test_synthesize_uses_configured_engine(self):
+        """tts.synthesize dispatches to the engine selected in settings."""
+        @tts.register_engine('fake')
+        class FakeEngine(tts.TTSEngine):
+            def stream(self, text, lang, voice=None):
+                yield text.encode()
+                yield b'|' + lang.encode()
+
+        self.addCleanup(tts._ENGINES.pop, 'fake', None)
+        self.addCleanup(tts._engine_instances.pop, 'fake', None)
+
+        with self.settings(TTS_ENGINE='fake'):
+            self.assertEqual(tts.synthesize("Hello", "en"), b"Hello|en")
+
+    @patch('talemo.audiostream.tts.gTTS')
+    def test_gtts_voice_selects_tld(self, mock_gtts_class):
+        """The gTTS voice is passed as the accent top-level domain."""
+        mock_gtts_class.return_value.stream.return_value = iter([b'a', b'b'])
+
+        data = list(tts.get_engine('gtts').stream("Hello", "en", voice="co.uk"))
+
+        self.assertEqual(data, [b'a', b'b'])
+        mock_gtts_class.assert_called_once_with(text="Hello", lang="en", slow=False, tld="co.uk")
+
+    @patch('talemo.audiostream.tts.shutil.which', return_value=None)
+    def test_espeak_not_installed(self, mock_which):
+        """The espeak engine fails clearly when espeak-ng is missing."""
+        with self.assertRaises(RuntimeError):
+            tts.get_engine('espeak').synthesize("Hello", "en")
+
+    @patch('talemo.audiostream.tts.shutil.which', return_value='/usr/bin/espeak-ng')
+    @patch('talemo.audiostream.tts.subprocess.Popen')
+    def test_espeak_pipes_wav_through_encoder(self, mock_popen, mock_which):
+        """espeak-ng output is encoded to MP3 and streamed in pieces."""
+        espeak = Mock()
+        espeak.returncode = 0
+        encoder = Mock()
+        encoder.returncode = 0
+        encoder.stdout.read1.side_effect = [b'mp3-1', b'mp3-2', b'']
+        mock_popen.side_effect = [espeak, encoder]
+
+        data = tts.get_engine('espeak').synthesize("Bonjour", "fr")
+
+        self.assertEqual(data, b'mp3-1mp3-2')
+        espeak_cmd = mock_popen.call_args_list[0][0][0]
+        self.assertEqual(espeak_cmd[:4], ['espeak-ng', '-v', 'fr', '--stdout'])
+        encoder_cmd = mock_popen.call_args_list[1][0][0]
+        self.assertIn('mp3', encoder_cmd)
+        self.assertIs(mock_popen.call_args_list[1][1]['stdin'], espeak.stdout)
+
+    @patch('talemo.audiostream.tts.shutil.which', return_value='/usr/bin/espeak-ng')
+    @patch('talemo.audiostream.tts.subprocess.Popen')
+    def test_espeak_encoder_failure(self, mock_popen, mock_which):
+        """A failed MP3 encoding raises, and its partial output is not cached."""
+        espeak = Mock()
+        espeak.returncode = 0
+        encoder = Mock()
+        encoder.returncode = 1
+        encoder.stdout.read1.side_effect = [b'mp3-1', b'']
+        mock_popen.side_effect = [espeak, encoder]
+        cache = TTSCache(memory_bytes=1024)
+
+        with patch('talemo.audiostream.tts.tts_cache.get_cache', return_value=cache):
+            with self.assertRaises(RuntimeError) as cm:
+                tts.synthesize("Bonjour", "fr", engine='espeak')
+
+        self.assertIn("ffmpeg exited with code 1", str(cm.exception))
+        self.assertEqual(len(cache.memory), 0)
+
+
+@override_settings(TTS_CACHE_ENABLED=False)
+class TestTTSStreaming(TestCase):
+    """Test cases for the streaming mode of speak_chunk_to_ffmpeg."""
+
+    @patch('talemo.audiostream.tts.gTTS')
+    def test_streaming_forwards_each_piece(self, mock_gtts_class):
+        """Each piece of MP3 data is written and flushed as soon as it is produced."""
+        mock_gtts_class.return_value.stream.return_value = iter([b'part1', b'', b'part2'])
+
+        mock_stdin = Mock()
+        mock_stdin.closed = False
+
+        tts.speak_chunk_to_ffmpeg("Hello world", "en", mock_stdin, streaming=True)
+
+        mock_stdin.write.assert_has_calls([call(b'part1'), call(b'part2')])
+        self.assertEqual(mock_stdin.write.call_count, 2)
+        self.assertEqual(mock_stdin.flush.call_count, 2)
+        mock_gtts_class.return_value.write_to_fp.assert_not_called()
+
+    @patch('talemo.audiostream.tts.gTTS')
+    @patch('talemo.audiostream.tts.logger')
+    def test_streaming_empty_output(self, mock_logger, mock_gtts_class):
+        """An engine that produces nothing is reported as an error."""
+        mock_gtts_class.return_value.stream.return_value = iter([])
+
+        mock_stdin = Mock()
+        mock_stdin.closed = False
+
+        tts.speak_chunk_to_ffmpeg("Hello world", "en", mock_stdin, streaming=True)
+
+        mock_stdin.write.assert_not_called()
+        mock_logger.error.assert_called_once_with("TTS engine generated empty MP3 data")
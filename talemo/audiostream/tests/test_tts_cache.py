@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+from django.test import TestCase
+from talemo.audiostream import tts, tts_cache
+from talemo.audiostream.tts_cache import TTSCache, MemoryAudioCache, DiskAudioCache, cache_key
+
+
+class TestCacheKey(TestCase):
+    """Test cases for the cache key derivation."""
+
+    def test_whitespace_is_normalized(self):
+        """Chunks that only differ in spacing share a key."""
+        self.assertEqual(
+            cache_key("Once upon  a\ntime", "en", "gtts"),
+            cache_key(" Once upon a time ", "en", "gtts"),
+        )
+
+    def test_lang_engine_and_voice_are_part_of_the_key(self):
+        """The same text in another language, engine or voice is a different entry."""
+        base = cache_key("Hello", "en", "gtts")
+        self.assertNotEqual(base, cache_key("Hello", "fr", "gtts"))
+        self.assertNotEqual(base, cache_key("Hello", "en", "espeak"))
+        self.assertNotEqual(base, cache_key("Hello", "en", "gtts", "co.uk"))
+
+
+class TestMemoryAudioCache(TestCase):
+    """Test cases for the in-process LRU tier."""
+
+    def test_evicts_least_recently_used(self):
+        """The tier stays under its byte budget, dropping the oldest entry first."""
+        cache = MemoryAudioCache(max_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        cache.get("a")  # "a" is now more recent than "b"
+        evicted = cache.put("c", b"cccc")
+
+        self.assertEqual(evicted, 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertEqual(cache.get("c"), b"cccc")
+        self.assertEqual(cache.size, 8)
+
+    def test_oversized_entry_is_not_stored(self):
+        """An entry larger than the whole tier is ignored."""
+        cache = MemoryAudioCache(max_bytes=3)
+        cache.put("a", b"aaaa")
+        self.assertIsNone(cache.get("a"))
+
+
+class TestDiskAudioCache(TestCase):
+    """Test cases for the shared on-disk tier."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        """Stored audio can be read back, also by another instance."""
+        DiskAudioCache(self.temp_dir, max_bytes=100).put("ab12", b"mp3")
+        self.assertEqual(DiskAudioCache(self.temp_dir, max_bytes=100).get("ab12"), b"mp3")
+
+    def test_size_based_eviction(self):
+        """The oldest files are removed once the tier exceeds its size."""
+        cache = DiskAudioCache(self.temp_dir, max_bytes=10)
+        cache.put("aa01", b"1111")
+        os.utime(cache._path("aa01"), (1, 1))
+        cache.put("bb02", b"2222")
+        os.utime(cache._path("bb02"), (2, 2))
+        evicted = cache.put("cc03", b"3333")
+
+        self.assertEqual(evicted, 1)
+        self.assertIsNone(cache.get("aa01"))
+        self.assertEqual(cache.get("bb02"), b"2222")
+        self.assertEqual(cache.size, 8)
+
+    def test_overwritten_entry_counted_once(self):
+        """Storing a key again replaces its size instead of adding to it."""
+        cache = DiskAudioCache(self.temp_dir, max_bytes=10)
+        cache.put("aa01", b"1111")
+        cache.put("bb02", b"2222")
+        for _ in range(3):
+            self.assertEqual(cache.put("aa01", b"11"), 0)
+
+        self.assertEqual(cache.size, 6)
+        self.assertEqual(cache.get("bb02"), b"2222")
+
+
+class TestTTSCache(TestCase):
+    """Test cases for the two-tier cache and its use by the TTS layer."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_counters(self):
+        """Hits are counted per tier, and disk hits are promoted to memory."""
+        cache = TTSCache(memory_bytes=100, directory=self.temp_dir, disk_bytes=100)
+        self.assertIsNone(cache.get("k1"))
+        cache.put("k1", b"data")
+        cache.get("k1")
+        cache.memory.clear()
+        cache.get("k1")
+        cache.get("k1")
+
+        stats = cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["memory_hits"], 2)
+        self.assertEqual(stats["disk_hits"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.75)
+
+    def test_repeated_phrase_skips_the_engine(self):
+        """A repeated chunk is served from the cache without calling the engine."""
+        cache = TTSCache(memory_bytes=1024)
+        engine = Mock()
+        engine.name = "gtts"
+        engine.stream.return_value = iter([b"once ", b"upon"])
+
+        with patch('talemo.audiostream.tts.tts_cache.get_cache', return_value=cache), \
+             patch('talemo.audiostream.tts.get_engine', return_value=engine):
+            first = b"".join(tts.stream("Once upon a time", "en"))
+            second = b"".join(tts.stream("Once upon a  time", "en"))
+            third = tts.synthesize("Once upon a time", "en")
+
+        self.assertEqual(first, b"once upon")
+        self.assertEqual(second, b"once upon")
+        self.assertEqual(third, b"once upon")
+        engine.stream.assert_called_once()
+        engine.synthesize.assert_not_called()
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_failed_stream_is_not_cached(self):
+        """A chunk whose synthesis fails halfway is not stored."""
+        cache = TTSCache(memory_bytes=1024)
+        engine = Mock()
+        engine.name = "gtts"
+
+        def failing_stream(text, lang, voice):
+            yield b"partial"
+            raise RuntimeError("network error")
+
+        engine.stream.side_effect = failing_stream
+
+        with patch('talemo.audiostream.tts.tts_cache.get_cache', return_value=cache), \
+             patch('talemo.audiostream.tts.get_engine', return_value=engine):
+            with self.assertRaises(RuntimeError):
+                list(tts.stream("Hello", "en"))
+
+        self.assertEqual(len(cache.memory), 0)
+
+    def test_disabled_by_setting(self):
+        """get_cache returns None when caching is disabled."""
+        with self.settings(TTS_CACHE_ENABLED=False):
+            self.assertIsNone(tts_cache.get_cache())
@@ -0,0 +1,170 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+from django.test import TestCase
+from talemo.audiostream.tts_pool import TTSWorkerPool
+
+
+class TestTTSWorkerPool(TestCase):
+    """Test cases for the shared TTS worker pool."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+        self.order = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def tearDown(self):
+        """Let blocked jobs finish."""
+        self.release.set()
+
+    def job(self, label, block=False):
+        with self.lock:
+            self.order.append(label)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.started.set()
+        if block:
+            self.assertTrue(self.release.wait(timeout=5))
+        with self.lock:
+            self.in_flight -= 1
+        return label
+
+    def test_results_and_errors(self):
+        """Futures carry the job result or its exception."""
+        pool = TTSWorkerPool(max_workers=2)
+        session = pool.open_session("story")
+
+        def fail():
+            raise ValueError("TTS error")
+
+        self.assertEqual(session.submit(self.job, "a").result(timeout=5), "a")
+        with self.assertRaisesRegex(ValueError, "TTS error"):
+            session.submit(fail).result(timeout=5)
+
+    def test_global_concurrency_cap(self):
+        """No more than max_workers jobs run at once across all sessions."""
+        pool = TTSWorkerPool(max_workers=3)
+        futures = []
+        for n in range(5):
+            session = pool.open_session(f"story-{n}")
+            futures += [session.submit(self.job, f"{n}-{i}", True) for i in range(2)]
+
+        # Let the pool fill up before releasing the jobs
+        deadline = time.monotonic() + 5
+        while self.in_flight < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.release.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(self.max_in_flight, 3)
+        self.assertEqual(pool.stats()["threads"], 3)
+        self.assertEqual(pool.stats()["completed"], 10)
+
+    def test_sessions_are_served_in_turn(self):
+        """A session with many queued jobs does not starve the others."""
+        pool = TTSWorkerPool(max_workers=1)
+        blocker = pool.open_session("blocker")
+        long_story = pool.open_session("long")
+        short_story = pool.open_session("short")
+
+        first = blocker.submit(self.job, "blocker", True)
+        self.assertTrue(self.started.wait(timeout=5))
+        futures = [long_story.submit(self.job, f"long-{i}") for i in range(3)]
+        futures.append(short_story.submit(self.job, "short-0"))
+
+        self.release.set()
+        for future in [first] + futures:
+            future.result(timeout=5)
+        self.assertEqual(self.order, ["blocker", "long-0", "short-0", "long-1", "long-2"])
+
+    def test_queue_time_metrics(self):
+        """The time jobs wait for a worker is recorded per session and for the pool."""
+        pool = TTSWorkerPool(max_workers=1)
+        session = pool.open_session("story")
+        first = session.submit(self.job, "a", True)
+        self.assertTrue(self.started.wait(timeout=5))
+        second = session.submit(self.job, "b")
+
+        self.assertEqual(session.stats()["queued"], 1)
+        threading.Timer(0.1, self.release.set).start()
+        first.result(timeout=5)
+        second.result(timeout=5)
+
+        stats = session.stats()
+        self.assertEqual(stats["submitted"], 2)
+        self.assertEqual(stats["queued"], 0)
+        self.assertGreaterEqual(stats["queue_seconds_max"], 0.1)
+        self.assertEqual(pool.stats()["queue_seconds_max"], stats["queue_seconds_max"])
+
+    def test_close_cancels_queued_jobs(self):
+        """Closing a session cancels its jobs that have not started yet."""
+        pool = TTSWorkerPool(max_workers=1)
+        session = pool.open_session("story")
+        running = session.submit(self.job, "a", True)
+        self.assertTrue(self.started.wait(timeout=5))
+        queued = session.submit(self.job, "b")
+
+        session.close()
+        self.release.set()
+
+        self.assertEqual(running.result(timeout=5), "a")
+        with self.assertRaises(CancelledError):
+            queued.result(timeout=5)
+        self.assertEqual(pool.stats()["queued"], 0)
+        self.assertEqual(self.order, ["a"])
+
+    def test_earliest_deadline_first(self):
+        """The session whose listener runs dry first is served first."""
+        pool = TTSWorkerPool(max_workers=1)
+        blocker = pool.open_session("blocker")
+        ahead = pool.open_session("ahead")
+        stalling = pool.open_session("stalling")
+
+        first = blocker.submit(self.job, "blocker", True)
+        self.assertTrue(self.started.wait(timeout=5))
+        now = time.monotonic()
+        futures = [
+            ahead.submit(self.job, "ahead-0", deadline=now + 30),
+            ahead.submit(self.job, "ahead-1", deadline=now + 35),
+            stalling.submit(self.job, "stalling-0", deadline=now + 1),
+            stalling.submit(self.job, "stalling-1", deadline=now + 40),
+        ]
+
+        self.release.set()
+        for future in [first] + futures:
+            future.result(timeout=5)
+        self.assertEqual(self.order, ["blocker", "stalling-0", "ahead-0", "ahead-1", "stalling-1"])
+
+    def test_late_jobs_are_counted(self):
+        """Jobs started after their deadline are reported."""
+        pool = TTSWorkerPool(max_workers=1)
+        session = pool.open_session("story")
+
+        session.submit(self.job, "late", deadline=time.monotonic() - 1).result(timeout=5)
+        session.submit(self.job, "on time", deadline=time.monotonic() + 60).result(timeout=5)
+
+        self.assertEqual(session.stats()["late_jobs"], 1)
+        self.assertEqual(pool.stats()["late_jobs"], 1)
+
+    def test_closed_session_is_skipped(self):
+        """Jobs of a closed session never run, the other sessions still do."""
+        pool = TTSWorkerPool(max_workers=1)
+        blocker = pool.open_session("blocker")
+        closed = pool.open_session("closed")
+        other = pool.open_session("other")
+
+        first = blocker.submit(self.job, "blocker", True)
+        self.assertTrue(self.started.wait(timeout=5))
+        closed.submit(self.job, "closed", deadline=0.0)
+        remaining = other.submit(self.job, "other")
+        closed.close()
+
+        self.release.set()
+        first.result(timeout=5)
+        self.assertEqual(remaining.result(timeout=5), "other")
+        self.assertEqual(self.order, ["blocker", "other"])
@@ -1,9 +1,13 @@
+import os
+import time
+import threading
 import uuid
 from unittest.mock import Mock, patch, MagicMock
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from talemo.audiostream.storage import master_url
 from talemo.audiostream.views import start_audio_session, task_status
 
 
@@ -203,6 +207,51 @@ class TestStartAudioSessionView(TestCase):
             mock_sync_task.assert_called_once()
 
 
+@patch('redis.Redis.from_url')
+@patch('talemo.audiostream.views.generate_audio_stream')
+class TestStartAudioSessionPlaylistURL(TestCase):
+    """Test cases for the playlist URL returned by start_audio_session."""
+
+    def start(self, run_eagerly=False):
+        with self.settings(CELERY_TASK_ALWAYS_EAGER=run_eagerly, HLS_URL='http://example.com/hls/',
+                           HLS_LOW_LATENCY=False, HLS_OBJECT_STORAGE=False):
+            response = APIClient().post('/audiostream/start/', {'prompt': 'Test prompt'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['task_id'], response.data['session_id'])
+            self.assertEqual(response.data['playlist'], master_url(response.data['session_id']))
+        return response
+
+    def test_task_still_running(self, mock_task, mock_from_url):
+        """While the task runs, the URL is derived from the session ID."""
+        mock_from_url.return_value.ping.return_value = True
+        mock_task.delay.return_value.ready.return_value = False
+
+        self.start()
+
+        mock_task.delay.return_value.get.assert_not_called()
+
+    def test_result_without_playlist(self, mock_task, mock_from_url):
+        """A finished task without a playlist URL, or whose result cannot be read, falls back to it too."""
+        mock_from_url.return_value.ping.return_value = True
+        mock_task.delay.return_value.ready.return_value = True
+        mock_task.delay.return_value.get.return_value = {'status': 'ok'}
+        self.start()
+
+        mock_task.delay.return_value.get.side_effect = RuntimeError("Result backend unavailable")
+        self.start()
+
+    def test_synchronous_execution(self, mock_task, mock_from_url):
+        """Sessions run in the request, eagerly or without Redis, fall back to it as well."""
+        mock_from_url.return_value.ping.return_value = True
+        self.start(run_eagerly=True)
+
+        mock_from_url.side_effect = ConnectionError("Redis is down")
+        self.start()
+
+        self.assertEqual(mock_task.call_count, 2)
+        mock_task.delay.assert_not_called()
+
+
 class TestTaskStatusView(TestCase):
     """Test cases for the task_status API endpoint."""
     
@@ -377,4 +426,293 @@ class TestViewsIntegration(TestCase):
         
         self.assertEqual(status_response.status_code, status.HTTP_200_OK)
         self.assertEqual(status_response.data['state'], 'PROGRESS')
-        self.assertEqual(status_response.data['chunk_count'], 3)
\ No newline at end of file
+        self.assertEqual(status_response.data['chunk_count'], 3)
+
+class TestLivePlaylistViews(TestCase):
+    """Test cases for the LL-HLS live endpoints."""
+
+    PLAYLIST = (
+        "#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:0\n"
+        '#EXT-X-PART:DURATION=0.2,URI="part_00000.m4s"\n'
+    )
+
+    def setUp(self):
+        """Set up test fixtures."""
+        import tempfile
+        self.temp_dir = tempfile.mkdtemp()
+        self.session_dir = os.path.join(self.temp_dir, "abc123")
+        os.makedirs(self.session_dir)
+        with open(os.path.join(self.session_dir, "audio.m3u8"), "w") as f:
+            f.write(self.PLAYLIST)
+        store_patcher = patch('talemo.audiostream.views.get_store')
+        self.store = store_patcher.start().return_value
+        self.store.session_path.side_effect = lambda sid: os.path.join(self.temp_dir, sid)
+        # No RAM tier or object storage unless a test sets one
+        self.store.live = None
+        self.store.remote = None
+        self.addCleanup(store_patcher.stop)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_playlist(self):
+        """A plain request returns the current playlist, uncached."""
+        response = self.client.get("/audiostream/live/abc123/audio.m3u8")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.apple.mpegurl")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(response.content.decode(), self.PLAYLIST)
+
+    def test_blocking_reload_waits_for_part(self):
+        """A request for a future part is held until the playlist lists it."""
+        updated = self.PLAYLIST + '#EXT-X-PART:DURATION=0.2,URI="part_00001.m4s"\n'
+
+        def publish():
+            time.sleep(0.1)
+            with open(os.path.join(self.session_dir, "audio.m3u8.tmp"), "w") as f:
+                f.write(updated)
+            os.replace(os.path.join(self.session_dir, "audio.m3u8.tmp"),
+                       os.path.join(self.session_dir, "audio.m3u8"))
+        thread = threading.Thread(target=publish)
+        thread.start()
+
+        response = self.client.get("/audiostream/live/abc123/audio.m3u8", {"_HLS_msn": 0, "_HLS_part": 1})
+        thread.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), updated)
+
+    @patch('talemo.audiostream.views.llhls.wait_for_playlist')
+    def test_blocking_reload_timeout(self, mock_wait):
+        """A part that does not come within the hold time is a 503."""
+        from talemo.audiostream.llhls import PlaylistState
+        mock_wait.return_value = (self.PLAYLIST, PlaylistState(self.PLAYLIST))
+
+        response = self.client.get("/audiostream/live/abc123/audio.m3u8", {"_HLS_msn": 1})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(mock_wait.call_args.kwargs["timeout"], 3)
+
+    def test_live_playlist_from_memory(self):
+        """A playlist produced in this process is served from memory, as a
+        delta update when asked."""
+        from talemo.audiostream.playlist import SegmentPackager, unregister
+        packager = SegmentPackager(self.session_dir, low_latency=True)
+        self.addCleanup(unregister, packager.playlist)
+        for index in range(10):
+            packager.playlist.add_segment(f"segment_{index:03d}.m4s", 1.0)
+        # Served from memory even if the file is gone
+        os.remove(os.path.join(self.session_dir, "audio.m3u8"))
+
+        url = "/audiostream/live/abc123/audio.m3u8"
+        full = self.client.get(url)
+        delta = self.client.get(url, {"_HLS_msn": 9, "_HLS_skip": "YES"})
+
+        self.assertEqual(full.content.decode(), packager.playlist.render())
+        self.assertEqual(delta.content.decode(), packager.playlist.render(skip=True))
+        self.assertIn("#EXT-X-SKIP:SKIPPED-SEGMENTS=", delta.content.decode())
+        self.assertEqual(self.client.get(url, {"_HLS_msn": 13}).status_code, 400)
+
+    def test_invalid_requests(self):
+        """Malformed or far-future reload requests are rejected."""
+        url = "/audiostream/live/abc123/audio.m3u8"
+        self.assertEqual(self.client.get(url, {"_HLS_part": 1}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"_HLS_msn": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"_HLS_msn": 5}).status_code, 400)
+        self.assertEqual(self.client.get("/audiostream/live/other/audio.m3u8").status_code, 404)
+
+    def test_media(self):
+        """Parts are served as immutable files, other names are refused."""
+        with open(os.path.join(self.session_dir, "part_00000.m4s"), "wb") as f:
+            f.write(b"part data")
+
+        response = self.client.get("/audiostream/live/abc123/part_00000.m4s")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"part data")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Content-Type"], "audio/mp4")
+        self.assertEqual(self.client.get("/audiostream/live/abc123/text_chunks.log").status_code, 404)
+
+    def test_master_and_rendition_playlists(self):
+        """The master playlist and the renditions of a ladder are served with relative URIs."""
+        rendition_dir = os.path.join(self.session_dir, "speech")
+        os.makedirs(rendition_dir)
+        with open(os.path.join(self.session_dir, "master.m3u8"), "w") as f:
+            f.write('#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=35200,CODECS="mp4a.40.2"\nspeech/audio.m3u8\n')
+        with open(os.path.join(rendition_dir, "audio.m3u8"), "w") as f:
+            f.write(self.PLAYLIST)
+        with open(os.path.join(rendition_dir, "init_speech.mp4"), "wb") as f:
+            f.write(b"init data")
+
+        master = self.client.get("/audiostream/live/abc123/master.m3u8")
+        playlist = self.client.get("/audiostream/live/abc123/speech/audio.m3u8")
+        init = self.client.get("/audiostream/live/abc123/speech/init_speech.mp4")
+
+        self.assertEqual(master.status_code, 200)
+        self.assertIn("speech/audio.m3u8", master.content.decode())
+        self.assertEqual(playlist.content.decode(), self.PLAYLIST)
+        self.assertEqual(b"".join(init.streaming_content), b"init data")
+        self.assertEqual(self.client.get("/audiostream/live/abc123/standard/audio.m3u8").status_code, 404)
+        self.assertEqual(self.client.get("/audiostream/live/other/master.m3u8").status_code, 404)
+
+    def test_compacted_session(self):
+        """A compacted session's VOD playlist is cached and its media file served by byte range."""
+        vod = (
+            "#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXT-X-PLAYLIST-TYPE:VOD\n"
+            '#EXT-X-MAP:URI="audio.mp4",BYTERANGE="4@0"\n'
+            "#EXTINF:1.0,\n#EXT-X-BYTERANGE:6@4\naudio.mp4\n#EXT-X-ENDLIST\n"
+        )
+        with open(os.path.join(self.session_dir, "audio.m3u8"), "w") as f:
+            f.write(vod)
+        with open(os.path.join(self.session_dir, "audio.mp4"), "wb") as f:
+            f.write(b"initmoofmd")
+
+        playlist = self.client.get("/audiostream/live/abc123/audio.m3u8")
+        fragment = self.client.get("/audiostream/live/abc123/audio.mp4", HTTP_RANGE="bytes=4-9")
+        past_end = self.client.get("/audiostream/live/abc123/audio.mp4", HTTP_RANGE="bytes=20-")
+
+        self.assertIn("immutable", playlist["Cache-Control"])
+        self.assertEqual(fragment.status_code, 206)
+        self.assertEqual(fragment.content, b"moofmd")
+        self.assertEqual(fragment["Content-Range"], "bytes 4-9/10")
+        self.assertIn("immutable", fragment["Cache-Control"])
+        self.assertEqual(past_end.status_code, 416)
+
+    def test_transport_stream_media(self):
+        """Segments of copy mode are served as MPEG-TS."""
+        with open(os.path.join(self.session_dir, "segment_000.ts"), "wb") as f:
+            f.write(b"segment data")
+
+        response = self.client.get("/audiostream/live/abc123/segment_000.ts")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "video/mp2t")
+
+    @patch('talemo.audiostream.views.llhls.wait_for_file', return_value=False)
+    def test_missing_part(self, mock_wait):
+        """A part that is never written is a 404 after the hold time."""
+        response = self.client.get("/audiostream/live/abc123/part_00009.m4s")
+
+        self.assertEqual(response.status_code, 404)
+        mock_wait.assert_called_once()
+
+    def test_live_tier(self):
+        """The files of the RAM tier are served without the session directory."""
+        from talemo.audiostream.storage import MemoryBackend
+        self.store.live = MemoryBackend()
+        self.store.live.put("live1", "master.m3u8", b"#EXTM3U\nspeech/audio.m3u8\n")
+        self.store.live.put("live1", "speech/audio.m3u8", self.PLAYLIST.encode())
+        self.store.live.put("live1", "speech/part_00000.m4s", b"part data")
+
+        master = self.client.get("/audiostream/live/live1/master.m3u8")
+        playlist = self.client.get("/audiostream/live/live1/speech/audio.m3u8")
+        part = self.client.get("/audiostream/live/live1/speech/part_00000.m4s", HTTP_RANGE="bytes=5-")
+
+        self.assertEqual(master.content, b"#EXTM3U\nspeech/audio.m3u8\n")
+        self.assertEqual(playlist.content.decode(), self.PLAYLIST)
+        self.assertEqual(playlist["Cache-Control"], "no-cache")
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part.content, b"data")
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "live1")))
+
+    def test_live_tier_held_requests(self):
+        """Blocking reloads and hinted parts wait for the RAM tier."""
+        from talemo.audiostream.storage import MemoryBackend
+        self.store.live = MemoryBackend()
+        self.store.live.put("abc123", "audio.m3u8", self.PLAYLIST.encode())
+        updated = self.PLAYLIST + '#EXT-X-PART:DURATION=0.2,URI="part_00001.m4s"\n'
+
+        def publish():
+            time.sleep(0.1)
+            self.store.live.put("abc123", "part_00001.m4s", b"next part")
+            self.store.live.put("abc123", "audio.m3u8", updated.encode())
+        thread = threading.Thread(target=publish)
+        thread.start()
+
+        part = self.client.get("/audiostream/live/abc123/part_00001.m4s")
+        playlist = self.client.get("/audiostream/live/abc123/audio.m3u8", {"_HLS_msn": 0, "_HLS_part": 1})
+        thread.join()
+
+        self.assertEqual(part.content, b"next part")
+        self.assertEqual(playlist.content.decode(), updated)
+
+    def test_live_tier_falls_back_to_disk(self):
+        """Files missing from the RAM tier, or a failing tier, are read from disk."""
+        self.store.live = Mock()
+        self.store.live.get.side_effect = ConnectionError("Redis is down")
+
+        response = self.client.get("/audiostream/live/abc123/audio.m3u8")
+
+        self.assertEqual(response.content.decode(), self.PLAYLIST)
+        self.store.live.get.assert_called_once_with("abc123", "audio.m3u8")
+
+    def test_archived_session(self):
+        """A session moved to object storage is served from there."""
+        from talemo.audiostream.storage import MemoryBackend
+        self.store.remote = MemoryBackend()
+        vod = "#EXTM3U\n#EXT-X-PLAYLIST-TYPE:VOD\n#EXT-X-ENDLIST\n"
+        self.store.remote.put("old1", "speech/audio.m3u8", vod.encode())
+        self.store.remote.put("old1", "speech/audio.mp4", b"initmoofmd")
+
+        playlist = self.client.get("/audiostream/live/old1/speech/audio.m3u8")
+        fragment = self.client.get("/audiostream/live/old1/speech/audio.mp4", HTTP_RANGE="bytes=4-")
+
+        self.assertEqual(playlist.content.decode(), vod)
+        self.assertIn("immutable", playlist["Cache-Control"])
+        self.assertEqual(fragment.content, b"moofmd")
+        self.assertEqual(self.client.get("/audiostream/live/old1/master.m3u8").status_code, 404)
+
+    @patch('redis.Redis.from_url')
+    @patch('talemo.audiostream.views.generate_audio_stream')
+    def test_archived_session_replayed_from_start_url(self, mock_task, mock_from_url):
+        """Without low-latency mode, the URL returned for a session still plays once it is moved to object storage."""
+        from urllib.parse import urljoin
+        from talemo.audiostream.storage import MemoryBackend
+        mock_from_url.return_value.ping.return_value = True
+        mock_task.delay.return_value.ready.return_value = False
+        with self.settings(CELERY_TASK_ALWAYS_EAGER=False, HLS_LOW_LATENCY=False, HLS_OBJECT_STORAGE=True):
+            start = self.client.post('/audiostream/start/', {'prompt': 'Test prompt'}, content_type='application/json')
+        session_id = start.json()['session_id']
+        # The session was compacted and moved to the bucket since
+        self.store.remote = MemoryBackend()
+        vod = "#EXTM3U\n#EXT-X-PLAYLIST-TYPE:VOD\n#EXT-X-ENDLIST\n"
+        self.store.remote.put(session_id, "master.m3u8", b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1\naudio.m3u8\n")
+        self.store.remote.put(session_id, "audio.m3u8", vod.encode())
+        self.store.remote.put(session_id, "audio.mp4", b"initmoofmd")
+
+        url = start.json()['playlist']
+        master = self.client.get(url)
+        playlist = self.client.get(urljoin(url, "audio.m3u8"))
+        media = self.client.get(urljoin(url, "audio.mp4"))
+
+        self.assertEqual(master.status_code, 200)
+        self.assertEqual(playlist.content.decode(), vod)
+        self.assertEqual(media.content, b"initmoofmd")
+
+    @patch.dict('talemo.audiostream.views._accessed', clear=True)
+    def test_access_recorded(self):
+        """Requests record the session's last access, at most once a minute."""
+        from talemo.audiostream.models import AudioSession
+        AudioSession.objects.create(session_id="abc123", status="ready")
+
+        self.client.get("/audiostream/live/abc123/audio.m3u8")
+        self.assertIsNotNone(AudioSession.objects.get(session_id="abc123").last_accessed_at)
+        AudioSession.objects.filter(session_id="abc123").update(last_accessed_at=None)
+        self.client.get("/audiostream/live/abc123/audio.m3u8")
+        self.assertIsNone(AudioSession.objects.get(session_id="abc123").last_accessed_at)
+
+    @patch.dict('talemo.audiostream.views._accessed', clear=True)
+    @patch('talemo.audiostream.views.AsyncResult')
+    def test_access_recorded_by_status_request(self, mock_async_result):
+        """A player of the static HLS files is seen through its task status requests."""
+        from talemo.audiostream.models import AudioSession
+        AudioSession.objects.create(session_id="abc123", status="ready")
+        mock_async_result.return_value.state = "PENDING"
+
+        self.client.get("/audiostream/task-status/abc123/")
+
+        self.assertIsNotNone(AudioSession.objects.get(session_id="abc123").last_accessed_at)
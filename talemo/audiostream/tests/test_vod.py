@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from talemo.audiostream import fmp4
+from talemo.audiostream.vod import EndedPlaylist, compact_rendition, compact_session
+from talemo.audiostream.tests.test_av_writer import make_mp3
+
+try:
+    import av
+    from talemo.audiostream.av_writer import PyAVHLSWriter
+except ImportError:
+    av = None
+
+TS_PLAYLIST = (
+    "#EXTM3U\n#EXT-X-VERSION:7\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:0\n"
+    "#EXT-X-PLAYLIST-TYPE:EVENT\n#EXT-X-INDEPENDENT-SEGMENTS\n"
+    "#EXT-X-PROGRAM-DATE-TIME:2024-01-01T00:00:00.000Z\n#EXTINF:1.008000,\nsegment_000.ts\n"
+    "#EXT-X-PROGRAM-DATE-TIME:2024-01-01T00:00:01.008Z\n#EXTINF:0.504000,\nsegment_001.ts\n"
+)
+
+
+class TestCompaction(TestCase):
+    """Test cases for the VOD compaction of finished sessions."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, data, directory=None):
+        path = os.path.join(directory or self.temp_dir, name)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
+
+    def write_ts_session(self, directory=None, ended=True):
+        self.write("audio.m3u8", TS_PLAYLIST + ("#EXT-X-ENDLIST\n" if ended else ""), directory)
+        self.write("segment_000.ts", b"G" * 376, directory)
+        self.write("segment_001.ts", b"G" * 188, directory)
+        self.write("muxer.m3u8", "#EXTM3U\n", directory)
+
+    def test_transport_stream_segments(self):
+        """MPEG-TS segments are joined into audio.ts and addressed by byte ranges."""
+        self.write_ts_session()
+
+        result = compact_rendition(self.temp_dir)
+
+        self.assertEqual(result, {"segments": 2, "uri": "audio.ts", "size": 564, "deleted": 3})
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ["audio.m3u8", "audio.ts"])
+        with open(os.path.join(self.temp_dir, "audio.m3u8")) as f:
+            text = f.read()
+        self.assertIn("#EXT-X-PLAYLIST-TYPE:VOD\n", text)
+        self.assertIn("#EXTINF:1.008000,\n#EXT-X-BYTERANGE:376@0\naudio.ts\n", text)
+        self.assertIn("#EXTINF:0.504000,\n#EXT-X-BYTERANGE:188@376\naudio.ts\n", text)
+        self.assertTrue(text.endswith("#EXT-X-ENDLIST\n"))
+        self.assertNotIn("#EXT-X-MAP", text)
+
+    def test_compaction_runs_once(self):
+        """A compacted rendition is left as it is."""
+        self.write_ts_session()
+        compact_rendition(self.temp_dir)
+
+        self.assertIsNone(compact_rendition(self.temp_dir))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "audio.ts")))
+
+    def test_live_playlist_not_compacted(self):
+        """A playlist without an end is still being produced."""
+        self.write_ts_session(ended=False)
+
+        with self.assertRaisesRegex(ValueError, "has not ended"):
+            compact_rendition(self.temp_dir)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "segment_000.ts")))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "audio.ts")))
+
+    def test_ladder_renditions(self):
+        """Every rendition listed in the master playlist is compacted."""
+        for name in ("standard", "speech"):
+            os.makedirs(os.path.join(self.temp_dir, name))
+            self.write_ts_session(os.path.join(self.temp_dir, name))
+        master = '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1\nstandard/audio.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=1\nspeech/audio.m3u8\n'
+        self.write("master.m3u8", master)
+
+        results = compact_session(self.temp_dir)
+
+        self.assertEqual(set(results), {os.path.join(self.temp_dir, "standard"), os.path.join(self.temp_dir, "speech")})
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "speech", "audio.ts")))
+        with open(os.path.join(self.temp_dir, "master.m3u8")) as f:
+            self.assertEqual(f.read(), master)
+
+    @skipUnless(av, "PyAV is not installed")
+    def test_fmp4_session(self):
+        """An encoded session becomes one fMP4 file whose byte ranges are its fragments."""
+        writer = PyAVHLSWriter(self.temp_dir, low_latency=True)
+        writer.process_chunk(make_mp3(3.0))
+        writer.finalize()
+        with open(os.path.join(self.temp_dir, "audio.m3u8")) as f:
+            segments = EndedPlaylist(f.read()).segments
+
+        compact_session(self.temp_dir)
+
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ["audio.m3u8", "audio.mp4", "manifest.json", "master.m3u8"])
+        with open(os.path.join(self.temp_dir, "audio.m3u8")) as f:
+            text = f.read()
+        with open(os.path.join(self.temp_dir, "audio.mp4"), "rb") as f:
+            data = f.read()
+        map_size = int(text.split('BYTERANGE="')[1].split("@")[0])
+        timescale, default_duration = fmp4.read_init(data[:map_size])
+        ranges = [line.split(":")[1].split("@") for line in text.splitlines() if line.startswith("#EXT-X-BYTERANGE:")]
+        self.assertEqual(len(ranges), len(segments))
+        for (size, offset), (_, duration) in zip(ranges, segments):
+            fragment = data[int(offset):int(offset) + int(size)]
+            self.assertEqual(next(fmp4.iter_boxes(fragment))[0], b"moof")
+            self.assertAlmostEqual(fmp4.fragment_duration(fragment, timescale, default_duration), duration, places=5)
+        self.assertEqual(int(ranges[-1][1]) + int(ranges[-1][0]), len(data))
+
+
+class TestCompactionTask(TestCase):
+    """Test cases for the scheduling of the compaction."""
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False, HLS_VOD_COMPACTION_DELAY=600.0)
+    @patch('talemo.audiostream.tasks.compact_hls_session.apply_async')
+    def test_scheduled_after_playback(self, mock_apply_async):
+        """The compaction waits for a playback of the whole story."""
+        from talemo.audiostream.tasks import schedule_compaction
+        schedule_compaction("abc123", 90.0)
+
+        mock_apply_async.assert_called_once_with(args=["abc123"], countdown=690.0)
+
+    @patch('talemo.audiostream.tasks.compact_hls_session.apply_async')
+    def test_disabled(self, mock_apply_async):
+        """A negative delay and eager tasks disable the compaction."""
+        from talemo.audiostream.tasks import schedule_compaction
+        with override_settings(CELERY_TASK_ALWAYS_EAGER=False, HLS_VOD_COMPACTION_DELAY=-1):
+            schedule_compaction("abc123", 90.0)
+        with override_settings(CELERY_TASK_ALWAYS_EAGER=True, HLS_VOD_COMPACTION_DELAY=600.0):
+            schedule_compaction("abc123", 90.0)
+
+        mock_apply_async.assert_not_called()
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False, HLS_VOD_COMPACTION_DELAY=-1, HLS_OBJECT_STORAGE=True)
+    @patch('talemo.audiostream.tasks.archive_hls_session.apply_async')
+    def test_archived_without_compaction(self, mock_apply_async):
+        """Without compaction, a session is moved to object storage after its playback."""
+        from talemo.audiostream.tasks import schedule_compaction
+        schedule_compaction("abc123", 90.0)
+
+        mock_apply_async.assert_called_once_with(args=["abc123"], countdown=90.0)
+
+    @patch('talemo.audiostream.tasks.get_store')
+    def test_archived_status(self, mock_get_store):
+        """A session moved to object storage, after compaction or without it, is marked archived."""
+        from talemo.audiostream.models import AudioSession
+        from talemo.audiostream.tasks import archive_hls_session, compact_hls_session
+        store = mock_get_store.return_value
+        store.session_path.side_effect = lambda sid: os.path.join(tempfile.gettempdir(), sid)
+        store.live = None
+        AudioSession.objects.create(session_id="abc123", status="ready")
+        AudioSession.objects.create(session_id="def456", status="ready")
+
+        archive_hls_session("abc123")
+        with patch('talemo.audiostream.vod.compact_session', return_value={}):
+            compact_hls_session("def456")
+
+        self.assertEqual([call.args[0] for call in store.archive.call_args_list], ["abc123", "def456"])
+        self.assertEqual(set(AudioSession.objects.values_list("status", flat=True)), {"archived"})
+
+    @patch('talemo.audiostream.tasks.get_store')
+    def test_archived_session_not_archived_again(self, mock_get_store):
+        """A retried task, or a compaction after the sweeper, leaves an archived session alone."""
+        from talemo.audiostream.models import AudioSession
+        from talemo.audiostream.tasks import archive_hls_session, compact_hls_session
+        store = mock_get_store.return_value
+        store.session_path.side_effect = lambda sid: os.path.join(tempfile.gettempdir(), sid)
+        store.live = None
+        AudioSession.objects.create(session_id="abc123", status="archived")
+
+        self.assertIsNone(archive_hls_session("abc123"))
+        with patch('talemo.audiostream.vod.compact_session', return_value={}):
+            compact_hls_session("abc123")
+
+        store.archive.assert_not_called()
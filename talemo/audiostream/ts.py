@@ -0,0 +1,67 @@
+"""
+Minimal reader of MPEG transport stream segments.
+
+In copy mode (see hls.ffmpeg_hls_command) the HLS muxer packs the MP3
+frames of the TTS engines into MPEG-TS segments without transcoding them.
+The duration of a segment is read from the MP3 frame headers of its audio
+packetized elementary stream (PES).
+"""
+from .mp3 import FrameReader
+
+PACKET_SIZE = 188
+SYNC_BYTE = 0x47
+# PES stream ids of MPEG audio streams
+AUDIO_STREAM_IDS = range(0xC0, 0xE0)
+
+
+def iter_payloads(data):
+    """
+    Yield the payloads of the transport packets in ``data``.
+
+    Yields:
+        tuple: (pid, payload_unit_start, payload)
+
+    Raises:
+        ValueError: If a packet does not start with the sync byte
+    """
+    for offset in range(0, len(data) - PACKET_SIZE + 1, PACKET_SIZE):
+        if data[offset] != SYNC_BYTE:
+            raise ValueError(f"No sync byte at offset {offset}")
+        pid = ((data[offset + 1] & 0x1F) << 8) | data[offset + 2]
+        unit_start = bool(data[offset + 1] & 0x40)
+        control = (data[offset + 3] >> 4) & 0x3
+        if not control & 0x1:
+            # Adaptation field only
+            continue
+        start = offset + 4
+        if control & 0x2:
+            start += 1 + data[start]
+        yield pid, unit_start, data[start:offset + PACKET_SIZE]
+
+
+def audio_stream(data):
+    """
+    Return the elementary stream of the first MPEG audio PES stream.
+
+    Returns:
+        bytes: The concatenated PES payloads, without their headers
+    """
+    audio_pid = None
+    stream = bytearray()
+    for pid, unit_start, payload in iter_payloads(data):
+        if unit_start and payload[:3] == b"\0\0\1" and len(payload) >= 9:
+            if audio_pid is None and payload[3] in AUDIO_STREAM_IDS:
+                audio_pid = pid
+            if pid == audio_pid:
+                # Fixed header, flags and the optional fields' length
+                stream += payload[9 + payload[8]:]
+        elif pid == audio_pid and audio_pid is not None:
+            stream += payload
+    return bytes(stream)
+
+
+def segment_duration(data):
+    """Return the duration in seconds of the MP3 audio of a TS segment."""
+    reader = FrameReader()
+    reader.feed(audio_stream(data))
+    return reader.seconds
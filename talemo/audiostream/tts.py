@@ -1,15 +1,235 @@
 from gtts import gTTS
+from django.conf import settings
 import logging
 import io
-import time
 import os
 import sys
+import shutil
 import subprocess
 import tempfile
+from . import tts_cache
 
 logger = logging.getLogger(__name__)
 
-def speak_chunk_to_ffmpeg(text: str, lang: str, ffmpeg_stdin):
+DEFAULT_ENGINE = "gtts"
+
+# Registry of available TTS engines, keyed by the name used in settings.TTS_ENGINE
+_ENGINES = {}
+_engine_instances = {}
+
+
+def register_engine(name):
+    """
+    Class decorator that registers a TTSEngine subclass under ``name``.
+    """
+    def decorator(cls):
+        cls.name = name
+        _ENGINES[name] = cls
+        return cls
+    return decorator
+
+
+def available_engines():
+    """Return the names of all registered TTS engines."""
+    return sorted(_ENGINES)
+
+
+def get_engine(name=None):
+    """
+    Return the (shared) TTS engine instance registered under ``name``.
+
+    Args:
+        name (str, optional): Engine name; defaults to settings.TTS_ENGINE
+
+    Returns:
+        TTSEngine: The engine instance
+
+    Raises:
+        ValueError: If no engine is registered under that name
+    """
+    if name is None:
+        name = getattr(settings, 'TTS_ENGINE', DEFAULT_ENGINE)
+
+    if name not in _engine_instances:
+        if name not in _ENGINES:
+            raise ValueError(f"Unknown TTS engine '{name}', available engines: {', '.join(available_engines())}")
+        _engine_instances[name] = _ENGINES[name]()
+    return _engine_instances[name]
+
+
+class TTSEngine:
+    """
+    Common interface of the TTS backends.
+
+    Every engine produces MP3 data, which is what the HLS writer's ffmpeg
+    process reads from its stdin. Subclasses implement at least one of
+    ``synthesize`` (whole chunk at once) or ``stream`` (MP3 data as it is
+    produced); each default implementation is built on the other one.
+    """
+
+    name = None
+
+    def synthesize(self, text: str, lang: str, voice: str | None = None) -> bytes:
+        """
+        Synthesize a text chunk and return the complete MP3 data.
+        """
+        return b"".join(self.stream(text, lang, voice))
+
+    def stream(self, text: str, lang: str, voice: str | None = None):
+        """
+        Synthesize a text chunk and yield MP3 data as it becomes available.
+        """
+        yield self.synthesize(text, lang, voice)
+
+
+@register_engine("gtts")
+class GTTSEngine(TTSEngine):
+    """
+    Google Translate TTS. Needs network access; ``voice`` is used as the
+    gTTS top-level domain, which selects the accent (e.g. "co.uk").
+    """
+
+    def _make_tts(self, text, lang, voice):
+        if voice:
+            return gTTS(text=text, lang=lang, slow=False, tld=voice)
+        return gTTS(text=text, lang=lang, slow=False)
+
+    def synthesize(self, text, lang, voice=None):
+        tts = self._make_tts(text, lang, voice)
+
+        mp3_data = io.BytesIO()
+        tts.write_to_fp(mp3_data)
+        return mp3_data.getvalue()
+
+    def stream(self, text, lang, voice=None):
+        yield from self._make_tts(text, lang, voice).stream()
+
+
+@register_engine("espeak")
+class EspeakEngine(TTSEngine):
+    """
+    Offline engine based on espeak-ng, bounded by local CPU rather than by
+    network latency. espeak-ng writes WAV, which is converted to MP3 by a
+    small ffmpeg process so the output is interchangeable with gTTS.
+
+    ``voice`` is passed to ``espeak-ng -v`` and defaults to the language code.
+    """
+
+    executable = "espeak-ng"
+    read_size = 4096
+
+    def stream(self, text, lang, voice=None):
+        if shutil.which(self.executable) is None:
+            raise RuntimeError(f"{self.executable} is not installed")
+
+        espeak_cmd = [self.executable, "-v", voice or lang, "--stdout", text]
+        ffmpeg_cmd = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "wav", "-i", "pipe:0",
+            "-c:a", "libmp3lame", "-b:a", "64k",
+            "-f", "mp3", "pipe:1",
+        ]
+
+        espeak = subprocess.Popen(espeak_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        encoder = subprocess.Popen(ffmpeg_cmd, stdin=espeak.stdout,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        # Only the encoder should hold the read end of the espeak pipe
+        espeak.stdout.close()
+        try:
+            while True:
+                data = encoder.stdout.read1(self.read_size)
+                if not data:
+                    break
+                yield data
+        finally:
+            encoder.stdout.close()
+            encoder.wait()
+            espeak.wait()
+
+        if espeak.returncode != 0:
+            raise RuntimeError(f"{self.executable} exited with code {espeak.returncode}")
+        # A failed encoder may have written truncated MP3 data
+        if encoder.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {encoder.returncode} while encoding {self.executable} output")
+
+
+def synthesize(text: str, lang: str, engine: str | None = None, voice: str | None = None) -> bytes:
+    """
+    Synthesize a text chunk to MP3 bytes without writing them anywhere.
+
+    This is the blocking half of speak_chunk_to_ffmpeg; the pipeline runs it
+    in a thread pool so that several chunks can be synthesized while the
+    previous ones are still being written to ffmpeg.
+
+    Args:
+        text (str): The text to synthesize
+        lang (str): The language code
+        engine (str, optional): TTS engine name (default: settings.TTS_ENGINE)
+        voice (str, optional): Engine-specific voice
+
+    Returns:
+        bytes: The encoded MP3 data (may be empty)
+    """
+    tts_engine = get_engine(engine)
+    cache = tts_cache.get_cache()
+    if cache is None:
+        return tts_engine.synthesize(text, lang, voice)
+
+    key = tts_cache.cache_key(text, lang, tts_engine.name, voice)
+    data = cache.get(key)
+    if data is None:
+        data = tts_engine.synthesize(text, lang, voice)
+        cache.put(key, data)
+    return data
+
+def stream(text: str, lang: str, engine: str | None = None, voice: str | None = None):
+    """
+    Synthesize a text chunk and yield MP3 data as the engine produces it.
+
+    Args:
+        text (str): The text to synthesize
+        lang (str): The language code
+        engine (str, optional): TTS engine name (default: settings.TTS_ENGINE)
+        voice (str, optional): Engine-specific voice
+
+    Yields:
+        bytes: Pieces of the encoded MP3 data
+    """
+    tts_engine = get_engine(engine)
+    cache = tts_cache.get_cache()
+    if cache is None:
+        yield from tts_engine.stream(text, lang, voice)
+        return
+
+    key = tts_cache.cache_key(text, lang, tts_engine.name, voice)
+    data = cache.get(key)
+    if data is not None:
+        # Repeated phrase: no TTS call at all
+        yield data
+        return
+
+    # Forward the pieces as they come and only cache a complete chunk
+    pieces = []
+    for data in tts_engine.stream(text, lang, voice):
+        pieces.append(data)
+        yield data
+    cache.put(key, b"".join(pieces))
+
+def speak_chunk_to_ffmpeg(text: str, lang: str, ffmpeg_stdin, streaming: bool = False):
+    """
+    Synthesize a text chunk and write the MP3 data to ffmpeg's stdin.
+
+    In the default buffered mode the whole chunk is synthesized and
+    validated before anything is written. In streaming mode each piece of
+    MP3 data is forwarded (and flushed) as soon as the engine yields it, so
+    the first audio reaches ffmpeg after the first network read.
+
+    Args:
+        text (str): The text to synthesize
+        lang (str): The language code
+        ffmpeg_stdin: stdin pipe of the ffmpeg process
+        streaming (bool): Forward MP3 data as it is produced (default: False)
+    """
     if not text.strip():
         logger.warning("Empty text received, skipping TTS")
         return
@@ -21,28 +241,36 @@ def speak_chunk_to_ffmpeg(text: str, lang: str, ffmpeg_stdin):
     try:
         logger.info(f"Converting text to speech: '{text[:50]}{'...' if len(text) > 50 else ''}'")
 
-        # Create a gTTS object
-        tts = gTTS(text=text, lang=lang, slow=False)
+        if streaming:
+            total = 0
+            for data in stream(text, lang):
+                if not data:
+                    continue
+                ffmpeg_stdin.write(data)
+                ffmpeg_stdin.flush()
+                total += len(data)
+
+            if not total:
+                logger.error("TTS engine generated empty MP3 data")
+                return
+
+            logger.info(f"Streamed {total} bytes of MP3 data to ffmpeg")
+            return
 
         # First, try to get the full MP3 data to validate it
-        mp3_data = io.BytesIO()
-        tts.write_to_fp(mp3_data)
-        mp3_data.seek(0)
-        data = mp3_data.read()
+        data = synthesize(text, lang)
 
         if not data:
-            logger.error("gTTS generated empty MP3 data")
+            logger.error("TTS engine generated empty MP3 data")
             return
 
         logger.info(f"Generated {len(data)} bytes of MP3 data")
 
-        # Write the data to ffmpeg's stdin
+        # Write the data to ffmpeg's stdin; flushing hands it to ffmpeg right
+        # away, there is no need to wait for ffmpeg to consume it
         ffmpeg_stdin.write(data)
         ffmpeg_stdin.flush()
 
-        # Small delay to allow ffmpeg to process the data
-        time.sleep(0.1)
-
         logger.info("Successfully wrote MP3 data to ffmpeg")
     except BrokenPipeError:
         logger.error("BrokenPipeError: ffmpeg process may have terminated unexpectedly")
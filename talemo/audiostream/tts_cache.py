@@ -0,0 +1,307 @@
+"""
+Content-addressed cache for synthesized TTS audio.
+
+Children's stories repeat a lot of text (titles, "Once upon a time", hero
+names, closing lines, replayed chapters), so synthesized MP3 data is cached
+under a key derived from the normalized text, the language, the engine and
+the voice. The cache has two tiers:
+
+1. A bounded in-process LRU tier (``TTS_CACHE_MEMORY_BYTES``)
+2. An optional on-disk tier shared by all worker processes of a host
+   (``TTS_CACHE_DIR``), evicted by size in least-recently-used order
+   (``TTS_CACHE_DISK_BYTES``)
+
+Hit and miss counters are exposed through ``TTSCache.stats()``.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """
+    Normalize a text chunk for cache lookups.
+
+    Unicode is NFC-normalized and runs of whitespace are collapsed, so that
+    chunks that only differ in spacing or line breaks share an entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, lang, engine, voice=None):
+    """
+    Return the content address of a synthesized chunk.
+
+    Args:
+        text (str): The text to synthesize
+        lang (str): The language code
+        engine (str): The TTS engine name
+        voice (str, optional): Engine-specific voice
+
+    Returns:
+        str: A hex SHA-256 digest
+    """
+    material = "\x1f".join([engine, lang, voice or "", normalize_text(text)])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class MemoryAudioCache:
+    """
+    Thread-safe LRU cache bounded by the total size of the stored audio.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        """Store data, evicting least recently used entries. Returns the number evicted."""
+        if len(data) > self.max_bytes:
+            return 0
+
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+
+            while self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= len(old)
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskAudioCache:
+    """
+    On-disk cache tier shared by the processes that use the same directory.
+
+    Entries are stored as ``<dir>/<key[:2]>/<key>.mp3`` and written
+    atomically. A hit refreshes the file's mtime, which is the LRU order used
+    for eviction: once the tier grows beyond ``max_bytes`` the oldest files
+    are deleted until it is back under 90% of the limit.
+    """
+
+    low_watermark = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _entries(self):
+        """Yield (path, mtime, size) for every cached file."""
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".mp3"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._entries())
+        return self._size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """Store data atomically, evicting old entries. Returns the number evicted."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Size of the entry the write replaces, already counted
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            # A first scan already counts the new entry
+            self._size = self.size if self._size is None else self._size + len(data) - replaced
+            if self._size <= self.max_bytes:
+                return 0
+            return self._evict()
+
+    def _evict(self):
+        # Re-scan so that writes from other processes are accounted for
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(entry[2] for entry in entries)
+        target = self.max_bytes * self.low_watermark
+        evicted = 0
+
+        for path, _, entry_size in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            evicted += 1
+
+        self._size = size
+        logger.info(f"Evicted {evicted} entries from the TTS disk cache, {size} bytes remaining")
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+
+
+class TTSCache:
+    """
+    Two-tier TTS audio cache with hit/miss counters.
+    """
+
+    def __init__(self, memory_bytes, directory=None, disk_bytes=0):
+        self.memory = MemoryAudioCache(memory_bytes)
+        self.disk = DiskAudioCache(directory, disk_bytes) if directory and disk_bytes else None
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, key):
+        """Return the cached audio for ``key`` or None."""
+        data = self.memory.get(key)
+        if data is not None:
+            self._count("memory_hits")
+            return data
+
+        if self.disk is not None:
+            try:
+                data = self.disk.get(key)
+            except OSError as e:
+                logger.warning(f"Error reading the TTS disk cache: {str(e)}")
+                data = None
+            if data is not None:
+                self._count("disk_hits")
+                # Promote to the in-process tier
+                self._count("evictions", self.memory.put(key, data))
+                return data
+
+        self._count("misses")
+        return None
+
+    def put(self, key, data):
+        """Store synthesized audio in every tier."""
+        if not data:
+            return
+
+        self._count("stores")
+        self._count("evictions", self.memory.put(key, data))
+        if self.disk is not None:
+            try:
+                self._count("evictions", self.disk.put(key, data))
+            except OSError as e:
+                logger.warning(f"Error writing the TTS disk cache: {str(e)}")
+
+    def clear(self):
+        """Drop every entry (counters are kept)."""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Return the hit/miss counters and the current tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.size
+        stats["disk_bytes"] = self.disk.size if self.disk is not None else 0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide TTS cache configured from settings, or None when
+    caching is disabled (``TTS_CACHE_ENABLED = False``).
+    """
+    global _cache
+
+    if not getattr(settings, 'TTS_CACHE_ENABLED', True):
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSCache(
+                    memory_bytes=getattr(settings, 'TTS_CACHE_MEMORY_BYTES', 32 * 1024 * 1024),
+                    directory=getattr(settings, 'TTS_CACHE_DIR', None),
+                    disk_bytes=getattr(settings, 'TTS_CACHE_DISK_BYTES', 512 * 1024 * 1024),
+                )
+    return _cache
@@ -0,0 +1,268 @@
+"""
+Per-process TTS worker pool shared by all audio sessions.
+
+Every session of a worker process submits its synthesis jobs to the same
+bounded pool, so the number of concurrent TTS requests leaving the process
+is capped by ``TTS_POOL_WORKERS`` however many stories are being rendered.
+
+Jobs are queued per session (a session's jobs always start in order) and
+the workers serve the sessions earliest deadline first: a job's deadline is
+the time at which its listener would run out of audio without it, so a
+session about to stall is served before one that is far ahead. Jobs
+submitted without a deadline are ranked by the time they reached the head
+of their session's queue, which serves such sessions in turn (round robin)
+so a long story cannot starve the sessions that start after it.
+
+The time each job waits in the queue and the number of jobs started after
+their deadline are recorded, per session and for the whole pool.
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ("session", "fn", "args", "kwargs", "future", "queued_at", "deadline")
+
+    def __init__(self, session, fn, args, kwargs, deadline=None):
+        self.session = session
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.deadline = deadline
+
+
+class _QueueTimes:
+    """Running count, total and maximum of queue times."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.late = 0
+
+    def add(self, seconds, late=False):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.late += late
+
+    def as_dict(self):
+        return {
+            "queue_seconds_avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "queue_seconds_max": round(self.max, 4),
+            "late_jobs": self.late,
+        }
+
+
+class PoolSession:
+    """
+    Handle through which one audio session submits jobs to the pool.
+    """
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+        self.submitted = 0
+        self.running = 0
+        self.queue_times = _QueueTimes()
+        self._jobs = deque()
+
+    def submit(self, fn, *args, deadline=None, **kwargs):
+        """
+        Queue ``fn(*args, **kwargs)`` for execution by the pool.
+
+        Args:
+            fn (callable): The job
+            deadline (float, optional): ``time.monotonic()`` value by which
+                the job should have started; sessions whose next job has the
+                earliest deadline are served first
+
+        Returns:
+            concurrent.futures.Future: The result of the call
+        """
+        return self.pool._submit(self, fn, args, kwargs, deadline)
+
+    def close(self):
+        """Cancel the session's queued jobs and stop scheduling it."""
+        self.pool._close_session(self)
+
+    @property
+    def queued(self):
+        return len(self._jobs)
+
+    def stats(self):
+        """Return the session's job counters and queue times."""
+        with self.pool._lock:
+            stats = {
+                "submitted": self.submitted,
+                "queued": self.queued,
+                "running": self.running,
+            }
+            stats.update(self.queue_times.as_dict())
+        return stats
+
+
+class TTSWorkerPool:
+    """
+    Bounded pool of TTS worker threads with earliest-deadline-first scheduling.
+    """
+
+    def __init__(self, max_workers):
+        """
+        Initialize the pool. Worker threads are started on demand.
+
+        Args:
+            max_workers (int): Maximum number of jobs running at the same time
+        """
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Condition()
+        # (priority, sequence, job) for the first queued job of each session
+        self._heads = []
+        self._threads = []
+        self._idle = 0
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._queue_times = _QueueTimes()
+        self._counter = itertools.count(1)
+        self._sequence = itertools.count()
+
+    def open_session(self, name=None):
+        """
+        Register a session with the pool.
+
+        Args:
+            name (str, optional): Label used in logs
+
+        Returns:
+            PoolSession: The handle used to submit the session's jobs
+        """
+        return PoolSession(self, name or f"session-{next(self._counter)}")
+
+    def _submit(self, session, fn, args, kwargs, deadline=None):
+        job = _Job(session, fn, args, kwargs, deadline)
+        with self._lock:
+            session._jobs.append(job)
+            session.submitted += 1
+            if len(session._jobs) == 1:
+                self._push_head(job, job.queued_at)
+            self._queued += 1
+            if self._idle < self._queued and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work, daemon=True,
+                    name=f"tts-pool-{len(self._threads) + 1}",
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._lock.notify()
+        return job.future
+
+    def _push_head(self, job, reached_head_at):
+        """Schedule a job that became the first of its session (lock held)."""
+        priority = job.deadline if job.deadline is not None else reached_head_at
+        heapq.heappush(self._heads, (priority, next(self._sequence), job))
+
+    def _next_job(self):
+        """Take the session head with the earliest deadline, or None (lock held)."""
+        while self._heads:
+            _, _, job = heapq.heappop(self._heads)
+            session = job.session
+            if not session._jobs or session._jobs[0] is not job:
+                # Stale entry of a closed session
+                continue
+            session._jobs.popleft()
+            self._queued -= 1
+            if session._jobs:
+                # Without a deadline the next job goes behind the waiting sessions
+                self._push_head(session._jobs[0], time.monotonic())
+            return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+                job = self._next_job()
+                while job is None:
+                    self._lock.wait()
+                    job = self._next_job()
+                self._idle -= 1
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+
+                now = time.monotonic()
+                waited = now - job.queued_at
+                late = job.deadline is not None and now > job.deadline
+                self._queue_times.add(waited, late)
+                job.session.queue_times.add(waited, late)
+                job.session.running += 1
+                self._running += 1
+
+            if waited > 1.0:
+                logger.debug(f"TTS job of {job.session.name} waited {waited:.2f}s in the pool queue")
+
+            try:
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                with self._lock:
+                    job.session.running -= 1
+                    self._running -= 1
+                    self._completed += 1
+
+    def _close_session(self, session):
+        with self._lock:
+            # Its heap entry is dropped lazily by _next_job
+            jobs, session._jobs = list(session._jobs), deque()
+            self._queued -= len(jobs)
+        for job in jobs:
+            job.future.cancel()
+
+    def stats(self):
+        """Return the pool's load and queue-time metrics."""
+        with self._lock:
+            stats = {
+                "max_workers": self.max_workers,
+                "threads": len(self._threads),
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+            }
+            stats.update(self._queue_times.as_dict())
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the TTS worker pool of the current process (``TTS_POOL_WORKERS``).
+
+    A new pool is created after a fork, since worker threads are not
+    inherited by the child process.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = TTSWorkerPool(getattr(settings, 'TTS_POOL_WORKERS', 8))
+                _pool_pid = pid
+    return _pool
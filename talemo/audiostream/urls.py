@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import start_audio_session, task_status
+from .views import start_audio_session, task_status, live_master, live_playlist, live_media
 urlpatterns = [
     path("start/", start_audio_session, name="start-audio"),
     path("task-status/<str:task_id>/", task_status, name="task-status"),
+    path("live/<str:session_id>/master.m3u8", live_master, name="live-master"),
+    path("live/<str:session_id>/audio.m3u8", live_playlist, name="live-playlist"),
+    path("live/<str:session_id>/<str:name>", live_media, name="live-media"),
+    path("live/<str:session_id>/<str:rendition>/audio.m3u8", live_playlist, name="live-rendition-playlist"),
+    path("live/<str:session_id>/<str:rendition>/<str:name>", live_media, name="live-rendition-media"),
 ]
@@ -1,15 +1,26 @@
+import functools
 import os
 import logging
 import traceback
+import re
 import sys
+import time
 import uuid
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, Http404
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 from celery.result import AsyncResult
 from .tasks import generate_audio_stream
 from .models import AudioSession
+from .storage import get_store, master_url
+from . import llhls
+from .hls import AUDIO_CODECS
+from .profiles import PROFILES
+from .playlist import MASTER_PLAYLIST_NAME, PLAYLIST_NAME, get_live
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -27,6 +38,16 @@ def start_audio_session(request):
     logger.info(f"start_audio_session called with request: {request.data}")
     prompt = request.data["prompt"]
     lang = request.data.get("lang","en")
+    # "copy" packages the TTS engine's MP3 without transcoding it to AAC
+    audio_codec = request.data.get("audio_codec")
+    if audio_codec is not None and audio_codec not in AUDIO_CODECS:
+        return Response({"error": f"Unknown audio codec: {audio_codec}"}, status=400)
+    # Encoding profile, e.g. "speech" for a low bit rate
+    profile = request.data.get("profile")
+    if profile is not None and profile not in PROFILES:
+        return Response({"error": f"Unknown encoding profile: {profile}"}, status=400)
+    # The session's output counts against the storage quota of its site
+    tenant = request.get_host()
 
     # Check if Celery is configured to run tasks eagerly (synchronously)
     from django.conf import settings
@@ -53,7 +74,8 @@ def start_audio_session(request):
             logger.info(f"Generated session ID: {session_id}")
 
             logger.info(f"Calling generate_audio_stream.delay with prompt: {prompt}, lang: {lang}, session_id: {session_id}")
-            async_res = generate_audio_stream.delay(prompt, lang, session_id)
+            async_res = generate_audio_stream.delay(prompt, lang, session_id, audio_codec=audio_codec,
+                                                    profile=profile, tenant=tenant)
             logger.info(f"generate_audio_stream.delay returned: {async_res}")
 
             # If we get here, Celery is working
@@ -71,7 +93,8 @@ def start_audio_session(request):
         # Run the task synchronously
         try:
             # Call the task directly with the session ID
-            result = generate_audio_stream(prompt, lang, session_id)
+            result = generate_audio_stream(prompt, lang, session_id, audio_codec=audio_codec, profile=profile,
+                                           tenant=tenant)
             logger.info(f"Synchronous execution result: {result}")
         except Exception as e:
             logger.error(f"Error in synchronous execution: {str(e)}")
@@ -84,32 +107,32 @@ def start_audio_session(request):
             try:
                 task_result = async_res.get(timeout=0)
                 if isinstance(task_result, dict) and "playlist" in task_result:
-                    playlist_url = task_result["playlist"]
-                    logger.info(f"Got playlist URL from task result: {playlist_url}")
+                    session_playlist_url = task_result["playlist"]
+                    logger.info(f"Got playlist URL from task result: {session_playlist_url}")
                 else:
                     # fall back – same as before
-                    playlist_url = f"{settings.HLS_URL}{session_id}/audio.m3u8"
-                    logger.warning(f"Task result doesn't contain playlist URL, using fallback: {playlist_url}")
+                    session_playlist_url = master_url(session_id)
+                    logger.warning(f"Task result doesn't contain playlist URL, using fallback: {session_playlist_url}")
             except Exception as exc:
                 logger.warning(f"Could not read result: {exc}")
-                playlist_url = f"{settings.HLS_URL}{session_id}/audio.m3u8"
-                logger.warning(f"Using fallback playlist URL due to error: {playlist_url}")
+                session_playlist_url = master_url(session_id)
+                logger.warning(f"Using fallback playlist URL due to error: {session_playlist_url}")
         else:
             # Task still running → fall back to deterministic URL
-            playlist_url = f"{settings.HLS_URL}{session_id}/audio.m3u8"
-            logger.info(f"Task still running, using deterministic playlist URL: {playlist_url}")
+            session_playlist_url = master_url(session_id)
+            logger.info(f"Task still running, using deterministic playlist URL: {session_playlist_url}")
     else:
         # For synchronous execution, we need to construct the URL ourselves
         # This is not ideal, but it's better than nothing
-        playlist_url = f"{settings.HLS_URL}{session_id}/audio.m3u8"
-        logger.warning(f"Using fallback playlist URL for synchronous execution: {playlist_url}")
+        session_playlist_url = master_url(session_id)
+        logger.warning(f"Using fallback playlist URL for synchronous execution: {session_playlist_url}")
 
     # Log the playlist URL for debugging
-    logger.info(f"Final playlist URL: {playlist_url}")
+    logger.info(f"Final playlist URL: {session_playlist_url}")
 
     return Response({
         "session_id": session_id,
-        "playlist": playlist_url,
+        "playlist": session_playlist_url,
         "task_id": session_id,  # Include task_id in the response for status checking
     })
 
@@ -126,6 +149,9 @@ def task_status(request, task_id):
     - FAILURE: Task failed
     """
     logger.info(f"Checking status for task: {task_id}")
+    # The task ID is the session ID; players of the static HLS files are
+    # only seen here
+    _touch(task_id)
 
     # Get the task result
     task_result = AsyncResult(task_id)
@@ -168,3 +194,238 @@ def task_status(request, task_id):
         response["status"] = f"Unknown state: {state}"
 
     return Response(response)
+
+
+def _check_ids(session_id, rendition=None):
+    if not re.fullmatch(r"[\w-]+", session_id):
+        raise Http404("Unknown session")
+    if rendition is not None and not re.fullmatch(r"[\w-]+", rendition):
+        raise Http404("Unknown rendition")
+
+
+# Seconds between two updates of a session's last access by this process
+ACCESS_UPDATE_INTERVAL = 60.0
+# Session ID -> time.monotonic() of its last access update
+_accessed = {}
+
+
+def _touch(session_id):
+    """Record an access to a session for the LRU eviction of its output (see retention.py)."""
+    now = time.monotonic()
+    if now - _accessed.get(session_id, -ACCESS_UPDATE_INTERVAL) < ACCESS_UPDATE_INTERVAL:
+        return
+    if len(_accessed) > 10000:
+        _accessed.clear()
+    _accessed[session_id] = now
+    try:
+        AudioSession.objects.filter(session_id=session_id).update(last_accessed_at=timezone.now())
+    except Exception as e:
+        logger.warning(f"Error recording the access to session {session_id}: {str(e)}")
+
+
+def _session_dir(session_id, rendition=None):
+    _check_ids(session_id, rendition)
+    path = get_store().session_path(session_id)
+    if rendition is not None:
+        # A rendition of an ABR ladder, in a subdirectory named after its profile
+        path = os.path.join(path, rendition)
+    if not os.path.isdir(path):
+        raise Http404("Unknown session")
+    return path
+
+
+def _reader(backend, session_id, name, rendition=None):
+    """
+    Return a function reading a file of a session from a backend of the
+    store (None if it is not there), or None if the store has no such
+    backend: its RAM tier (store.live) or object storage (store.remote).
+    """
+    if backend is None:
+        return None
+    _check_ids(session_id, rendition)
+    key = f"{rendition}/{name}" if rendition is not None else name
+
+    def read():
+        try:
+            return backend.get(session_id, key)
+        except Exception as e:
+            logger.warning(f"Error reading {key} of session {session_id} from {type(backend).__name__}: {str(e)}")
+            return None
+    return read
+
+
+def _archived(session_id, name, rendition=None):
+    """Return a file of a session moved to object storage, or raise Http404."""
+    read = _reader(get_store().remote, session_id, name, rendition)
+    data = read() if read is not None else None
+    if data is None:
+        raise Http404("Unknown session")
+    return data
+
+
+@require_GET
+def live_master(request, session_id):
+    """
+    Serve a session's master playlist. It lists the renditions' media
+    playlists with URIs relative to it, which are served by live_playlist.
+    """
+    _check_ids(session_id)
+    _touch(session_id)
+    read = _reader(get_store().live, session_id, MASTER_PLAYLIST_NAME)
+    data = read() if read is not None else None
+    if data is not None:
+        return _playlist_response(data.decode(), None)
+
+    try:
+        path = os.path.join(_session_dir(session_id), MASTER_PLAYLIST_NAME)
+    except Http404:
+        return _playlist_response(_archived(session_id, MASTER_PLAYLIST_NAME).decode(), None)
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+    except FileNotFoundError:
+        raise Http404("Playlist not available yet")
+    return _playlist_response(text, None)
+
+
+@require_GET
+def live_playlist(request, session_id, rendition=None):
+    """
+    Serve a session's LL-HLS playlist, with blocking playlist reload.
+
+    With ``_HLS_msn`` (and optionally ``_HLS_part``) the request is held
+    until the playlist lists that segment or part, for at most three target
+    durations, as the LL-HLS specification requires. ``_HLS_skip=YES``
+    asks for a delta update without the segments older than CAN-SKIP-UNTIL.
+
+    The playlist is read from the store's RAM tier if there is one, without
+    disk I/O. Otherwise a playlist produced in this process is answered
+    from memory, and the rendered file is read; the RAM tier and the file
+    are always returned in full. A finished session moved to object storage
+    is read from there.
+    """
+    msn = request.GET.get("_HLS_msn")
+    part = request.GET.get("_HLS_part")
+    if msn is None and part is not None:
+        return HttpResponseBadRequest("_HLS_part requires _HLS_msn")
+    try:
+        msn = int(msn) if msn is not None else None
+        part = int(part) if part is not None else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid _HLS_msn or _HLS_part")
+    # v2 also skips date ranges, which these playlists do not have
+    skip = request.GET.get("_HLS_skip") in ("YES", "v2")
+    _check_ids(session_id, rendition)
+    _touch(session_id)
+
+    read = _reader(get_store().live, session_id, PLAYLIST_NAME, rendition)
+    data = read() if read is not None else None
+    if data is not None:
+        text = data.decode()
+        state = llhls.PlaylistState(text)
+        wait = functools.partial(llhls.wait_for_stored_playlist, read, msn, part)
+    else:
+        try:
+            path = os.path.join(_session_dir(session_id, rendition), PLAYLIST_NAME)
+        except Http404:
+            # A finished session moved to object storage
+            text = _archived(session_id, PLAYLIST_NAME, rendition).decode()
+            return _playlist_response(text, msn, immutable=llhls.PlaylistState(text).vod)
+        live = get_live(path)
+        if live is not None:
+            if msn is not None and not live.has(msn, part):
+                if msn > live.next_msn + 2:
+                    return HttpResponseBadRequest("_HLS_msn is too far ahead of the playlist")
+                if not live.wait(msn, part, timeout=3 * live.target_duration):
+                    return HttpResponse("Playlist update not available", status=503)
+            return _playlist_response(live.render(skip=skip), msn)
+
+        text, state = llhls.read_playlist(path)
+        if text is None:
+            raise Http404("Playlist not available yet")
+        wait = functools.partial(llhls.wait_for_playlist, path, msn, part)
+
+    if msn is not None and not state.has(msn, part):
+        if msn > state.next_msn + 2:
+            # Too far ahead to be answered within the hold time
+            return HttpResponseBadRequest("_HLS_msn is too far ahead of the playlist")
+        text, state = wait(timeout=3 * state.target_duration)
+        if not state.has(msn, part):
+            return HttpResponse("Playlist update not available", status=503)
+    return _playlist_response(text, msn, immutable=state.vod)
+
+
+def _playlist_response(text, msn, immutable=False):
+    response = HttpResponse(text, content_type="application/vnd.apple.mpegurl")
+    if immutable:
+        # The VOD playlist of a compacted session never changes
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        # Blocking requests name a specific playlist version and can be cached
+        response["Cache-Control"] = "max-age=60" if msn is not None else "no-cache"
+    return response
+
+
+@require_GET
+def live_media(request, session_id, name, rendition=None):
+    """
+    Serve an init segment, segment or part of a session. A part that is
+    not written yet (the playlist's preload hint) is held until it is.
+
+    A single byte range is answered with 206, for the segments of a
+    compacted session's media file.
+
+    Files in the store's RAM tier are served from it, without disk I/O,
+    and the files of a session moved to object storage from there.
+    """
+    if not llhls.MEDIA_NAME_RE.match(name):
+        raise Http404("Unknown file")
+    _check_ids(session_id, rendition)
+    _touch(session_id)
+    content_type = "video/mp2t" if name.endswith(".ts") else "audio/mp4"
+    hold = 3 * getattr(settings, 'HLS_PART_DURATION', 0.2) + 1.0
+
+    read = _reader(get_store().live, session_id, name, rendition)
+    if read is not None:
+        # Only a part can be hinted before it is written
+        data = llhls.wait_for_data(read, timeout=hold) if name.startswith("part_") else read()
+        if data is not None:
+            return _media_response(request, content_type, data=data)
+        hold = 0.0
+
+    try:
+        path = os.path.join(_session_dir(session_id, rendition), name)
+    except Http404:
+        return _media_response(request, content_type, data=_archived(session_id, name, rendition))
+    if not llhls.wait_for_file(path, timeout=hold):
+        raise Http404("File not available")
+    return _media_response(request, content_type, path=path)
+
+
+def _media_response(request, content_type, data=None, path=None):
+    """Respond with a media file's data, or the file at ``path``."""
+    size = len(data) if data is not None else os.path.getsize(path)
+    match = llhls.RANGE_RE.match(request.headers.get("Range", ""))
+    if match:
+        start = int(match.group("start"))
+        end = min(int(match.group("end") or size - 1), size - 1)
+        if start > end:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if data is None:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
+        else:
+            data = data[start:end + 1]
+        response = HttpResponse(data, status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    elif data is not None:
+        response = HttpResponse(data, content_type=content_type)
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    # Parts, segments and compacted files never change once written
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
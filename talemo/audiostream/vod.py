@@ -0,0 +1,185 @@
+"""
+Compaction of a finished session into a video-on-demand (VOD) rendition.
+
+While a story is generated its playlist is an EVENT playlist of one small
+file per segment (see playlist.py). Once the playlist has ended,
+compact_session joins the init segment and the segments of each rendition
+into a single file, ``audio.mp4`` (``audio.ts`` for the MPEG-TS segments
+of copy mode), and replaces the playlist with a VOD playlist that
+addresses each segment with ``EXT-X-BYTERANGE``. The loose segments and
+parts are deleted afterwards, and the session's manifest records the
+new media file (see manifest.py).
+
+Nothing is transcoded: the fMP4 fragments are moved as they are, without
+their ``styp`` and ``sidx`` boxes, which only describe a standalone
+segment. A replay then loads a playlist and one media file that never
+change, so both can be cached for ever.
+"""
+import logging
+import os
+import re
+
+from . import fmp4
+from .manifest import SessionManifest
+from .playlist import MASTER_PLAYLIST_NAME, MUXER_PLAYLIST_NAME, PLAYLIST_NAME, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Single media file of a compacted rendition, by segment type
+VOD_NAMES = {"fmp4": "audio.mp4", "mpegts": "audio.ts"}
+# Files of the live session that the compacted rendition replaces
+LOOSE_MEDIA_RE = re.compile(r"^((segment|part)_\d+\.(m4s|ts)|init(_[\w-]+)?\.mp4)(\.tmp)?$")
+
+
+class EndedPlaylist:
+    """Init segment and segments of an ended media playlist."""
+
+    def __init__(self, text):
+        self.target_duration = None
+        self.map_uri = None
+        # (uri, duration) of the segments
+        self.segments = []
+        self.ended = False
+        self.vod = False
+
+        duration = None
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("#EXT-X-TARGETDURATION:"):
+                self.target_duration = int(line.split(":", 1)[1])
+            elif line.startswith("#EXT-X-MAP:"):
+                self.map_uri = re.search(r'URI="([^"]+)"', line).group(1)
+            elif line.startswith("#EXT-X-PLAYLIST-TYPE:"):
+                self.vod = line.split(":", 1)[1] == "VOD"
+            elif line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line.startswith("#EXT-X-ENDLIST"):
+                self.ended = True
+            elif line and not line.startswith("#") and duration is not None:
+                self.segments.append((line, duration))
+                duration = None
+
+
+def render_vod_playlist(uri, segments, target_duration, map_size=None):
+    """
+    Return the text of a VOD playlist of byte ranges of a single file.
+
+    Args:
+        uri (str): URI of the media file
+        segments (list): (offset, size, duration) of the segments
+        target_duration (int): EXT-X-TARGETDURATION in seconds
+        map_size (int, optional): Size of the init segment at the start of
+            the file, None for segments without one
+    """
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    if map_size is not None:
+        lines.append(f'#EXT-X-MAP:URI="{uri}",BYTERANGE="{map_size}@0"')
+    for offset, size, duration in segments:
+        lines += [f"#EXTINF:{duration:.6f},", f"#EXT-X-BYTERANGE:{size}@{offset}", uri]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def compact_rendition(hls_dir):
+    """
+    Compact the ended playlist of a directory into a single media file.
+
+    Args:
+        hls_dir (str): Directory of the media playlist and its segments
+
+    Returns:
+        dict: Segments compacted, name and size of the media file and
+        number of files deleted, or None if the rendition was already
+        compacted
+
+    Raises:
+        ValueError: If the playlist has not ended yet
+        FileNotFoundError: If the playlist or one of its files is missing
+    """
+    playlist_path = os.path.join(hls_dir, PLAYLIST_NAME)
+    with open(playlist_path, "r") as f:
+        playlist = EndedPlaylist(f.read())
+    if playlist.vod:
+        return None
+    if not playlist.ended:
+        raise ValueError(f"The playlist {playlist_path} has not ended")
+
+    segment_type = "fmp4" if playlist.map_uri else "mpegts"
+    name = VOD_NAMES[segment_type]
+    path = os.path.join(hls_dir, name)
+    ranges = []
+    map_size = None
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as out:
+        if playlist.map_uri:
+            with open(os.path.join(hls_dir, playlist.map_uri), "rb") as f:
+                map_size = out.write(f.read())
+        for uri, duration in playlist.segments:
+            with open(os.path.join(hls_dir, uri), "rb") as f:
+                data = f.read()
+            if segment_type == "fmp4":
+                data = fmp4.strip_boxes(data, {b"styp", b"sidx"})
+            ranges.append((out.tell(), out.write(data), duration))
+        size = out.tell()
+    os.replace(tmp_path, path)
+
+    target_duration = playlist.target_duration or max(1, round(max((d for _, d in playlist.segments), default=1)))
+    # The playlist only points to the new file once it is complete
+    write_atomic(playlist_path, render_vod_playlist(name, ranges, target_duration, map_size).encode())
+
+    deleted = 0
+    for entry in os.listdir(hls_dir):
+        if LOOSE_MEDIA_RE.match(entry) or entry.startswith(MUXER_PLAYLIST_NAME):
+            try:
+                os.remove(os.path.join(hls_dir, entry))
+                deleted += 1
+            except OSError as e:
+                logger.warning(f"Error deleting {entry} from {hls_dir}: {str(e)}")
+
+    logger.info(f"Compacted {len(ranges)} segments of {hls_dir} into {name} ({size} bytes), "
+                f"{deleted} files deleted")
+    return {"segments": len(ranges), "uri": name, "size": size, "deleted": deleted}
+
+
+def rendition_dirs(session_dir):
+    """
+    Return the directories of a session's renditions: the subdirectories
+    listed in its master playlist, or the session directory itself.
+    """
+    try:
+        with open(os.path.join(session_dir, MASTER_PLAYLIST_NAME), "r") as f:
+            uris = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        uris = []
+    dirs = [os.path.join(session_dir, os.path.dirname(uri)) for uri in uris if os.path.dirname(uri)]
+    return dirs or [session_dir]
+
+
+def compact_session(session_dir):
+    """
+    Compact every rendition of a finished session.
+
+    The master playlist is left as it is: the media playlists keep their
+    names.
+
+    Args:
+        session_dir (str): Session directory
+
+    Returns:
+        dict: compact_rendition's result by rendition directory
+    """
+    results = {hls_dir: compact_rendition(hls_dir) for hls_dir in rendition_dirs(session_dir)}
+    manifest = SessionManifest.load(session_dir)
+    if manifest is not None:
+        for hls_dir, result in results.items():
+            if result is not None:
+                rendition = os.path.relpath(hls_dir, session_dir)
+                manifest.compacted("" if rendition == os.curdir else rendition, result["uri"], result["size"])
+    return results
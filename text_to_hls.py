@@ -4,7 +4,8 @@ Simple script to convert text to HLS audio using Google Text-to-Speech and ffmpe
 
 This script:
 1. Takes a text input
-2. Converts text to speech using Google Text-to-Speech (gTTS)
+2. Converts text to speech using a pluggable TTS engine (gTTS by default,
+   or the offline espeak-ng engine)
 3. Uses ffmpeg to create an HLS playlist and MP3 file
 4. Supports streaming mode for processing text chunks incrementally
 5. Optimized for low-latency HTTP audio streaming
@@ -34,10 +35,10 @@ import tempfile
 import subprocess
 import logging
 import argparse
-import nltk
 import shutil
 import uuid
-from gtts import gTTS
+from talemo.audiostream.segmenter import SentenceSegmenter
+from talemo.audiostream.tts import get_engine
 
 # Set up logging
 logging.basicConfig(
@@ -46,14 +47,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Download NLTK punkt tokenizer for sentence splitting if not already downloaded
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-
-def speak_chunk_to_ffmpeg(text: str, lang: str, ffmpeg_stdin):
+def speak_chunk_to_ffmpeg(text: str, lang: str, ffmpeg_stdin, engine: str = "gtts"):
     """
     Stream text-to-speech output directly to ffmpeg.
     
@@ -61,12 +55,12 @@ def speak_chunk_to_ffmpeg(text: str, lang: str, ffmpeg_stdin):
         text (str): Text to convert to speech
         lang (str): Language code for speech synthesis
         ffmpeg_stdin: stdin pipe of the ffmpeg process
+        engine (str): Name of the TTS engine (default: "gtts")
         
     Returns:
         None
     """
-    tts = gTTS(text=text, lang=lang, slow=False)
-    for buf in tts.stream():          # MP3 frames
+    for buf in get_engine(engine).stream(text, lang):          # MP3 frames
         ffmpeg_stdin.write(buf)
     ffmpeg_stdin.flush()
 
@@ -79,7 +73,7 @@ class StreamingTextToHLS:
     text-to-speech output directly to it for true low-latency streaming.
     """
 
-    def __init__(self, output_dir=None, segment_duration=2, language="en"):
+    def __init__(self, output_dir=None, segment_duration=2, language="en", engine="gtts"):
         """
         Initialize the StreamingTextToHLS instance.
 
@@ -87,6 +81,7 @@ class StreamingTextToHLS:
             output_dir (str): Path to output directory
             segment_duration (int): Duration of each segment in seconds (default: 2)
             language (str): Language code for speech synthesis
+            engine (str): Name of the TTS engine (default: "gtts")
         """
         # Create a temporary directory if output_dir is not provided
         self.temp_dir = None
@@ -96,6 +91,7 @@ class StreamingTextToHLS:
 
         self.segment_duration = segment_duration
         self.language = language
+        self.engine = engine
 
         # Create HLS directory
         self.hls_dir = os.path.join(output_dir, "hls")
@@ -168,7 +164,8 @@ class StreamingTextToHLS:
         speak_chunk_to_ffmpeg(
             text_chunk,
             self.language,
-            self.ffmpeg_stdin
+            self.ffmpeg_stdin,
+            self.engine
         )
 
         # Update state
@@ -229,7 +226,8 @@ class StreamingTextToHLS:
 def process_text_to_hls(text,
                        output_dir: str = None,
                        segment_duration: int = 2,
-                       language: str = "en") -> dict:
+                       language: str = "en",
+                       engine: str = "gtts") -> dict:
     """
     Process text to HLS audio with low-latency streaming.
 
@@ -243,6 +241,7 @@ def process_text_to_hls(text,
         output_dir (str): Path to output directory
         segment_duration (int): Duration of each segment in seconds (default: 2)
         language (str): Language code for speech synthesis
+        engine (str): Name of the TTS engine (default: "gtts")
 
     Returns:
         dict: Information about the generated HLS stream
@@ -252,6 +251,7 @@ def process_text_to_hls(text,
         output_dir=output_dir,
         segment_duration=segment_duration,
         language=language,
+        engine=engine,
     )
 
     if isinstance(text, str):
@@ -269,10 +269,11 @@ def process_text_to_hls(text,
 def main():
     """Main function."""
     # Parse arguments
-    parser = argparse.ArgumentParser(description='Convert text to HLS audio using Google Text-to-Speech')
+    parser = argparse.ArgumentParser(description='Convert text to HLS audio using text-to-speech')
     parser.add_argument('--output-dir', '-o', type=str, help='Output directory')
     parser.add_argument('--segment-duration', '-d', type=int, default=2, help='Segment duration in seconds (ignored in streaming mode)')
     parser.add_argument('--language', '-l', type=str, default='en', help='Language code (e.g., en, fr, es)')
+    parser.add_argument('--engine', '-e', type=str, default='gtts', choices=['gtts', 'espeak'], help='TTS engine (espeak runs offline)')
     parser.add_argument('--text-file', '-t', type=str, help='Path to text file')
     parser.add_argument('--streaming', action='store_true', help='Use streaming mode (default behavior, flag kept for backward compatibility)')
     parser.add_argument('--chunk-size', type=int, default=40, help='Number of words per chunk in streaming mode')
@@ -299,38 +300,13 @@ L'enthousiasme de Freddy déborda lorsqu'il ouvrit fébrilement ce tome ancien,
 Freddy jeta un dernier regard au château flottant avant de se mettre en route, prêt à découvrir non seulement de lointaines planètes, mais aussi des histoires méconnues pouvant nous instruire tous. Son cœur débordait d'émerveillement tandis qu'il s'élançait dans l'espace, emportant avec lui ce rappel précieux : peu importe jusqu'où l'on s'aventure loin de chez soi ou l'audace de nos rêves, des amis et le savoir attendent ceux qui ont le courage de les chercher !
         """
 
-    # Split text into chunks based on sentence boundaries and chunk_size
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_chunk_size = 0
-    
-    # Use NLTK to split text into sentences
-    sentences = nltk.sent_tokenize(text)
-    
-    for sentence in sentences:
-        sentence_words = sentence.split()
-        
-        # If adding this sentence would exceed chunk_size,
-        # finalize the current chunk and start a new one
-        if current_chunk_size + len(sentence_words) > args.chunk_size and current_chunk:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = []
-            current_chunk_size = 0
-        
-        # Add the sentence to the current chunk
-        current_chunk.append(sentence)
-        current_chunk_size += len(sentence_words)
-        
-        # If the chunk is now at or over the target size, finalize it
-        if current_chunk_size >= args.chunk_size:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = []
-            current_chunk_size = 0
-    
-    # Add any remaining text as the final chunk
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+    # Split text into chunks on sentence boundaries, packing short sentences
+    # together up to chunk_size words; the first chunk is kept short
+    segmenter = SentenceSegmenter(max_words=args.chunk_size, min_words=max(1, args.chunk_size // 2))
+    chunks = segmenter.feed(text)
+    last_chunk = segmenter.flush()
+    if last_chunk:
+        chunks.append(last_chunk)
 
     logger.info(f"Processing text with {len(chunks)} chunks")
 
@@ -340,6 +316,7 @@ Freddy jeta un dernier regard au château flottant avant de se mettre en route,
         output_dir=args.output_dir,
         segment_duration=args.segment_duration,
         language=args.language,
+        engine=args.engine,
     )
 
     logger.info(f"HLS playlist created at {result['playlist_path']}")